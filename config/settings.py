@@ -11,6 +11,47 @@ class DatabaseConfig:
     name: str = "budget_workflow.db"
     path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "budget_workflow.db")
 
+    # Pool de connexions
+    pool_size: int = 8
+    pool_timeout: float = 10.0  # secondes d'attente max pour obtenir une connexion
+    max_connection_age: float = 1800.0  # recyclage des connexions après 30 min
+    health_check_interval: float = 60.0  # ping des connexions inactives depuis plus de 60 s
+
+    # Paramètres SQLite appliqués une seule fois à chaque nouvelle connexion
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    busy_timeout_ms: int = 5000
+    statement_cache_size: int = 128
+
+    # Écritures en lot (execute_many / bulk_insert / bulk_upsert)
+    bulk_chunk_size: int = 500
+
+    # Instrumentation des requêtes (utils/query_monitor.py)
+    query_monitoring: bool = os.getenv("BUDGET_QUERY_MONITORING", "1") != "0"
+    slow_query_threshold_ms: float = 200.0
+    slow_query_log_path: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "slow_queries.log")
+    page_query_budget: int = 40  # requêtes max par rerun d'une page
+    page_time_budget_ms: float = 1000.0  # temps SQL cumulé max par rerun d'une page
+    full_scan_check: bool = True  # EXPLAIN de chaque lecture filtrée distincte, alerte si parcours complet
+    full_scan_ignore_tables: tuple = ('dropdown_options', 'schema_migrations', 'sqlite_master', 'demande_stats',
+                                      'analytics_cube', 'bi_export_partitions', 'dropdown_usage')
+
+    # Cache de lecture des modèles (utils/query_cache.py)
+    query_cache_enabled: bool = os.getenv("BUDGET_QUERY_CACHE", "1") != "0"
+    query_cache_ttl: float = 300.0  # durée de vie max d'une entrée (secondes)
+    query_cache_max_entries: int = 1000
+    query_cache_max_bytes: int = 64 * 1024 * 1024
+    query_cache_check_interval: float = 2.0  # relecture de data_versions pour les écritures d'autres processus
+
+@dataclass
+class BudgetConfig:
+    """Contrôle des budgets à la soumission des demandes"""
+    # Réservation du montant sur le budget restant de l'année fiscale à la soumission :
+    # 'block' refuse une soumission qui dépasse le budget restant, 'warn' l'accepte avec
+    # un avertissement, 'off' désactive le contrôle
+    reservation_policy: str = os.getenv("BUDGET_RESERVATION_POLICY", "warn")
+    reservation_retries: int = 3  # relectures du registre en cas de modification concurrente
+
 @dataclass
 class EmailConfig:
     """Configuration for email notifications"""
@@ -85,6 +126,7 @@ class RoleConfig:
 
 # Configuration instances
 db_config = DatabaseConfig()
+budget_config = BudgetConfig()
 email_config = EmailConfig()
 app_config = AppConfig()
 role_config = RoleConfig()
@@ -22,105 +22,120 @@ class DemandeController:
                        by: str = "", selected_participants: Optional[List[int]] = None) -> tuple[bool, Optional[int]]:
         """Create a new demande with participant support (normal workflow)"""
         try:
-            from utils.spinner_utils import OperationFeedback
+            with db.unit_of_work() as uow:
+                from utils.spinner_utils import OperationFeedback
             
-            with OperationFeedback.create_demande():
-                # Calculate cy (calendar year) from date_evenement
-                try:
-                    date_obj = datetime.strptime(date_evenement, '%Y-%m-%d').date()
-                    cy = date_obj.year
-                except Exception:
-                    cy = None # Set cy to None if date parsing fails
+                with OperationFeedback.create_demande():
+                    # Calculate cy (calendar year) from date_evenement
+                    try:
+                        date_obj = datetime.strptime(date_evenement, '%Y-%m-%d').date()
+                        cy = date_obj.year
+                    except Exception:
+                        cy = None # Set cy to None if date parsing fails
 
-                # Valider l'année fiscale fournie
-                from utils.fiscal_year_utils import validate_fiscal_year, get_default_fiscal_year
+                    # Valider l'année fiscale fournie
+                    from utils.fiscal_year_utils import validate_fiscal_year, get_default_fiscal_year
                 
-                if by and validate_fiscal_year(by):
-                    final_by_string = by
-                else:
-                    if by:
-                        print(f"⚠️ Année fiscale non autorisée '{by}', utilisation de l'année par défaut")
-                    final_by_string = get_default_fiscal_year()
+                    if by and validate_fiscal_year(by):
+                        final_by_string = by
+                    else:
+                        if by:
+                            print(f"⚠️ Année fiscale non autorisée '{by}', utilisation de l'année par défaut")
+                        final_by_string = get_default_fiscal_year()
                 
-                print(f"[DEBUG] Création demande avec by={final_by_string}, cy={cy}")
+                    print(f"[DEBUG] Création demande avec by={final_by_string}, cy={cy}")
 
-                # Create the demande in the database
-                success, demande_id = DemandeModel.create_demande(
-                    user_id=user_id,
-                    type_demande=type_demande,
-                    nom_manifestation=nom_manifestation,
-                    client=client,
-                    date_evenement=date_evenement,
-                    lieu=lieu,
-                    montant=montant,
-                    participants=participants,
-                    commentaires=commentaires,
-                    urgence=urgence,
-                    budget=budget or "",
-                    categorie=categorie or "",
-                    typologie_client=typologie_client or "",
-                    groupe_groupement=groupe_groupement or "",
-                    region=region or "",
-                    agence=agence or "",
-                    client_enseigne=client_enseigne or "",
-                    mail_contact=mail_contact or "",
-                    nom_contact=nom_contact or "",
-                    demandeur_participe=demandeur_participe,
-                    participants_libres=participants_libres or "",
-                    cy=cy,  # Pass calculated cy
-                    by=final_by_string,  # Pass validated by string
-                )
+                    # Create the demande in the database
+                    success, demande_id = DemandeModel.create_demande(
+                        user_id=user_id,
+                        type_demande=type_demande,
+                        nom_manifestation=nom_manifestation,
+                        client=client,
+                        date_evenement=date_evenement,
+                        lieu=lieu,
+                        montant=montant,
+                        participants=participants,
+                        commentaires=commentaires,
+                        urgence=urgence,
+                        budget=budget or "",
+                        categorie=categorie or "",
+                        typologie_client=typologie_client or "",
+                        groupe_groupement=groupe_groupement or "",
+                        region=region or "",
+                        agence=agence or "",
+                        client_enseigne=client_enseigne or "",
+                        mail_contact=mail_contact or "",
+                        nom_contact=nom_contact or "",
+                        demandeur_participe=demandeur_participe,
+                        participants_libres=participants_libres or "",
+                        cy=cy,  # Pass calculated cy
+                        by=final_by_string,  # Pass validated by string
+                    )
             
-            if success and demande_id:
-                # Logger l'activité
-                ActivityLogModel.log_activity(
-                    user_id, demande_id, 'creation_demande',
-                    f"Création demande '{nom_manifestation}' - {montant}€"
-                )
+                if success and demande_id:
+                    # Logger l'activité
+                    ActivityLogModel.log_activity(
+                        user_id, demande_id, 'creation_demande',
+                        f"Création demande '{nom_manifestation}' - {montant}€"
+                    )
                 
-                # Gérer les participants selon le rôle
-                from models.participant import ParticipantModel
-                from models.user import UserModel
+                    # Gérer les participants selon le rôle
+                    from models.participant import ParticipantModel
+                    from models.user import UserModel
                 
-                # Récupérer le rôle de l'utilisateur
-                user_data = UserModel.get_user_by_id(user_id)
-                if user_data:
-                    user_role = user_data['role']
+                    # Récupérer le rôle de l'utilisateur
+                    user_data = UserModel.get_user_by_id(user_id)
+                    if user_data:
+                        user_role = user_data['role']
                     
-                    # Logique selon le rôle
-                    if user_role == 'tc':
-                        # TC participe automatiquement
-                        ParticipantModel.add_participant(demande_id, user_id, user_id)
-                        
-                    elif user_role == 'dr':
-                        # DR peut choisir de participer
-                        if demandeur_participe:
+                        # Logique selon le rôle
+                        if user_role == 'tc':
+                            # TC participe automatiquement
                             ParticipantModel.add_participant(demande_id, user_id, user_id)
                         
-                    # Add participants selected by the user in the form
-                    if selected_participants is not None:
-                        for participant_id in selected_participants:
-                             # Ensure participant_id is a valid user ID and not the creator's ID if auto-added
-                             # (Basic check, more robust validation might be needed)
-                             if participant_id and participant_id != user_id:
-                                 ParticipantModel.add_participant(demande_id, participant_id, user_id)
+                        elif user_role == 'dr':
+                            # DR peut choisir de participer
+                            if demandeur_participe:
+                                ParticipantModel.add_participant(demande_id, user_id, user_id)
+                        
+                        # Add participants selected by the user in the form
+                        if selected_participants is not None:
+                            for participant_id in selected_participants:
+                                 # Ensure participant_id is a valid user ID and not the creator's ID if auto-added
+                                 # (Basic check, more robust validation might be needed)
+                                 if participant_id and participant_id != user_id:
+                                     ParticipantModel.add_participant(demande_id, participant_id, user_id)
                 
-                # Handle automatic DR validation if the creator is a DR
-                if user_data and user_data['role'] == 'dr':
-                     now = datetime.now().isoformat()
-                     # Mettre à jour le statut et les champs de validation DR
-                     # Note: This assumes a DR validating their own request moves it to en_attente_financier
-                     # This might need adjustment based on exact workflow requirements.
-                     update_success = DemandeModel.update_demande(
-                          demande_id,
-                          status='en_attente_financier', # Pass directly to the next stage after DR validation
-                          valideur_dr_id=user_id,
-                          date_validation_dr=now,
-                          commentaire_dr="Validée automatiquement par le créateur (DR)"
-                     )
-                     if not update_success:
-                          print(f"[WARNING] Failed to auto-validate DR demand {demande_id}")
+                    # Handle automatic DR validation if the creator is a DR
+                    reservation = None
+                    if user_data and user_data['role'] == 'dr':
+                         # Même réservation du budget que la soumission avant le passage en attente ;
+                         # refusée (politique 'block') : la demande reste en brouillon
+                         reservation = DemandeModel.reserve_budget(demande_id)
+                         if reservation['message']:
+                              print(f"⚠️ {reservation['message']}")
+                    if reservation and reservation['allowed']:
+                         now = datetime.now().isoformat()
+                         # Mettre à jour le statut et les champs de validation DR
+                         # Note: This assumes a DR validating their own request moves it to en_attente_financier
+                         # This might need adjustment based on exact workflow requirements.
+                         update_success = DemandeModel.update_demande(
+                              demande_id,
+                              status='en_attente_financier', # Pass directly to the next stage after DR validation
+                              valideur_dr_id=user_id,
+                              date_validation_dr=now,
+                              commentaire_dr="Validée automatiquement par le créateur (DR)"
+                         )
+                         if not update_success:
+                              print(f"[WARNING] Failed to auto-validate DR demand {demande_id}")
+                              uow.set_rollback_only()
+            
+                if not success:
+                    uow.set_rollback_only()
             
+            # Participant, journal ou validation automatique en échec : rien n'a été enregistré
+            if uow.rollback_only:
+                return False, None
             print(f"[DEBUG] create_demande returning success: {success}, demande_id: {demande_id}")
             return success, demande_id
         except Exception as e:
@@ -129,10 +144,50 @@ class DemandeController:
     
     @staticmethod
     def get_demandes_for_user(user_id: int, role: str, search_query: str = "", 
-                             status_filter: str = "tous", fiscal_year_filter: Optional[str] = None) -> pd.DataFrame:
-        """Récupérer les demandes pour un utilisateur selon son rôle avec filtre année fiscale string"""
-        return DemandeModel.get_demandes_for_user(user_id, role, search_query, status_filter, fiscal_year_filter)
+                             status_filter: str = "tous", fiscal_year_filter: Optional[str] = None,
+                             filters: Optional[Dict[str, Any]] = None,
+                             search_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Récupérer les demandes pour un utilisateur selon son rôle, filtres appliqués en SQL"""
+        return DemandeModel.get_demandes_for_user(user_id, role, search_query, status_filter, fiscal_year_filter,
+                                                  filters=filters, search_columns=search_columns)
     
+    @staticmethod
+    def count_demandes_for_user(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Compter les demandes visibles par un utilisateur"""
+        return DemandeModel.count_demandes_for_user(user_id, role, filters)
+
+    @staticmethod
+    def get_demandes_page(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                          search_columns: Optional[List[str]] = None, page_size: Optional[int] = None,
+                          after: Optional[tuple] = None) -> Dict[str, Any]:
+        """Récupérer une page de demandes (pagination par clé updated_at, id)"""
+        return DemandeModel.get_demandes_page(user_id, role, filters, search_columns, page_size, after)
+
+    @staticmethod
+    def get_demandes_totals(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                            search_columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Totaux des demandes visibles correspondant aux filtres"""
+        return DemandeModel.get_demandes_totals(user_id, role, filters, search_columns)
+
+    @staticmethod
+    def get_top_clients(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                        limit: int = 10) -> List[Dict[str, Any]]:
+        """Clients des demandes visibles classés par montant total"""
+        return DemandeModel.get_top_clients(user_id, role, filters, limit)
+
+    @staticmethod
+    def get_analytics_slice(user_id: int, role: str, dims: List[str],
+                            filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Agrégats du cube analytique par dimensions, dans le périmètre du rôle"""
+        from models.analytics_cube import cube
+        return cube.slice(dims, filters, (user_id, role))
+
+    @staticmethod
+    def export_demandes_file(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                             fmt: str = 'csv') -> Dict[str, Any]:
+        """Exporter les demandes visibles et filtrées dans un fichier CSV/XLSX temporaire"""
+        return DemandeModel.export_demandes_to_file(user_id, role, filters, fmt)
+
     @staticmethod
     def get_demande_by_id(demande_id: int) -> Optional[Dict[str, Any]]:
         """Récupérer une demande par son ID"""
@@ -155,36 +210,42 @@ class DemandeController:
         return DemandeModel.update_demande(demande_id, **kwargs)
     
     @staticmethod
-    def submit_demande(demande_id: int, user_id: int) -> Tuple[bool, str]:
-        """Soumettre une demande pour validation"""
+    def submit_demande(demande_id: int, user_id: int) -> Tuple[bool, str, bool]:
+        """Soumettre une demande pour validation : (succès, message, avertissement budget)"""
         
-        # Soumettre via le modèle
-        success, message = DemandeModel.submit_demande(demande_id, user_id)
-        
-        if success:
-            # Logger l'activité
-            ActivityLogModel.log_activity(
-                user_id, demande_id, 'soumission_demande',
-                f"Soumission demande pour validation"
-            )
+        with db.unit_of_work() as uow:
+            # Soumettre via le modèle
+            success, message, warning = DemandeModel.submit_demande(demande_id, user_id)
+            
+            if success:
+                # Logger l'activité
+                ActivityLogModel.log_activity(
+                    user_id, demande_id, 'soumission_demande',
+                    f"Soumission demande pour validation"
+                )
         
-        return success, message
+        if success and uow.rollback_only:
+            return False, "Erreur lors de l'enregistrement de la soumission, opération annulée", False
+        return success, message, warning
     
     @staticmethod
     def validate_demande(demande_id: int, valideur_id: int, action: str, 
                         commentaire: str = "") -> Tuple[bool, str]:
         """Valider ou rejeter une demande"""
         
-        # Valider via le modèle
-        success, message = DemandeModel.validate_demande(demande_id, valideur_id, action, commentaire)
-        
-        if success:
-            # Logger l'activité
-            ActivityLogModel.log_activity(
-                valideur_id, demande_id, f'{action}_demande',
-                f"Demande {action}ée - Commentaire: {commentaire}"
-            )
+        with db.unit_of_work() as uow:
+            # Valider via le modèle
+            success, message = DemandeModel.validate_demande(demande_id, valideur_id, action, commentaire)
+            
+            if success:
+                # Logger l'activité
+                ActivityLogModel.log_activity(
+                    valideur_id, demande_id, f'{action}_demande',
+                    f"Demande {action}ée - Commentaire: {commentaire}"
+                )
         
+        if success and uow.rollback_only:
+            return False, "Erreur lors de l'enregistrement de la validation, opération annulée"
         return success, message
     
     @staticmethod
@@ -217,13 +278,12 @@ class DemandeController:
         """Récupérer le nombre de demandes en attente de validation pour un utilisateur"""
         try:
             if role == 'dr':
-                # Pour un DR, compter les demandes de son équipe en attente de validation DR
-                demandes = DemandeModel.get_demandes_for_user(user_id, role, status_filter='en_attente_dr')
-                return len(demandes)
+                # Pour un DR, compter les demandes de toute son équipe en attente de validation DR
+                return DemandeModel.count_demandes_for_user(user_id, role, {'status_filter': 'en_attente_dr',
+                                                                            'team_of': user_id})
             elif role in ['dr_financier', 'dg']:
                 # Pour les financiers, compter les demandes en attente de validation financière
-                demandes = DemandeModel.get_demandes_for_user(user_id, role, status_filter='en_attente_financier')
-                return len(demandes)
+                return DemandeModel.count_demandes_for_user(user_id, role, {'status_filter': 'en_attente_financier'})
             else:
                 return 0
         except Exception:
@@ -343,6 +343,41 @@ class UserController:
             st.error(f"Erreur lors de l'export: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def export_users_file(fmt: str = 'xlsx', active_only: bool = False,
+                          exported_by: Optional[str] = None) -> Dict[str, Any]:
+        """Export des utilisateurs en flux vers un fichier XLSX/CSV temporaire (mêmes colonnes qu'export_users)"""
+        from datetime import datetime
+        from config.settings import get_role_label
+        from models.database import db
+        from utils.streaming_export import export_query
+
+        where_clause = "WHERE is_active = TRUE" if active_only else ""
+        total = db.execute_query(f"SELECT COUNT(*) FROM users {where_clause}", fetch='one')
+        columns = [
+            ('ID', 'id', None),
+            ('Email', 'email', None),
+            ('Nom', 'nom', None),
+            ('Prénom', 'prenom', None),
+            ('Rôle', 'role', get_role_label),
+            ('Région', 'region', None),
+            ('Actif', 'is_active', lambda x: 'Oui' if x else 'Non'),
+            ('Date Création', 'created_at', lambda x: datetime.strptime(x[:10], '%Y-%m-%d').strftime('%d/%m/%Y') if x else ''),
+        ]
+        informations = [
+            ['Statistique', 'Valeur'],
+            ['Total utilisateurs', total[0] if total else 0],
+            ['Date export', datetime.now().strftime('%d/%m/%Y %H:%M')],
+            ['Exporté par', exported_by or ''],
+        ]
+        return export_query(f'''
+            SELECT id, email, nom, prenom, role, region, is_active, created_at
+            FROM users
+            {where_clause}
+            ORDER BY created_at DESC
+        ''', (), columns, fmt=fmt, file_prefix='utilisateurs', sheet_name='Utilisateurs',
+            extra_sheets={'Informations': informations})
+
     @staticmethod
     def delete_user_complete(user_id: int) -> Tuple[bool, str]:
         """Permanently delete a user and associated data"""
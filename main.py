@@ -50,15 +50,9 @@ def initialize_app():
     et le chargement des styles CSS personnalisés.
     Utilise le gestionnaire de session centralisé.
     """
-    # Initialise la base de données (crée le fichier .db et les tables si besoin).
+    # Met le schéma à jour via le registre schema_migrations (création des tables et
+    # migrations en attente). Une base déjà à jour ne coûte qu'une lecture de version.
     db.init_database()
-    
-    # Exécuter les migrations nécessaires
-    try:
-        from migrations.migrate_participants import migrate_participants_table
-        migrate_participants_table()
-    except Exception as e:
-        print(f"Avertissement: Erreur lors des migrations: {e}")
 
     # Charge et applique les styles CSS personnalisés.
     st.markdown(load_css(), unsafe_allow_html=True)
@@ -205,10 +199,12 @@ def route_pages():
     Utilise le gestionnaire de session centralisé.
     """
     from utils.session_manager import session_manager
+    from utils.query_monitor import query_monitor
     
     # Si l'utilisateur n'est pas connecté, affiche la page de connexion et arrête le routage.
     if not session_manager.is_authenticated():
         print("[DEBUG] User not authenticated, showing login page.")
+        query_monitor.set_page("login")
         login_page()
         return
 
@@ -225,6 +221,10 @@ def route_pages():
         st.rerun()
         return
 
+    # Requêtes de ce rerun comptées pour la page effectivement affichée
+    # (la barre latérale a pu changer de page depuis le début du rerun)
+    query_monitor.set_page(page)
+
     # Route vers la fonction de vue correspondante en fonction de la page demandée.
     # Les vues sont importées localement ici pour une meilleure organisation et potentiellement pour éviter les importations circulaires.
     print(f"[DEBUG] Routing to page function for: {page}")
@@ -264,6 +264,7 @@ def route_pages():
         # Si la page demandée n'est pas reconnue, affiche le tableau de bord par défaut.
         print(f"[DEBUG] Unrecognized page: {page}. Defaulting to dashboard.")
         session_manager.set_current_page("dashboard")
+        query_monitor.set_page("dashboard")
         dashboard_page()
 
 def main():
@@ -275,18 +276,21 @@ def main():
     # Configure les paramètres de la page Streamlit.
     configure_page()
 
+    # Mesure des requêtes SQL de ce rerun, agrégées par page (voir utils/query_monitor.py)
+    from utils.query_monitor import query_monitor
+    from utils.session_manager import session_manager
+    query_monitor.start_rerun(session_manager.get_current_page())
+    try:
+        _run_app()
+    finally:
+        query_monitor.end_rerun()
+
+def _run_app():
+    """Initialisation (premier passage), barre latérale et page courante."""
     # Initialise l'application (DB, CSS, session_manager) une seule fois
     if 'initialized' not in st.session_state or not st.session_state.initialized:
         print("[DEBUG] Initializing application for the first time...")
         initialize_app()
-        
-        # Exécuter la migration des années fiscales
-        try:
-            from migrations.fiscal_year_unification import migrate_fiscal_year_unification
-            migrate_fiscal_year_unification()
-        except Exception as e:
-            print(f"Avertissement: Erreur migration années fiscales: {e}")
-        
         st.session_state.initialized = True
     
     # Affiche la barre latérale de navigation
@@ -67,19 +67,15 @@ def run_migration():
             cursor.execute("SELECT id, date_evenement FROM demandes WHERE date_evenement IS NOT NULL")
             demandes = cursor.fetchall()
             
-            updated_count = 0
+            updates = []
             for demande in demandes:
-                demande_id = demande['id']
-                date_evenement = demande['date_evenement']
-                
-                cy, by = calculate_cy_by(date_evenement)
+                cy, by = calculate_cy_by(demande['date_evenement'])
                 
                 if cy and by:
-                    cursor.execute(
-                        "UPDATE demandes SET cy = ?, by = ? WHERE id = ?",
-                        (cy, by, demande_id)
-                    )
-                    updated_count += 1
+                    updates.append((cy, by, demande['id']))
+            
+            cursor.executemany("UPDATE demandes SET cy = ?, by = ? WHERE id = ?", updates)
+            updated_count = len(updates)
             
             conn.commit()
             print(f"✅ {updated_count} demandes mises à jour avec cy/by")
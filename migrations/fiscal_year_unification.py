@@ -23,17 +23,19 @@ def migrate_fiscal_year_unification():
                 AND (by IS NULL OR by = '')
             """, fetch='all')
             
-            # Mettre à jour chaque demande
-            for demande in demandes_to_update or []:
-                fiscal_year = demande['fiscal_year']
-                if fiscal_year and fiscal_year >= 1000:  # Validation basique
-                    by_value = f"BY{str(fiscal_year)[2:]}"
-                    db.execute_query("""
-                        UPDATE demandes 
-                        SET by = ?
-                        WHERE id = ?
-                    """, (by_value, demande['id']))
-                    print(f"  ✅ Demande {demande['id']}: fiscal_year {fiscal_year} → by {by_value}")
+            # Mettre à jour toutes les demandes en une seule transaction
+            updates = [
+                (f"BY{str(demande['fiscal_year'])[2:]}", demande['id'])
+                for demande in demandes_to_update or []
+                if demande['fiscal_year'] and demande['fiscal_year'] >= 1000  # Validation basique
+            ]
+            if updates:
+                result = db.execute_many("""
+                    UPDATE demandes 
+                    SET by = ?
+                    WHERE id = ?
+                """, updates)
+                print(f"  ✅ {result['success_count']} demande(s): fiscal_year → by")
         
         # 3. S'assurer que toutes les demandes ont une année fiscale par défaut
         from datetime import datetime
@@ -67,12 +69,12 @@ def migrate_fiscal_year_unification():
                 ('BY27', 'BY27', 5),
             ]
             
-            for value, label, order_index in default_years:
-                db.execute_query("""
-                    INSERT OR IGNORE INTO dropdown_options 
-                    (category, value, label, order_index, is_active)
-                    VALUES (?, ?, ?, ?, TRUE)
-                """, ('annee_fiscale', value, label, order_index))
+            db.bulk_insert(
+                'dropdown_options',
+                ['category', 'value', 'label', 'order_index', 'is_active'],
+                [('annee_fiscale', value, label, order_index, True) for value, label, order_index in default_years],
+                on_conflict='IGNORE'
+            )
             
             print(f"✅ {len(default_years)} années fiscales créées")
         else:
@@ -0,0 +1,205 @@
+"""
+Registre versionné des migrations de schéma (table schema_migrations)
+
+Chaque migration a un numéro de version, un nom et une somme de contrôle calculée
+sur son code source. Elle est appliquée une seule fois par base, dans sa propre
+transaction avec l'inscription dans le registre ; au démarrage d'une session, une
+base à jour ne coûte qu'une lecture de MAX(version).
+
+Ajouter une migration : l'ajouter en fin de liste dans get_migrations() avec le
+numéro suivant. Ne jamais modifier une migration déjà livrée, en créer une nouvelle.
+"""
+import hashlib
+import inspect
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from models.database import db
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Migration:
+    """Migration de schéma : apply(cursor) ou apply() ; un retour False signale un échec"""
+    version: int
+    name: str
+    apply: Callable
+
+    @property
+    def checksum(self) -> str:
+        try:
+            source = inspect.getsource(self.apply)
+        except (OSError, TypeError):
+            source = self.name
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def run(self, cursor: sqlite3.Cursor) -> Any:
+        if inspect.signature(self.apply).parameters:
+            return self.apply(cursor)
+        return self.apply()
+
+def get_migrations() -> List[Migration]:
+    """Liste ordonnée des migrations connues de cette version de l'application"""
+    from migrations.migrate_participants import migrate_participants_table
+    from migrations.fiscal_year_unification import migrate_fiscal_year_unification
+    from models.demande_visibility import DemandeVisibilityModel
+    from models.demande_search import DemandeSearchModel
+    from models.demande_stats import DemandeStatsModel
+    from utils.query_cache import QueryCache
+    from models.analytics_cube import AnalyticsCube
+    from models.demande_bi_export import DemandeParquetExport
+    from models.budget_ledger import BudgetLedgerModel
+    from models.user_hierarchy import UserHierarchyModel
+    from models.dropdown_usage import DropdownUsageModel
+
+    return [
+        Migration(1, 'schema_initial', db._create_tables),
+        Migration(2, 'colonnes_historiques', db._run_migrations),
+        Migration(3, 'donnees_par_defaut', db._create_default_data),
+        Migration(4, 'index_de_base', db._create_indexes),
+        Migration(5, 'table_participants', migrate_participants_table),
+        Migration(6, 'unification_annees_fiscales', migrate_fiscal_year_unification),
+        Migration(7, 'index_composites', db._create_composite_indexes),
+        Migration(8, 'visibilite_demandes', DemandeVisibilityModel.create_schema),
+        Migration(9, 'recherche_plein_texte', DemandeSearchModel.create_schema),
+        Migration(10, 'statistiques_demandes', DemandeStatsModel.create_schema),
+        Migration(11, 'compteurs_modifications', QueryCache.create_schema),
+        Migration(12, 'cube_analytique', AnalyticsCube.create_schema),
+        Migration(13, 'export_bi_partitions', DemandeParquetExport.create_schema),
+        Migration(14, 'registre_budgets', BudgetLedgerModel.create_schema),
+        Migration(15, 'hierarchie_utilisateurs', UserHierarchyModel.create_schema),
+        Migration(16, 'utilisations_listes_deroulantes', DropdownUsageModel.create_schema),
+        Migration(17, 'recherche_plein_texte_listes', DemandeSearchModel.recreate_schema),
+        Migration(18, 'visibilite_sans_equipe', DemandeVisibilityModel.drop_team_reason),
+        Migration(19, 'statistiques_suppression_utilisateur', DemandeStatsModel.add_user_delete_trigger),
+    ]
+
+class SchemaLedger:
+    """Application des migrations en attente sous verrou, une seule fois par base"""
+
+    _CREATE_LEDGER = '''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            checksum TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL
+        )
+    '''
+
+    def __init__(self):
+        # Verrou du processus : une seule session Streamlit migre, les autres attendent
+        self._lock = threading.Lock()
+        self._up_to_date = False
+
+    def current_version(self) -> int:
+        """Version du schéma enregistrée dans la base (0 si le registre n'existe pas)"""
+        with db.get_connection() as conn:
+            try:
+                row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+            except sqlite3.OperationalError:
+                return 0
+            return row[0] or 0
+
+    def migrate(self, target_version: Optional[int] = None) -> int:
+        """
+        Appliquer les migrations en attente.
+
+        Args:
+            target_version: S'arrêter à cette version (benchmarks, tests) ; par défaut la dernière
+
+        Returns:
+            Nombre de migrations appliquées par cet appel
+        """
+        if self._up_to_date:
+            return 0
+
+        with self._lock:
+            if self._up_to_date:
+                return 0
+
+            migrations = get_migrations()
+            if target_version is not None:
+                migrations = [m for m in migrations if m.version <= target_version]
+            if self.current_version() >= migrations[-1].version:
+                self._up_to_date = target_version is None
+                return 0
+
+            with db.get_connection() as conn:
+                conn.execute(self._CREATE_LEDGER)
+                conn.commit()
+
+            self._check_checksums(migrations)
+
+            applied = 0
+            for migration in migrations:
+                if self._apply(migration):
+                    applied += 1
+
+            self._up_to_date = target_version is None
+            logger.info(f"✅ Schéma à jour (version {migrations[-1].version}, {applied} migration(s) appliquée(s))")
+            return applied
+
+    def _apply(self, migration: Migration) -> bool:
+        """Appliquer une migration et l'inscrire dans le registre, dans la même transaction"""
+        with db.unit_of_work():
+            with db.get_connection() as conn:
+                cursor = conn.cursor()
+                # Relu sous BEGIN IMMEDIATE : un autre processus a pu l'appliquer entre-temps
+                cursor.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (migration.version,))
+                if cursor.fetchone():
+                    return False
+
+                logger.info(f"🔄 Migration {migration.version:04d} {migration.name}...")
+                start = time.perf_counter()
+                if migration.run(cursor) is False:
+                    raise RuntimeError(f"Échec de la migration {migration.version:04d} {migration.name}")
+
+                cursor.execute('''
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (?, ?, ?, ?)
+                ''', (migration.version, migration.name, migration.checksum,
+                      round((time.perf_counter() - start) * 1000, 1)))
+        return True
+
+    def _check_checksums(self, migrations: List[Migration]):
+        """Signaler les migrations déjà appliquées dont le code a changé depuis"""
+        by_version = {m.version: m for m in migrations}
+        for row in self.get_applied():
+            migration = by_version.get(row['version'])
+            if migration is None:
+                logger.warning(f"⚠️ Migration {row['version']:04d} {row['name']} inconnue de cette version de l'application")
+            elif migration.checksum != row['checksum']:
+                logger.warning(f"⚠️ Migration {row['version']:04d} {row['name']} modifiée depuis son application (somme de contrôle différente)")
+
+    def get_applied(self) -> List[Dict[str, Any]]:
+        """Migrations inscrites dans le registre"""
+        try:
+            rows = db.execute_query(
+                "SELECT version, name, checksum, applied_at, duration_ms FROM schema_migrations ORDER BY version",
+                fetch='all'
+            )
+            return [dict(row) for row in rows or []]
+        except Exception:
+            return []
+
+    def get_status(self) -> Dict[str, Any]:
+        """Version courante, version attendue, migrations en attente et sommes de contrôle divergentes"""
+        migrations = get_migrations()
+        applied = {row['version']: row for row in self.get_applied()}
+        return {
+            'current_version': max(applied) if applied else 0,
+            'latest_version': migrations[-1].version,
+            'pending': [f"{m.version:04d} {m.name}" for m in migrations if m.version not in applied],
+            'checksum_mismatch': [
+                f"{m.version:04d} {m.name}" for m in migrations
+                if m.version in applied and applied[m.version]['checksum'] != m.checksum
+            ],
+        }
+
+# Instance globale
+schema_ledger = SchemaLedger()
@@ -23,7 +23,7 @@ def update_existing_demandes():
         
         print(f"🔄 Mise à jour de {len(demandes)} demandes...")
         
-        updated_count = 0
+        updates = []
         for demande in demandes:
             demande_id = demande['id']
             date_evenement = demande['date_evenement']
@@ -32,16 +32,17 @@ def update_existing_demandes():
             cy, by = calculate_cy_by(date_evenement)
             
             if cy and by:
-                # Mettre à jour la demande
-                db.execute_query('''
-                    UPDATE demandes 
-                    SET cy = ?, by = ? 
-                    WHERE id = ?
-                ''', (cy, by, demande_id))
-                updated_count += 1
+                updates.append((cy, by, demande_id))
                 print(f"  ✓ Demande {demande_id}: {date_evenement} → cy={cy}, by={by}")
         
-        print(f"✅ {updated_count} demandes mises à jour avec succès")
+        # Appliquer toutes les mises à jour en une seule transaction
+        result = db.execute_many('''
+            UPDATE demandes 
+            SET cy = ?, by = ? 
+            WHERE id = ?
+        ''', updates)
+        
+        print(f"✅ {result['success_count']} demandes mises à jour avec succès")
         
     except Exception as e:
         print(f"❌ Erreur lors de la mise à jour: {e}")
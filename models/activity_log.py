@@ -33,6 +33,7 @@ class ActivityLogModel:
             return True
         except Exception as e:
             print(f"Erreur log activité: {e}")
+            db.set_rollback_only()
             return False
     
     @staticmethod
@@ -161,36 +162,57 @@ class ActivityLogModel:
             print(f"Erreur nettoyage logs: {e}")
             return False
     
+    # Colonnes de l'export des logs : (en-tête, clé, formateur)
+    EXPORT_COLUMNS = [
+        ('Date', 'created_at', None),
+        ('Nom', 'nom', None),
+        ('Prénom', 'prenom', None),
+        ('Rôle', 'role', None),
+        ('Email', 'email', None),
+        ('Action', 'action', None),
+        ('Détails', 'details', None),
+        ('Manifestation', 'nom_manifestation', None),
+        ('Client', 'client', None),
+    ]
+
+    @staticmethod
+    def _export_logs_query(start_date: str = None, end_date: str = None) -> tuple:
+        """Requête (sql, params) de l'export des logs ; intervalle sur created_at brut (index idx_activity_created)"""
+        from utils.filter_sql import date_range_conditions
+
+        where_conditions, params = date_range_conditions('a.created_at', start_date, end_date)
+        where_clause = ""
+        if where_conditions:
+            where_clause = "WHERE " + " AND ".join(where_conditions)
+
+        return f'''
+            SELECT a.created_at, u.nom, u.prenom, u.role, u.email,
+                   a.action, a.details, d.nom_manifestation, d.client
+            FROM activity_logs a
+            JOIN users u ON a.user_id = u.id
+            LEFT JOIN demandes d ON a.demande_id = d.id
+            {where_clause}
+            ORDER BY a.created_at DESC
+        ''', params
+
     @staticmethod
     def export_logs(start_date: str = None, end_date: str = None) -> pd.DataFrame:
         """Export activity logs for a date range"""
         try:
-            where_conditions = []
-            params = []
-            
-            if start_date:
-                where_conditions.append("DATE(a.created_at) >= ?")
-                params.append(start_date)
-            
-            if end_date:
-                where_conditions.append("DATE(a.created_at) <= ?")
-                params.append(end_date)
-            
-            where_clause = ""
-            if where_conditions:
-                where_clause = "WHERE " + " AND ".join(where_conditions)
-            
+            query, params = ActivityLogModel._export_logs_query(start_date, end_date)
             with db.get_connection() as conn:
-                df = pd.read_sql_query(f'''
-                    SELECT a.created_at, u.nom, u.prenom, u.role, u.email,
-                           a.action, a.details, d.nom_manifestation, d.client
-                    FROM activity_logs a
-                    JOIN users u ON a.user_id = u.id
-                    LEFT JOIN demandes d ON a.demande_id = d.id
-                    {where_clause}
-                    ORDER BY a.created_at DESC
-                ''', conn, params=params)
+                df = pd.read_sql_query(query, conn, params=params)
                 return df
         except Exception as e:
             print(f"Erreur export logs: {e}")
             return pd.DataFrame()
+
+    @staticmethod
+    def export_logs_to_file(start_date: str = None, end_date: str = None, fmt: str = 'csv') -> Dict[str, Any]:
+        """Export des logs en flux vers un fichier CSV/XLSX temporaire (voir utils.streaming_export)"""
+        from utils.streaming_export import export_query
+
+        query, params = ActivityLogModel._export_logs_query(start_date, end_date)
+        return export_query(query, params, ActivityLogModel.EXPORT_COLUMNS, fmt=fmt,
+                            file_prefix='activite', sheet_name='Activité')
+
@@ -0,0 +1,348 @@
+"""
+Cube analytique pré-agrégé des demandes (tables analytics_cube*)
+
+Le cube stocke nombre, somme des montants et somme des montants validés par mois de
+l'événement et par dimension (créateur, région, catégorie, budget, typologie client,
+année fiscale BY, CY, statut, type). Les graphiques interrogent ces lignes agrégées
+via cube.slice() au lieu de relire les demandes : le coût dépend du nombre de groupes,
+pas de l'historique.
+
+Rafraîchissement incrémental : des triggers journalisent dans analytics_cube_log la
+contribution retirée (OLD, signe -1) et ajoutée (NEW, signe +1) de chaque demande
+modifiée. refresh() agrège les lignes du journal au-delà du watermark (dernier seq
+traité) dans le cube, puis avance le watermark. Le journal est préféré à updated_at,
+qui n'est pas mis à jour par toutes les écritures (renommage de valeurs de listes
+déroulantes, ...) et n'a qu'une précision à la seconde.
+
+Périmètre : le cube ne sert que les rôles dont la liste des demandes s'exprime sur ses
+dimensions (CUBE_ROLES : admin, dr_financier, dg) ; pour tc / marketing / dr, la liste
+comprend les participations et les agrégats sont lus dans les demandes visibles.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.database import db
+from models.demande_visibility import SUBMITTED_ROLES, SUBMITTED_STATUSES_SQL
+from utils.filter_sql import _is_set
+from utils.query_cache import cached_query
+
+logger = logging.getLogger(__name__)
+
+# Dimensions du cube et leur expression sur une ligne de demandes (préfixe NEW / OLD / d)
+_DIMENSION_EXPRESSIONS = {
+    'mois': "COALESCE(strftime('%Y-%m', {p}.date_evenement), '')",
+    'user_id': "{p}.user_id",
+    'region': "COALESCE({p}.region, '')",
+    'categorie': "COALESCE({p}.categorie, '')",
+    'budget': "COALESCE({p}.budget, '')",
+    'typologie_client': "COALESCE({p}.typologie_client, '')",
+    'by': "COALESCE({p}.by, '')",
+    'cy': "COALESCE({p}.cy, 0)",
+    'status': "COALESCE({p}.status, '')",
+    'type_demande': "{p}.type_demande",
+}
+
+DIMENSIONS = tuple(_DIMENSION_EXPRESSIONS)
+
+# Colonnes de demandes dont la modification change la contribution d'une ligne au cube
+_SOURCE_COLUMNS = ('date_evenement', 'user_id', 'region', 'categorie', 'budget', 'typologie_client',
+                   'by', 'cy', 'status', 'type_demande', 'montant')
+
+# Filtres FilterUI exprimables sur les dimensions du cube
+_UI_FILTER_DIMENSIONS = {
+    'status_filter': 'status',
+    'type_filter': 'type_demande',
+    'by_filter': 'by',
+    'cy_filter': 'cy',
+}
+
+_DIMENSION_COLUMNS = ', '.join(DIMENSIONS)
+
+# Rôles dont le périmètre de la liste s'exprime sur les dimensions du cube. tc / marketing /
+# dr voient aussi leurs participations (demande_visibility), que le cube n'agrège pas :
+# leurs agrégats sont calculés sur les demandes visibles (DemandeModel)
+CUBE_ROLES = ('admin', *SUBMITTED_ROLES)
+
+def _dimension_values(prefix: str) -> str:
+    return ', '.join(_DIMENSION_EXPRESSIONS[dim].format(p=prefix) for dim in DIMENSIONS)
+
+def _log_sql(prefix: str, sign: int) -> str:
+    """Journaliser la contribution de la ligne NEW/OLD avec son signe"""
+    return f'''
+        INSERT INTO analytics_cube_log ({_DIMENSION_COLUMNS}, sign, montant)
+        VALUES ({_dimension_values(prefix)}, {sign}, COALESCE({prefix}.montant, 0));
+    '''
+
+class AnalyticsCube:
+    """Cube analytique des demandes : rafraîchissement incrémental et requêtes par tranche"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer le cube, son journal, ses triggers et le remplir (migration 0012)"""
+        dimensions_def = ''.join(f"{dim} {'INTEGER' if dim in ('user_id', 'cy') else 'TEXT'} NOT NULL,\n"
+                                 for dim in DIMENSIONS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS analytics_cube (
+                {dimensions_def}
+                nb INTEGER NOT NULL DEFAULT 0,
+                montant REAL NOT NULL DEFAULT 0,
+                montant_valide REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY ({_DIMENSION_COLUMNS})
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_analytics_cube_user ON analytics_cube(user_id, mois)")
+        # AUTOINCREMENT : seq jamais réutilisé après purge du journal (watermark monotone)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS analytics_cube_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                {dimensions_def}
+                sign INTEGER NOT NULL,
+                montant REAL NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_cube_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                watermark INTEGER NOT NULL DEFAULT 0,
+                refreshed_at TIMESTAMP
+            )
+        ''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_analytics_cube_insert AFTER INSERT ON demandes
+            BEGIN
+                {_log_sql('NEW', 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_analytics_cube_delete AFTER DELETE ON demandes
+            BEGIN
+                {_log_sql('OLD', -1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_analytics_cube_update
+            AFTER UPDATE OF {', '.join(_SOURCE_COLUMNS)} ON demandes
+            BEGIN
+                {_log_sql('OLD', -1)}
+                {_log_sql('NEW', 1)}
+            END
+        ''')
+
+        AnalyticsCube._fill(cursor.execute)
+
+    @staticmethod
+    def _fill(execute):
+        """Recalculer le cube depuis demandes et vider le journal (execute : cursor.execute ou db.execute_query)"""
+        execute("DELETE FROM analytics_cube")
+        execute(f'''
+            INSERT INTO analytics_cube ({_DIMENSION_COLUMNS}, nb, montant, montant_valide)
+            SELECT {_dimension_values('d')}, COUNT(*), SUM(d.montant),
+                   SUM(CASE WHEN d.status = 'validee' THEN d.montant ELSE 0 END)
+            FROM demandes d
+            GROUP BY {_dimension_values('d')}
+        ''')
+        execute("DELETE FROM analytics_cube_log")
+        execute('''
+            INSERT INTO analytics_cube_state (id, watermark, refreshed_at)
+            VALUES (1, COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'analytics_cube_log'), 0), CURRENT_TIMESTAMP)
+            ON CONFLICT (id) DO UPDATE SET watermark = excluded.watermark, refreshed_at = excluded.refreshed_at
+        ''')
+
+    def refresh(self) -> int:
+        """
+        Intégrer au cube les lignes du journal au-delà du watermark.
+
+        Returns:
+            Nombre de lignes de journal intégrées (0 si le cube était à jour)
+        """
+        state_sql = '''
+            SELECT (SELECT watermark FROM analytics_cube_state WHERE id = 1) AS watermark,
+                   (SELECT MAX(seq) FROM analytics_cube_log) AS upto
+        '''
+        try:
+            # Cube à jour : une lecture, sans ouvrir de transaction d'écriture
+            state = db.execute_query(state_sql, fetch='one')
+            if state['upto'] is None or state['upto'] <= (state['watermark'] or 0):
+                return 0
+
+            with db.unit_of_work():
+                state = db.execute_query(state_sql, fetch='one')
+                watermark, upto = state['watermark'] or 0, state['upto']
+                if upto is None or upto <= watermark:
+                    return 0
+
+                db.execute_query(f'''
+                    INSERT INTO analytics_cube ({_DIMENSION_COLUMNS}, nb, montant, montant_valide)
+                    SELECT {_DIMENSION_COLUMNS}, SUM(sign), SUM(sign * montant),
+                           SUM(CASE WHEN status = 'validee' THEN sign * montant ELSE 0 END)
+                    FROM analytics_cube_log
+                    WHERE seq > ? AND seq <= ?
+                    GROUP BY {_DIMENSION_COLUMNS}
+                    ON CONFLICT ({_DIMENSION_COLUMNS}) DO UPDATE SET
+                        nb = nb + excluded.nb,
+                        montant = montant + excluded.montant,
+                        montant_valide = montant_valide + excluded.montant_valide
+                ''', (watermark, upto))
+                db.execute_query("DELETE FROM analytics_cube WHERE nb <= 0")
+                processed = db.execute_query("DELETE FROM analytics_cube_log WHERE seq <= ?", (upto,))
+                db.execute_query('''
+                    UPDATE analytics_cube_state SET watermark = ?, refreshed_at = CURRENT_TIMESTAMP WHERE id = 1
+                ''', (upto,))
+            return processed
+        except Exception as e:
+            logger.error(f"Erreur rafraîchissement cube analytique: {e}")
+            return 0
+
+    def rebuild(self) -> bool:
+        """Recalculer entièrement le cube depuis les demandes"""
+        try:
+            with db.unit_of_work():
+                AnalyticsCube._fill(db.execute_query)
+            return True
+        except Exception as e:
+            logger.error(f"Erreur reconstruction cube analytique: {e}")
+            return False
+
+    @staticmethod
+    def supports_role(role: str) -> bool:
+        """Le cube donne-t-il les mêmes agrégats que la liste des demandes pour ce rôle ?"""
+        return role in CUBE_ROLES
+
+    @staticmethod
+    def _scope_condition(role_scope: Optional[Tuple[int, str]]) -> Optional[Tuple[List[str], List[Any]]]:
+        """
+        Périmètre d'un rôle sur le cube, identique à celui de la liste ; None si le rôle
+        n'est pas couvert par le cube (voir CUBE_ROLES).
+
+        dr_financier / dg : demandes soumises (SUBMITTED_STATUSES_SQL) ; admin ou role_scope None : toutes.
+        """
+        if role_scope is None:
+            return [], []
+        role = role_scope[1]
+        if role in SUBMITTED_ROLES:
+            return [f"status IN {SUBMITTED_STATUSES_SQL}"], []
+        if role == 'admin':
+            return [], []
+        return None
+
+    def slice(self, dims: Iterable[str], filters: Optional[Dict[str, Any]] = None,
+              role_scope: Optional[Tuple[int, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Agrégats du cube groupés par dims (roll-up : moins de dimensions ; drill-down : plus).
+
+        Args:
+            dims: Dimensions de regroupement parmi DIMENSIONS ([] : une ligne de total)
+            filters: {dimension: valeur ou liste de valeurs} ; 'mois_debut' / 'mois_fin'
+                (format AAAA-MM, bornes incluses) restreignent la période
+            role_scope: (user_id, role) de l'utilisateur, None pour tout le cube ; rôle hors
+                CUBE_ROLES : aucune ligne (agrégats à calculer sur les demandes visibles)
+
+        Returns:
+            Lignes {dimensions..., nb, montant, montant_valide} triées par dimensions
+        """
+        dims = tuple(dims)
+        unknown = [dim for dim in dims if dim not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Dimensions inconnues: {unknown}")
+
+        normalized = []
+        for name, value in sorted((filters or {}).items()):
+            if name not in DIMENSIONS and name not in ('mois_debut', 'mois_fin'):
+                raise ValueError(f"Filtre inconnu: {name}")
+            if isinstance(value, (list, tuple, set)):
+                value = tuple(sorted(value))
+            normalized.append((name, value))
+
+        # Écritures du journal intégrées hors de la lecture mise en cache
+        self.refresh()
+        return self._slice(dims, tuple(normalized), tuple(role_scope) if role_scope else None)
+
+    @cached_query('demandes', 'users')
+    def _slice(self, dims: Tuple[str, ...], filters: Tuple, role_scope: Optional[Tuple]) -> List[Dict[str, Any]]:
+        scope = self._scope_condition(role_scope)
+        if scope is None:
+            return []
+        conditions, params = scope
+
+        for name, value in filters:
+            if name == 'mois_debut':
+                conditions.append("mois >= ?")
+                params.append(value)
+            elif name == 'mois_fin':
+                conditions.append("mois <= ?")
+                params.append(value)
+            elif isinstance(value, tuple):
+                if not value:
+                    return []
+                conditions.append(f"{name} IN ({', '.join('?' for _ in value)})")
+                params.extend(value)
+            else:
+                conditions.append(f"{name} = ?")
+                params.append(value)
+
+        group_by = ', '.join(dims)
+        query = f'''
+            SELECT {group_by + ', ' if dims else ''}
+                   COALESCE(SUM(nb), 0) AS nb,
+                   ROUND(COALESCE(SUM(montant), 0), 2) AS montant,
+                   ROUND(COALESCE(SUM(montant_valide), 0), 2) AS montant_valide
+            FROM analytics_cube
+        '''
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if dims:
+            query += f" GROUP BY {group_by} ORDER BY {group_by}"
+
+        try:
+            rows = db.execute_query(query, tuple(params), fetch='all')
+            return [dict(row) for row in rows] if rows else []
+        except Exception as e:
+            logger.error(f"Erreur requête cube analytique: {e}")
+            return []
+
+    def verify(self) -> List[Dict[str, Any]]:
+        """Groupes en écart entre le cube (après rafraîchissement) et un recomptage des demandes"""
+        self.refresh()
+        keys_match = ' AND '.join(f"c.{dim} = e.{dim}" for dim in DIMENSIONS)
+        rows = db.execute_query(f'''
+            WITH expected AS (
+                SELECT {', '.join(f"{_DIMENSION_EXPRESSIONS[dim].format(p='d')} AS {dim}" for dim in DIMENSIONS)},
+                       COUNT(*) AS nb, SUM(d.montant) AS montant
+                FROM demandes d
+                GROUP BY {_dimension_values('d')}
+            )
+            SELECT {', '.join(f'e.{dim}' for dim in DIMENSIONS)}, e.nb AS nb_attendu, c.nb AS nb_cube
+            FROM expected e LEFT JOIN analytics_cube c ON {keys_match}
+            WHERE c.nb IS NULL OR c.nb != e.nb OR ABS(c.montant - e.montant) > 0.005
+            UNION ALL
+            SELECT {', '.join(f'c.{dim}' for dim in DIMENSIONS)}, NULL, c.nb
+            FROM analytics_cube c
+            WHERE NOT EXISTS (SELECT 1 FROM expected e WHERE {keys_match})
+        ''', fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def filters_from_ui(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Traduire les filtres FilterUI (status_filter, type_filter, by_filter, cy_filter) en
+        filtres du cube ; None si un filtre actif n'est pas une dimension du cube (montant,
+        période de création, recherche, ...) et impose de lire les demandes.
+        """
+        cube_filters = {}
+        for name, value in (filters or {}).items():
+            if not _is_set(value):
+                continue
+            dimension = _UI_FILTER_DIMENSIONS.get(name)
+            if dimension is None:
+                return None
+            if dimension == 'cy':
+                try:
+                    value = [int(v) for v in value] if isinstance(value, (list, tuple, set)) else int(value)
+                except (TypeError, ValueError):
+                    return None
+            cube_filters[dimension] = value
+        return cube_filters
+
+# Instance globale
+cube = AnalyticsCube()
@@ -0,0 +1,280 @@
+"""
+Registre courant des budgets (table budget_ledger)
+
+Une ligne par (utilisateur, année fiscale BY) avec le budget alloué, le montant en
+attente de validation (en_attente_dr / en_attente_financier), le montant consommé
+(validée) et une version incrémentée à chaque mouvement. Des triggers la tiennent à
+jour dans la transaction de l'écriture : soumission, validation / rejet, rappel,
+modification du montant ou de l'année fiscale, suppression de demande, et
+attribution / suppression de budget. La consommation d'un budget se lit alors par
+clé primaire au lieu de sommer les demandes. verify() compare le registre aux
+demandes et budgets sources (voir scripts/reconcile_budget_ledger.py).
+
+Réservation à la soumission (reserve) : le montant d'une demande soumise entre dans
+pending par les triggers ; reserve() vérifie avant la soumission que le budget restant
+le couvre et réserve la ligne du registre par un UPDATE conditionnel sur sa version.
+Une soumission concurrente qui a lu la même version échoue sur cet UPDATE, relit le
+registre (qui inclut alors la première demande) et refait le contrôle. Le rejet et le
+rappel libèrent la réservation, la validation finale la convertit en consommé (statut
+en_attente_* -> rejetee / brouillon / validee, mêmes triggers).
+"""
+from typing import Any, Dict, List, Optional
+
+from config.settings import budget_config
+from models.database import db
+
+# Statuts qui engagent le budget : en attente (pending) et validé (consumed)
+PENDING_STATUSES = ('en_attente_dr', 'en_attente_financier')
+CONSUMED_STATUS = 'validee'
+
+_PENDING_SQL = "('en_attente_dr', 'en_attente_financier')"
+_ENGAGED_SQL = "('validee', 'en_attente_dr', 'en_attente_financier')"
+
+# Recalcul complet depuis les sources, même clé que le registre ('' pour BY absent)
+_RECOUNT_SQL = f'''
+    WITH engaged AS (
+        SELECT user_id, COALESCE(by, '') AS by,
+               SUM(CASE WHEN status IN {_PENDING_SQL} THEN montant ELSE 0 END) AS pending,
+               SUM(CASE WHEN status = '{CONSUMED_STATUS}' THEN montant ELSE 0 END) AS consumed
+        FROM demandes
+        WHERE status IN {_ENGAGED_SQL}
+        GROUP BY user_id, COALESCE(by, '')
+    ),
+    keys AS (
+        SELECT user_id, by FROM user_budgets WHERE by IS NOT NULL
+        UNION
+        SELECT user_id, by FROM engaged
+    )
+    SELECT k.user_id, k.by, COALESCE(ub.allocated_budget, 0) AS allocated,
+           COALESCE(e.pending, 0) AS pending, COALESCE(e.consumed, 0) AS consumed
+    FROM keys k
+    LEFT JOIN user_budgets ub ON ub.user_id = k.user_id AND ub.by = k.by
+    LEFT JOIN engaged e ON e.user_id = k.user_id AND e.by = k.by
+'''
+
+# Écart de montant toléré entre le registre et le recalcul (sommes flottantes incrémentales)
+_AMOUNT_TOLERANCE = 0.005
+
+def _engage_sql(prefix: str, sign: str) -> str:
+    """Ajouter (sign '+') ou retirer ('-') l'engagement de la demande NEW/OLD à son budget"""
+    return f'''
+        INSERT INTO budget_ledger (user_id, by, pending, consumed)
+        SELECT {prefix}.user_id, COALESCE({prefix}.by, ''),
+               {sign}CASE WHEN {prefix}.status IN {_PENDING_SQL} THEN {prefix}.montant ELSE 0 END,
+               {sign}CASE WHEN {prefix}.status = '{CONSUMED_STATUS}' THEN {prefix}.montant ELSE 0 END
+        WHERE {prefix}.status IN {_ENGAGED_SQL}
+        ON CONFLICT (user_id, by) DO UPDATE SET
+            pending = pending + excluded.pending,
+            consumed = consumed + excluded.consumed,
+            version = version + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    '''
+
+def _allocate_sql(prefix: str) -> str:
+    """Recopier le budget alloué (user_id, by) de la ligne NEW/OLD depuis user_budgets"""
+    return f'''
+        INSERT INTO budget_ledger (user_id, by, allocated)
+        SELECT {prefix}.user_id, {prefix}.by,
+               COALESCE((SELECT allocated_budget FROM user_budgets
+                         WHERE user_id = {prefix}.user_id AND by = {prefix}.by), 0)
+        WHERE {prefix}.by IS NOT NULL
+        ON CONFLICT (user_id, by) DO UPDATE SET
+            allocated = excluded.allocated,
+            version = version + 1,
+            updated_at = CURRENT_TIMESTAMP;
+    '''
+
+class BudgetLedgerModel:
+    """Modèle pour le registre courant des budgets"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer le registre, ses triggers de maintenance et le remplir (migration 0014)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS budget_ledger (
+                user_id INTEGER NOT NULL,
+                by TEXT NOT NULL,
+                allocated REAL NOT NULL DEFAULT 0,
+                pending REAL NOT NULL DEFAULT 0,
+                consumed REAL NOT NULL DEFAULT 0,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, by)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_budget_ledger_by ON budget_ledger(by)")
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_demande_insert AFTER INSERT ON demandes
+            BEGIN
+                {_engage_sql('NEW', '+')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_demande_delete AFTER DELETE ON demandes
+            BEGIN
+                {_engage_sql('OLD', '-')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_demande_update
+            AFTER UPDATE OF status, montant, by, user_id ON demandes
+            BEGIN
+                {_engage_sql('OLD', '-')}
+                {_engage_sql('NEW', '+')}
+            END
+        ''')
+        # Budget alloué relu depuis user_budgets : correct aussi pour INSERT OR REPLACE
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_budget_insert AFTER INSERT ON user_budgets
+            BEGIN
+                {_allocate_sql('NEW')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_budget_update AFTER UPDATE ON user_budgets
+            BEGIN
+                {_allocate_sql('OLD')}
+                {_allocate_sql('NEW')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_budget_ledger_budget_delete AFTER DELETE ON user_budgets
+            BEGIN
+                {_allocate_sql('OLD')}
+            END
+        ''')
+
+        BudgetLedgerModel._fill(cursor.execute)
+
+    @staticmethod
+    def _fill(execute):
+        """
+        Recaler le registre sur les sources (execute : cursor.execute ou db.execute_query).
+        Les versions sont incrémentées, pas remises à zéro.
+        """
+        execute(f'''
+            INSERT INTO budget_ledger (user_id, by, allocated, pending, consumed)
+            {_RECOUNT_SQL}
+            WHERE true
+            ON CONFLICT (user_id, by) DO UPDATE SET
+                allocated = excluded.allocated,
+                pending = excluded.pending,
+                consumed = excluded.consumed,
+                version = version + 1,
+                updated_at = CURRENT_TIMESTAMP
+        ''')
+        # Lignes sans budget ni demande engagée : remises à zéro
+        execute(f'''
+            UPDATE budget_ledger
+            SET allocated = 0, pending = 0, consumed = 0, version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE (allocated != 0 OR pending != 0 OR consumed != 0)
+              AND NOT EXISTS (SELECT 1 FROM user_budgets ub
+                              WHERE ub.user_id = budget_ledger.user_id AND ub.by = budget_ledger.by)
+              AND NOT EXISTS (SELECT 1 FROM demandes d
+                              WHERE d.user_id = budget_ledger.user_id AND COALESCE(d.by, '') = budget_ledger.by
+                                AND d.status IN {_ENGAGED_SQL})
+        ''')
+
+    @staticmethod
+    def get_entry(user_id: int, by: str) -> Optional[Dict[str, Any]]:
+        """Ligne du registre d'un utilisateur pour une année fiscale (None si aucun mouvement)"""
+        result = db.execute_query('''
+            SELECT user_id, by, allocated, pending, consumed, version, updated_at
+            FROM budget_ledger
+            WHERE user_id = ? AND by = ?
+        ''', (user_id, by), fetch='one')
+        return dict(result) if result else None
+
+    @staticmethod
+    def reserve(user_id: int, by: Optional[str], montant: float, policy: Optional[str] = None,
+                already_pending: float = 0.0) -> Dict[str, Any]:
+        """
+        Réserver le montant d'une demande sur le budget restant (allocated - pending - consumed)
+        de son créateur pour l'année fiscale, avant de passer la demande en attente.
+
+        À appeler dans la transaction (db.unit_of_work) qui change le statut de la demande :
+        la version réservée et l'ajout du montant à pending sont validés ensemble.
+
+        Args:
+            policy: 'block', 'warn' ou 'off' ; par défaut budget_config.reservation_policy
+            already_pending: part du montant déjà comptée dans pending (demande déjà en
+                attente, par exemple créée par un DR directement en en_attente_financier) :
+                elle n'est pas décomptée une seconde fois du budget restant
+
+        Returns:
+            Dict avec allowed (la soumission peut continuer), reserved (budget réservé),
+            over_budget (dépassement accepté en mode warn), available (budget restant
+            avant la demande, None si l'utilisateur n'a pas de budget) et message
+        """
+        policy = policy or budget_config.reservation_policy
+        result = {'allowed': True, 'reserved': False, 'over_budget': False, 'available': None, 'message': ''}
+        if policy == 'off' or not by or not montant:
+            return result
+
+        for _ in range(max(budget_config.reservation_retries, 1)):
+            entry = BudgetLedgerModel.get_entry(user_id, by)
+            if not entry or entry['allocated'] <= 0:
+                return result  # pas de budget alloué pour cette année : rien à contrôler
+
+            available = round(entry['allocated'] - entry['pending'] - entry['consumed'] + already_pending, 2)
+            result['available'] = available
+            if montant > available + _AMOUNT_TOLERANCE:
+                message = (f"Budget {by} insuffisant : {montant:,.2f}€ demandés, "
+                           f"{max(available, 0):,.2f}€ restants")
+                result.update({'allowed': policy != 'block', 'over_budget': True, 'message': message})
+                return result
+
+            # Réservation : la ligne n'a pas changé depuis la lecture et couvre toujours le montant
+            updated = db.execute_query(f'''
+                UPDATE budget_ledger SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND by = ? AND version = ?
+                  AND allocated - pending - consumed >= ? - {_AMOUNT_TOLERANCE}
+            ''', (user_id, by, entry['version'], montant - already_pending))
+            if updated:
+                result['reserved'] = True
+                return result
+
+        message = f"Budget {by} modifié simultanément, réservation impossible"
+        result.update({'allowed': policy != 'block', 'message': message})
+        return result
+
+    @staticmethod
+    def verify() -> List[Dict[str, Any]]:
+        """
+        Comparer le registre au recalcul depuis les demandes et les budgets alloués.
+
+        Les lignes du registre sans montant ni source (budget supprimé, demandes rappelées)
+        ne sont pas des écarts.
+
+        Returns:
+            Lignes en écart : clé, montants attendus (recalcul) et montants du registre
+        """
+        amounts = ('allocated', 'pending', 'consumed')
+        mismatch = ' OR '.join(f"ABS(COALESCE(l.{c}, 0) - e.{c}) > {_AMOUNT_TOLERANCE}" for c in amounts)
+        expected_cols = ', '.join(f"e.{c} AS {c}_attendu" for c in amounts)
+        ledger_cols = ', '.join(f"l.{c} AS {c}_registre" for c in amounts)
+        zero_cols = ', '.join("0" for _ in amounts)
+        rows = db.execute_query(f'''
+            WITH expected AS ({_RECOUNT_SQL})
+            SELECT e.user_id, e.by, {expected_cols}, {ledger_cols}
+            FROM expected e LEFT JOIN budget_ledger l ON l.user_id = e.user_id AND l.by = e.by
+            WHERE {mismatch}
+            UNION ALL
+            SELECT l.user_id, l.by, {zero_cols}, {', '.join(f"l.{c}" for c in amounts)}
+            FROM budget_ledger l
+            WHERE NOT EXISTS (SELECT 1 FROM expected e WHERE e.user_id = l.user_id AND e.by = l.by)
+              AND ({' OR '.join(f"ABS(l.{c}) > {_AMOUNT_TOLERANCE}" for c in amounts)})
+        ''', fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def rebuild() -> bool:
+        """Recalculer entièrement le registre depuis les demandes et les budgets"""
+        try:
+            with db.unit_of_work():
+                BudgetLedgerModel._fill(db.execute_query)
+            return True
+        except Exception as e:
+            print(f"Erreur reconstruction registre des budgets: {e}")
+            return False
@@ -3,40 +3,367 @@ Database connection and initialization - Version Corrigée
 """
 import sqlite3
 import os
+import re
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
-from typing import Optional, Any, Union, List
+from typing import Optional, Any, Union, List, Dict
 import logging
 from config.settings import db_config
+from utils.query_monitor import InstrumentedConnection, query_monitor
+from utils.query_cache import query_cache
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def _quote_identifier(name: str) -> str:
+    """Valider et citer un nom de table/colonne utilisé dans une requête générée"""
+    if not _IDENTIFIER_RE.match(name or ''):
+        raise ValueError(f"Identifiant SQL invalide: {name!r}")
+    return f'"{name}"'
+
+def _row_values(rows, columns: List[str]):
+    """Convertir des lignes (dicts ou séquences) en tuples ordonnés selon columns"""
+    for row in rows:
+        if isinstance(row, dict):
+            yield tuple(row.get(col) for col in columns)
+        else:
+            yield tuple(row)
+
+class _PooledConnection:
+    """Connexion SQLite gérée par le pool, avec ses métadonnées d'âge et d'usage"""
+
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+class ConnectionPool:
+    """
+    Pool borné de connexions SQLite longue durée partagé entre les threads
+    (threads de script Streamlit, service de synchronisation SharePoint, ...).
+
+    Chaque connexion est configurée une seule fois à sa création (WAL, busy_timeout,
+    synchronous, cache de requêtes) puis empruntée/rendue. Un thread qui détient déjà
+    une connexion la réutilise pour les emprunts imbriqués, ce qui évite les
+    interblocages lorsque le pool est saturé.
+    """
+
+    def __init__(self, db_path: str, config=db_config):
+        self.db_path = db_path
+        self.config = config
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._local = threading.local()
+        self._size = 0
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'recycled': 0,
+            'discarded': 0,
+        }
+
+    def _connect(self) -> _PooledConnection:
+        """Ouvrir et configurer une nouvelle connexion"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.config.busy_timeout_ms / 1000,
+            check_same_thread=False,
+            cached_statements=self.config.statement_cache_size,
+            factory=InstrumentedConnection if self.config.query_monitoring else sqlite3.Connection
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {self.config.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.config.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.config.busy_timeout_ms)}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        return _PooledConnection(conn)
+
+    def _close(self, pooled: _PooledConnection):
+        try:
+            pooled.conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _is_usable(self, pooled: _PooledConnection, now: float) -> bool:
+        """Vérifier l'âge et la santé d'une connexion inactive avant de la prêter"""
+        if now - pooled.created_at > self.config.max_connection_age:
+            self._stats['recycled'] += 1
+            return False
+        if now - pooled.last_used > self.config.health_check_interval:
+            try:
+                pooled.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                self._stats['discarded'] += 1
+                return False
+        return True
+
+    def _checkout(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.config.pool_timeout
+        with self._available:
+            waited = False
+            while True:
+                while self._idle:
+                    pooled = self._idle.pop()
+                    if self._is_usable(pooled, time.monotonic()):
+                        self._stats['hits'] += 1
+                        return pooled
+                    self._size -= 1
+                    self._close(pooled)
+
+                if self._size < self.config.pool_size:
+                    self._size += 1
+                    self._stats['misses'] += 1
+                    break
+
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise RuntimeError(
+                        f"Pool de connexions saturé ({self.config.pool_size} connexions en cours d'utilisation)"
+                    )
+                self._available.wait(remaining)
+
+        # Ouverture hors verrou : la place est déjà réservée dans _size
+        try:
+            return self._connect()
+        except Exception:
+            with self._available:
+                self._size -= 1
+                self._available.notify()
+            raise
+
+    def _checkin(self, pooled: _PooledConnection, discard: bool = False):
+        if not discard:
+            try:
+                # Une connexion rendue ne doit jamais garder une transaction ouverte
+                if pooled.conn.in_transaction:
+                    pooled.conn.rollback()
+            except sqlite3.Error:
+                discard = True
+
+        with self._available:
+            if discard:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._close(pooled)
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+            self._available.notify()
+
+    @contextmanager
+    def connection(self):
+        """Emprunter une connexion ; réentrant pour le thread courant"""
+        held = getattr(self._local, 'pooled', None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held.conn
+            finally:
+                self._local.depth -= 1
+            return
+
+        pooled = self._checkout()
+        self._local.pooled = pooled
+        self._local.depth = 1
+        discard = False
+        changes = pooled.conn.total_changes
+        try:
+            yield pooled.conn
+        except sqlite3.IntegrityError:
+            raise
+        except sqlite3.DatabaseError:
+            # Erreur possiblement liée à l'état de la connexion : ne pas la remettre dans le pool
+            discard = True
+            raise
+        finally:
+            self._local.pooled = None
+            self._local.depth = 0
+            # Écriture (validée ou annulée) : le cache de lecture relira les versions de tables
+            if pooled.conn.total_changes != changes:
+                query_cache.notify_write()
+            self._checkin(pooled, discard=discard)
+
+    def holds_connection(self) -> bool:
+        """Le thread courant détient-il déjà une connexion du pool ?"""
+        return getattr(self._local, 'pooled', None) is not None
+
+    def close_all(self):
+        """Fermer toutes les connexions inactives (arrêt, tests, restauration de sauvegarde)"""
+        with self._available:
+            while self._idle:
+                self._close(self._idle.pop())
+                self._size -= 1
+            self._available.notify_all()
+
+    def get_stats(self) -> Dict[str, int]:
+        """Compteurs du pool (hits, misses, waits, ...) et occupation courante"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.config.pool_size,
+            })
+            return stats
+
+class UnitOfWork:
+    """
+    Transaction applicative en cours : toutes les écritures du thread courant
+    (modèles, notifications, journal d'activité) la rejoignent et sont validées
+    par un seul commit à la sortie du bloc db.unit_of_work().
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.rollback_only = False
+        self._on_commit = []
+
+    def set_rollback_only(self):
+        """Annuler toute la transaction à la sortie du bloc (échec métier sans exception)"""
+        self.rollback_only = True
+
+    def on_commit(self, callback):
+        """Différer un effet de bord (email, ...) jusqu'au commit effectif"""
+        self._on_commit.append(callback)
+
 class Database:
     """Database connection manager - Version corrigée"""
-    
+
     def __init__(self):
         self.use_sharepoint = False
         self.db_path = db_config.path
         logger.info("💾 Mode local activé")
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-    
+        self.pool = ConnectionPool(self.db_path)
+        self._uow_local = threading.local()
+
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections with error handling"""
-        conn = None
+        """Context manager for pooled database connections with error handling"""
+        nested = self.pool.holds_connection()
+        with self.pool.connection() as conn:
+            try:
+                yield conn
+            except Exception as e:
+                # Seul l'emprunt le plus externe annule la transaction en cours
+                if not nested:
+                    try:
+                        conn.rollback()
+                    except sqlite3.Error:
+                        pass
+                logger.error(f"Erreur connexion base de données: {e}")
+                raise
+
+    @contextmanager
+    def unit_of_work(self, immediate: bool = True):
+        """
+        Regrouper les écritures d'une action utilisateur dans une transaction atomique.
+
+        Tous les appels à execute_query / get_connection / execute_many faits par le thread
+        courant à l'intérieur du bloc utilisent la même connexion et ne committent pas ;
+        le commit unique a lieu à la sortie du bloc. Une exception, ou un appel à
+        uow.set_rollback_only(), annule l'ensemble. Un bloc imbriqué rejoint le bloc externe.
+
+        Args:
+            immediate: Prendre le verrou d'écriture dès le début (BEGIN IMMEDIATE), ce qui
+                évite les échecs SQLITE_BUSY lors du passage lecture -> écriture
+        """
+        current = getattr(self._uow_local, 'uow', None)
+        if current is not None:
+            yield current
+            return
+
+        with self.pool.connection() as conn:
+            # Connexion déjà engagée dans une transaction (bloc get_connection externe) : savepoint
+            use_savepoint = conn.in_transaction
+            if use_savepoint:
+                conn.execute("SAVEPOINT unit_of_work")
+            else:
+                conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+            uow = UnitOfWork(conn)
+            self._uow_local.uow = uow
+            try:
+                yield uow
+            except BaseException:
+                self._uow_local.uow = None
+                self._end_unit_of_work(conn, use_savepoint, commit=False)
+                raise
+
+            self._uow_local.uow = None
+            self._end_unit_of_work(conn, use_savepoint, commit=not uow.rollback_only)
+
+        if not uow.rollback_only:
+            for callback in uow._on_commit:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Erreur action post-commit: {e}")
+
+    def _end_unit_of_work(self, conn: sqlite3.Connection, use_savepoint: bool, commit: bool):
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            conn.execute("PRAGMA foreign_keys = ON")
-            yield conn
-        except Exception as e:
-            if conn:
+            if use_savepoint:
+                if not commit:
+                    conn.execute("ROLLBACK TO SAVEPOINT unit_of_work")
+                conn.execute("RELEASE SAVEPOINT unit_of_work")
+            elif commit:
+                conn.commit()
+            else:
                 conn.rollback()
-            logger.error(f"Erreur connexion base de données: {e}")
-            raise
-        finally:
-            if conn:
-                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Erreur fin de transaction: {e}")
+            if commit:
+                conn.rollback()
+                raise RuntimeError(f"Erreur base de données: {e}")
+
+    def in_unit_of_work(self) -> bool:
+        """Le thread courant est-il dans un bloc unit_of_work() ?"""
+        return getattr(self._uow_local, 'uow', None) is not None
+
+    def set_rollback_only(self):
+        """
+        Annuler la transaction en cours à la sortie de son bloc unit_of_work() (sans effet hors bloc).
+
+        Appelé par les écritures annexes qui absorbent leur erreur et renvoient False (journal
+        d'activité, notifications, participants) : l'opération ne peut pas être validée à moitié.
+        """
+        uow = getattr(self._uow_local, 'uow', None)
+        if uow is not None:
+            uow.set_rollback_only()
+
+    def on_commit(self, callback):
+        """Exécuter callback après le commit de la transaction en cours, ou immédiatement hors transaction"""
+        uow = getattr(self._uow_local, 'uow', None)
+        if uow is not None:
+            uow.on_commit(callback)
+        else:
+            callback()
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """Statistiques du pool de connexions"""
+        return self.pool.get_stats()
+
+    def get_query_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Coût SQL moyen par page (requêtes et temps par rerun, principaux appelants)"""
+        return query_monitor.get_page_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Statistiques du cache de lecture (hits, misses, évictions, taille)"""
+        return query_cache.get_stats()
     
     def execute_query(self, query: str, params: tuple = None, fetch: str = None) -> Any:
         """Execute a query and return results with improved error handling"""
@@ -54,10 +381,12 @@ class Database:
                 elif fetch == 'all':
                     return cursor.fetchall()
                 elif fetch == 'lastrowid':
-                    conn.commit()
+                    if not self.in_unit_of_work():
+                        conn.commit()
                     return cursor.lastrowid
                 else:
-                    conn.commit()
+                    if not self.in_unit_of_work():
+                        conn.commit()
                     return cursor.rowcount
                     
         except sqlite3.IntegrityError as e:
@@ -70,6 +399,124 @@ class Database:
             logger.error(f"Erreur inattendue: {e}")
             raise
     
+    def execute_many(self, query: str, params_seq, chunk_size: int = None) -> Dict[str, Any]:
+        """
+        Exécuter une requête pour plusieurs jeux de paramètres dans une seule transaction.
+
+        Les lignes sont envoyées par lots via executemany ; si un lot échoue sur une
+        contrainte, il est annulé (SAVEPOINT) puis rejoué ligne par ligne afin d'isoler
+        les lignes en erreur sans perdre les autres. Un seul commit en fin de traitement.
+
+        Returns:
+            Dict avec total, success_count, error_count, rowcount et errors
+            (liste de {'index', 'error'} pour chaque ligne rejetée)
+        """
+        rows = list(params_seq)
+        result = {
+            'total': len(rows),
+            'success_count': 0,
+            'error_count': 0,
+            'rowcount': 0,
+            'errors': []
+        }
+        if not rows:
+            return result
+
+        chunk_size = chunk_size or db_config.bulk_chunk_size
+        row_errors = (sqlite3.IntegrityError, sqlite3.InterfaceError, sqlite3.ProgrammingError)
+
+        try:
+            with self.get_connection() as conn:
+                owns_transaction = not conn.in_transaction
+                if owns_transaction:
+                    conn.execute("BEGIN")
+
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    conn.execute("SAVEPOINT bulk_chunk")
+                    try:
+                        cursor = conn.executemany(query, chunk)
+                        result['rowcount'] += max(cursor.rowcount, 0)
+                        result['success_count'] += len(chunk)
+                        conn.execute("RELEASE SAVEPOINT bulk_chunk")
+                        continue
+                    except row_errors:
+                        conn.execute("ROLLBACK TO SAVEPOINT bulk_chunk")
+                        conn.execute("RELEASE SAVEPOINT bulk_chunk")
+
+                    # Rejouer le lot ligne par ligne pour isoler les lignes en échec
+                    for offset, params in enumerate(chunk):
+                        try:
+                            cursor = conn.execute(query, params)
+                            result['rowcount'] += max(cursor.rowcount, 0)
+                            result['success_count'] += 1
+                        except row_errors as e:
+                            result['error_count'] += 1
+                            result['errors'].append({'index': start + offset, 'error': str(e)})
+
+                if owns_transaction:
+                    conn.commit()
+
+            if result['error_count']:
+                logger.warning(f"⚠️ Écriture en lot: {result['error_count']}/{result['total']} ligne(s) rejetée(s)")
+            return result
+
+        except sqlite3.Error as e:
+            logger.error(f"Erreur SQLite (lot): {e}")
+            raise RuntimeError(f"Erreur base de données: {e}")
+
+    def bulk_insert(self, table: str, columns: List[str], rows, on_conflict: str = None,
+                    chunk_size: int = None) -> Dict[str, Any]:
+        """
+        Insérer plusieurs lignes (tuples ou dicts) en une transaction
+
+        Args:
+            table: Nom de la table
+            columns: Colonnes insérées, dans l'ordre des valeurs
+            rows: Lignes à insérer (tuples dans l'ordre de columns, ou dicts)
+            on_conflict: None, 'IGNORE' ou 'REPLACE' (INSERT OR ...)
+        """
+        column_list = ', '.join(_quote_identifier(col) for col in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        verb = "INSERT"
+        if on_conflict:
+            if on_conflict.upper() not in ('IGNORE', 'REPLACE'):
+                raise ValueError(f"Clause de conflit non supportée: {on_conflict}")
+            verb = f"INSERT OR {on_conflict.upper()}"
+
+        query = f"{verb} INTO {_quote_identifier(table)} ({column_list}) VALUES ({placeholders})"
+        return self.execute_many(query, _row_values(rows, columns), chunk_size)
+
+    def bulk_upsert(self, table: str, columns: List[str], rows, conflict_columns: List[str],
+                    update_columns: List[str] = None, update_expressions: Dict[str, str] = None,
+                    chunk_size: int = None) -> Dict[str, Any]:
+        """
+        Insérer ou mettre à jour plusieurs lignes via INSERT ... ON CONFLICT DO UPDATE
+
+        Args:
+            conflict_columns: Colonnes de la contrainte UNIQUE ciblée
+            update_columns: Colonnes reprises de la ligne insérée (excluded.col) en cas de conflit;
+                par défaut toutes les colonnes hors conflict_columns
+            update_expressions: Expressions SQL supplémentaires, ex. {'updated_at': 'CURRENT_TIMESTAMP'}
+        """
+        column_list = ', '.join(_quote_identifier(col) for col in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        conflict_list = ', '.join(_quote_identifier(col) for col in conflict_columns)
+
+        if update_columns is None:
+            update_columns = [col for col in columns if col not in conflict_columns]
+
+        assignments = [f"{_quote_identifier(col)} = excluded.{_quote_identifier(col)}" for col in update_columns]
+        for col, expression in (update_expressions or {}).items():
+            assignments.append(f"{_quote_identifier(col)} = {expression}")
+
+        action = f"DO UPDATE SET {', '.join(assignments)}" if assignments else "DO NOTHING"
+        query = (
+            f"INSERT INTO {_quote_identifier(table)} ({column_list}) VALUES ({placeholders}) "
+            f"ON CONFLICT({conflict_list}) {action}"
+        )
+        return self.execute_many(query, _row_values(rows, columns), chunk_size)
+
     def table_exists(self, table_name: str) -> bool:
         """Vérifier si une table existe"""
         try:
@@ -105,189 +552,236 @@ class Database:
             logger.error(f"Erreur ajout colonne {column_name}: {e}")
     
     def init_database(self):
-        """Initialize database with all tables - Version corrigée"""
+        """
+        Mettre le schéma à jour via le registre schema_migrations.
+
+        Une base déjà à jour ne coûte qu'une lecture de version ; les migrations en
+        attente sont appliquées une seule fois par base (voir migrations/ledger.py).
+        Les statistiques de l'optimiseur ne sont contrôlées qu'après une migration
+        (ensuite : scripts/refresh_statistics.py en tâche planifiée).
+        """
+        from migrations.ledger import schema_ledger
         try:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                logger.info("🚀 Initialisation de la base de données...")
-                
-                # TABLE USERS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS users (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        email TEXT UNIQUE NOT NULL,
-                        password_hash TEXT NOT NULL,
-                        nom TEXT NOT NULL,
-                        prenom TEXT NOT NULL,
-                        role TEXT NOT NULL CHECK (role IN ('admin', 'tc', 'dr', 'dr_financier', 'dg', 'marketing')),
-                        region TEXT,
-                        budget_alloue REAL DEFAULT 0,
-                        directeur_id INTEGER,
-                        is_active BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        activated_at TIMESTAMP,
-                        last_login TIMESTAMP,
-                        FOREIGN KEY (directeur_id) REFERENCES users (id) ON DELETE SET NULL
-                    )
-                ''')
-                
-                # TABLE USER_BUDGETS - NOUVELLE TABLE
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS user_budgets (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        fiscal_year INTEGER NOT NULL,
-                        allocated_budget REAL NOT NULL DEFAULT 0.0,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        UNIQUE(user_id, fiscal_year)
-                    )
-                ''')
-                
-                # TABLE DEMANDES
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS demandes (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        type_demande TEXT NOT NULL CHECK (type_demande IN ('budget', 'marketing')),
-                        nom_manifestation TEXT NOT NULL,
-                        client TEXT NOT NULL,
-                        date_evenement DATE NOT NULL,
-                        lieu TEXT NOT NULL,
-                        montant REAL NOT NULL CHECK (montant > 0),
-                        participants TEXT DEFAULT '',
-                        commentaires TEXT,
-                        urgence TEXT DEFAULT 'normale' CHECK (urgence IN ('faible', 'normale', 'haute', 'critique')),
-                        budget TEXT DEFAULT '',
-                        categorie TEXT DEFAULT '',
-                        typologie_client TEXT DEFAULT '',
-                        groupe_groupement TEXT DEFAULT '',
-                        region TEXT DEFAULT '',
-                        agence TEXT DEFAULT '',
-                        client_enseigne TEXT DEFAULT '',
-                        mail_contact TEXT DEFAULT '',
-                        nom_contact TEXT DEFAULT '',
-                        demandeur_participe BOOLEAN DEFAULT TRUE,
-                        participants_libres TEXT DEFAULT '',
-                        cy INTEGER,
-                        by TEXT,
-                        status TEXT DEFAULT 'brouillon' CHECK (status IN ('brouillon', 'en_attente_dr', 'en_attente_financier', 'validee', 'rejetee')),
-                        valideur_dr_id INTEGER,
-                        valideur_financier_id INTEGER,
-                        valideur_dg_id INTEGER,
-                        date_validation_dr TIMESTAMP,
-                        date_validation_financier TIMESTAMP,
-                        date_validation_dg TIMESTAMP,
-                        commentaire_dr TEXT,
-                        commentaire_financier TEXT,
-                        commentaire_dg TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        FOREIGN KEY (valideur_dr_id) REFERENCES users (id) ON DELETE SET NULL,
-                        FOREIGN KEY (valideur_financier_id) REFERENCES users (id) ON DELETE SET NULL,
-                        FOREIGN KEY (valideur_dg_id) REFERENCES users (id) ON DELETE SET NULL
-                    )
-                ''')
-                
-            # fiscal_year column migration désactivée - utiliser 'by' uniquement
-            # self.add_column_if_not_exists('demandes', 'fiscal_year', "INTEGER NOT NULL DEFAULT (CAST(strftime('%Y', CURRENT_TIMESTAMP) AS INTEGER))")  # ← DÉSACTIVÉ: fiscal_year obsolète, utiliser 'by'
-                
-                # TABLE DEMANDE_VALIDATIONS - MANQUANTE CRÉÉE
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS demande_validations (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        demande_id INTEGER NOT NULL,
-                        validated_by INTEGER NOT NULL,
-                        validation_type TEXT NOT NULL CHECK (validation_type IN ('dr', 'financier', 'dg')),
-                        action TEXT NOT NULL CHECK (action IN ('valider', 'rejeter')),
-                        commentaire TEXT,
-                        validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE,
-                        FOREIGN KEY (validated_by) REFERENCES users (id) ON DELETE CASCADE,
-                        UNIQUE(demande_id, validated_by, validation_type)
-                    )
-                ''')
-                
-                # TABLE DEMANDE_PARTICIPANTS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS demande_participants (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        demande_id INTEGER NOT NULL,
-                        user_id INTEGER NOT NULL,
-                        added_by_user_id INTEGER NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE,
-                        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        FOREIGN KEY (added_by_user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        UNIQUE(demande_id, user_id)
-                    )
-                ''')
-                
-                # TABLE NOTIFICATIONS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS notifications (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        demande_id INTEGER,
-                        type_notification TEXT NOT NULL,
-                        titre TEXT NOT NULL,
-                        message TEXT NOT NULL,
-                        is_read BOOLEAN DEFAULT FALSE,
-                        sent_by_email BOOLEAN DEFAULT FALSE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        read_at TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE
-                    )
-                ''')
-                
-                # TABLE ACTIVITY_LOGS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS activity_logs (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        demande_id INTEGER,
-                        action TEXT NOT NULL,
-                        details TEXT,
-                        ip_address TEXT,
-                        user_agent TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                        FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE SET NULL
-                    )
-                ''')
-                
-                # TABLE DROPDOWN_OPTIONS
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS dropdown_options (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        category TEXT NOT NULL,
-                        value TEXT NOT NULL,
-                        label TEXT NOT NULL,
-                        order_index INTEGER DEFAULT 0,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        created_by INTEGER,
-                        FOREIGN KEY (created_by) REFERENCES users (id) ON DELETE SET NULL,
-                        UNIQUE(category, value)
-                    )
-                ''')
-                
-                # Migrations et données par défaut
-                self._run_migrations(cursor)
-                self._create_default_data(cursor)
-                self._create_indexes(cursor)
-                
-                conn.commit()
-                logger.info("✅ Base de données initialisée avec succès")
-                
+            applied = schema_ledger.migrate()
         except Exception as e:
             logger.error(f"❌ Erreur initialisation base: {e}")
             raise
-    
+        if applied:
+            self.refresh_statistics()
+        # Schéma (re)migré : repartir d'un cache de lecture et d'un registre des options vides
+        query_cache.reset()
+        from utils.dropdown_registry import dropdown_registry
+        dropdown_registry.invalidate()
+
+    # Tables dont le volume guide les plans des requêtes chaudes
+    _STATISTICS_TABLES = ('demandes', 'users')
+
+    def refresh_statistics(self, force: bool = False) -> bool:
+        """
+        Recalculer les statistiques de l'optimiseur (ANALYZE) si elles ne reflètent plus le volume.
+
+        Des statistiques prises sur une base presque vide (installation) font choisir à SQLite
+        des parcours complets une fois la base remplie : elles sont recalculées dès que le
+        nombre de lignes d'une table principale a été multiplié ou divisé par quatre.
+
+        Returns:
+            True si ANALYZE a été exécuté
+        """
+        try:
+            with self.get_connection() as conn:
+                stale = force
+                for table in self._STATISTICS_TABLES:
+                    try:
+                        # Premier nombre de chaque ligne de stat = nombre de lignes estimé de la table
+                        row = conn.execute("SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = ?",
+                                           (table,)).fetchone()
+                    except sqlite3.OperationalError:
+                        row = None
+                    analyzed = (row[0] or 0) if row else 0
+                    actual = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    # Marge large : avec analysis_limit, les estimations varient d'un index à l'autre
+                    if actual > 4 * analyzed + 100 or 4 * actual + 100 < analyzed:
+                        stale = True
+                if not stale:
+                    return False
+
+                conn.execute("PRAGMA analysis_limit = 1000")
+                conn.execute("ANALYZE")
+                conn.commit()
+                logger.info("📊 Statistiques de l'optimiseur recalculées")
+                return True
+        except Exception as e:
+            logger.error(f"Erreur mise à jour des statistiques: {e}")
+            return False
+
+    def _create_tables(self, cursor):
+        """Schéma initial : création des tables (CREATE TABLE IF NOT EXISTS)"""
+        logger.info("🚀 Initialisation de la base de données...")
+        # TABLE USERS
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                nom TEXT NOT NULL,
+                prenom TEXT NOT NULL,
+                role TEXT NOT NULL CHECK (role IN ('admin', 'tc', 'dr', 'dr_financier', 'dg', 'marketing')),
+                region TEXT,
+                budget_alloue REAL DEFAULT 0,
+                directeur_id INTEGER,
+                is_active BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                activated_at TIMESTAMP,
+                last_login TIMESTAMP,
+                FOREIGN KEY (directeur_id) REFERENCES users (id) ON DELETE SET NULL
+            )
+        ''')
+
+        # TABLE USER_BUDGETS - NOUVELLE TABLE
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_budgets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                fiscal_year INTEGER NOT NULL,
+                allocated_budget REAL NOT NULL DEFAULT 0.0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                UNIQUE(user_id, fiscal_year)
+            )
+        ''')
+
+        # TABLE DEMANDES
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demandes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                type_demande TEXT NOT NULL CHECK (type_demande IN ('budget', 'marketing')),
+                nom_manifestation TEXT NOT NULL,
+                client TEXT NOT NULL,
+                date_evenement DATE NOT NULL,
+                lieu TEXT NOT NULL,
+                montant REAL NOT NULL CHECK (montant > 0),
+                participants TEXT DEFAULT '',
+                commentaires TEXT,
+                urgence TEXT DEFAULT 'normale' CHECK (urgence IN ('faible', 'normale', 'haute', 'critique')),
+                budget TEXT DEFAULT '',
+                categorie TEXT DEFAULT '',
+                typologie_client TEXT DEFAULT '',
+                groupe_groupement TEXT DEFAULT '',
+                region TEXT DEFAULT '',
+                agence TEXT DEFAULT '',
+                client_enseigne TEXT DEFAULT '',
+                mail_contact TEXT DEFAULT '',
+                nom_contact TEXT DEFAULT '',
+                demandeur_participe BOOLEAN DEFAULT TRUE,
+                participants_libres TEXT DEFAULT '',
+                cy INTEGER,
+                by TEXT,
+                status TEXT DEFAULT 'brouillon' CHECK (status IN ('brouillon', 'en_attente_dr', 'en_attente_financier', 'validee', 'rejetee')),
+                valideur_dr_id INTEGER,
+                valideur_financier_id INTEGER,
+                valideur_dg_id INTEGER,
+                date_validation_dr TIMESTAMP,
+                date_validation_financier TIMESTAMP,
+                date_validation_dg TIMESTAMP,
+                commentaire_dr TEXT,
+                commentaire_financier TEXT,
+                commentaire_dg TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                FOREIGN KEY (valideur_dr_id) REFERENCES users (id) ON DELETE SET NULL,
+                FOREIGN KEY (valideur_financier_id) REFERENCES users (id) ON DELETE SET NULL,
+                FOREIGN KEY (valideur_dg_id) REFERENCES users (id) ON DELETE SET NULL
+            )
+        ''')
+
+        # fiscal_year column migration désactivée - utiliser 'by' uniquement
+        # self.add_column_if_not_exists('demandes', 'fiscal_year', "INTEGER NOT NULL DEFAULT (CAST(strftime('%Y', CURRENT_TIMESTAMP) AS INTEGER))")  # ← DÉSACTIVÉ: fiscal_year obsolète, utiliser 'by'
+
+        # TABLE DEMANDE_VALIDATIONS - MANQUANTE CRÉÉE
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demande_validations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                demande_id INTEGER NOT NULL,
+                validated_by INTEGER NOT NULL,
+                validation_type TEXT NOT NULL CHECK (validation_type IN ('dr', 'financier', 'dg')),
+                action TEXT NOT NULL CHECK (action IN ('valider', 'rejeter')),
+                commentaire TEXT,
+                validated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE,
+                FOREIGN KEY (validated_by) REFERENCES users (id) ON DELETE CASCADE,
+                UNIQUE(demande_id, validated_by, validation_type)
+            )
+        ''')
+
+        # TABLE DEMANDE_PARTICIPANTS
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demande_participants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                demande_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                added_by_user_id INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                FOREIGN KEY (added_by_user_id) REFERENCES users (id) ON DELETE CASCADE,
+                UNIQUE(demande_id, user_id)
+            )
+        ''')
+
+        # TABLE NOTIFICATIONS
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                demande_id INTEGER,
+                type_notification TEXT NOT NULL,
+                titre TEXT NOT NULL,
+                message TEXT NOT NULL,
+                is_read BOOLEAN DEFAULT FALSE,
+                sent_by_email BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                read_at TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE CASCADE
+            )
+        ''')
+
+        # TABLE ACTIVITY_LOGS
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                demande_id INTEGER,
+                action TEXT NOT NULL,
+                details TEXT,
+                ip_address TEXT,
+                user_agent TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+                FOREIGN KEY (demande_id) REFERENCES demandes (id) ON DELETE SET NULL
+            )
+        ''')
+
+        # TABLE DROPDOWN_OPTIONS
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS dropdown_options (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                value TEXT NOT NULL,
+                label TEXT NOT NULL,
+                order_index INTEGER DEFAULT 0,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                created_by INTEGER,
+                FOREIGN KEY (created_by) REFERENCES users (id) ON DELETE SET NULL,
+                UNIQUE(category, value)
+            )
+        ''')
+
     def _run_migrations(self, cursor):
         """Exécuter les migrations nécessaires"""
         logger.info("🔄 Exécution des migrations...")
@@ -306,7 +800,16 @@ class Database:
             self.add_column_if_not_exists('activity_logs', 'ip_address', 'TEXT')
             self.add_column_if_not_exists('activity_logs', 'user_agent', 'TEXT')
             self.add_column_if_not_exists('dropdown_options', 'created_by', 'INTEGER')
+            self.add_column_if_not_exists('user_budgets', 'by', 'TEXT')
             logger.info("✅ Migrations terminées")
+
+            # Clé unique (user_id, by) requise par les upserts de budgets
+            try:
+                cursor.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_budgets_user_by ON user_budgets(user_id, by)"
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Index unique user_budgets(user_id, by) non créé (doublons ?): {e}")
             
             # Migration to remove old budget_alloue column from users table
             if self.column_exists('users', 'budget_alloue'):
@@ -416,5 +919,46 @@ class Database:
             logger.error(f"❌ Erreur création index: {e}")
             raise
 
+    def _create_composite_indexes(self, cursor):
+        """
+        Index composites dérivés des requêtes chaudes (voir scripts/benchmark_indexes.py).
+
+        L'ordre des colonnes suit les filtres d'égalité puis le tri ; les index mono-colonne
+        devenus préfixes d'un index composite sont supprimés pour alléger les écritures.
+        """
+        indexes = [
+            # Listes de demandes : filtre par créateur (TC/DR/marketing), tri updated_at DESC
+            "CREATE INDEX IF NOT EXISTS idx_demandes_user_updated ON demandes(user_id, updated_at DESC)",
+            # Consommation budgétaire : user_id + by + status, montant couvert (SUM sans accès table)
+            "CREATE INDEX IF NOT EXISTS idx_demandes_user_by_status ON demandes(user_id, by, status, montant)",
+            # Listes financier/DG filtrées par statut, tri updated_at DESC
+            "CREATE INDEX IF NOT EXISTS idx_demandes_status_updated ON demandes(status, updated_at DESC)",
+            # Liste admin triée sans filtre, et filtre année fiscale
+            "CREATE INDEX IF NOT EXISTS idx_demandes_updated ON demandes(updated_at DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_demandes_by_status ON demandes(by, status)",
+            # Équipe d'un DR
+            "CREATE INDEX IF NOT EXISTS idx_users_directeur ON users(directeur_id, is_active)",
+            # Compteur de notifications non lues et liste par utilisateur
+            "CREATE INDEX IF NOT EXISTS idx_notifications_user_read ON notifications(user_id, is_read, created_at DESC)",
+            # Visibilité par participation
+            "CREATE INDEX IF NOT EXISTS idx_participants_user ON demande_participants(user_id, demande_id)",
+            # Historique d'une demande, d'un utilisateur, et fenêtres de dates
+            "CREATE INDEX IF NOT EXISTS idx_activity_demande_created ON activity_logs(demande_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_activity_user_created ON activity_logs(user_id, created_at DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_activity_created ON activity_logs(created_at)",
+        ]
+        for index_query in indexes:
+            cursor.execute(index_query)
+
+        # Préfixes d'index composites : redondants
+        for index_name in ('idx_demandes_user', 'idx_notifications_user', 'idx_activity_user',
+                           'idx_demande_participants_user_id'):
+            cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+
+        # Statistiques pour le planificateur (échantillonnage borné sur les grosses tables)
+        cursor.execute("PRAGMA analysis_limit = 1000")
+        cursor.execute("ANALYZE")
+        logger.info("🔍 Index composites créés")
+
 # Instance globale de la base de données
 db = Database()
@@ -7,6 +7,8 @@ from datetime import datetime, date
 import pandas as pd
 
 from models.database import db
+from models.budget_ledger import BudgetLedgerModel, PENDING_STATUSES
+from utils.query_cache import cached_query
 from config.settings import WORKFLOW_CONFIG
 
 def calculate_cy_by(date_evenement):
@@ -15,7 +17,7 @@ def calculate_cy_by(date_evenement):
     à partir de la date d'événement. L'année fiscale commence en mai.
     """
     if not date_evenement:
-        return None, None, None
+        return None, None
     
     # Convertir en datetime si c'est une string
     if isinstance(date_evenement, str):
@@ -25,7 +27,7 @@ def calculate_cy_by(date_evenement):
             try:
                 date_obj = datetime.strptime(date_evenement, '%d/%m/%Y').date()
             except ValueError:
-                return None, None, None
+                return None, None
     else:
         date_obj = date_evenement
     
@@ -101,7 +103,7 @@ class DemandeModel:
         try:
             from utils.spinner_utils import OperationFeedback
             
-            with OperationFeedback.create_demande():
+            with OperationFeedback.create_demande(), db.unit_of_work() as uow:
                 # Valider et utiliser l'année fiscale fournie
                 from utils.fiscal_year_utils import validate_fiscal_year, get_default_fiscal_year
                 
@@ -113,7 +115,7 @@ class DemandeModel:
                     by_string = get_default_fiscal_year()
                 
                 # Calculer cy, by et fiscal_year à partir de la date d'événement
-                cy, _, _ = calculate_cy_by(date_evenement)  # On utilise seulement cy
+                cy, _ = calculate_cy_by(date_evenement)  # On utilise seulement cy
                 
                 # Si DR sélectionné, utiliser son ID comme user_id pour simuler qu'il a créé la demande
                 # Sinon utiliser l'admin comme créateur
@@ -141,7 +143,7 @@ class DemandeModel:
                     comment = f"Validée directement par l'admin {admin_name}"
                     
                     # Valider à tous les niveaux avec l'admin comme valideur
-                    DemandeModel.update_demande(
+                    validated = DemandeModel.update_demande(
                         demande_id,
                         status='validee',
                         valideur_dr_id=admin_id,
@@ -154,6 +156,8 @@ class DemandeModel:
                         commentaire_financier=comment,
                         commentaire_dg=comment
                     )
+                    if not validated:
+                        uow.set_rollback_only()
                     
                     # Notifier les DRs et TCs concernés
                     DemandeModel._notify_admin_validation(demande_id, admin_id, selected_dr_id)
@@ -164,14 +168,24 @@ class DemandeModel:
                         admin_info = db.execute_query('SELECT nom, prenom FROM users WHERE id = ?', (admin_id,), fetch='one')
                         admin_name = f"{admin_info['prenom']} {admin_info['nom']}" if admin_info else f"Admin #{admin_id}"
                         
-                        DemandeModel.update_demande(
+                        reservation = DemandeModel.reserve_budget(demande_id)
+                        if not reservation['allowed']:
+                            raise ValueError(reservation['message'])
+                        if reservation['message']:
+                            print(f"⚠️ {reservation['message']}")
+                        
+                        if not DemandeModel.update_demande(
                             demande_id,
                             status='en_attente_financier',
                             valideur_dr_id=selected_dr_id,
                             date_validation_dr=datetime.now().isoformat(),
                             commentaire_dr=f"Créée et pré-validée par l'admin {admin_name}"
-                        )
-                
+                        ):
+                            uow.set_rollback_only()
+            
+            # Validation ou notification en échec : la création a été annulée
+            if uow.rollback_only:
+                return False, None
             return True, demande_id
         except Exception as e:
             print(f"Erreur création demande admin: {e}")
@@ -299,6 +313,7 @@ class DemandeModel:
                     
         except Exception as e:
             print(f"Erreur notification admin validation: {e}")
+            db.set_rollback_only()
     
     @staticmethod
     def _create_notification(user_id: int, demande_id: int, type_notification: str, titre: str, message: str):
@@ -310,8 +325,10 @@ class DemandeModel:
             ''', (user_id, demande_id, type_notification, titre, message))
         except Exception as e:
             print(f"Erreur création notification: {e}")
+            db.set_rollback_only()
     
     @staticmethod
+    @cached_query('users')
     def get_all_drs() -> List[Dict[str, Any]]:
         """Get all active DRs for admin demande creation"""
         try:
@@ -327,130 +344,208 @@ class DemandeModel:
             print(f"Erreur récupération DRs: {e}")
             return []
     
+    # Périmètre de visibilité par rôle : tc, marketing et dr passent par la table matérialisée
+    # demande_visibility (une seule sous-requête indexée), les validateurs par le statut.
+    @staticmethod
+    def _visibility_condition(user_id: int, role: str) -> Optional[tuple]:
+        """(condition, paramètres) des demandes visibles par le rôle ; condition None = toutes"""
+        from models.demande_visibility import DemandeVisibilityModel, SUBMITTED_ROLES, SUBMITTED_STATUSES_SQL
+
+        if role == 'admin':
+            return None, []
+        visibility = DemandeVisibilityModel.visibility_condition(user_id, role)
+        if visibility is not None:
+            # tc/marketing : ses demandes et ses participations ; dr : en plus celles de son équipe
+            return visibility
+        if role in SUBMITTED_ROLES:
+            return f"d.status IN {SUBMITTED_STATUSES_SQL}", []
+        return None
+
+    @staticmethod
+    def _build_visible_query(user_id: int, role: str, filters: Dict[str, Any],
+                             search_columns: Optional[List[str]] = None,
+                             select: str = "d.*, u.nom, u.prenom, u.email, u.role as user_role",
+                             keyset_after: Optional[tuple] = None) -> Optional[tuple]:
+        """Requête (sql, params) des demandes visibles par l'utilisateur et correspondant aux filtres"""
+        from utils.filter_sql import build_demande_filters
+
+        visibility = DemandeModel._visibility_condition(user_id, role)
+        if visibility is None:
+            return None
+        condition, params = visibility
+
+        filter_conditions, filter_params = build_demande_filters(filters, search_columns)
+        if keyset_after is not None:
+            # Pagination par clé : demandes strictement après le curseur dans l'ordre (updated_at, id) DESC
+            filter_conditions.append("(d.updated_at, d.id) < (?, ?)")
+            filter_params.extend(keyset_after)
+        conditions = ([condition] if condition else []) + filter_conditions
+        # CROSS JOIN : demandes reste la table pilote (index de visibilité, plein texte, tri),
+        # users n'est qu'une recherche par clé primaire
+        query = f"SELECT {select} FROM demandes d CROSS JOIN users u ON d.user_id = u.id"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query, list(params) + filter_params
+
     @staticmethod
     def get_demandes_for_user(user_id: int, role: str, search_query: str = "", 
-                             status_filter: str = "tous", fiscal_year_filter: Optional[str] = None) -> pd.DataFrame:
-        """Get demandes based on user role and filters avec filtre année fiscale string"""
+                             status_filter: str = "tous", fiscal_year_filter: Optional[str] = None,
+                             filters: Optional[Dict[str, Any]] = None,
+                             search_columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Get demandes based on user role and filters avec filtre année fiscale string
+
+        Args:
+            filters: Dictionnaire de filtres de FilterUI (status_filter, type_filter, montant_filter,
+                urgence_filter, periode_filter, cy_filter, by_filter, search_query), compilé en SQL
+                par utils.filter_sql.build_demande_filters ; complète search_query/status_filter/fiscal_year_filter
+            search_columns: Colonnes de la recherche textuelle (par défaut tout l'index plein texte demandes_fts)
+        """
         try:
+            combined_filters = {
+                'search_query': search_query,
+                'status_filter': status_filter,
+                'by_filter': fiscal_year_filter,
+            }
+            combined_filters.update({k: v for k, v in (filters or {}).items() if v is not None})
+
+            built = DemandeModel._build_visible_query(user_id, role, combined_filters, search_columns)
+            if built is None:
+                return pd.DataFrame()
+            query, params = built
+
             with db.get_connection() as conn:
-                # Build query based on role
-                if role == 'admin':
-                    base_query = '''
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                    '''
-                    params = []
-                elif role == 'tc':
-                    # TC voit ses propres demandes ET les demandes où il est participant
-                    base_query = '''
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        WHERE d.user_id = ?
-                        UNION
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN demande_participants dp ON d.id = dp.demande_id
-                        WHERE dp.user_id = ?
-                    '''
-                    params = [user_id, user_id]
-                elif role == 'dr':
-                    # DR voit ses propres demandes + celles de son équipe + celles où il est participant
-                    base_query = '''
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        WHERE d.user_id = ? OR u.directeur_id = ?
-                        UNION
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN demande_participants dp ON d.id = dp.demande_id
-                        WHERE dp.user_id = ?
-                    '''
-                    params = [user_id, user_id, user_id]
-                elif role in ['dr_financier', 'dg']:
-                    base_query = '''
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        WHERE d.status IN ('en_attente_financier', 'validee')
-                    '''
-                    params = []
-                elif role == 'marketing':
-                    # Marketing voit ses propres demandes + celles où il est participant
-                    base_query = '''
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        WHERE d.user_id = ?
-                        UNION
-                        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
-                        FROM demandes d
-                        JOIN users u ON d.user_id = u.id
-                        JOIN demande_participants dp ON d.id = dp.demande_id
-                        WHERE dp.user_id = ?
-                    '''
-                    params = [user_id, user_id]
-                else:
-                    return pd.DataFrame()
-                
-                # Add filters
-                where_conditions = []
-
-                # Add fiscal_year filter (string-based)
-                if fiscal_year_filter:
-                    where_conditions.append("by = ?")
-                    params.append(fiscal_year_filter)
-
-                if search_query:
-                    where_conditions.append("(nom_manifestation LIKE ? OR client LIKE ? OR lieu LIKE ?)")
-                    search_term = f"%{search_query}%"
-                    params.extend([search_term, search_term, search_term])
-                
-                # Handle status_filter (string or list)
-                if status_filter != "tous":
-                    if isinstance(status_filter, list):
-                        # Handle list of statuses
-                        placeholders = ', '.join(['?' for _ in status_filter])
-                        status_condition = f"status IN ({placeholders})" 
-                        params.extend(status_filter)
-                    else:
-                        # Handle single status
-                        status_condition = "status = ?"
-                        params.append(status_filter)
-                    
-                    # Add status condition to where_conditions
-                    where_conditions.append(status_condition)
-
-                # Apply filters to the base query or outer select for UNION queries
-                if where_conditions:
-                     # For UNION queries, apply filters to the outer SELECT on combined_results
-                    if "UNION" in base_query:
-                         base_query = f"SELECT * FROM ({base_query}) AS combined_results WHERE " + " AND ".join(where_conditions)
-                    else:
-                        # For non-UNION queries, apply filters directly to the main WHERE clause
-                        if "WHERE" in base_query:
-                            base_query += " AND " + " AND ".join(where_conditions)
-                        else:
-                             base_query += " WHERE " + " AND ".join(where_conditions)
-                
-                base_query += " ORDER BY updated_at DESC"
-                
-                df = pd.read_sql_query(base_query, conn, params=params)
-                
-                # Supprimer les doublons qui peuvent survenir avec les UNION
-                if not df.empty and 'id' in df.columns:
-                    df = df.drop_duplicates(subset=['id'])
-                
-                return df
+                return pd.read_sql_query(query + " ORDER BY d.updated_at DESC", conn, params=params)
         except Exception as e:
             print(f"Erreur récupération demandes: {e}")
             return pd.DataFrame()
+
+    @staticmethod
+    def count_demandes_for_user(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                                search_columns: Optional[List[str]] = None) -> int:
+        """Nombre de demandes visibles par l'utilisateur (avec filtres éventuels), sans charger les lignes"""
+        try:
+            built = DemandeModel._build_visible_query(user_id, role, filters or {}, search_columns, select="d.id")
+            if built is None:
+                return 0
+            query, params = built
+            result = db.execute_query(f"SELECT COUNT(*) FROM ({query})", tuple(params), fetch='one')
+            return result[0] if result else 0
+        except Exception as e:
+            print(f"Erreur comptage demandes: {e}")
+            return 0
     
     @staticmethod
+    def get_demandes_page(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                          search_columns: Optional[List[str]] = None, page_size: Optional[int] = None,
+                          after: Optional[tuple] = None) -> Dict[str, Any]:
+        """
+        Page de demandes visibles, paginée par clé (updated_at, id) décroissante.
+
+        Le coût d'une page ne dépend pas de sa position : la page suivante reprend après
+        le curseur de la précédente au lieu de sauter des lignes (OFFSET).
+
+        Args:
+            page_size: Nombre de demandes par page (défaut app_config.default_page_size)
+            after: Curseur (updated_at, id) de la dernière demande de la page précédente
+
+        Returns:
+            Dict avec rows (DataFrame), next_cursor (curseur de la page suivante ou None) et has_more
+        """
+        from config.settings import app_config
+
+        page_size = page_size or app_config.default_page_size
+        empty = {'rows': pd.DataFrame(), 'next_cursor': None, 'has_more': False}
+        try:
+            built = DemandeModel._build_visible_query(user_id, role, filters or {}, search_columns,
+                                                      select="d.id", keyset_after=after)
+            if built is None:
+                return empty
+            ids_query, params = built
+
+            # Tri et limite sur les seuls identifiants, lignes complètes lues pour la page uniquement
+            # (une ligne de plus que la page pour savoir s'il existe une page suivante)
+            query = f'''
+                SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+                FROM demandes d JOIN users u ON d.user_id = u.id
+                WHERE d.id IN ({ids_query} ORDER BY d.updated_at DESC, d.id DESC LIMIT ?)
+                ORDER BY d.updated_at DESC, d.id DESC
+            '''
+            with db.get_connection() as conn:
+                df = pd.read_sql_query(query, conn, params=params + [page_size + 1])
+
+            has_more = len(df) > page_size
+            df = df.head(page_size)
+            next_cursor = None
+            if has_more and not df.empty:
+                last = df.iloc[-1]
+                next_cursor = (last['updated_at'], int(last['id']))
+            return {'rows': df, 'next_cursor': next_cursor, 'has_more': has_more}
+        except Exception as e:
+            print(f"Erreur récupération page de demandes: {e}")
+            return empty
+
+    @staticmethod
+    def get_demandes_totals(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                            search_columns: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Totaux (nombre, montants, en attente, validées) des demandes visibles et filtrées, calculés en SQL"""
+        totals = {'total': 0, 'montant_total': 0, 'montant_valide': 0, 'en_attente': 0, 'validees': 0}
+        try:
+            built = DemandeModel._build_visible_query(user_id, role, filters or {}, search_columns,
+                                                      select="d.id, d.montant, d.status")
+            if built is None:
+                return totals
+            query, params = built
+            result = db.execute_query(f'''
+                SELECT COUNT(*) AS total,
+                       COALESCE(SUM(montant), 0) AS montant_total,
+                       COALESCE(SUM(CASE WHEN status = 'validee' THEN montant ELSE 0 END), 0) AS montant_valide,
+                       COUNT(CASE WHEN status LIKE '%attente%' THEN 1 END) AS en_attente,
+                       COUNT(CASE WHEN status = 'validee' THEN 1 END) AS validees
+                FROM ({query})
+            ''', tuple(params), fetch='one')
+            return dict(result) if result else totals
+        except Exception as e:
+            print(f"Erreur totaux demandes: {e}")
+            return totals
+    
+    @staticmethod
+    def get_top_clients(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                        limit: int = 10) -> List[Dict[str, Any]]:
+        """Clients des demandes visibles et filtrées classés par montant total (GROUP BY SQL)"""
+        try:
+            built = DemandeModel._build_visible_query(user_id, role, filters or {},
+                                                      select="d.client, d.montant")
+            if built is None:
+                return []
+            query, params = built
+            rows = db.execute_query(f'''
+                SELECT client, SUM(montant) AS montant_total, COUNT(*) AS nb_demandes
+                FROM ({query})
+                GROUP BY client
+                ORDER BY montant_total DESC
+                LIMIT ?
+            ''', tuple(params) + (limit,), fetch='all')
+            return [dict(row) for row in rows] if rows else []
+        except Exception as e:
+            print(f"Erreur top clients: {e}")
+            return []
+    
+    @staticmethod
+    def export_demandes_to_file(user_id: int, role: str, filters: Optional[Dict[str, Any]] = None,
+                                fmt: str = 'csv') -> Dict[str, Any]:
+        """Export des demandes visibles et filtrées en flux vers un fichier CSV/XLSX temporaire"""
+        from utils.streaming_export import export_query
+
+        built = DemandeModel._build_visible_query(user_id, role, filters or {})
+        if built is None:
+            return {'success': False, 'rows': 0, 'error': "Rôle sans accès aux demandes"}
+        query, params = built
+        return export_query(query + " ORDER BY d.updated_at DESC", params, fmt=fmt,
+                            file_prefix='demandes', sheet_name='Demandes')
+    
+    @staticmethod
+    @cached_query('demandes', 'users')
     def get_demande_by_id(demande_id: int) -> Optional[Dict[str, Any]]:
         """Get demande by ID with user info"""
         try:
@@ -519,22 +614,51 @@ class DemandeModel:
             
         except Exception as e:
             print(f"Erreur mise à jour demande: {e}")
+            db.set_rollback_only()
             return False
     
     @staticmethod
-    def submit_demande(demande_id: int, user_id: int) -> tuple[bool, str]:
-        """Submit a demande for approval"""
+    def reserve_budget(demande_id: int) -> Dict[str, Any]:
+        """
+        Réserver le montant d'une demande sur le budget de son créateur avant de la passer
+        en attente (voir BudgetLedgerModel.reserve). Étape commune à tous les passages en
+        attente : soumission, création directe en en_attente_financier (DR, admin).
+
+        À appeler dans la transaction qui change le statut ; une demande déjà en attente
+        n'est pas décomptée une seconde fois.
+        """
+        demande = db.execute_query(
+            "SELECT user_id, by, montant, status FROM demandes WHERE id = ?",
+            (demande_id,), fetch='one'
+        )
+        if not demande:
+            return {'allowed': False, 'reserved': False, 'over_budget': False, 'available': None,
+                    'message': "Demande non trouvée"}
+        already_pending = demande['montant'] if demande['status'] in PENDING_STATUSES else 0.0
+        return BudgetLedgerModel.reserve(demande['user_id'], demande['by'], demande['montant'],
+                                         already_pending=already_pending)
+    
+    @staticmethod
+    def submit_demande(demande_id: int, user_id: int) -> tuple[bool, str, bool]:
+        """
+        Submit a demande for approval
+
+        Returns:
+            (succès, message, avertissement) : avertissement vrai si la demande est soumise
+            malgré un dépassement de budget (politique 'warn'), détaillé dans le message
+        """
         try:
             # Get demande and user info
             demande_data = db.execute_query('''
-                SELECT d.nom_manifestation, d.type_demande, d.user_id, u.role, u.directeur_id, u.nom, u.prenom
+                SELECT d.nom_manifestation, d.type_demande, d.user_id,
+                       u.role, u.directeur_id, u.nom, u.prenom
                 FROM demandes d
                 JOIN users u ON d.user_id = u.id
                 WHERE d.id = ? AND d.user_id = ?
             ''', (demande_id, user_id), fetch='one')
             
             if not demande_data:
-                return False, "Demande non trouvée"
+                return False, "Demande non trouvée", False
             
             type_demande = demande_data['type_demande']
             user_role = demande_data['role']
@@ -557,20 +681,32 @@ class DemandeModel:
                         'commentaire_dr': f'Validé automatiquement lors de la soumission par {demande_data["prenom"]} {demande_data["nom"]}'
                     })
                 else:
-                    return False, "Workflow non défini pour ce rôle"
+                    return False, "Workflow non défini pour ce rôle", False
             elif type_demande == 'marketing':
                 # Marketing va directement au financier
                 update_data['status'] = 'en_attente_financier'
             else:
-                return False, "Type de demande non valide"
+                return False, "Type de demande non valide", False
             
-            # Update demande with the determined data
-            DemandeModel.update_demande(demande_id, **update_data)
+            # Réservation du montant sur le budget et passage en attente dans la même transaction
+            with db.unit_of_work() as uow:
+                reservation = DemandeModel.reserve_budget(demande_id)
+                if not reservation['allowed']:
+                    return False, reservation['message'], False
+                
+                # Update demande with the determined data
+                if not DemandeModel.update_demande(demande_id, **update_data):
+                    uow.set_rollback_only()
+                    return False, "Erreur lors de la mise à jour", False
             
-            return True, "Demande soumise avec succès"
+            if uow.rollback_only:
+                return False, "Erreur lors de l'enregistrement de la soumission, opération annulée", False
+            if reservation['message']:
+                return True, f"Demande soumise avec succès (⚠️ {reservation['message']})", True
+            return True, "Demande soumise avec succès", False
             
         except Exception as e:
-            return False, f"Erreur: {e}"
+            return False, f"Erreur: {e}", False
     
     @staticmethod
     def validate_demande(demande_id: int, valideur_id: int, action: str, 
@@ -587,64 +723,18 @@ class DemandeModel:
             return False, f"Erreur: {e}"
     
     @staticmethod
+    @cached_query('demandes', 'users', 'demande_participants')
     def get_dashboard_stats(user_id: int, role: str, fiscal_year_filter: Optional[str] = None) -> Dict[str, Any]:
-        """Récupérer les statistiques pour le tableau de bord avec filtre année fiscale string"""
+        """Récupérer les statistiques pour le tableau de bord avec filtre année fiscale string
+
+        Calculées sur la table d'agrégats demande_stats (quelques lignes par utilisateur),
+        périmètre : celui de la liste pour tc/marketing/dr (ses demandes, celles de son
+        équipe pour un dr, et ses participations), les demandes soumises (dr_financier/dg),
+        toutes (admin).
+        """
         try:
-            # Base query to get counts for different statuses
-            base_query = '''
-                SELECT
-                    COUNT(CASE WHEN status = 'brouillon' THEN 1 END) AS brouillon,
-                    COUNT(CASE WHEN status IN ('en_attente_dr', 'en_attente_financier') THEN 1 END) AS en_cours,
-                    COUNT(CASE WHEN status = 'validee' THEN 1 END) AS validees,
-                    COUNT(CASE WHEN status = 'rejetee' THEN 1 END) AS rejetees,
-                    SUM(CASE WHEN status = 'validee' THEN montant ELSE 0 END) AS montant_valide,
-                    COUNT(*) AS total_demandes
-                FROM demandes d
-                JOIN users u ON d.user_id = u.id
-            '''
-            params = []
-            
-            # Add role-based filtering
-            role_conditions = []
-            if role == 'tc':
-                role_conditions.append("d.user_id = ?")
-                params.append(user_id)
-            elif role == 'dr':
-                role_conditions.append("d.user_id = ? OR u.directeur_id = ?")
-                params.extend([user_id, user_id])
-            elif role in ['dr_financier', 'dg']:
-                 # Financier/DG voit toutes les demandes sauf brouillon et rejetee par DR
-                 role_conditions.append("d.status NOT IN ('brouillon', 'rejetee')")
-            # Admin sees all (no role condition needed)
-
-            # Add fiscal_year filtering (string-based)
-            if fiscal_year_filter:
-                role_conditions.append("d.by = ?")
-                params.append(fiscal_year_filter)
-
-            # Combine conditions
-            if role_conditions:
-                base_query += " WHERE " + " AND ".join(role_conditions)
-
-            # Execute query
-            stats = db.execute_query(base_query, tuple(params), fetch='one')
-            
-            if stats:
-                # Convert Row to dictionary and ensure no None values
-                result = dict(stats)
-                # Replace None values with 0 for numeric fields
-                result['montant_valide'] = result.get('montant_valide') or 0
-                return result
-            else:
-                # Return zero stats if no data
-                return {
-                    'brouillon': 0,
-                    'en_cours': 0,
-                    'validees': 0,
-                    'rejetees': 0,
-                    'montant_valide': 0,
-                    'total_demandes': 0
-                }
+            from models.demande_stats import DemandeStatsModel
+            return DemandeStatsModel.get_stats(user_id, role, fiscal_year_filter)
 
         except Exception as e:
             print(f"Erreur récupération stats tableau de bord: {e}")
@@ -659,42 +749,70 @@ class DemandeModel:
             }
     
     @staticmethod
+    @cached_query('demandes', 'users', 'demande_participants')
     def get_analytics_data(user_id: int, role: str) -> Dict[str, Any]:
-        """Get analytics data for charts and reports"""
+        """Get analytics data for charts and reports
+
+        Agrégats calculés en SQL (GROUP BY) sur les demandes visibles par le rôle : seules
+        les lignes agrégées (mois, statuts, 10 premiers clients) sont chargées.
+        """
         try:
-            # Get demandes dataframe
-            demandes_df = DemandeModel.get_demandes_for_user(user_id, role)
-            
-            if demandes_df.empty:
+            visibility = DemandeModel._visibility_condition(user_id, role)
+            if visibility is None:
                 return {}
-            
-            # Convert date column
-            demandes_df['date_evenement'] = pd.to_datetime(demandes_df['date_evenement'])
-            demandes_df['mois'] = demandes_df['date_evenement'].dt.to_period('M')
-            
+            condition, params = visibility
+            conditions = [condition] if condition else []
+            where = "WHERE " + " AND ".join(conditions) if conditions else ""
+            dated_where = "WHERE " + " AND ".join(conditions + ["d.date_evenement IS NOT NULL"])
+            params = tuple(params)
+
+            summary = db.execute_query(f'''
+                SELECT COUNT(*) AS total_demandes,
+                       COALESCE(SUM(montant), 0) AS montant_total,
+                       AVG(montant) AS montant_moyen,
+                       COUNT(CASE WHEN status = 'validee' THEN 1 END) AS validees
+                FROM demandes d {where}
+            ''', params, fetch='one')
+
+            if not summary or not summary['total_demandes']:
+                return {}
+
             # Monthly evolution
-            monthly_data = demandes_df.groupby('mois')['montant'].agg(['sum', 'count']).reset_index()
-            monthly_data['mois'] = monthly_data['mois'].astype(str)
-            
+            monthly_data = db.execute_query(f'''
+                SELECT strftime('%Y-%m', d.date_evenement) AS mois,
+                       SUM(d.montant) AS "sum", COUNT(*) AS "count"
+                FROM demandes d {dated_where}
+                GROUP BY mois
+                ORDER BY mois
+            ''', params, fetch='all')
+
             # Status distribution
-            status_data = demandes_df.groupby('status').size().reset_index(name='count')
-            
+            status_data = db.execute_query(f'''
+                SELECT d.status, COUNT(*) AS "count"
+                FROM demandes d {where}
+                GROUP BY d.status
+                ORDER BY d.status
+            ''', params, fetch='all')
+
             # Top clients
-            client_data = demandes_df.groupby('client').agg({
-                'montant': ['sum', 'count']
-            }).reset_index()
-            client_data.columns = ['client', 'montant_total', 'nb_demandes']
-            client_data = client_data.sort_values('montant_total', ascending=False).head(10)
-            
+            client_data = db.execute_query(f'''
+                SELECT d.client, SUM(d.montant) AS montant_total, COUNT(*) AS nb_demandes
+                FROM demandes d {where}
+                GROUP BY d.client
+                ORDER BY montant_total DESC
+                LIMIT 10
+            ''', params, fetch='all')
+
+            total = summary['total_demandes']
             return {
-                'monthly_evolution': monthly_data.to_dict('records'),
-                'status_distribution': status_data.to_dict('records'),
-                'top_clients': client_data.to_dict('records'),
+                'monthly_evolution': [dict(row) for row in monthly_data or []],
+                'status_distribution': [dict(row) for row in status_data or []],
+                'top_clients': [dict(row) for row in client_data or []],
                 'summary': {
-                    'total_demandes': len(demandes_df),
-                    'montant_total': demandes_df['montant'].sum(),
-                    'montant_moyen': demandes_df['montant'].mean(),
-                    'taux_validation': (len(demandes_df[demandes_df['status'] == 'validee']) / len(demandes_df) * 100) if len(demandes_df) > 0 else 0
+                    'total_demandes': total,
+                    'montant_total': summary['montant_total'],
+                    'montant_moyen': summary['montant_moyen'],
+                    'taux_validation': summary['validees'] / total * 100
                 }
             }
             
@@ -0,0 +1,322 @@
+"""
+Export Parquet des demandes pour les outils BI (table bi_export_partitions)
+
+Les demandes, les attributs de leur créateur et les labels résolus des listes
+déroulantes sont écrits en Parquet, partitionnés à la Hive par année fiscale et
+statut (by=<BY>/status=<statut>/part-0.parquet), avec des colonnes typées :
+catégories (dictionnaire) pour région, catégorie, statut, ..., float pour le montant,
+dates et horodatages pour date_evenement, created_at, ...
+
+Export incrémental : la table bi_export_partitions tient une version par partition
+(by, statut), incrémentée par des triggers à chaque écriture sur une demande de la
+partition (ancienne et nouvelle partition pour un changement de statut ou de BY), sur
+les attributs exportés de son créateur, et sur toutes les partitions quand une option
+de liste déroulante change (labels). Le fichier _manifest.json du répertoire d'export
+garde la version exportée de chaque partition : seules les partitions dont la version
+a changé (ou dont le fichier manque) sont réécrites. pyarrow est optionnel.
+"""
+import json
+import logging
+import os
+import shutil
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from models.database import db
+from utils.streaming_export import DEFAULT_CHUNK_SIZE, iter_query_chunks
+
+logger = logging.getLogger(__name__)
+
+# Réécriture complète si les colonnes exportées changent
+EXPORT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = '_manifest.json'
+
+# Valeur de partition absente (convention Hive)
+_DEFAULT_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+# Colonnes exportées : (nom, expression SQL, type) ; by et status sont portés par les partitions
+_COLUMNS = [
+    ('id', 'd.id', 'int'),
+    ('user_id', 'd.user_id', 'int'),
+    ('type_demande', 'd.type_demande', 'category'),
+    ('nom_manifestation', 'd.nom_manifestation', 'string'),
+    ('client', 'd.client', 'string'),
+    ('date_evenement', 'd.date_evenement', 'date'),
+    ('lieu', 'd.lieu', 'string'),
+    ('montant', 'd.montant', 'float'),
+    ('urgence', 'd.urgence', 'category'),
+    ('budget', 'd.budget', 'category'),
+    ('categorie', 'd.categorie', 'category'),
+    ('typologie_client', 'd.typologie_client', 'category'),
+    ('groupe_groupement', 'd.groupe_groupement', 'category'),
+    ('region', 'd.region', 'category'),
+    ('agence', 'd.agence', 'string'),
+    ('client_enseigne', 'd.client_enseigne', 'string'),
+    ('cy', 'd.cy', 'int'),
+    ('demandeur_nom', 'u.nom', 'string'),
+    ('demandeur_prenom', 'u.prenom', 'string'),
+    ('demandeur_email', 'u.email', 'string'),
+    ('demandeur_role', 'u.role', 'category'),
+    ('demandeur_region', 'u.region', 'category'),
+    ('directeur_id', 'u.directeur_id', 'int'),
+    ('date_validation_dr', 'd.date_validation_dr', 'timestamp'),
+    ('date_validation_financier', 'd.date_validation_financier', 'timestamp'),
+    ('date_validation_dg', 'd.date_validation_dg', 'timestamp'),
+    ('created_at', 'd.created_at', 'timestamp'),
+    ('updated_at', 'd.updated_at', 'timestamp'),
+]
+
+# Colonnes de listes déroulantes : une colonne <champ>_label (catégorie) est ajoutée après chacune
+_LABEL_FIELDS = {
+    'budget': 'budget',
+    'categorie': 'categorie',
+    'typologie_client': 'typologie_client',
+    'groupe_groupement': 'groupe_groupement',
+    'region': 'region',
+}
+
+# Attributs du créateur exportés : leur modification rend ses partitions à réexporter
+_USER_COLUMNS = ('nom', 'prenom', 'email', 'role', 'region', 'directeur_id')
+
+def _bump_partition_sql(prefix: str) -> str:
+    return f'''
+        INSERT INTO bi_export_partitions (by, status) VALUES (COALESCE({prefix}.by, ''), {prefix}.status)
+        ON CONFLICT (by, status) DO UPDATE SET version = version + 1;
+    '''
+
+def _partition_path(by: str, status: str) -> str:
+    by_dir = quote(by, safe='') if by else _DEFAULT_PARTITION
+    return os.path.join(f"by={by_dir}", f"status={quote(status or '', safe='') or _DEFAULT_PARTITION}")
+
+def _to_date(value) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def _to_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+class DemandeParquetExport:
+    """Export Parquet partitionné et incrémental des demandes"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table des versions de partitions et ses triggers (migration 0013)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bi_export_partitions (
+                by TEXT NOT NULL,
+                status TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (by, status)
+            ) WITHOUT ROWID
+        ''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bi_export_insert AFTER INSERT ON demandes
+            BEGIN
+                {_bump_partition_sql('NEW')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bi_export_delete AFTER DELETE ON demandes
+            BEGIN
+                {_bump_partition_sql('OLD')}
+            END
+        ''')
+        # Toutes les colonnes sont exportées : toute modification de la ligne compte
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bi_export_update AFTER UPDATE ON demandes
+            BEGIN
+                {_bump_partition_sql('OLD')}
+                INSERT INTO bi_export_partitions (by, status)
+                SELECT COALESCE(NEW.by, ''), NEW.status
+                WHERE COALESCE(OLD.by, '') IS NOT COALESCE(NEW.by, '') OR OLD.status IS NOT NEW.status
+                ON CONFLICT (by, status) DO UPDATE SET version = version + 1;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_bi_export_user
+            AFTER UPDATE OF {', '.join(_USER_COLUMNS)} ON users
+            BEGIN
+                UPDATE bi_export_partitions SET version = version + 1
+                WHERE (by, status) IN (SELECT DISTINCT COALESCE(by, ''), status FROM demandes WHERE user_id = NEW.id);
+            END
+        ''')
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_bi_export_dropdown_{event.lower()}
+                AFTER {event} ON dropdown_options
+                BEGIN
+                    UPDATE bi_export_partitions SET version = version + 1;
+                END
+            ''')
+
+        cursor.execute('''
+            INSERT OR IGNORE INTO bi_export_partitions (by, status)
+            SELECT DISTINCT COALESCE(by, ''), status FROM demandes
+        ''')
+
+    @staticmethod
+    def get_partitions() -> List[Dict[str, Any]]:
+        """Partitions (by, status) connues et leur version courante"""
+        rows = db.execute_query("SELECT by, status, version FROM bi_export_partitions ORDER BY by, status",
+                                fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def _read_manifest(output_dir: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(output_dir, MANIFEST_FILE), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('format_version') != EXPORT_FORMAT_VERSION:
+            return {}
+        return manifest
+
+    @staticmethod
+    def _write_manifest(output_dir: str, partitions: Dict[str, Dict[str, Any]]):
+        path = os.path.join(output_dir, MANIFEST_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({
+                'format_version': EXPORT_FORMAT_VERSION,
+                'exported_at': datetime.now().isoformat(timespec='seconds'),
+                'partitions': partitions,
+            }, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def _arrow_schema(pa):
+        types = {
+            'int': pa.int64(),
+            'float': pa.float64(),
+            'string': pa.string(),
+            'category': pa.dictionary(pa.int32(), pa.string()),
+            'date': pa.date32(),
+            'timestamp': pa.timestamp('s'),
+        }
+        fields = []
+        for name, _, kind in _COLUMNS:
+            fields.append(pa.field(name, types[kind]))
+            if name in _LABEL_FIELDS:
+                fields.append(pa.field(f"{name}_label", types['category']))
+        return pa.schema(fields)
+
+    @staticmethod
+    def _record_batch(pa, schema, rows) -> Any:
+        """Lignes SQL -> RecordBatch typé, labels des listes déroulantes résolus en une requête"""
+        from utils.dropdown_display import DropdownDisplayUtils
+
+        labels = DropdownDisplayUtils.get_labels_for_values(
+            (category, row[field]) for row in rows for field, category in _LABEL_FIELDS.items()
+        )
+        converters = {'date': _to_date, 'timestamp': _to_timestamp}
+        arrays = []
+        for position, (name, _, kind) in enumerate(_COLUMNS):
+            values = [row[position] for row in rows]
+            convert = converters.get(kind)
+            if convert:
+                values = [convert(value) for value in values]
+            if kind == 'category':
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, schema.field(name).type))
+            if name in _LABEL_FIELDS:
+                category = _LABEL_FIELDS[name]
+                arrays.append(pa.array([labels.get((category, value)) if value else None for value in values],
+                                       pa.string()).dictionary_encode())
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    @staticmethod
+    def _write_partition(pa, pq, schema, output_dir: str, by: str, status: str, chunk_size: int) -> int:
+        """Écrire une partition (fichier temporaire puis renommage) ; supprimée si elle est vide"""
+        partition_dir = os.path.join(output_dir, _partition_path(by, status))
+        query = f'''
+            SELECT {', '.join(sql for _, sql, _ in _COLUMNS)}
+            FROM demandes d
+            LEFT JOIN users u ON u.id = d.user_id
+            WHERE d.status = ? AND COALESCE(d.by, '') = ?
+            ORDER BY d.id
+        '''
+        count = 0
+        writer = None
+        tmp_path = os.path.join(partition_dir, 'part-0.parquet.tmp')
+        try:
+            for rows in iter_query_chunks(query, (status, by), chunk_size):
+                if writer is None:
+                    os.makedirs(partition_dir, exist_ok=True)
+                    writer = pq.ParquetWriter(tmp_path, schema, compression='snappy')
+                writer.write_batch(DemandeParquetExport._record_batch(pa, schema, rows))
+                count += len(rows)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if count:
+            os.replace(tmp_path, os.path.join(partition_dir, 'part-0.parquet'))
+        elif os.path.isdir(partition_dir):
+            shutil.rmtree(partition_dir)
+        return count
+
+    @staticmethod
+    def export(output_dir: str, full: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+        """
+        Exporter les demandes en Parquet partitionné par BY et statut.
+
+        Args:
+            output_dir: Répertoire du jeu de données (créé si besoin)
+            full: Réécrire toutes les partitions même si elles n'ont pas changé
+
+        Returns:
+            Dict avec success, output_dir, written (partitions réécrites), removed (partitions
+            vidées), unchanged (nombre de partitions conservées), rows (lignes écrites) et error
+        """
+        result = {'success': False, 'output_dir': output_dir, 'written': [], 'removed': [],
+                  'unchanged': 0, 'rows': 0, 'error': None}
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            result['error'] = "pyarrow non installé (pip install pyarrow)"
+            return result
+
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            exported = {} if full else DemandeParquetExport._read_manifest(output_dir).get('partitions', {})
+            schema = DemandeParquetExport._arrow_schema(pa)
+            manifest = {}
+
+            for partition in DemandeParquetExport.get_partitions():
+                key = _partition_path(partition['by'], partition['status']).replace(os.sep, '/')
+                previous = exported.get(key)
+                file_present = os.path.exists(os.path.join(output_dir, key, 'part-0.parquet'))
+                # Version lue avant les lignes : une écriture concurrente sera réexportée au prochain passage
+                if previous and previous.get('version') == partition['version'] and (file_present or not previous.get('rows')):
+                    manifest[key] = previous
+                    result['unchanged'] += 1
+                    continue
+
+                rows = DemandeParquetExport._write_partition(pa, pq, schema, output_dir, partition['by'],
+                                                             partition['status'], chunk_size)
+                manifest[key] = {'version': partition['version'], 'rows': rows}
+                result['rows'] += rows
+                (result['written'] if rows else result['removed']).append(key)
+
+            DemandeParquetExport._write_manifest(output_dir, manifest)
+            result['success'] = True
+            logger.info(f"✅ Export Parquet: {len(result['written'])} partition(s) écrite(s), "
+                        f"{result['unchanged']} inchangée(s), {result['rows']} ligne(s)")
+        except Exception as e:
+            logger.error(f"Erreur export Parquet: {e}")
+            result['error'] = str(e)
+        return result
@@ -0,0 +1,121 @@
+"""
+Recherche plein texte sur les demandes (table FTS5 demandes_fts)
+
+Table FTS5 à contenu externe (content='demandes') : seul l'index est stocké, les
+textes restent dans demandes. Des triggers la tiennent à jour à chaque insertion,
+suppression ou modification d'une colonne indexée. Le tokenizer unicode61 avec
+remove_diacritics rend la recherche insensible aux accents et à la casse
+(« evenement » trouve « Événement ») ; les index de préfixes accélèrent les
+recherches « mot* » utilisées par la saisie utilisateur.
+
+Les colonnes indexées sont celles de utils.filter_sql.FTS_COLUMNS ; la migration 0017
+recrée l'index pour y ajouter les valeurs des listes déroulantes (budget, categorie,
+typologie_client, groupe_groupement).
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+from models.database import db
+from utils.filter_sql import FTS_COLUMNS, fts_match_expression
+
+logger = logging.getLogger(__name__)
+
+class DemandeSearchModel:
+    """Modèle pour l'index plein texte des demandes"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table FTS5, ses triggers de synchronisation et l'alimenter (migration 0009)"""
+        columns = ', '.join(FTS_COLUMNS)
+        new_values = ', '.join(f"NEW.{c}" for c in FTS_COLUMNS)
+        old_values = ', '.join(f"OLD.{c}" for c in FTS_COLUMNS)
+
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS demandes_fts USING fts5(
+                {columns},
+                content='demandes', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3 4'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demandes_fts_insert AFTER INSERT ON demandes
+            BEGIN
+                INSERT INTO demandes_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demandes_fts_delete AFTER DELETE ON demandes
+            BEGIN
+                INSERT INTO demandes_fts (demandes_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        # Seules les modifications des colonnes indexées réindexent (pas les changements de statut)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demandes_fts_update AFTER UPDATE OF {columns} ON demandes
+            BEGIN
+                INSERT INTO demandes_fts (demandes_fts, rowid, {columns}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO demandes_fts (rowid, {columns}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        cursor.execute("INSERT INTO demandes_fts (demandes_fts) VALUES ('rebuild')")
+
+    @staticmethod
+    def recreate_schema(cursor):
+        """Supprimer l'index et ses triggers puis les recréer sur les colonnes courantes (migration 0017)"""
+        for trigger in ('trg_demandes_fts_insert', 'trg_demandes_fts_delete', 'trg_demandes_fts_update'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE IF EXISTS demandes_fts")
+        DemandeSearchModel.create_schema(cursor)
+
+    @staticmethod
+    def search(search_query: str, user_id: int, role: str, limit: int = 20,
+               columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Demandes visibles par l'utilisateur correspondant à la saisie, classées par pertinence (bm25).
+
+        Returns:
+            Liste de dicts (id, nom_manifestation, client, lieu, montant, status, updated_at,
+            score, extrait) ; extrait est un passage avec les termes trouvés entre ** **
+
+        Raises:
+            RuntimeError: erreur de la base (index absent ou corrompu), journalisée
+        """
+        from models.demande import DemandeModel
+
+        match = fts_match_expression(search_query, columns)
+        visibility = DemandeModel._visibility_condition(user_id, role)
+        if match is None or visibility is None:
+            return []
+        condition, params = visibility
+
+        query = '''
+            SELECT d.id, d.nom_manifestation, d.client, d.lieu, d.montant, d.status, d.updated_at,
+                   bm25(demandes_fts) AS score,
+                   snippet(demandes_fts, -1, '**', '**', '…', 12) AS extrait
+            FROM demandes_fts
+            JOIN demandes d ON d.id = demandes_fts.rowid
+            WHERE demandes_fts MATCH ?
+        '''
+        if condition:
+            query += f" AND {condition}"
+        query += " ORDER BY score LIMIT ?"
+
+        try:
+            rows = db.execute_query(query, (match, *params, limit), fetch='all')
+        except Exception as e:
+            logger.error(f"❌ Erreur recherche plein texte '{search_query}': {e}")
+            raise
+        return [dict(row) for row in rows] if rows else []
+
+    @staticmethod
+    def rebuild() -> bool:
+        """Reconstruire l'index depuis la table demandes puis le compacter"""
+        try:
+            with db.unit_of_work():
+                db.execute_query("INSERT INTO demandes_fts (demandes_fts) VALUES ('rebuild')")
+                db.execute_query("INSERT INTO demandes_fts (demandes_fts) VALUES ('optimize')")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Erreur reconstruction index plein texte: {e}")
+            return False
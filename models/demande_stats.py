@@ -0,0 +1,242 @@
+"""
+Agrégats des demandes pour le tableau de bord (table demande_stats)
+
+Une ligne par (créateur, directeur du créateur, année fiscale, statut, type) avec le
+nombre de demandes et la somme des montants (les participations, peu nombreuses,
+sont ajoutées à la lecture depuis demande_visibility). Des triggers la mettent à jour à chaque
+création, modification (statut, montant, année fiscale, type, créateur), suppression
+de demande et changement de directeur (suppression d'un utilisateur : ses lignes sont
+retirées avant la suppression en cascade de ses demandes, migration 0019) : les statistiques d'un rôle se calculent sur
+quelques lignes agrégées au lieu de parcourir les demandes. verify() compare la table
+à un recomptage complet (voir scripts/verify_demande_stats.py).
+"""
+from typing import Any, Dict, List, Optional
+
+from models.database import db
+from models.demande_visibility import SUBMITTED_ROLES, SUBMITTED_STATUSES_SQL
+from models.user_hierarchy import UserHierarchyModel
+
+# Recomptage complet, même clé que la table (0 / '' pour directeur et année absents)
+_RECOUNT_SQL = '''
+    SELECT d.user_id, COALESCE(u.directeur_id, 0) AS directeur_id, COALESCE(d.by, '') AS by,
+           d.status, d.type_demande, COUNT(*) AS nb, COALESCE(SUM(d.montant), 0) AS montant
+    FROM demandes d LEFT JOIN users u ON u.id = d.user_id
+    GROUP BY d.user_id, COALESCE(u.directeur_id, 0), COALESCE(d.by, ''), d.status, d.type_demande
+'''
+
+_KEY_COLUMNS = ('user_id', 'directeur_id', 'by', 'status', 'type_demande')
+
+# Écart de montant toléré entre la table et le recomptage (sommes flottantes incrémentales)
+_AMOUNT_TOLERANCE = 0.005
+
+_EMPTY_STATS = {
+    'brouillon': 0,
+    'en_cours': 0,
+    'en_attente_dr': 0,
+    'en_attente_financier': 0,
+    'en_attente_validation': 0,
+    'validees': 0,
+    'rejetees': 0,
+    'montant_valide': 0,
+    'total_demandes': 0,
+    'mes_demandes': 0,
+}
+
+def _increment_sql(prefix: str, sign: str) -> str:
+    """Ajout (sign '+') ou retrait ('-') de la demande NEW/OLD dans son agrégat"""
+    directeur = f"COALESCE((SELECT directeur_id FROM users WHERE id = {prefix}.user_id), 0)"
+    if sign == '+':
+        return f'''
+            INSERT INTO demande_stats (user_id, directeur_id, by, status, type_demande, nb, montant)
+            VALUES ({prefix}.user_id, {directeur}, COALESCE({prefix}.by, ''), {prefix}.status,
+                    {prefix}.type_demande, 1, COALESCE({prefix}.montant, 0))
+            ON CONFLICT (user_id, directeur_id, by, status, type_demande)
+            DO UPDATE SET nb = nb + 1, montant = montant + excluded.montant;
+        '''
+    where = (f"user_id = {prefix}.user_id AND directeur_id = {directeur} AND by = COALESCE({prefix}.by, '') "
+             f"AND status = {prefix}.status AND type_demande = {prefix}.type_demande")
+    return f'''
+            UPDATE demande_stats SET nb = nb - 1, montant = montant - COALESCE({prefix}.montant, 0)
+            WHERE {where};
+            DELETE FROM demande_stats WHERE {where} AND nb <= 0;
+        '''
+
+class DemandeStatsModel:
+    """Modèle pour la table d'agrégats des demandes"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table, ses triggers de maintenance et la remplir (migration 0010)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demande_stats (
+                user_id INTEGER NOT NULL,
+                directeur_id INTEGER NOT NULL DEFAULT 0,
+                by TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL,
+                type_demande TEXT NOT NULL,
+                nb INTEGER NOT NULL DEFAULT 0,
+                montant REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, directeur_id, by, status, type_demande)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_demande_stats_directeur ON demande_stats(directeur_id, by)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_demande_stats_status ON demande_stats(status, by)")
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demande_stats_insert AFTER INSERT ON demandes
+            BEGIN
+                {_increment_sql('NEW', '+')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demande_stats_delete AFTER DELETE ON demandes
+            BEGIN
+                {_increment_sql('OLD', '-')}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_demande_stats_update
+            AFTER UPDATE OF status, montant, by, type_demande, user_id ON demandes
+            BEGIN
+                {_increment_sql('OLD', '-')}
+                {_increment_sql('NEW', '+')}
+            END
+        ''')
+        # Changement de directeur : toutes les lignes du créateur changent de clé ensemble
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_demande_stats_directeur
+            AFTER UPDATE OF directeur_id ON users
+            WHEN NEW.directeur_id IS NOT OLD.directeur_id
+            BEGIN
+                UPDATE demande_stats SET directeur_id = COALESCE(NEW.directeur_id, 0)
+                WHERE user_id = NEW.id;
+            END
+        ''')
+
+        cursor.execute("DELETE FROM demande_stats")
+        cursor.execute(f"INSERT INTO demande_stats (user_id, directeur_id, by, status, type_demande, nb, montant) {_RECOUNT_SQL}")
+
+    @staticmethod
+    def add_user_delete_trigger(cursor):
+        """
+        Retirer les lignes d'un utilisateur supprimé avant la cascade sur ses demandes
+        (migration 0019) : pendant la cascade, son directeur n'est plus lisible et le
+        retrait de chaque demande visait la clé directeur 0, laissant la vraie ligne en place.
+        Les lignes déjà en écart sont recalculées.
+        """
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_demande_stats_user_delete
+            BEFORE DELETE ON users
+            BEGIN
+                DELETE FROM demande_stats WHERE user_id = OLD.id;
+            END
+        ''')
+        cursor.execute("DELETE FROM demande_stats")
+        cursor.execute(f"INSERT INTO demande_stats (user_id, directeur_id, by, status, type_demande, nb, montant) {_RECOUNT_SQL}")
+
+    @staticmethod
+    def get_stats(user_id: int, role: str, fiscal_year_filter: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Statistiques du tableau de bord d'un utilisateur, sommées sur les lignes agrégées.
+
+        tc / marketing / dr : mêmes demandes que la liste (DemandeVisibilityModel) : celles
+        qu'il a créées (dr : et celles de toute son équipe), lues dans les agrégats par
+        créateur, plus ses participations aux demandes des autres, lues dans demande_visibility ;
+        dr_financier / dg : demandes en attente financière ou validées, comme la liste
+        (SUBMITTED_STATUSES_SQL) ; admin : toutes.
+        """
+        conditions, params = [], []
+        creators = None
+        if role in ['tc', 'marketing']:
+            creators = ("{column} = ?", [user_id])
+        elif role == 'dr':
+            creators = (UserHierarchyModel.subtree_condition('{column}'), [user_id])
+        elif role in SUBMITTED_ROLES:
+            conditions.append(f"status IN {SUBMITTED_STATUSES_SQL}")
+        if creators:
+            conditions.append(creators[0].format(column='user_id'))
+            params.extend(creators[1])
+        if fiscal_year_filter:
+            conditions.append("by = ?")
+            params.append(fiscal_year_filter)
+
+        rows = "SELECT status, nb, montant FROM demande_stats"
+        if conditions:
+            rows += " WHERE " + " AND ".join(conditions)
+        if creators:
+            # Participations aux demandes créées hors du périmètre ci-dessus (sans double compte)
+            rows += f'''
+                UNION ALL
+                SELECT d.status, 1, COALESCE(d.montant, 0)
+                FROM demande_visibility v JOIN demandes d ON d.id = v.demande_id
+                WHERE v.user_id = ? AND v.reason = 'participant'
+                  AND NOT ({creators[0].format(column='d.user_id')})
+            '''
+            params.extend([user_id, *creators[1]])
+            if fiscal_year_filter:
+                rows += " AND COALESCE(d.by, '') = ?"
+                params.append(fiscal_year_filter)
+
+        query = f'''
+            SELECT
+                SUM(CASE WHEN status = 'brouillon' THEN nb ELSE 0 END) AS brouillon,
+                SUM(CASE WHEN status IN ('en_attente_dr', 'en_attente_financier') THEN nb ELSE 0 END) AS en_cours,
+                SUM(CASE WHEN status = 'en_attente_dr' THEN nb ELSE 0 END) AS en_attente_dr,
+                SUM(CASE WHEN status = 'en_attente_financier' THEN nb ELSE 0 END) AS en_attente_financier,
+                SUM(CASE WHEN status = 'validee' THEN nb ELSE 0 END) AS validees,
+                SUM(CASE WHEN status = 'rejetee' THEN nb ELSE 0 END) AS rejetees,
+                SUM(CASE WHEN status = 'validee' THEN montant ELSE 0 END) AS montant_valide,
+                SUM(nb) AS total_demandes
+            FROM ({rows})
+        '''
+
+        result = db.execute_query(query, tuple(params), fetch='one')
+        stats = dict(_EMPTY_STATS)
+        if result:
+            stats.update({key: value or 0 for key, value in dict(result).items()})
+        stats['montant_valide'] = round(stats['montant_valide'], 2)
+        stats['mes_demandes'] = stats['total_demandes']
+        # File de validation du rôle : DR pour un directeur, financière pour les valideurs finaux
+        if role == 'dr':
+            stats['en_attente_validation'] = stats['en_attente_dr']
+        elif role in ['dr_financier', 'dg']:
+            stats['en_attente_validation'] = stats['en_attente_financier']
+        return stats
+
+    @staticmethod
+    def verify() -> List[Dict[str, Any]]:
+        """
+        Comparer la table à un recomptage complet des demandes.
+
+        Returns:
+            Lignes en écart : clé, nb/montant attendus (recomptage) et nb/montant de la table
+        """
+        keys_match = ' AND '.join(f"s.{c} = e.{c}" for c in _KEY_COLUMNS)
+        key_select_e = ', '.join(f"e.{c}" for c in _KEY_COLUMNS)
+        key_select_s = ', '.join(f"s.{c}" for c in _KEY_COLUMNS)
+        rows = db.execute_query(f'''
+            WITH expected AS ({_RECOUNT_SQL})
+            SELECT {key_select_e}, e.nb AS nb_attendu, e.montant AS montant_attendu,
+                   s.nb AS nb_table, s.montant AS montant_table
+            FROM expected e LEFT JOIN demande_stats s ON {keys_match}
+            WHERE s.nb IS NULL OR s.nb != e.nb OR ABS(s.montant - e.montant) > {_AMOUNT_TOLERANCE}
+            UNION ALL
+            SELECT {key_select_s}, NULL, NULL, s.nb, s.montant
+            FROM demande_stats s
+            WHERE NOT EXISTS (SELECT 1 FROM expected e WHERE {keys_match})
+        ''', fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def rebuild() -> bool:
+        """Recalculer entièrement la table depuis les demandes"""
+        try:
+            with db.unit_of_work():
+                db.execute_query("DELETE FROM demande_stats")
+                db.execute_query(
+                    f"INSERT INTO demande_stats (user_id, directeur_id, by, status, type_demande, nb, montant) {_RECOUNT_SQL}"
+                )
+            return True
+        except Exception as e:
+            print(f"Erreur reconstruction statistiques: {e}")
+            return False
@@ -0,0 +1,217 @@
+"""
+Table matérialisée de visibilité des demandes (demande_visibility)
+
+Une ligne (user_id, demande_id, reason) par raison pour laquelle un utilisateur voit
+une demande : il en est le créateur (proprietaire) ou il y participe (participant).
+La table est tenue à jour par des triggers sur demandes et demande_participants ;
+rebuild() la recalcule entièrement (voir scripts/rebuild_visibility.py).
+
+L'équipe d'un dr (toute sa hiérarchie) est lue dans la table de fermeture
+user_hierarchy : la raison equipe (directeur direct du créateur) et ses triggers
+sont supprimés par la migration 0018.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+from models.database import db
+from models.user_hierarchy import UserHierarchyModel
+
+# Raisons de visibilité prises en compte pour chaque rôle
+REASONS_BY_ROLE = {
+    'tc': ('proprietaire', 'participant'),
+    'marketing': ('proprietaire', 'participant'),
+    'dr': ('proprietaire', 'participant'),
+}
+
+# Rôles qui voient en plus les demandes de toute leur hiérarchie (user_hierarchy)
+TEAM_ROLES = ('dr',)
+
+# Validateurs financiers : demandes soumises à leur validation ou validées, sans table
+# de visibilité (même périmètre pour la liste, le tableau de bord et le cube analytique)
+SUBMITTED_ROLES = ('dr_financier', 'dg')
+SUBMITTED_STATUSES_SQL = "('en_attente_financier', 'validee')"
+
+# Contenu attendu de la table, recalculé depuis les tables sources
+_EXPECTED_SQL = '''
+    SELECT user_id, id AS demande_id, 'proprietaire' AS reason FROM demandes
+    UNION
+    SELECT user_id, demande_id, 'participant' FROM demande_participants
+'''
+
+# Triggers de création / réaffectation d'une demande sans la raison equipe (migration 0018)
+_OWNER_TRIGGERS = {
+    'trg_visibility_demande_insert': '''
+        CREATE TRIGGER trg_visibility_demande_insert
+        AFTER INSERT ON demandes
+        BEGIN
+            INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+            VALUES (NEW.user_id, NEW.id, 'proprietaire');
+        END
+    ''',
+    'trg_visibility_demande_owner': '''
+        CREATE TRIGGER trg_visibility_demande_owner
+        AFTER UPDATE OF user_id ON demandes
+        WHEN NEW.user_id IS NOT OLD.user_id
+        BEGIN
+            DELETE FROM demande_visibility WHERE demande_id = NEW.id AND reason = 'proprietaire';
+            INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+            VALUES (NEW.user_id, NEW.id, 'proprietaire');
+        END
+    ''',
+}
+
+class DemandeVisibilityModel:
+    """Modèle pour la table de visibilité des demandes"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table, ses triggers de maintenance et la remplir (migration 0008)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS demande_visibility (
+                user_id INTEGER NOT NULL,
+                demande_id INTEGER NOT NULL,
+                reason TEXT NOT NULL CHECK (reason IN ('proprietaire', 'equipe', 'participant')),
+                PRIMARY KEY (user_id, demande_id, reason)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_visibility_demande ON demande_visibility(demande_id)")
+
+        # Création d'une demande : créateur et directeur du créateur
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_demande_insert
+            AFTER INSERT ON demandes
+            BEGIN
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                VALUES (NEW.user_id, NEW.id, 'proprietaire');
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                SELECT directeur_id, NEW.id, 'equipe' FROM users
+                WHERE id = NEW.user_id AND directeur_id IS NOT NULL;
+            END
+        ''')
+        # Changement de créateur (réaffectation par un administrateur)
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_demande_owner
+            AFTER UPDATE OF user_id ON demandes
+            WHEN NEW.user_id IS NOT OLD.user_id
+            BEGIN
+                DELETE FROM demande_visibility
+                WHERE demande_id = NEW.id AND reason IN ('proprietaire', 'equipe');
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                VALUES (NEW.user_id, NEW.id, 'proprietaire');
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                SELECT directeur_id, NEW.id, 'equipe' FROM users
+                WHERE id = NEW.user_id AND directeur_id IS NOT NULL;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_demande_delete
+            AFTER DELETE ON demandes
+            BEGIN
+                DELETE FROM demande_visibility WHERE demande_id = OLD.id;
+            END
+        ''')
+        # Ajout / retrait d'un participant
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_participant_insert
+            AFTER INSERT ON demande_participants
+            BEGIN
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                VALUES (NEW.user_id, NEW.demande_id, 'participant');
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_participant_delete
+            AFTER DELETE ON demande_participants
+            BEGIN
+                DELETE FROM demande_visibility
+                WHERE user_id = OLD.user_id AND demande_id = OLD.demande_id AND reason = 'participant';
+            END
+        ''')
+        # Changement de directeur : les demandes de l'utilisateur passent à la nouvelle équipe
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_directeur
+            AFTER UPDATE OF directeur_id ON users
+            WHEN NEW.directeur_id IS NOT OLD.directeur_id
+            BEGIN
+                DELETE FROM demande_visibility
+                WHERE reason = 'equipe' AND user_id = OLD.directeur_id
+                  AND demande_id IN (SELECT id FROM demandes WHERE user_id = NEW.id);
+                INSERT OR IGNORE INTO demande_visibility (user_id, demande_id, reason)
+                SELECT NEW.directeur_id, id, 'equipe' FROM demandes
+                WHERE user_id = NEW.id AND NEW.directeur_id IS NOT NULL;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_visibility_user_delete
+            AFTER DELETE ON users
+            BEGIN
+                DELETE FROM demande_visibility WHERE user_id = OLD.id;
+            END
+        ''')
+
+        cursor.execute("DELETE FROM demande_visibility")
+        cursor.execute(f"INSERT INTO demande_visibility (user_id, demande_id, reason) {_EXPECTED_SQL}")
+
+    @staticmethod
+    def drop_team_reason(cursor):
+        """
+        Supprimer la raison equipe, remplacée par user_hierarchy (migration 0018) :
+        trigger de changement de directeur, insertions equipe des triggers de création
+        et de réaffectation, et lignes existantes.
+        """
+        cursor.execute("DROP TRIGGER IF EXISTS trg_visibility_directeur")
+        for name, create_sql in _OWNER_TRIGGERS.items():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(create_sql)
+        cursor.execute("DELETE FROM demande_visibility WHERE reason = 'equipe'")
+
+    @staticmethod
+    def visibility_condition(user_id: int, role: str) -> Optional[Tuple[str, list]]:
+        """
+        Condition SQL (sur l'alias d) restreignant aux demandes visibles par l'utilisateur.
+
+        Returns:
+            (condition, params), ou None si le rôle n'est pas géré par la table
+        """
+        reasons = REASONS_BY_ROLE.get(role)
+        if reasons is None:
+            return None
+        placeholders = ', '.join('?' for _ in reasons)
+        condition = (f"d.id IN (SELECT demande_id FROM demande_visibility "
+                     f"WHERE user_id = ? AND reason IN ({placeholders}))")
+        params = [user_id, *reasons]
+        if role in TEAM_ROLES:
+            condition = f"({condition} OR {UserHierarchyModel.subtree_condition('d.user_id', include_self=False)})"
+            params.append(user_id)
+        return condition, params
+
+    @staticmethod
+    def check() -> Dict[str, int]:
+        """Comparer la table à son contenu attendu : lignes manquantes et lignes en trop"""
+        try:
+            result = db.execute_query(f'''
+                WITH expected AS ({_EXPECTED_SQL})
+                SELECT
+                    (SELECT COUNT(*) FROM (SELECT * FROM expected
+                                           EXCEPT SELECT user_id, demande_id, reason FROM demande_visibility)) AS manquantes,
+                    (SELECT COUNT(*) FROM (SELECT user_id, demande_id, reason FROM demande_visibility
+                                           EXCEPT SELECT * FROM expected)) AS en_trop
+            ''', fetch='one')
+            return dict(result) if result else {'manquantes': 0, 'en_trop': 0}
+        except Exception as e:
+            print(f"Erreur vérification visibilité: {e}")
+            return {'manquantes': -1, 'en_trop': -1}
+
+    @staticmethod
+    def rebuild() -> Dict[str, Any]:
+        """Recalculer entièrement la table depuis demandes et demande_participants"""
+        try:
+            before = DemandeVisibilityModel.check()
+            with db.unit_of_work():
+                db.execute_query("DELETE FROM demande_visibility")
+                rows = db.execute_query(
+                    f"INSERT INTO demande_visibility (user_id, demande_id, reason) {_EXPECTED_SQL}"
+                )
+            return {'success': True, 'lignes': rows, 'corrigees': before}
+        except Exception as e:
+            print(f"Erreur reconstruction visibilité: {e}")
+            return {'success': False, 'error': str(e)}
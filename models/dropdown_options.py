@@ -4,50 +4,26 @@ Dropdown Options model and related operations - Version avec auto-normalisation
 from typing import Optional, List, Dict, Any
 import pandas as pd
 from models.database import db
+from models.dropdown_usage import DEMANDE_COLUMNS, DropdownUsageModel
+from utils.dropdown_registry import dropdown_registry
 from utils.dropdown_value_normalizer import normalize_dropdown_value, validate_normalized_value
 
+def _demande_columns(categories) -> Dict[str, str]:
+    """Colonnes de demandes des catégories données, limitées aux colonnes existantes (un seul PRAGMA)"""
+    columns_info = db.execute_query("PRAGMA table_info(demandes)", fetch='all')
+    existing_columns = {col['name'] for col in columns_info or []}
+    return {
+        category: DEMANDE_COLUMNS[category]
+        for category in categories
+        if DEMANDE_COLUMNS.get(category) in existing_columns
+    }
+
 def _get_demandes_usage_count(category: str, value: str) -> int:
     """
     Obtient le nombre d'utilisations d'une valeur dans les demandes
-    Gère le mapping des catégories vers les bonnes colonnes
+    (compteur tenu à jour par triggers dans dropdown_usage)
     """
-    try:
-        # Mapping des catégories vers les colonnes de la table demandes
-        column_mapping = {
-            'budget': 'budget',
-            'categorie': 'categorie',
-            'typologie_client': 'typologie_client',
-            'groupe_groupement': 'groupe_groupement',
-            'region': 'region',
-            'annee_fiscale': None  # Cas spécial - pas de colonne directe
-        }
-        
-        column_name = column_mapping.get(category)
-        
-        if column_name is None:
-            # Pour annee_fiscale, on ne peut pas compter directement
-            if category == 'annee_fiscale':
-                return 0  # Pas d'utilisation directe dans demandes
-            else:
-                return 0  # Catégorie inconnue
-        
-        # Vérifier si la colonne existe dans la table demandes
-        columns_info = db.execute_query("PRAGMA table_info(demandes)", fetch='all')
-        existing_columns = [col['name'] for col in columns_info]
-        
-        if column_name not in existing_columns:
-            return 0  # Colonne n'existe pas
-        
-        # Compter les utilisations
-        result = db.execute_query(f'''
-            SELECT COUNT(*) FROM demandes WHERE {column_name} = ?
-        ''', (value,), fetch='one')
-        
-        return result[0] if result else 0
-        
-    except Exception as e:
-        print(f"Erreur _get_demandes_usage_count pour {category}={value}: {e}")
-        return 0
+    return DropdownUsageModel.get_count(category, value)
 
 def _update_demandes_value_safe(category: str, old_value: str, new_value: str) -> int:
     """
@@ -55,28 +31,9 @@ def _update_demandes_value_safe(category: str, old_value: str, new_value: str) -
     Gère le mapping des catégories vers les bonnes colonnes
     """
     try:
-        # Mapping des catégories vers les colonnes de la table demandes
-        column_mapping = {
-            'budget': 'budget',
-            'categorie': 'categorie',
-            'typologie_client': 'typologie_client',
-            'groupe_groupement': 'groupe_groupement',
-            'region': 'region',
-            'annee_fiscale': None  # Cas spécial - pas de colonne directe
-        }
-        
-        column_name = column_mapping.get(category)
-        
+        column_name = _demande_columns([category]).get(category)
         if column_name is None:
-            # Pour annee_fiscale, on ne peut pas mettre à jour directement
-            return 0
-        
-        # Vérifier si la colonne existe dans la table demandes
-        columns_info = db.execute_query("PRAGMA table_info(demandes)", fetch='all')
-        existing_columns = [col['name'] for col in columns_info]
-        
-        if column_name not in existing_columns:
-            return 0  # Colonne n'existe pas
+            return 0  # annee_fiscale, catégorie inconnue ou colonne absente
         
         # Mettre à jour les demandes
         result = db.execute_query(f'''
@@ -89,6 +46,11 @@ def _update_demandes_value_safe(category: str, old_value: str, new_value: str) -
         print(f"Erreur _update_demandes_value_safe pour {category}: {old_value}->{new_value}: {e}")
         return 0
 
+def _create_staging_table(name: str, columns: str):
+    """Table temporaire de travail (propre à la connexion de la transaction en cours), vidée"""
+    db.execute_query(f"CREATE TEMP TABLE IF NOT EXISTS {name} ({columns})")
+    db.execute_query(f"DELETE FROM {name}")
+
 class DropdownOptionsModel:
     """Model for managing dropdown options with automatic value normalization"""
     
@@ -99,34 +61,16 @@ class DropdownOptionsModel:
     
     @staticmethod
     def get_options_for_category(category: str) -> List[Dict[str, Any]]:
-        """Get all active options for a specific category"""
-        try:
-            options = db.execute_query('''
-                SELECT id, value, label, order_index
-                FROM dropdown_options 
-                WHERE category = ? AND is_active = TRUE
-                ORDER BY order_index ASC, label ASC
-            ''', (category,), fetch='all')
-            
-            return [dict(option) for option in options] if options else []
-        except Exception as e:
-            print(f"Erreur récupération options {category}: {e}")
-            return []
+        """Get all active options for a specific category (registre en mémoire)"""
+        return [
+            {key: option[key] for key in ('id', 'value', 'label', 'order_index')}
+            for option in dropdown_registry.get_options(category)
+        ]
     
     @staticmethod
     def get_all_categories() -> List[str]:
         """Get all available categories"""
-        try:
-            categories = db.execute_query('''
-                SELECT DISTINCT category
-                FROM dropdown_options
-                ORDER BY category
-            ''', fetch='all')
-            
-            return [cat[0] for cat in categories] if categories else []
-        except Exception as e:
-            print(f"Erreur récupération catégories: {e}")
-            return []
+        return dropdown_registry.get_categories()
     
     @staticmethod
     def get_all_options() -> pd.DataFrame:
@@ -325,17 +269,26 @@ class DropdownOptionsModel:
     
     @staticmethod
     def reorder_options(category: str, option_orders: List[Dict[str, int]]) -> tuple[bool, str]:
-        """Reorder options in a category"""
+        """Reorder options in a category
+
+        Les nouveaux ordres sont chargés dans une table temporaire puis appliqués par un
+        seul UPDATE, dans une transaction.
+        """
         try:
-            for item in option_orders:
-                option_id = item['id']
-                new_order = item['order']
-                
+            if not option_orders:
+                return True, "Ordre mis à jour avec succès"
+            
+            with db.unit_of_work():
+                _create_staging_table('dropdown_new_order', "id INTEGER PRIMARY KEY, order_index INTEGER NOT NULL")
+                db.bulk_insert('dropdown_new_order', ['id', 'order_index'],
+                               [(item['id'], item['order']) for item in option_orders], on_conflict='REPLACE')
                 db.execute_query('''
-                    UPDATE dropdown_options 
-                    SET order_index = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ? AND category = ?
-                ''', (new_order, option_id, category))
+                    UPDATE dropdown_options
+                    SET order_index = (SELECT n.order_index FROM dropdown_new_order n WHERE n.id = dropdown_options.id),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE category = ? AND id IN (SELECT id FROM dropdown_new_order)
+                ''', (category,))
+                db.execute_query("DROP TABLE dropdown_new_order")
             
             return True, "Ordre mis à jour avec succès"
             
@@ -349,15 +302,12 @@ class DropdownOptionsModel:
             categories = ['budget', 'categorie', 'typologie_client', 
                          'groupe_groupement', 'region', 'agence']
             
-            options_dict = {}
-            for category in categories:
-                options = DropdownOptionsModel.get_options_for_category(category)
-                options_dict[category] = [
-                    {'value': opt['value'], 'label': opt['label']} 
-                    for opt in options
-                ]
-            
-            return options_dict
+            # Toutes les catégories lues dans le même instantané du registre
+            form_options = dropdown_registry.get_form_options_by_category(categories)
+            return {
+                category: [{'value': value, 'label': label} for value, label in options]
+                for category, options in form_options.items()
+            }
             
         except Exception as e:
             print(f"Erreur formatage options: {e}")
@@ -437,7 +387,16 @@ class DropdownOptionsModel:
     
     @staticmethod
     def batch_normalize_existing_values() -> tuple[bool, str]:
-        """Normalise toutes les valeurs existantes selon la nouvelle logique"""
+        """Normalise toutes les valeurs existantes selon la nouvelle logique
+
+        Traitement ensembliste dans une transaction :
+        1. nouvelles valeurs calculées pour toutes les options et chargées dans une table
+           de correspondance (ancienne valeur -> nouvelle valeur) ;
+        2. conflits détectés par GROUP BY sur les valeurs finales (catégorie, valeur) : les
+           renommages qui produiraient un doublon sont écartés, jusqu'à stabilité ;
+        3. un UPDATE de dropdown_options, puis un UPDATE par colonne de demandes joint à
+           la table de correspondance (un seul passage par colonne).
+        """
         try:
             options = db.execute_query('''
                 SELECT id, category, value, label
@@ -448,57 +407,72 @@ class DropdownOptionsModel:
             if not options:
                 return True, "Aucune option à traiter"
             
-            updated_count = 0
-            conflicts = []
-            
+            renames = []
             for option in options:
-                option_id = option['id']
-                category = option['category']
-                old_value = option['value']
-                label = option['label']
-                
-                # Calculer la nouvelle valeur
-                new_value = normalize_dropdown_value(label)
+                new_value = normalize_dropdown_value(option['label'])
+                if new_value != option['value']:
+                    renames.append((option['id'], option['category'], option['value'], new_value))
+            
+            if not renames:
+                return True, "0 options normalisées"
+            
+            with db.unit_of_work():
+                _create_staging_table('dropdown_renames', '''
+                    option_id INTEGER NOT NULL UNIQUE,
+                    category TEXT NOT NULL,
+                    old_value TEXT NOT NULL,
+                    new_value TEXT NOT NULL,
+                    conflict INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (category, old_value)
+                ''')
+                db.bulk_insert('dropdown_renames', ['option_id', 'category', 'old_value', 'new_value'], renames)
                 
-                # Si la valeur ne change pas, passer au suivant
-                if old_value == new_value:
-                    continue
-                
-                # Vérifier s'il y a conflit
-                existing = db.execute_query('''
-                    SELECT id, label FROM dropdown_options
-                    WHERE category = ? AND value = ? AND id != ?
-                ''', (category, new_value, option_id), fetch='one')
-                
-                if existing:
-                    conflicts.append({
-                        'option_id': option_id,
-                        'label': label,
-                        'old_value': old_value,
-                        'new_value': new_value,
-                        'conflict_label': existing['label']
-                    })
-                    continue
+                # Conflits : une valeur finale portée par plusieurs options. Écarter un
+                # renommage peut en créer un autre (l'option garde sa valeur) : répéter
+                while db.execute_query('''
+                    UPDATE dropdown_renames SET conflict = 1
+                    WHERE conflict = 0 AND (category, new_value) IN (
+                        SELECT o.category, COALESCE(r.new_value, o.value)
+                        FROM dropdown_options o
+                        LEFT JOIN dropdown_renames r ON r.option_id = o.id AND r.conflict = 0
+                        GROUP BY o.category, COALESCE(r.new_value, o.value)
+                        HAVING COUNT(*) > 1
+                    )
+                '''):
+                    pass
                 
-                # Mettre à jour la valeur
+                # Valeurs provisoires d'abord : un échange ou une chaîne de renommages
+                # (a -> b, b -> c) ne viole pas UNIQUE(category, value) en cours d'UPDATE
                 db.execute_query('''
-                    UPDATE dropdown_options 
-                    SET value = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (new_value, option_id))
+                    UPDATE dropdown_options SET value = '#' || id
+                    WHERE id IN (SELECT option_id FROM dropdown_renames WHERE conflict = 0)
+                ''')
+                updated_count = db.execute_query('''
+                    UPDATE dropdown_options
+                    SET value = (SELECT r.new_value FROM dropdown_renames r WHERE r.option_id = dropdown_options.id),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE id IN (SELECT option_id FROM dropdown_renames WHERE conflict = 0)
+                ''')
+                
+                # Demandes : un UPDATE par colonne, chaque ligne lue avec sa valeur d'origine
+                categories = {category for _, category, _, _ in renames}
+                demandes_count = 0
+                for category, column in _demande_columns(categories).items():
+                    demandes_count += db.execute_query(f'''
+                        UPDATE demandes
+                        SET {column} = (SELECT r.new_value FROM dropdown_renames r
+                                        WHERE r.category = ? AND r.old_value = demandes.{column} AND r.conflict = 0)
+                        WHERE {column} IN (SELECT old_value FROM dropdown_renames WHERE category = ? AND conflict = 0)
+                    ''', (category, category)) or 0
                 
-                # Mettre à jour les demandes qui utilisent cette valeur (si possible)
-                try:
-                    update_count = _update_demandes_value_safe(category, old_value, new_value)
-                    if update_count > 0:
-                        updated_count += 1
-                except:
-                    # Ignorer si la mise à jour échoue
-                    updated_count += 1
-            
-            message = f"{updated_count} options normalisées"
+                conflicts = db.execute_query(
+                    "SELECT COUNT(*) FROM dropdown_renames WHERE conflict = 1", fetch='one'
+                )[0]
+                db.execute_query("DROP TABLE dropdown_renames")
+            
+            message = f"{updated_count} options normalisées ({demandes_count} demande(s) mises à jour)"
             if conflicts:
-                message += f", {len(conflicts)} conflits détectés"
+                message += f", {conflicts} conflits détectés"
             
             return True, message
             
@@ -530,19 +504,5 @@ class DropdownOptionsModel:
         if not stored_value:
             return "Non spécifié"
         
-        try:
-            # D'abord chercher dans la table dropdown_options
-            option = db.execute_query('''
-                SELECT label FROM dropdown_options 
-                WHERE category = 'region' AND value = ? AND is_active = TRUE
-            ''', (stored_value,), fetch='one')
-            
-            if option:
-                return option['label']
-            else:
-                # Si pas trouvé, appliquer la transformation automatique
-                return DropdownOptionsModel.format_region_display(stored_value)
-                
-        except Exception as e:
-            print(f"Erreur récupération région: {e}")
-            return DropdownOptionsModel.format_region_display(stored_value)
+        # Label actif du registre en mémoire, sinon transformation automatique
+        return dropdown_registry.get_label('region', stored_value)
@@ -0,0 +1,163 @@
+"""
+Nombre d'utilisations des options des listes déroulantes (table dropdown_usage)
+
+Une ligne (catégorie, valeur) avec le nombre de demandes qui portent cette valeur
+dans la colonne de la catégorie (budget, categorie, typologie_client,
+groupe_groupement, region). Des triggers la tiennent à jour à chaque création,
+modification de ces colonnes et suppression de demande : la page d'administration
+lit les compteurs d'une catégorie en une requête au lieu d'un COUNT(*) par option.
+verify() compare la table à un recomptage (un GROUP BY par colonne, voir
+scripts/verify_dropdown_usage.py).
+"""
+from typing import Any, Dict, List, Optional
+
+from models.database import db
+
+# Colonne de la table demandes qui stocke la valeur de chaque catégorie
+# (annee_fiscale : pas de colonne directe)
+DEMANDE_COLUMNS = {
+    'budget': 'budget',
+    'categorie': 'categorie',
+    'typologie_client': 'typologie_client',
+    'groupe_groupement': 'groupe_groupement',
+    'region': 'region',
+}
+
+# Recomptage complet : un GROUP BY par colonne, valeurs vides exclues
+_RECOUNT_SQL = '\n    UNION ALL\n'.join(
+    f'''
+    SELECT '{category}' AS category, {column} AS value, COUNT(*) AS count
+    FROM demandes
+    WHERE {column} IS NOT NULL AND {column} != ''
+    GROUP BY {column}'''
+    for category, column in DEMANDE_COLUMNS.items()
+)
+
+def _increment_sql(category: str, column: str, prefix: str, sign: str) -> str:
+    """Ajout (sign '+') ou retrait ('-') de la valeur NEW/OLD de la colonne dans son compteur"""
+    if sign == '+':
+        return f'''
+            INSERT INTO dropdown_usage (category, value, count)
+            SELECT '{category}', {prefix}.{column}, 1
+            WHERE {prefix}.{column} IS NOT NULL AND {prefix}.{column} != ''
+            ON CONFLICT (category, value) DO UPDATE SET count = count + 1;
+        '''
+    where = f"category = '{category}' AND value = {prefix}.{column}"
+    return f'''
+            UPDATE dropdown_usage SET count = count - 1 WHERE {where};
+            DELETE FROM dropdown_usage WHERE {where} AND count <= 0;
+        '''
+
+class DropdownUsageModel:
+    """Modèle pour la table des utilisations des options"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table, ses triggers de maintenance et la remplir (migration 0016)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS dropdown_usage (
+                category TEXT NOT NULL,
+                value TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (category, value)
+            ) WITHOUT ROWID
+        ''')
+
+        inserts = ''.join(_increment_sql(category, column, 'NEW', '+') for category, column in DEMANDE_COLUMNS.items())
+        deletes = ''.join(_increment_sql(category, column, 'OLD', '-') for category, column in DEMANDE_COLUMNS.items())
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_dropdown_usage_insert AFTER INSERT ON demandes
+            BEGIN
+                {inserts}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_dropdown_usage_delete AFTER DELETE ON demandes
+            BEGIN
+                {deletes}
+            END
+        ''')
+        # Un trigger par colonne : seules les colonnes modifiées déplacent un compteur
+        for category, column in DEMANDE_COLUMNS.items():
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_dropdown_usage_update_{column}
+                AFTER UPDATE OF {column} ON demandes
+                WHEN NEW.{column} IS NOT OLD.{column}
+                BEGIN
+                    {_increment_sql(category, column, 'OLD', '-')}
+                    {_increment_sql(category, column, 'NEW', '+')}
+                END
+            ''')
+
+        cursor.execute("DELETE FROM dropdown_usage")
+        cursor.execute(f"INSERT INTO dropdown_usage (category, value, count) {_RECOUNT_SQL}")
+
+    @staticmethod
+    def get_count(category: str, value: str) -> int:
+        """Nombre de demandes qui utilisent la valeur (0 pour une catégorie sans colonne)"""
+        try:
+            result = db.execute_query(
+                "SELECT count FROM dropdown_usage WHERE category = ? AND value = ?",
+                (category, value), fetch='one'
+            )
+            return result['count'] if result else 0
+        except Exception as e:
+            print(f"Erreur lecture utilisation {category}={value}: {e}")
+            return 0
+
+    @staticmethod
+    def get_counts(category: str) -> Optional[Dict[str, int]]:
+        """Nombre d'utilisations de toutes les valeurs d'une catégorie {valeur: nombre}, None en cas d'erreur"""
+        try:
+            rows = db.execute_query(
+                "SELECT value, count FROM dropdown_usage WHERE category = ?",
+                (category,), fetch='all'
+            )
+            return {row['value']: row['count'] for row in rows or []}
+        except Exception as e:
+            print(f"Erreur lecture utilisations {category}: {e}")
+            return None
+
+    @staticmethod
+    def count_unknown_values() -> int:
+        """Nombre de valeurs utilisées dans les demandes sans option active correspondante"""
+        result = db.execute_query('''
+            SELECT COUNT(*) FROM dropdown_usage u
+            WHERE NOT EXISTS (
+                SELECT 1 FROM dropdown_options o
+                WHERE o.category = u.category AND o.value = u.value AND o.is_active = 1
+            )
+        ''', fetch='one')
+        return result[0] if result else 0
+
+    @staticmethod
+    def verify() -> List[Dict[str, Any]]:
+        """
+        Comparer la table au recomptage des demandes.
+
+        Returns:
+            Lignes en écart : catégorie, valeur, nombre attendu et nombre en table
+        """
+        rows = db.execute_query(f'''
+            WITH expected AS ({_RECOUNT_SQL})
+            SELECT e.category, e.value, e.count AS count_attendu, u.count AS count_table
+            FROM expected e LEFT JOIN dropdown_usage u ON u.category = e.category AND u.value = e.value
+            WHERE u.count IS NOT e.count
+            UNION ALL
+            SELECT u.category, u.value, NULL, u.count
+            FROM dropdown_usage u
+            WHERE NOT EXISTS (SELECT 1 FROM expected e WHERE e.category = u.category AND e.value = u.value)
+        ''', fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def rebuild() -> bool:
+        """Recalculer entièrement la table depuis les demandes"""
+        try:
+            with db.unit_of_work():
+                db.execute_query("DELETE FROM dropdown_usage")
+                db.execute_query(f"INSERT INTO dropdown_usage (category, value, count) {_RECOUNT_SQL}")
+            return True
+        except Exception as e:
+            print(f"Erreur reconstruction utilisations des options: {e}")
+            return False
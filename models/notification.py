@@ -7,6 +7,7 @@ from datetime import datetime
 import pandas as pd
 
 from models.database import db
+from utils.query_cache import cached_query
 
 @dataclass
 class Notification:
@@ -35,8 +36,33 @@ class NotificationModel:
             return True
         except Exception as e:
             print(f"Erreur ajout notification: {e}")
+            db.set_rollback_only()
             return False
     
+    @staticmethod
+    def add_notifications_bulk(notifications: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Add several notifications in a single transaction
+        
+        Each item holds user_id, demande_id, type_notification, titre, message.
+        Returns the Database.execute_many result (success_count, error_count, errors).
+        """
+        try:
+            return db.bulk_insert(
+                'notifications',
+                ['user_id', 'demande_id', 'type_notification', 'titre', 'message'],
+                notifications
+            )
+        except Exception as e:
+            print(f"Erreur ajout notifications en lot: {e}")
+            db.set_rollback_only()
+            return {
+                'total': len(notifications),
+                'success_count': 0,
+                'error_count': len(notifications),
+                'rowcount': 0,
+                'errors': []
+            }
+    
     @staticmethod
     def get_user_notifications(user_id: int, limit: int = 10, 
                               unread_only: bool = False) -> pd.DataFrame:
@@ -91,6 +117,7 @@ class NotificationModel:
             return False
     
     @staticmethod
+    @cached_query('notifications')
     def get_unread_count(user_id: int) -> int:
         """Get count of unread notifications"""
         try:
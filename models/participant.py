@@ -19,6 +19,7 @@ class ParticipantModel:
             return True
         except Exception as e:
             print(f"Erreur ajout participant: {e}")
+            db.set_rollback_only()
             return False
     
     @staticmethod
@@ -32,6 +33,7 @@ class ParticipantModel:
             return True
         except Exception as e:
             print(f"Erreur suppression participant: {e}")
+            db.set_rollback_only()
             return False
     
     @staticmethod
@@ -52,6 +54,30 @@ class ParticipantModel:
             print(f"Erreur récupération participants: {e}")
             return []
     
+    @staticmethod
+    def get_participants_for_demandes(demande_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Participants de plusieurs demandes en une requête : {demande_id: [participants]}"""
+        participants_by_demande = {demande_id: [] for demande_id in demande_ids}
+        if not demande_ids:
+            return participants_by_demande
+        try:
+            placeholders = ', '.join('?' for _ in demande_ids)
+            participants = db.execute_query(f'''
+                SELECT dp.demande_id, dp.user_id, u.nom, u.prenom, u.email, u.role, u.region,
+                       dp.added_by_user_id, dp.created_at
+                FROM demande_participants dp
+                JOIN users u ON dp.user_id = u.id
+                WHERE dp.demande_id IN ({placeholders})
+                ORDER BY dp.created_at
+            ''', tuple(demande_ids), fetch='all')
+
+            for participant in participants or []:
+                participants_by_demande.setdefault(participant['demande_id'], []).append(dict(participant))
+            return participants_by_demande
+        except Exception as e:
+            print(f"Erreur récupération participants (lot): {e}")
+            return participants_by_demande
+
     @staticmethod
     def is_participant(demande_id: int, user_id: int) -> bool:
         """Vérifier si un utilisateur est participant à une demande"""
@@ -68,19 +94,62 @@ class ParticipantModel:
     
     @staticmethod
     def add_multiple_participants(demande_id: int, user_ids: List[int], added_by_user_id: int) -> Dict[str, Any]:
-        """Ajouter plusieurs participants à une demande"""
+        """
+        Ajouter plusieurs participants à une demande (une seule transaction)
+
+        Les utilisateurs déjà participants (ou en double dans la liste) ne sont pas
+        comptés comme ajoutés : added_users ne contient que les nouveaux participants,
+        à notifier par l'appelant.
+        """
         results = {
             'success_count': 0,
+            'already_count': 0,
             'failed_count': 0,
+            'added_users': [],
             'failed_users': []
         }
         
-        for user_id in user_ids:
-            if ParticipantModel.add_participant(demande_id, user_id, added_by_user_id):
-                results['success_count'] += 1
-            else:
-                results['failed_count'] += 1
-                results['failed_users'].append(user_id)
+        if not user_ids:
+            return results
+        
+        try:
+            with db.unit_of_work():
+                placeholders = ', '.join('?' for _ in user_ids)
+                existing = db.execute_query(f'''
+                    SELECT user_id FROM demande_participants
+                    WHERE demande_id = ? AND user_id IN ({placeholders})
+                ''', (demande_id, *user_ids), fetch='all')
+                known = {row['user_id'] for row in existing or []}
+
+                new_users = []
+                for user_id in user_ids:
+                    if user_id in known:
+                        results['already_count'] += 1
+                    else:
+                        known.add(user_id)
+                        new_users.append(user_id)
+
+                if new_users:
+                    bulk_result = db.bulk_insert(
+                        'demande_participants',
+                        ['demande_id', 'user_id', 'added_by_user_id'],
+                        [(demande_id, user_id, added_by_user_id) for user_id in new_users]
+                    )
+                    failed = {new_users[failure['index']] for failure in bulk_result['errors']}
+                    results['added_users'] = [user_id for user_id in new_users if user_id not in failed]
+                    results['success_count'] = len(results['added_users'])
+                    results['failed_count'] = len(failed)
+                    results['failed_users'] = [user_id for user_id in new_users if user_id in failed]
+        except Exception as e:
+            print(f"Erreur ajout participants en lot: {e}")
+            db.set_rollback_only()
+            results.update({
+                'success_count': 0,
+                'already_count': 0,
+                'failed_count': len(user_ids),
+                'added_users': [],
+                'failed_users': list(user_ids)
+            })
         
         return results
     
@@ -128,26 +197,30 @@ class ParticipantModel:
         """Récupérer une chaîne formatée des participants pour affichage"""
         try:
             participants_db = ParticipantModel.get_participants(demande_id)
-            
-            # Construire la liste des participants
-            participants_list = []
-            
-            # Ajouter les participants de la base de données
-            for participant in participants_db:
-                participants_list.append(f"{participant['prenom']} {participant['nom']} ({participant['role'].upper()})")
-            
-            # Ajouter les participants libres s'il y en a
-            if participants_libres and participants_libres.strip():
-                participants_list.append(participants_libres.strip())
-            
-            # Joindre tous les participants
-            if participants_list:
-                return " | ".join(participants_list)
-            elif demandeur_participe:
-                return "Demandeur uniquement"
-            else:
-                return "Aucun participant"
-                
+            return ParticipantModel.format_participants(participants_db, demandeur_participe, participants_libres)
         except Exception as e:
             print(f"Erreur formatage participants: {e}")
             return "Erreur récupération participants"
+
+    @staticmethod
+    def format_participants(participants_db: List[Dict[str, Any]], demandeur_participe: bool = True,
+                            participants_libres: str = "") -> str:
+        """Chaîne d'affichage des participants à partir de lignes déjà chargées"""
+        # Construire la liste des participants
+        participants_list = []
+        
+        # Ajouter les participants de la base de données
+        for participant in participants_db:
+            participants_list.append(f"{participant['prenom']} {participant['nom']} ({participant['role'].upper()})")
+        
+        # Ajouter les participants libres s'il y en a
+        if participants_libres and str(participants_libres).strip():
+            participants_list.append(str(participants_libres).strip())
+        
+        # Joindre tous les participants
+        if participants_list:
+            return " | ".join(participants_list)
+        elif demandeur_participe:
+            return "Demandeur uniquement"
+        else:
+            return "Aucun participant"
@@ -7,6 +7,8 @@ from datetime import datetime
 import pandas as pd
 
 from models.database import db
+from models.user_hierarchy import UserHierarchyModel
+from utils.query_cache import cached_query
 from utils.security import hash_password, verify_password
 from utils.validators import validate_email, validate_password
 
@@ -117,6 +119,7 @@ class UserModel:
             return False
     
     @staticmethod
+    @cached_query('users')
     def get_user_by_id(user_id: int) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         try:
@@ -132,6 +135,25 @@ class UserModel:
             return None
     
     @staticmethod
+    def get_users_by_ids(user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get several users in one query: {user_id: user}"""
+        if not user_ids:
+            return {}
+        try:
+            placeholders = ', '.join('?' for _ in user_ids)
+            users = db.execute_query(f'''
+                SELECT id, email, nom, prenom, role, region, 
+                       directeur_id, is_active, created_at, activated_at
+                FROM users WHERE id IN ({placeholders})
+            ''', tuple(user_ids), fetch='all')
+            
+            return {user['id']: dict(user) for user in users or []}
+        except Exception as e:
+            print(f"Erreur récupération utilisateurs: {e}")
+            return {}
+    
+    @staticmethod
+    @cached_query('users')
     def get_all_users_list() -> List[Dict[str, Any]]:
         """Get all users as a list of dictionaries (for budget management)"""
         try:
@@ -166,6 +188,7 @@ class UserModel:
             return pd.DataFrame()
     
     @staticmethod
+    @cached_query('users')
     def get_directors() -> List[Dict[str, Any]]:
         """Get all active directors for TC assignment"""
         try:
@@ -182,14 +205,20 @@ class UserModel:
             return []
     
     @staticmethod
+    @cached_query('users')
     def get_team_members(director_id: int) -> List[Dict[str, Any]]:
-        """Get team members for a director"""
+        """Get team members for a director
+
+        Équipe complète sur tous les niveaux de management (table user_hierarchy),
+        depth = 1 pour les subordonnés directs.
+        """
         try:
             members = db.execute_query('''
-                SELECT id, nom, prenom, email, role, region
-                FROM users 
-                WHERE directeur_id = ? AND is_active = TRUE
-                ORDER BY nom, prenom
+                SELECT u.id, u.nom, u.prenom, u.email, u.role, u.region, h.depth
+                FROM user_hierarchy h
+                JOIN users u ON u.id = h.descendant_id
+                WHERE h.ancestor_id = ? AND h.depth > 0 AND u.is_active = TRUE
+                ORDER BY u.nom, u.prenom
             ''', (director_id,), fetch='all')
             
             return [dict(member) for member in members] if members else []
@@ -231,6 +260,14 @@ class UserModel:
             if not set_clauses:
                 print("Erreur: Aucun champ valide à mettre à jour")
                 return False
+
+            # La hiérarchie (user_hierarchy) est mise à jour par trigger ; un directeur pris
+            # dans l'équipe de l'utilisateur créerait une boucle
+            new_director = kwargs.get('directeur_id')
+            if new_director is not None and UserHierarchyModel.is_in_subtree(user_id, new_director):
+                print(f"Erreur: l'utilisateur {new_director} fait partie de l'équipe de {user_id}, "
+                      f"il ne peut pas en être le directeur")
+                return False
             
             values.append(user_id)
             query = f"UPDATE users SET {', '.join(set_clauses)} WHERE id = ?"
@@ -293,6 +330,7 @@ class UserModel:
             return []
     
     @staticmethod
+    @cached_query('users')
     def get_users_by_role(role: str, active_only: bool = False) -> List[Dict[str, Any]]:
         """Get users by role"""
         try:
@@ -378,14 +416,16 @@ class UserModel:
             return []
     
     @staticmethod
+    @cached_query('users')
     def get_tc_users_by_director(director_id: int) -> List[Dict[str, Any]]:
-        """Get all TC users under a specific director"""
+        """Get all TC users under a specific director (à tous les niveaux, via user_hierarchy)"""
         try:
             tcs = db.execute_query('''
-                SELECT id, nom, prenom, email, region
-                FROM users 
-                WHERE role = 'tc' AND is_active = TRUE AND directeur_id = ?
-                ORDER BY nom, prenom
+                SELECT u.id, u.nom, u.prenom, u.email, u.region
+                FROM user_hierarchy h
+                JOIN users u ON u.id = h.descendant_id
+                WHERE h.ancestor_id = ? AND h.depth > 0 AND u.role = 'tc' AND u.is_active = TRUE
+                ORDER BY u.nom, u.prenom
             ''', (director_id,), fetch='all')
             
             return [dict(tc) for tc in tcs] if tcs else []
@@ -605,6 +645,7 @@ class UserModel:
             return {}
     
     @staticmethod
+    @cached_query('users')
     def get_all_tc_users() -> List[Dict[str, Any]]:
         """Get all active TC users (for admin or cross-region access)"""
         try:
@@ -3,12 +3,51 @@ Version migrée du UserBudgetModel pour utiliser by (string) au lieu de fiscal_y
 Remplace complètement models/user_budget.py
 """
 from models.database import db
-from typing import Optional, List, Dict, Any
+from utils.query_cache import cached_query
+from typing import Optional, List, Dict, Any, Sequence
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+_USER_COLUMNS = ('nom', 'prenom', 'email', 'role', 'region')
+
+# Totaux des budgets d'un directeur et de toute son équipe (table de fermeture
+# user_hierarchy, profondeur 0 = le directeur lui-même), une ligne par directeur
+_TEAM_ROLLUP_SQL = """
+    SELECT h.ancestor_id AS directeur_id, a.nom, a.prenom, a.region,
+           COUNT(*) AS user_count,
+           SUM(ub.allocated_budget) AS total_budget,
+           COALESCE(SUM(l.pending), 0) AS pending_budget,
+           COALESCE(SUM(l.consumed), 0) AS consumed_budget
+    FROM users a
+    JOIN user_hierarchy h ON h.ancestor_id = a.id
+    JOIN user_budgets ub ON ub.user_id = h.descendant_id AND ub.by = ?
+    LEFT JOIN budget_ledger l ON l.user_id = ub.user_id AND l.by = ub.by
+    WHERE {where}
+    GROUP BY h.ancestor_id
+"""
+
+def _consumption(user_id: int, by: str, allocated_budget, consumed_budget, pending_budget) -> Dict[str, Any]:
+    """Consommation d'un budget : restant, taux de consommation et dépassement"""
+    allocated_budget = float(allocated_budget or 0)
+    # Sommes tenues incrémentalement (budget_ledger) : arrondi au centime
+    consumed_budget = round(float(consumed_budget or 0), 2)
+    pending_budget = round(float(pending_budget or 0), 2)
+    remaining_budget = allocated_budget - consumed_budget - pending_budget
+    consumption_rate = (consumed_budget / allocated_budget * 100) if allocated_budget > 0 else 0
+    
+    return {
+        'user_id': user_id,
+        'by': by,
+        'allocated_budget': allocated_budget,
+        'consumed_budget': consumed_budget,
+        'pending_budget': pending_budget,
+        'remaining_budget': remaining_budget,
+        'consumption_rate': round(consumption_rate, 2),
+        'is_over_budget': remaining_budget < 0
+    }
+
 class UserBudgetModel:
     """Modèle pour gérer les budgets alloués aux utilisateurs - Version BY uniquement"""
     
@@ -27,7 +66,7 @@ class UserBudgetModel:
         """
         try:
             # Validation format BY
-            from utils.fiscal_year_utils import validate_fiscal_year_format, validate_fiscal_year
+            from utils.fiscal_year_utils import validate_fiscal_year_format, validate_fiscal_year, fiscal_year_number
             
             if not validate_fiscal_year_format(by):
                 logger.error(f"Format année fiscale invalide: {by}")
@@ -39,9 +78,9 @@ class UserBudgetModel:
             
             db.execute_query("""
                 INSERT OR REPLACE INTO user_budgets 
-                (user_id, by, allocated_budget, updated_at)
-                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-            """, (user_id, by, allocated_budget))
+                (user_id, fiscal_year, by, allocated_budget, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (user_id, fiscal_year_number(by), by, allocated_budget))
             
             logger.info(f"Budget créé/mis à jour pour utilisateur {user_id} année {by}: {allocated_budget}€")
             return True
@@ -51,6 +90,7 @@ class UserBudgetModel:
             return False
     
     @staticmethod
+    @cached_query('user_budgets', 'users')
     def get_user_budget(user_id: int, by: str) -> Optional[Dict[str, Any]]:
         """
         Obtenir le budget d'un utilisateur pour une année
@@ -77,6 +117,7 @@ class UserBudgetModel:
             return None
     
     @staticmethod
+    @cached_query('user_budgets', 'users')
     def get_all_budgets_for_year(by: str) -> List[Dict[str, Any]]:
         """
         Obtenir tous les budgets pour une année
@@ -158,6 +199,7 @@ class UserBudgetModel:
             return False
     
     @staticmethod
+    @cached_query('user_budgets', 'users', 'demandes')
     def get_budget_summary_by_year(by: str) -> Dict[str, Any]:
         """
         Obtenir un résumé des budgets par année
@@ -202,6 +244,14 @@ class UserBudgetModel:
             
             by_region = [dict(row) for row in by_region_results] if by_region_results else []
             
+            # Budget par directeur : équipe complète sur tous les niveaux, en une jointure
+            by_director_results = db.execute_query(
+                _TEAM_ROLLUP_SQL.format(where="a.role = 'dr'") + " ORDER BY total_budget DESC",
+                (by,), fetch='all'
+            )
+            
+            by_director = [dict(row) for row in by_director_results] if by_director_results else []
+            
             # Utilisateurs avec/sans budget
             users_with_budget = db.execute_query("""
                 SELECT COUNT(DISTINCT ub.user_id) as count
@@ -227,6 +277,7 @@ class UserBudgetModel:
                 'users_without_budget': without_budget_count,
                 'by_role': by_role,
                 'by_region': by_region,
+                'by_director': by_director,
                 'average_budget': float(total_allocated / with_budget_count) if with_budget_count > 0 else 0.0
             }
             
@@ -240,10 +291,57 @@ class UserBudgetModel:
                 'users_without_budget': 0,
                 'by_role': [],
                 'by_region': [],
+                'by_director': [],
                 'average_budget': 0.0
             }
     
     @staticmethod
+    @cached_query('user_budgets', 'users', 'demandes')
+    def get_team_budget_summary(director_id: int, by: str) -> Dict[str, Any]:
+        """
+        Totaux des budgets d'un directeur et de toute son équipe (tous niveaux)
+        
+        Args:
+            director_id: ID du directeur
+            by: Année fiscale format BYXX (ex: "BY25")
+            
+        Returns:
+            Dict avec directeur_id, user_count, total_budget, pending_budget,
+            consumed_budget et remaining_budget
+        """
+        empty = {
+            'directeur_id': director_id,
+            'by': by,
+            'user_count': 0,
+            'total_budget': 0.0,
+            'pending_budget': 0.0,
+            'consumed_budget': 0.0,
+            'remaining_budget': 0.0
+        }
+        try:
+            row = db.execute_query(_TEAM_ROLLUP_SQL.format(where="a.id = ?"), (by, director_id), fetch='one')
+            if not row:
+                return empty
+            
+            total_budget = float(row['total_budget'] or 0)
+            pending_budget = round(float(row['pending_budget']), 2)
+            consumed_budget = round(float(row['consumed_budget']), 2)
+            return {
+                'directeur_id': director_id,
+                'by': by,
+                'user_count': row['user_count'],
+                'total_budget': total_budget,
+                'pending_budget': pending_budget,
+                'consumed_budget': consumed_budget,
+                'remaining_budget': total_budget - pending_budget - consumed_budget
+            }
+            
+        except Exception as e:
+            logger.error(f"Erreur calcul budget équipe: {e}")
+            return empty
+    
+    @staticmethod
+    @cached_query('user_budgets', 'users', 'demandes')
     def get_budget_consumption(user_id: int, by: str) -> Dict[str, Any]:
         """
         Calculer la consommation de budget d'un utilisateur
@@ -256,46 +354,17 @@ class UserBudgetModel:
             Dict contenant les informations de consommation
         """
         try:
-            # Budget alloué
-            budget_info = UserBudgetModel.get_user_budget(user_id, by)
-            allocated_budget = budget_info['allocated_budget'] if budget_info else 0.0
-            
-            # Budget consommé (demandes validées pour cette année fiscale BY)
-            consumed_result = db.execute_query("""
-                SELECT SUM(montant) as consumed
-                FROM demandes 
-                WHERE user_id = ? 
-                AND status = 'validee'
-                AND by = ?
-            """, (user_id, by), fetch='one')
-            
-            consumed_budget = consumed_result['consumed'] if consumed_result['consumed'] else 0.0
-            
-            # Budget en attente (demandes en cours de validation pour cette année fiscale BY)
-            pending_result = db.execute_query("""
-                SELECT SUM(montant) as pending
-                FROM demandes 
-                WHERE user_id = ? 
-                AND status IN ('en_attente_dr', 'en_attente_financier')
-                AND by = ?
+            # Registre des budgets : alloué, en attente et consommé lus par clé primaire
+            entry = db.execute_query("""
+                SELECT allocated, pending, consumed
+                FROM budget_ledger
+                WHERE user_id = ? AND by = ?
             """, (user_id, by), fetch='one')
             
-            pending_budget = pending_result['pending'] if pending_result['pending'] else 0.0
-            
-            # Calculs
-            remaining_budget = allocated_budget - consumed_budget - pending_budget
-            consumption_rate = (consumed_budget / allocated_budget * 100) if allocated_budget > 0 else 0
+            if not entry:
+                return _consumption(user_id, by, 0.0, 0.0, 0.0)
             
-            return {
-                'user_id': user_id,
-                'by': by,
-                'allocated_budget': float(allocated_budget),
-                'consumed_budget': float(consumed_budget),
-                'pending_budget': float(pending_budget),
-                'remaining_budget': float(remaining_budget),
-                'consumption_rate': round(consumption_rate, 2),
-                'is_over_budget': remaining_budget < 0
-            }
+            return _consumption(user_id, by, entry['allocated'], entry['consumed'], entry['pending'])
             
         except Exception as e:
             logger.error(f"Erreur calcul consommation budget: {e}")
@@ -310,10 +379,96 @@ class UserBudgetModel:
                 'is_over_budget': False
             }
     
+    @staticmethod
+    @cached_query('user_budgets', 'users', 'demandes')
+    def get_budget_consumption_for_year(by: str) -> List[Dict[str, Any]]:
+        """
+        Consommation de budget de tous les utilisateurs ayant un budget pour une année,
+        en une requête (budgets joints au registre budget_ledger)
+        
+        Args:
+            by: Année fiscale format BYXX (ex: "BY25")
+            
+        Returns:
+            Liste des consommations (mêmes clés que get_budget_consumption, plus nom, prenom,
+            email, role et region), triée par nom
+        """
+        try:
+            results = db.execute_query("""
+                SELECT ub.user_id, ub.by, ub.allocated_budget, u.nom, u.prenom, u.email, u.role, u.region,
+                       COALESCE(l.consumed, 0) AS consumed, COALESCE(l.pending, 0) AS pending
+                FROM user_budgets ub
+                JOIN users u ON ub.user_id = u.id
+                LEFT JOIN budget_ledger l ON l.user_id = ub.user_id AND l.by = ub.by
+                WHERE ub.by = ?
+                ORDER BY u.nom, u.prenom
+            """, (by,), fetch='all')
+            
+            return [
+                {
+                    **_consumption(row['user_id'], row['by'], row['allocated_budget'], row['consumed'], row['pending']),
+                    **{key: row[key] for key in _USER_COLUMNS},
+                }
+                for row in results or []
+            ]
+            
+        except Exception as e:
+            logger.error(f"Erreur calcul consommation budgets année: {e}")
+            return []
+    
+    @staticmethod
+    def get_budget_consumption_matrix(fiscal_years: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        """
+        Matrice utilisateur × année fiscale de la consommation de budget (vues de tendance)
+        
+        Args:
+            fiscal_years: Années fiscales format BYXX ; par défaut toutes celles ayant des budgets
+            
+        Returns:
+            Dict avec fiscal_years (triées) et users : une entrée par utilisateur ayant un budget
+            ou des demandes sur l'une des années, avec years {by: consommation}
+        """
+        fiscal_years = tuple(sorted(set(fiscal_years))) if fiscal_years else tuple(UserBudgetModel.get_all_fiscal_years())
+        return UserBudgetModel._consumption_matrix(fiscal_years)
+    
+    @staticmethod
+    @cached_query('user_budgets', 'users', 'demandes')
+    def _consumption_matrix(fiscal_years: tuple) -> Dict[str, Any]:
+        matrix = {'fiscal_years': list(fiscal_years), 'users': []}
+        if not fiscal_years:
+            return matrix
+        
+        try:
+            placeholders = ', '.join('?' for _ in fiscal_years)
+            results = db.execute_query(f"""
+                SELECT l.user_id, l.by, l.allocated AS allocated_budget,
+                       u.nom, u.prenom, u.email, u.role, u.region, l.consumed, l.pending
+                FROM budget_ledger l
+                JOIN users u ON u.id = l.user_id
+                WHERE l.by IN ({placeholders})
+                  AND (l.allocated != 0 OR l.pending != 0 OR l.consumed != 0)
+                ORDER BY u.nom, u.prenom, l.user_id, l.by
+            """, fiscal_years, fetch='all')
+            
+            users = {}
+            for row in results or []:
+                user = users.get(row['user_id'])
+                if user is None:
+                    user = {'user_id': row['user_id'], **{key: row[key] for key in _USER_COLUMNS}, 'years': {}}
+                    users[row['user_id']] = user
+                    matrix['users'].append(user)
+                user['years'][row['by']] = _consumption(row['user_id'], row['by'], row['allocated_budget'],
+                                                        row['consumed'], row['pending'])
+            return matrix
+            
+        except Exception as e:
+            logger.error(f"Erreur calcul matrice consommation budgets: {e}")
+            return matrix
+    
     @staticmethod
     def bulk_create_budgets(budgets_data: List[Dict[str, Any]]) -> Dict[str, int]:
         """
-        Créer plusieurs budgets en une seule opération
+        Créer plusieurs budgets en une seule opération (un seul upsert transactionnel)
         
         Args:
             budgets_data: Liste de dictionnaires avec user_id, by, allocated_budget
@@ -321,26 +476,38 @@ class UserBudgetModel:
         Returns:
             Dict avec le nombre de succès et d'échecs
         """
-        success_count = 0
+        from utils.fiscal_year_utils import validate_fiscal_year_format, fiscal_year_number
+        
+        rows = []
         error_count = 0
         
         for budget_data in budgets_data:
+            user_id = budget_data.get('user_id')
+            by = budget_data.get('by')
+            allocated_budget = budget_data.get('allocated_budget')
+            
+            if user_id and by and allocated_budget is not None and validate_fiscal_year_format(by):
+                rows.append((user_id, fiscal_year_number(by), by, allocated_budget))
+            else:
+                error_count += 1
+                logger.warning(f"Données budget invalides: {budget_data}")
+        
+        success_count = 0
+        if rows:
             try:
-                user_id = budget_data.get('user_id')
-                by = budget_data.get('by')
-                allocated_budget = budget_data.get('allocated_budget')
-                
-                if user_id and by and allocated_budget is not None:
-                    if UserBudgetModel.create_budget(user_id, by, allocated_budget):
-                        success_count += 1
-                    else:
-                        error_count += 1
-                else:
-                    error_count += 1
-                    logger.warning(f"Données budget invalides: {budget_data}")
-                    
+                result = db.bulk_upsert(
+                    'user_budgets',
+                    ['user_id', 'fiscal_year', 'by', 'allocated_budget'],
+                    rows,
+                    conflict_columns=['user_id', 'by'],
+                    update_expressions={'updated_at': 'CURRENT_TIMESTAMP'}
+                )
+                success_count = result['success_count']
+                error_count += result['error_count']
+                for failure in result['errors']:
+                    logger.error(f"Erreur création budget en lot {rows[failure['index']]}: {failure['error']}")
             except Exception as e:
-                error_count += 1
+                error_count += len(rows)
                 logger.error(f"Erreur création budget en lot: {e}")
         
         logger.info(f"Création budgets en lot: {success_count} succès, {error_count} erreurs")
@@ -352,64 +519,100 @@ class UserBudgetModel:
     
     @staticmethod
     def copy_budgets_to_next_year(source_by: str, target_by: str, 
-                                 increase_percentage: float = 0.0) -> Dict[str, int]:
+                                 increase_percentage: float = 0.0, dry_run: bool = False) -> Dict[str, Any]:
         """
-        Copier les budgets d'une année vers l'année suivante
+        Copier les budgets d'une année vers une autre en une requête ensembliste
+        (INSERT ... SELECT ... ON CONFLICT, augmentation calculée en SQL), dans une transaction
         
         Args:
             source_by: Année source format BYXX (ex: "BY24")
             target_by: Année cible format BYXX (ex: "BY25")
             increase_percentage: Pourcentage d'augmentation (ex: 5.0 pour +5%)
+            dry_run: Calculer seulement l'écart, sans rien écrire
             
         Returns:
-            Dict avec le nombre de succès et d'échecs
+            Dict avec le nombre de succès et d'échecs, et diff : budgets new (créés), overwritten
+            (remplacés), unchanged (déjà au bon montant) et skipped_inactive (utilisateurs inactifs),
+            chacun une liste de {user_id, nom, prenom, source_amount, current_amount, new_amount}
         """
+        from utils.fiscal_year_utils import validate_fiscal_year_format, fiscal_year_number
+        
+        result = {
+            'success_count': 0,
+            'error_count': 0,
+            'source_by': source_by,
+            'target_by': target_by,
+            'increase_percentage': increase_percentage,
+            'dry_run': dry_run,
+            'diff': {'new': [], 'overwritten': [], 'unchanged': [], 'skipped_inactive': []}
+        }
+        
+        if not validate_fiscal_year_format(target_by):
+            logger.error(f"Format année fiscale invalide: {target_by}")
+            result['error_count'] = 1
+            return result
+        
+        factor = 1 + increase_percentage / 100
+        
         try:
-            # Récupérer tous les budgets de l'année source
-            source_budgets = UserBudgetModel.get_all_budgets_for_year(source_by)
-            
-            success_count = 0
-            error_count = 0
-            
-            for budget in source_budgets:
-                try:
-                    # Calculer le nouveau montant avec augmentation
-                    old_amount = budget['allocated_budget']
-                    new_amount = old_amount * (1 + increase_percentage / 100)
-                    
-                    if UserBudgetModel.create_budget(
-                        budget['user_id'], 
-                        target_by, 
-                        new_amount
-                    ):
-                        success_count += 1
+            # Aperçu seul : transaction de lecture, sans verrou d'écriture
+            with db.unit_of_work(immediate=not dry_run):
+                # Écart : budgets source, montant recalculé et budget cible existant
+                rows = db.execute_query("""
+                    SELECT s.user_id, u.nom, u.prenom, u.is_active,
+                           s.allocated_budget AS source_amount,
+                           ROUND(s.allocated_budget * ?, 2) AS new_amount,
+                           t.allocated_budget AS current_amount
+                    FROM user_budgets s
+                    JOIN users u ON u.id = s.user_id
+                    LEFT JOIN user_budgets t ON t.user_id = s.user_id AND t.by = ?
+                    WHERE s.by = ?
+                    ORDER BY u.nom, u.prenom
+                """, (factor, target_by, source_by), fetch='all')
+                
+                for row in rows or []:
+                    entry = {key: row[key] for key in ('user_id', 'nom', 'prenom', 'source_amount',
+                                                        'current_amount', 'new_amount')}
+                    if not row['is_active']:
+                        result['diff']['skipped_inactive'].append(entry)
+                    elif row['current_amount'] is None:
+                        result['diff']['new'].append(entry)
+                    elif row['current_amount'] != row['new_amount']:
+                        result['diff']['overwritten'].append(entry)
                     else:
-                        error_count += 1
-                        
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Erreur copie budget utilisateur {budget['user_id']}: {e}")
-            
-            logger.info(f"Copie budgets {source_by}→{target_by}: {success_count} succès, {error_count} erreurs")
-            return {
-                'success_count': success_count,
-                'error_count': error_count,
-                'source_by': source_by,
-                'target_by': target_by,
-                'increase_percentage': increase_percentage
-            }
+                        result['diff']['unchanged'].append(entry)
+                
+                if dry_run:
+                    return result
+                
+                # Copie ensembliste : les budgets déjà au bon montant ne sont pas réécrits ;
+                # fiscal_year (NOT NULL, unique par utilisateur) est celle de l'année cible
+                written = db.execute_query("""
+                    INSERT INTO user_budgets (user_id, fiscal_year, by, allocated_budget, updated_at)
+                    SELECT s.user_id, ?, ?, ROUND(s.allocated_budget * ?, 2), CURRENT_TIMESTAMP
+                    FROM user_budgets s
+                    JOIN users u ON u.id = s.user_id
+                    WHERE s.by = ? AND u.is_active = TRUE
+                    ON CONFLICT (user_id, by) DO UPDATE SET
+                        allocated_budget = excluded.allocated_budget,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE allocated_budget IS NOT excluded.allocated_budget
+                """, (fiscal_year_number(target_by), target_by, factor, source_by))
+            
+            result['success_count'] = written or 0
+            logger.info(f"Copie budgets {source_by}→{target_by}: {len(result['diff']['new'])} créé(s), "
+                        f"{len(result['diff']['overwritten'])} remplacé(s), {len(result['diff']['unchanged'])} inchangé(s), "
+                        f"{len(result['diff']['skipped_inactive'])} utilisateur(s) inactif(s) ignoré(s)")
+            return result
             
         except Exception as e:
             logger.error(f"Erreur copie budgets vers année suivante: {e}")
-            return {
-                'success_count': 0,
-                'error_count': 0,
-                'source_by': source_by,
-                'target_by': target_by,
-                'increase_percentage': increase_percentage
-            }
+            result['success_count'] = 0
+            result['error_count'] = len(result['diff']['new']) + len(result['diff']['overwritten'])
+            return result
     
     @staticmethod
+    @cached_query('user_budgets')
     def get_all_fiscal_years() -> List[str]:
         """
         Obtenir toutes les années fiscales ayant des budgets
@@ -0,0 +1,164 @@
+"""
+Table de fermeture de la hiérarchie des utilisateurs (user_hierarchy)
+
+Une ligne (ancestor_id, descendant_id, depth) pour chaque couple supérieur / subordonné
+de la chaîne users.directeur_id, à toute profondeur, plus une ligne de profondeur 0 par
+utilisateur (lui-même). L'équipe complète d'un directeur, sur plusieurs niveaux de
+management régional, se lit alors par une jointure indexée sur ancestor_id au lieu
+de parcourir directeur_id niveau par niveau.
+
+Des triggers sur users tiennent la table à jour : création d'un utilisateur,
+changement de directeur (tout le sous-arbre de l'utilisateur est déplacé, un
+directeur pris dans ce sous-arbre est refusé) et suppression. verify() compare la
+table au parcours récursif de directeur_id (voir scripts/verify_user_hierarchy.py).
+"""
+from typing import Any, Dict, List
+
+from models.database import db
+
+# Garde-fou du parcours récursif si directeur_id contient déjà une boucle
+_MAX_DEPTH = 32
+
+# Contenu attendu de la table, recalculé depuis users.directeur_id
+_EXPECTED_SQL = f'''
+    WITH RECURSIVE chain (ancestor_id, descendant_id, depth) AS (
+        SELECT id, id, 0 FROM users
+        UNION ALL
+        SELECT u.directeur_id, c.descendant_id, c.depth + 1
+        FROM chain c
+        JOIN users u ON u.id = c.ancestor_id
+        JOIN users p ON p.id = u.directeur_id
+        WHERE c.depth < {_MAX_DEPTH}
+    )
+    SELECT ancestor_id, descendant_id, MIN(depth) AS depth
+    FROM chain
+    GROUP BY ancestor_id, descendant_id
+'''
+
+class UserHierarchyModel:
+    """Modèle pour la table de fermeture de la hiérarchie"""
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table, ses triggers de maintenance et la remplir (migration 0015)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_hierarchy (
+                ancestor_id INTEGER NOT NULL,
+                descendant_id INTEGER NOT NULL,
+                depth INTEGER NOT NULL,
+                PRIMARY KEY (ancestor_id, descendant_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_user_hierarchy_descendant ON user_hierarchy(descendant_id, depth)"
+        )
+
+        # Nouvel utilisateur : lui-même et la chaîne de son directeur
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_hierarchy_insert
+            AFTER INSERT ON users
+            BEGIN
+                INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+                VALUES (NEW.id, NEW.id, 0);
+                INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, NEW.id, depth + 1 FROM user_hierarchy
+                WHERE descendant_id = NEW.directeur_id;
+            END
+        ''')
+        # Un utilisateur ne peut pas être placé sous lui-même ou sous un de ses subordonnés
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_hierarchy_cycle
+            BEFORE UPDATE OF directeur_id ON users
+            WHEN NEW.directeur_id IS NOT NULL AND NEW.directeur_id IS NOT OLD.directeur_id
+            BEGIN
+                SELECT RAISE(ABORT, 'hierarchie circulaire')
+                WHERE EXISTS (SELECT 1 FROM user_hierarchy
+                              WHERE ancestor_id = NEW.id AND descendant_id = NEW.directeur_id);
+            END
+        ''')
+        # Changement de directeur : le sous-arbre quitte les anciens supérieurs et
+        # rejoint la chaîne du nouveau directeur
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_hierarchy_directeur
+            AFTER UPDATE OF directeur_id ON users
+            WHEN NEW.directeur_id IS NOT OLD.directeur_id
+            BEGIN
+                DELETE FROM user_hierarchy
+                WHERE descendant_id IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = NEW.id)
+                  AND ancestor_id NOT IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = NEW.id);
+                INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT a.ancestor_id, s.descendant_id, a.depth + s.depth + 1
+                FROM user_hierarchy a CROSS JOIN user_hierarchy s
+                WHERE a.descendant_id = NEW.directeur_id AND s.ancestor_id = NEW.id;
+            END
+        ''')
+        # Suppression : les chemins passant par l'utilisateur disparaissent
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_user_hierarchy_delete
+            AFTER DELETE ON users
+            BEGIN
+                DELETE FROM user_hierarchy
+                WHERE ancestor_id IN (SELECT ancestor_id FROM user_hierarchy WHERE descendant_id = OLD.id)
+                  AND descendant_id IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = OLD.id);
+            END
+        ''')
+
+        cursor.execute("DELETE FROM user_hierarchy")
+        cursor.execute(f"INSERT INTO user_hierarchy (ancestor_id, descendant_id, depth) {_EXPECTED_SQL}")
+
+    @staticmethod
+    def subtree_condition(column: str, include_self: bool = True) -> str:
+        """
+        Condition SQL restreignant column (un id d'utilisateur) à l'équipe complète du
+        directeur passé en paramètre (un ?), lui compris si include_self
+        """
+        depth = "" if include_self else " AND depth > 0"
+        return f"{column} IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = ?{depth})"
+
+    @staticmethod
+    def is_in_subtree(ancestor_id: int, user_id: int) -> bool:
+        """Vrai si user_id est ancestor_id ou l'un de ses subordonnés, à toute profondeur"""
+        try:
+            row = db.execute_query(
+                "SELECT 1 FROM user_hierarchy WHERE ancestor_id = ? AND descendant_id = ?",
+                (ancestor_id, user_id), fetch='one'
+            )
+            return row is not None
+        except Exception as e:
+            print(f"Erreur lecture hiérarchie: {e}")
+            return False
+
+    @staticmethod
+    def verify() -> List[Dict[str, Any]]:
+        """
+        Comparer la table au parcours récursif de users.directeur_id.
+
+        Returns:
+            Couples en écart : ancestor_id, descendant_id, profondeur attendue et
+            profondeur en table (None si absente d'un côté)
+        """
+        rows = db.execute_query(f'''
+            WITH expected AS ({_EXPECTED_SQL})
+            SELECT e.ancestor_id, e.descendant_id, e.depth AS depth_attendue, h.depth AS depth_table
+            FROM expected e
+            LEFT JOIN user_hierarchy h ON h.ancestor_id = e.ancestor_id AND h.descendant_id = e.descendant_id
+            WHERE h.depth IS NOT e.depth
+            UNION ALL
+            SELECT h.ancestor_id, h.descendant_id, NULL, h.depth
+            FROM user_hierarchy h
+            WHERE NOT EXISTS (SELECT 1 FROM expected e
+                              WHERE e.ancestor_id = h.ancestor_id AND e.descendant_id = h.descendant_id)
+        ''', fetch='all')
+        return [dict(row) for row in rows or []]
+
+    @staticmethod
+    def rebuild() -> bool:
+        """Recalculer entièrement la table depuis users.directeur_id"""
+        try:
+            with db.unit_of_work():
+                db.execute_query("DELETE FROM user_hierarchy")
+                db.execute_query(f"INSERT INTO user_hierarchy (ancestor_id, descendant_id, depth) {_EXPECTED_SQL}")
+            return True
+        except Exception as e:
+            print(f"Erreur reconstruction hiérarchie: {e}")
+            return False
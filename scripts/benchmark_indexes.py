@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Benchmark des index composites (migration 0007 index_composites)
+
+Crée une base temporaire au schéma d'avant la migration, la remplit avec un volume
+réaliste (100 000 demandes par défaut), mesure les requêtes chaudes de l'application,
+applique la migration puis mesure à nouveau. Affiche pour chaque requête la latence
+médiane avant/après, le plan d'exécution et les parcours complets de table restants.
+
+Usage:
+    python scripts/benchmark_indexes.py [--demandes 100000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INDEX_MIGRATION_VERSION = 7
+
+STATUSES = ['brouillon', 'en_attente_dr', 'en_attente_financier', 'validee', 'rejetee']
+FISCAL_YEARS = ['BY23', 'BY24', 'BY25', 'BY26']
+
+# Requêtes chaudes reprises des modèles ; les paramètres sont tirés des identifiants générés
+HOT_QUERIES = [
+    ('liste_tc', '''
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        WHERE d.user_id = ?
+        UNION
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        JOIN demande_participants dp ON d.id = dp.demande_id
+        WHERE dp.user_id = ?
+        ORDER BY updated_at DESC
+    ''', lambda ids: (ids['tc'], ids['tc'])),
+    ('liste_dr_equipe', '''
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        WHERE d.user_id IN (SELECT id FROM users WHERE id = ? OR directeur_id = ?)
+        UNION
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        JOIN demande_participants dp ON d.id = dp.demande_id
+        WHERE dp.user_id = ?
+        ORDER BY updated_at DESC
+    ''', lambda ids: (ids['dr'], ids['dr'], ids['dr'])),
+    ('liste_financier', '''
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        WHERE d.status IN ('en_attente_financier', 'validee')
+        ORDER BY updated_at DESC LIMIT 50
+    ''', lambda ids: ()),
+    ('liste_admin_annee', '''
+        SELECT d.*, u.nom, u.prenom, u.email, u.role as user_role
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        WHERE d.by = ? AND d.status = ?
+        ORDER BY d.updated_at DESC LIMIT 50
+    ''', lambda ids: ('BY25', 'en_attente_dr')),
+    ('budget_consomme', '''
+        SELECT SUM(montant) as consumed FROM demandes
+        WHERE user_id = ? AND status = 'validee' AND by = ?
+    ''', lambda ids: (ids['tc'], 'BY25')),
+    ('budget_en_attente', '''
+        SELECT SUM(montant) as pending FROM demandes
+        WHERE user_id = ? AND status IN ('en_attente_dr', 'en_attente_financier') AND by = ?
+    ''', lambda ids: (ids['tc'], 'BY25')),
+    ('stats_dashboard_dr', '''
+        SELECT COUNT(*), SUM(CASE WHEN status = 'validee' THEN montant ELSE 0 END)
+        FROM demandes d JOIN users u ON d.user_id = u.id
+        WHERE d.user_id IN (SELECT id FROM users WHERE id = ? OR directeur_id = ?) AND d.by = ?
+    ''', lambda ids: (ids['dr'], ids['dr'], 'BY25')),
+    ('notifications_non_lues', '''
+        SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = FALSE
+    ''', lambda ids: (ids['tc'],)),
+    ('equipe_dr', '''
+        SELECT id, nom, prenom, email, role, region FROM users
+        WHERE directeur_id = ? AND is_active = TRUE ORDER BY nom, prenom
+    ''', lambda ids: (ids['dr'],)),
+    ('participations', '''
+        SELECT demande_id FROM demande_participants WHERE user_id = ?
+    ''', lambda ids: (ids['tc'],)),
+    ('historique_demande', '''
+        SELECT a.*, u.nom, u.prenom FROM activity_logs a JOIN users u ON a.user_id = u.id
+        WHERE a.demande_id = ? ORDER BY a.created_at ASC
+    ''', lambda ids: (ids['demande'],)),
+    ('activite_utilisateur', '''
+        SELECT a.* FROM activity_logs a WHERE a.user_id = ? ORDER BY a.created_at DESC LIMIT 50
+    ''', lambda ids: (ids['tc'],)),
+]
+
+def populate(conn: sqlite3.Connection, n_demandes: int, seed: int = 42) -> dict:
+    """Remplir la base : DR et leurs équipes de TC, demandes, participants, notifications, journal"""
+    rng = random.Random(seed)
+    n_dr = max(5, n_demandes // 5000)
+    n_tc = n_dr * 20
+    users = []
+    for i in range(n_dr):
+        users.append((f"dr{i}@bench.local", 'x', f"DR{i}", 'Bench', 'dr', 'nord', None, True))
+    first_dr_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+    for i in range(n_tc):
+        users.append((f"tc{i}@bench.local", 'x', f"TC{i}", 'Bench', 'tc', 'nord',
+                      first_dr_id + i % n_dr, True))
+    conn.executemany('''
+        INSERT INTO users (email, password_hash, nom, prenom, role, region, directeur_id, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', users)
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE email LIKE '%@bench.local'")]
+    tc_ids = user_ids[n_dr:]
+
+    start = datetime(2023, 1, 1)
+    demandes = []
+    for i in range(n_demandes):
+        created = start + timedelta(minutes=rng.randint(0, 60 * 24 * 900))
+        demandes.append((
+            rng.choice(tc_ids), rng.choice(['budget', 'marketing']), f"Manifestation {i}",
+            f"Client {rng.randint(1, 2000)}", created.date().isoformat(), 'Paris',
+            round(rng.uniform(100, 20000), 2), rng.choice(STATUSES), rng.choice(FISCAL_YEARS),
+            created.year, created.isoformat(sep=' '),
+            (created + timedelta(days=rng.randint(0, 30))).isoformat(sep=' ')
+        ))
+    conn.executemany('''
+        INSERT INTO demandes (user_id, type_demande, nom_manifestation, client, date_evenement, lieu,
+                              montant, status, by, cy, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', demandes)
+    first_demande, last_demande = conn.execute("SELECT MIN(id), MAX(id) FROM demandes").fetchone()
+
+    conn.executemany('''
+        INSERT OR IGNORE INTO demande_participants (demande_id, user_id, added_by_user_id)
+        VALUES (?, ?, ?)
+    ''', ((rng.randint(first_demande, last_demande), rng.choice(tc_ids), tc_ids[0])
+          for _ in range(n_demandes // 3)))
+    conn.executemany('''
+        INSERT INTO notifications (user_id, demande_id, type_notification, titre, message, is_read)
+        VALUES (?, ?, 'info', 'Titre', 'Message', ?)
+    ''', ((rng.choice(user_ids), rng.randint(first_demande, last_demande), rng.random() < 0.8)
+          for _ in range(n_demandes // 2)))
+    conn.executemany('''
+        INSERT INTO activity_logs (user_id, demande_id, action, details, created_at)
+        VALUES (?, ?, 'modification_demande', '', ?)
+    ''', ((rng.choice(user_ids), rng.randint(first_demande, last_demande),
+           (start + timedelta(minutes=rng.randint(0, 60 * 24 * 900))).isoformat(sep=' '))
+          for _ in range(n_demandes * 2)))
+    conn.commit()
+
+    return {'tc': tc_ids[0], 'dr': first_dr_id, 'demande': first_demande + 10}
+
+def measure(conn: sqlite3.Connection, ids: dict, repeat: int) -> dict:
+    """Latence médiane (ms), plan et parcours complets de chaque requête chaude"""
+    from utils.query_monitor import find_full_scans
+    from config.settings import db_config
+
+    results = {}
+    for name, sql, params_fn in HOT_QUERIES:
+        params = params_fn(ids)
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'ms': statistics.median(timings),
+            'plan': plan,
+            'full_scans': find_full_scans(plan, db_config.full_scan_ignore_tables),
+        }
+    return results
+
+def print_report(before: dict, after: dict):
+    print("\n" + "=" * 100)
+    print(f"{'Requête':<24}{'Avant (ms)':>12}{'Après (ms)':>12}{'Gain':>10}   Parcours complets restants")
+    print("-" * 100)
+    for name, _, _ in HOT_QUERIES:
+        b, a = before[name], after[name]
+        gain = b['ms'] / a['ms'] if a['ms'] > 0 else float('inf')
+        scans = ', '.join(a['full_scans']) or '-'
+        print(f"{name:<24}{b['ms']:>12.2f}{a['ms']:>12.2f}{gain:>9.1f}x   {scans}")
+    print("=" * 100)
+
+    print("\n📋 Plans d'exécution")
+    for name, _, _ in HOT_QUERIES:
+        print(f"\n▶ {name}")
+        print("  avant : " + " | ".join(before[name]['plan']))
+        print("  après : " + " | ".join(after[name]['plan']))
+
+    flagged = [name for name in after if after[name]['full_scans']]
+    if flagged:
+        print(f"\n⚠️ {len(flagged)} requête(s) avec parcours complet après migration: {', '.join(flagged)}")
+    else:
+        print("\n✅ Aucun parcours complet de table sur les requêtes chaudes")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des index composites")
+    parser.add_argument('--demandes', type=int, default=100_000, help="Nombre de demandes générées")
+    parser.add_argument('--repeat', type=int, default=20, help="Exécutions par requête")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='budget_bench_'), 'bench.db')
+    from config.settings import db_config
+    db_config.path = db_path
+    db_config.query_monitoring = False
+
+    from migrations.ledger import schema_ledger
+
+    print(f"🚀 Base de benchmark: {db_path}")
+    schema_ledger.migrate(target_version=INDEX_MIGRATION_VERSION - 1)
+
+    conn = sqlite3.connect(db_path)
+    print(f"📦 Génération de {args.demandes} demandes...")
+    start = time.perf_counter()
+    ids = populate(conn, args.demandes)
+    conn.execute("ANALYZE")
+    print(f"   terminé en {time.perf_counter() - start:.1f} s")
+
+    print("⏱️ Mesures avant migration...")
+    before = measure(conn, ids, args.repeat)
+    conn.close()
+
+    print("🔍 Application de la migration des index...")
+    start = time.perf_counter()
+    schema_ledger.migrate()
+    print(f"   terminé en {time.perf_counter() - start:.1f} s")
+
+    conn = sqlite3.connect(db_path)
+    print("⏱️ Mesures après migration...")
+    after = measure(conn, ids, args.repeat)
+    conn.close()
+
+    print_report(before, after)
+
+if __name__ == "__main__":
+    main()
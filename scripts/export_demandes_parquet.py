@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Export Parquet des demandes pour les outils BI
+
+Écrit les demandes, les attributs de leur créateur et les labels des listes
+déroulantes en Parquet partitionné par année fiscale et statut. Seules les
+partitions modifiées depuis le dernier export dans ce répertoire sont réécrites ;
+--full force la réécriture de toutes les partitions. Nécessite pyarrow.
+
+Usage:
+    python scripts/export_demandes_parquet.py <répertoire> [--full]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Parquet partitionné des demandes")
+    parser.add_argument('output_dir', help="Répertoire du jeu de données Parquet")
+    parser.add_argument('--full', action='store_true', help="Réécrire toutes les partitions")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.demande_bi_export import DemandeParquetExport
+
+    db.init_database()
+
+    print(f"🔄 Export Parquet vers {args.output_dir}...")
+    result = DemandeParquetExport.export(args.output_dir, full=args.full)
+    if not result['success']:
+        print(f"❌ Échec de l'export: {result['error']}")
+        return 1
+
+    for key in result['written']:
+        print(f"   ✏️ {key}")
+    for key in result['removed']:
+        print(f"   🗑️ {key} (vide)")
+    print(f"✅ {len(result['written'])} partition(s) écrite(s), {len(result['removed'])} supprimée(s), "
+          f"{result['unchanged']} inchangée(s), {result['rows']} ligne(s) écrite(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
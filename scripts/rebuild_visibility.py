@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Reconstruction de la table de visibilité des demandes (demande_visibility)
+
+La table est tenue à jour par des triggers ; ce script la vérifie et la recalcule
+entièrement depuis demandes et demande_participants (après un import direct
+en base, une restauration partielle, ...).
+
+Usage:
+    python scripts/rebuild_visibility.py [--check]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruction de la table demande_visibility")
+    parser.add_argument('--check', action='store_true', help="Vérifier sans reconstruire")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.demande_visibility import DemandeVisibilityModel
+
+    db.init_database()
+
+    if args.check:
+        result = DemandeVisibilityModel.check()
+        print(f"🔍 Lignes manquantes: {result['manquantes']}, lignes en trop: {result['en_trop']}")
+        return 0 if result['manquantes'] == 0 and result['en_trop'] == 0 else 1
+
+    print("🔄 Reconstruction de la table demande_visibility...")
+    result = DemandeVisibilityModel.rebuild()
+    if not result['success']:
+        print(f"❌ Échec de la reconstruction: {result['error']}")
+        return 1
+
+    corrected = result['corrigees']
+    print(f"✅ {result['lignes']} ligne(s) de visibilité "
+          f"({corrected['manquantes']} manquante(s) ajoutée(s), {corrected['en_trop']} en trop supprimée(s))")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
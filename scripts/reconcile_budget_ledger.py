@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Rapprochement du registre des budgets (budget_ledger)
+
+Le registre est tenu à jour par des triggers ; ce script le compare aux demandes
+(montants en attente et validés par utilisateur et année fiscale) et aux budgets
+alloués, et liste les écarts. Avec --fix, le registre est recalé sur les sources.
+
+Usage:
+    python scripts/reconcile_budget_ledger.py [--fix]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapprochement du registre des budgets")
+    parser.add_argument('--fix', action='store_true', help="Recaler le registre en cas d'écart")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.budget_ledger import BudgetLedgerModel
+
+    db.init_database()
+
+    differences = BudgetLedgerModel.verify()
+    if not differences:
+        print("✅ Registre des budgets conforme aux demandes et budgets alloués")
+        return 0
+
+    print(f"⚠️ {len(differences)} ligne(s) du registre en écart:")
+    for row in differences:
+        print(f"   user={row['user_id']} by={row['by'] or '-'} : "
+              f"alloué {row['allocated_attendu'] or 0:.2f}/{row['allocated_registre'] or 0:.2f}, "
+              f"en attente {row['pending_attendu'] or 0:.2f}/{row['pending_registre'] or 0:.2f}, "
+              f"consommé {row['consumed_attendu'] or 0:.2f}/{row['consumed_registre'] or 0:.2f} (attendu/registre)")
+
+    if not args.fix:
+        return 1
+
+    print("🔄 Recalage du registre des budgets...")
+    if not BudgetLedgerModel.rebuild():
+        print("❌ Échec du recalage")
+        return 1
+    remaining = BudgetLedgerModel.verify()
+    print(f"✅ Registre recalé, écarts restants: {len(remaining)}")
+    return 0 if not remaining else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
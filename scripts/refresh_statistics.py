@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Recalcul des statistiques de l'optimiseur SQLite (ANALYZE)
+
+Au démarrage, les statistiques ne sont contrôlées qu'après l'application d'une
+migration ; ce script est à planifier (tâche quotidienne, cron) pour les recalculer
+quand le volume des tables principales a beaucoup changé depuis le dernier ANALYZE.
+Avec --force, ANALYZE est exécuté dans tous les cas.
+
+Usage:
+    python scripts/refresh_statistics.py [--force]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcul des statistiques de l'optimiseur")
+    parser.add_argument('--force', action='store_true', help="Exécuter ANALYZE même si les statistiques sont à jour")
+    args = parser.parse_args()
+
+    from models.database import db
+
+    db.init_database()
+
+    if db.refresh_statistics(force=args.force):
+        print("✅ Statistiques de l'optimiseur recalculées")
+    else:
+        print("✅ Statistiques de l'optimiseur à jour")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Vérification de la table d'agrégats des demandes (demande_stats)
+
+La table est tenue à jour par des triggers ; ce script la compare à un recomptage
+complet des demandes et liste les écarts. Avec --fix, la table est recalculée
+entièrement (après un import direct en base, une restauration partielle, ...).
+
+Usage:
+    python scripts/verify_demande_stats.py [--fix]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification de la table demande_stats")
+    parser.add_argument('--fix', action='store_true', help="Recalculer la table en cas d'écart")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.demande_stats import DemandeStatsModel
+
+    db.init_database()
+
+    differences = DemandeStatsModel.verify()
+    if not differences:
+        print("✅ Agrégats conformes au recomptage des demandes")
+        return 0
+
+    print(f"⚠️ {len(differences)} agrégat(s) en écart:")
+    for row in differences:
+        print(f"   user={row['user_id']} directeur={row['directeur_id']} by={row['by'] or '-'} "
+              f"{row['status']}/{row['type_demande']} : attendu {row['nb_attendu'] or 0} "
+              f"({row['montant_attendu'] or 0:.2f}), table {row['nb_table'] or 0} ({row['montant_table'] or 0:.2f})")
+
+    if not args.fix:
+        return 1
+
+    print("🔄 Recalcul de la table demande_stats...")
+    if not DemandeStatsModel.rebuild():
+        print("❌ Échec du recalcul")
+        return 1
+    remaining = DemandeStatsModel.verify()
+    print(f"✅ Table recalculée, écarts restants: {len(remaining)}")
+    return 0 if not remaining else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Vérification des utilisations des options des listes déroulantes (dropdown_usage)
+
+La table est tenue à jour par des triggers sur demandes ; ce script la compare à un
+recomptage (un GROUP BY par colonne de demandes) et liste les écarts. Avec --fix, la
+table est recalculée entièrement (après un import direct en base, une restauration, ...).
+
+Usage:
+    python scripts/verify_dropdown_usage.py [--fix]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification de la table dropdown_usage")
+    parser.add_argument('--fix', action='store_true', help="Recalculer la table en cas d'écart")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.dropdown_usage import DropdownUsageModel
+
+    db.init_database()
+
+    differences = DropdownUsageModel.verify()
+    if not differences:
+        print("✅ Utilisations conformes au recomptage des demandes")
+        return 0
+
+    print(f"⚠️ {len(differences)} compteur(s) en écart:")
+    for row in differences:
+        print(f"   {row['category']}={row['value']} : attendu {row['count_attendu'] or 0}, "
+              f"table {row['count_table'] or 0}")
+
+    if not args.fix:
+        return 1
+
+    print("🔄 Recalcul de la table dropdown_usage...")
+    if not DropdownUsageModel.rebuild():
+        print("❌ Échec du recalcul")
+        return 1
+    remaining = DropdownUsageModel.verify()
+    print(f"✅ Table recalculée, écarts restants: {len(remaining)}")
+    return 0 if not remaining else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
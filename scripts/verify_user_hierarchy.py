@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Vérification de la table de fermeture de la hiérarchie (user_hierarchy)
+
+La table est tenue à jour par des triggers sur users ; ce script la compare au
+parcours récursif de users.directeur_id et liste les écarts. Avec --fix, la table
+est recalculée entièrement (après un import direct en base, une restauration, ...).
+
+Usage:
+    python scripts/verify_user_hierarchy.py [--fix]
+"""
+import argparse
+import os
+import sys
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def main():
+    parser = argparse.ArgumentParser(description="Vérification de la table user_hierarchy")
+    parser.add_argument('--fix', action='store_true', help="Recalculer la table en cas d'écart")
+    args = parser.parse_args()
+
+    from models.database import db
+    from models.user_hierarchy import UserHierarchyModel
+
+    db.init_database()
+
+    differences = UserHierarchyModel.verify()
+    if not differences:
+        print("✅ Hiérarchie conforme aux directeurs des utilisateurs")
+        return 0
+
+    print(f"⚠️ {len(differences)} lien(s) hiérarchique(s) en écart:")
+    for row in differences:
+        expected = row['depth_attendue'] if row['depth_attendue'] is not None else '-'
+        actual = row['depth_table'] if row['depth_table'] is not None else '-'
+        print(f"   supérieur={row['ancestor_id']} subordonné={row['descendant_id']} : "
+              f"profondeur attendue {expected}, table {actual}")
+
+    if not args.fix:
+        return 1
+
+    print("🔄 Recalcul de la table user_hierarchy...")
+    if not UserHierarchyModel.rebuild():
+        print("❌ Échec du recalcul")
+        return 1
+    remaining = UserHierarchyModel.verify()
+    print(f"✅ Table recalculée, écarts restants: {len(remaining)}")
+    return 0 if not remaining else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Chargement groupé des données d'affichage des cartes de demandes
+
+Une carte de demande affiche des labels de listes déroulantes, les participants et
+les valideurs DR / financier / DG. Chargées carte par carte, ces données coûtent
+une dizaine de requêtes par demande ; DemandeCardLoader les résout pour toute la
+page en trois requêtes IN (...), exécutées à la première lecture seulement (aucune
+requête si aucune carte n'est ouverte).
+"""
+from typing import Any, Dict, List, Optional
+
+from models.participant import ParticipantModel
+from models.user import UserModel
+
+# Colonnes des valideurs sur une demande
+VALIDATOR_COLUMNS = ('valideur_dr_id', 'valideur_financier_id', 'valideur_dg_id')
+
+def _as_id(value) -> Optional[int]:
+    """Identifiant entier, None pour les valeurs vides ou NaN (colonnes pandas)"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        if value != value:  # NaN
+            return None
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+class DemandeCardLoader:
+    """Préchargement des participants, valideurs et labels d'une page de demandes"""
+
+    def __init__(self, demandes):
+        """
+        Args:
+            demandes: DataFrame ou liste de dicts des demandes affichées
+        """
+        rows = demandes.to_dict('records') if hasattr(demandes, 'to_dict') else list(demandes)
+        self._demande_ids = [demande_id for demande_id in (_as_id(row.get('id')) for row in rows)
+                             if demande_id is not None]
+        self._validator_ids = sorted({
+            user_id for row in rows for user_id in (_as_id(row.get(column)) for column in VALIDATOR_COLUMNS)
+            if user_id is not None
+        })
+        self._label_pairs = self._collect_label_pairs(rows)
+        self._loaded = False
+        self._participants: Dict[int, List[Dict[str, Any]]] = {}
+        self._users: Dict[int, Dict[str, Any]] = {}
+        self._labels: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _collect_label_pairs(rows) -> set:
+        try:
+            from utils.dropdown_display import DropdownDisplayUtils
+        except ImportError:
+            return set()
+        return {
+            (category, row.get(field)) for row in rows
+            for field, category in DropdownDisplayUtils.DEMANDE_FIELD_CATEGORIES.items()
+            if row.get(field)
+        }
+
+    def load(self):
+        """Exécuter les requêtes groupées (une fois)"""
+        if self._loaded:
+            return
+        self._participants = ParticipantModel.get_participants_for_demandes(self._demande_ids)
+        self._users = UserModel.get_users_by_ids(self._validator_ids)
+        if self._label_pairs:
+            from utils.dropdown_display import DropdownDisplayUtils
+            self._labels = DropdownDisplayUtils.get_labels_for_values(self._label_pairs)
+        self._loaded = True
+
+    def participants(self, demande_id) -> List[Dict[str, Any]]:
+        """Participants (utilisateurs) d'une demande de la page"""
+        self.load()
+        return self._participants.get(_as_id(demande_id), [])
+
+    def participants_text(self, row) -> str:
+        """Texte d'affichage des participants (même format que ParticipantModel.get_participants_for_display)"""
+        demandeur_participe = row.get('demandeur_participe', True)
+        if demandeur_participe is None or demandeur_participe != demandeur_participe:
+            demandeur_participe = True
+        participants_libres = row.get('participants_libres')
+        return ParticipantModel.format_participants(
+            self.participants(row.get('id')), bool(demandeur_participe),
+            participants_libres if isinstance(participants_libres, str) else ''
+        )
+
+    def user(self, user_id) -> Optional[Dict[str, Any]]:
+        """Valideur d'une demande de la page (None si inconnu)"""
+        self.load()
+        return self._users.get(_as_id(user_id))
+
+    def display_labels(self, row) -> Dict[str, str]:
+        """Labels d'affichage des listes déroulantes d'une demande de la page"""
+        from utils.dropdown_display import DropdownDisplayUtils
+
+        self.load()
+        return DropdownDisplayUtils.get_display_labels_for_demande(row, self._labels)
@@ -4,6 +4,7 @@ Notification service for managing notifications and alerts
 from typing import List, Dict, Any, Optional
 import logging
 
+from models.database import db
 from models.notification import NotificationModel
 from models.user import UserModel
 from models.activity_log import ActivityLogModel
@@ -26,8 +27,8 @@ class NotificationService:
             )
             
             if success and send_email:
-                # Send email notification
-                email_service.send_notification_email(user_id, title, message)
+                # Send email notification once the surrounding transaction (if any) is committed
+                db.on_commit(lambda: email_service.send_notification_email(user_id, title, message))
             
             return success
         except Exception as e:
@@ -154,17 +155,25 @@ class NotificationService:
             if user_roles:
                 users_df = users_df[users_df['role'].isin(user_roles)]
             
-            success_count = 0
             total_count = len(users_df)
+            if users_df.empty:
+                return {'success': 0, 'total': 0}
             
-            for _, user in users_df.iterrows():
-                if user['is_active']:
-                    if NotificationService.create_notification(
-                        user['id'], None, 'system_maintenance', title, message, send_email=False
-                    ):
-                        success_count += 1
+            active_ids = users_df[users_df['is_active'].astype(bool)]['id'].tolist()
+            notifications = [
+                {
+                    'user_id': int(user_id),
+                    'demande_id': None,
+                    'type_notification': 'system_maintenance',
+                    'titre': title,
+                    'message': message
+                }
+                for user_id in active_ids
+            ]
+            
+            result = NotificationModel.add_notifications_bulk(notifications)
             
-            return {'success': success_count, 'total': total_count}
+            return {'success': result['success_count'], 'total': total_count}
         except Exception as e:
             logger.error(f"Error notifying system maintenance: {e}")
             return {'success': 0, 'total': 0}
@@ -6,6 +6,8 @@ from typing import Dict, List, Optional, Any
 import logging
 from enum import Enum
 
+from models.user_hierarchy import UserHierarchyModel
+
 logger = logging.getLogger(__name__)
 
 class Permission(Enum):
@@ -139,14 +141,20 @@ class PermissionService:
     @staticmethod
     def can_validate_demande(user_role: str, demande_status: str, user_id: int, 
                            demande_user_id: int, directeur_id: Optional[int] = None) -> bool:
-        """Vérifier si un utilisateur peut valider une demande"""
+        """
+        Vérifier si un utilisateur peut valider une demande
+
+        directeur_id n'est plus utilisé (compatibilité) : l'équipe d'un DR est lue
+        dans user_hierarchy, à toute profondeur.
+        """
         try:
             role = Role(user_role)
             
             if demande_status == 'en_attente_dr':
                 if role != Role.DR:
                     return False
-                return user_id == demande_user_id or user_id == directeur_id
+                # Ses demandes et celles de toute son équipe (user_hierarchy, toute profondeur)
+                return UserHierarchyModel.is_in_subtree(user_id, demande_user_id)
             
             elif demande_status == 'en_attente_financier':
                 return role in [Role.DR_FINANCIER, Role.DG, Role.ADMIN]
@@ -181,7 +189,7 @@ class PermissionService:
     def can_view_demande(user_role: str, user_id: int, demande_user_id: int, 
                         demande_participants: List[int] = None, 
                         directeur_id: Optional[int] = None) -> bool:
-        """Vérifier si un utilisateur peut voir une demande"""
+        """Vérifier si un utilisateur peut voir une demande (équipe : user_hierarchy, directeur_id ignoré)"""
         try:
             if PermissionService.has_permission(user_role, Permission.VIEW_ALL_DEMANDES):
                 return True
@@ -190,7 +198,7 @@ class PermissionService:
                 return True
             
             if (PermissionService.has_permission(user_role, Permission.VIEW_TEAM_DEMANDES) 
-                and user_id == directeur_id):
+                and UserHierarchyModel.is_in_subtree(user_id, demande_user_id)):
                 return True
             
             if demande_participants and user_id in demande_participants:
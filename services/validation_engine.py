@@ -7,6 +7,7 @@ import logging
 from datetime import datetime
 
 from models.database import db
+from models.user_hierarchy import UserHierarchyModel
 from config.settings import WORKFLOW_CONFIG, get_status_info
 
 logger = logging.getLogger(__name__)
@@ -29,6 +30,25 @@ class ValidationEngine:
         Returns:
             Tuple[bool, str]: (succès, message)
         """
+        try:
+            # Une seule transaction pour la mise à jour, l'historique et les notifications
+            with db.unit_of_work() as uow:
+                success, message = ValidationEngine._run_validation(demande_id, validator_id, action, comment)
+                if not success:
+                    uow.set_rollback_only()
+            if uow.rollback_only and success:
+                # Historique ou notification en échec : rien n'a été enregistré
+                return False, "Erreur lors de l'enregistrement de la validation, opération annulée"
+            return success, message
+            
+        except Exception as e:
+            logger.error(f"Erreur lors de la validation de la demande {demande_id}: {e}")
+            return False, f"Erreur technique: {str(e)}"
+    
+    @staticmethod
+    def _run_validation(demande_id: int, validator_id: int, action: str, 
+                        comment: str) -> Tuple[bool, str]:
+        """Enchaîner les contrôles et le traitement de la validation (dans la transaction appelante)"""
         try:
             # Récupérer les informations de la demande et du validateur
             demande_info = ValidationEngine._get_demande_info(demande_id)
@@ -102,7 +122,6 @@ class ValidationEngine:
             validator_id = validator_info['id']
             demande_status = demande_info['status']
             demande_user_id = demande_info['user_id']
-            directeur_id = demande_info.get('directeur_id')
             
             # Vérifications selon le statut de la demande
             if demande_status == 'en_attente_dr':
@@ -110,10 +129,11 @@ class ValidationEngine:
                 if validator_role != 'dr':
                     return False, "Seuls les Directeurs Régionaux peuvent valider à cette étape"
                 
-                # Le DR peut valider les demandes de son équipe ou ses propres demandes
+                # Le DR peut valider ses propres demandes et celles de toute son équipe
+                # (subordonnés à toute profondeur, même règle que sa file de validation)
                 if validator_id == demande_user_id:
                     return True, "Validation de sa propre demande"
-                elif validator_id == directeur_id:
+                elif UserHierarchyModel.is_in_subtree(validator_id, demande_user_id):
                     return True, "Validation d'une demande de son équipe"
                 else:
                     return False, "Vous ne pouvez valider que vos demandes ou celles de votre équipe"
@@ -251,7 +271,8 @@ class ValidationEngine:
             success = ValidationEngine._update_demande(demande_id, update_fields)
             if success:
                 # Enregistrer la validation dans l'historique
-                ValidationEngine._log_validation(demande_id, validator_id, 'valider', comment)
+                level = 'financier' if 'valideur_financier_id' in update_fields else 'dg'
+                ValidationEngine._log_validation(demande_id, validator_id, 'valider', comment, level)
                 
                 # Notifier selon le statut final
                 if update_fields['status'] == 'validee':
@@ -320,7 +341,8 @@ class ValidationEngine:
             success = ValidationEngine._update_demande(demande_id, update_fields)
             if success:
                 # Enregistrer le rejet dans l'historique
-                ValidationEngine._log_validation(demande_id, validator_id, 'rejeter', comment)
+                level = {'DR': 'dr', 'DG': 'dg'}.get(rejection_level, 'financier')
+                ValidationEngine._log_validation(demande_id, validator_id, 'rejeter', comment, level)
                 
                 # Notifier le rejet
                 ValidationEngine._notify_rejection(demande_info, validator_info, comment)
@@ -359,32 +381,31 @@ class ValidationEngine:
             
         except Exception as e:
             logger.error(f"Erreur mise à jour demande {demande_id}: {e}")
+            db.set_rollback_only()
             return False
     
     @staticmethod
-    def _log_validation(demande_id: int, validator_id: int, action: str, comment: str):
-        """Enregistrer une validation dans l'historique"""
+    def _log_validation(demande_id: int, validator_id: int, action: str, comment: str, level: str):
+        """
+        Enregistrer une validation dans l'historique (échec : transaction annulée).
+
+        level : niveau de validation 'dr', 'financier' ou 'dg' ; une nouvelle décision du même
+        valideur au même niveau (demande soumise à nouveau) remplace la précédente.
+        """
         try:
-            # Enregistrer dans demande_validations si la table existe
-            try:
-                db.execute_query('''
-                    INSERT INTO demande_validations (demande_id, validated_by, validation_type, action, commentaire)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (demande_id, validator_id, 'general', action, comment))
-            except:
-                pass  # Table peut ne pas exister
-            
-            # Enregistrer dans activity_logs
-            try:
-                db.execute_query('''
-                    INSERT INTO activity_logs (user_id, demande_id, action, details)
-                    VALUES (?, ?, ?, ?)
-                ''', (validator_id, demande_id, f'{action}_demande', comment))
-            except:
-                pass  # Table peut ne pas exister
+            db.execute_query('''
+                INSERT OR REPLACE INTO demande_validations (demande_id, validated_by, validation_type, action, commentaire)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (demande_id, validator_id, level, action, comment))
+            
+            db.execute_query('''
+                INSERT INTO activity_logs (user_id, demande_id, action, details)
+                VALUES (?, ?, ?, ?)
+            ''', (validator_id, demande_id, f'{action}_demande', comment))
                 
         except Exception as e:
             logger.error(f"Erreur log validation: {e}")
+            db.set_rollback_only()
     
     @staticmethod
     def _notify_financial_validators(demande_info: Dict[str, Any]):
@@ -412,6 +433,7 @@ class ValidationEngine:
                     
         except Exception as e:
             logger.error(f"Erreur notification validateurs financiers: {e}")
+            db.set_rollback_only()
     
     @staticmethod
     def _notify_final_approval(demande_info: Dict[str, Any], validator_info: Dict[str, Any]):
@@ -430,6 +452,7 @@ class ValidationEngine:
             
         except Exception as e:
             logger.error(f"Erreur notification approbation finale: {e}")
+            db.set_rollback_only()
     
     @staticmethod
     def _notify_partial_approval(demande_info: Dict[str, Any], validator_info: Dict[str, Any], validation_type: str):
@@ -448,6 +471,7 @@ class ValidationEngine:
             
         except Exception as e:
             logger.error(f"Erreur notification validation partielle: {e}")
+            db.set_rollback_only()
     
     @staticmethod
     def _notify_rejection(demande_info: Dict[str, Any], validator_info: Dict[str, Any], comment: str):
@@ -466,6 +490,7 @@ class ValidationEngine:
             
         except Exception as e:
             logger.error(f"Erreur notification rejet: {e}")
+            db.set_rollback_only()
 
 # Instance globale du moteur de validation
 validation_engine = ValidationEngine()
@@ -6,7 +6,9 @@ import logging
 
 from models.demande import DemandeModel
 from models.user import UserModel
+from models.user_hierarchy import UserHierarchyModel
 from models.activity_log import ActivityLogModel
+from models.database import db
 from services.notification_service import notification_service
 from config.settings import WORKFLOW_CONFIG, has_permission
 
@@ -16,23 +18,23 @@ class WorkflowService:
     """Service for managing demande workflow"""
     
     @staticmethod
-    def submit_demande(demande_id: int, user_id: int) -> Tuple[bool, str]:
-        """Submit a demande for approval"""
+    def submit_demande(demande_id: int, user_id: int) -> Tuple[bool, str, bool]:
+        """Submit a demande for approval : (succès, message, avertissement budget)"""
         try:
             # Get demande and user info
             demande = DemandeModel.get_demande_by_id(demande_id)
             if not demande:
-                return False, "Demande non trouvée"
+                return False, "Demande non trouvée", False
             
             if demande['user_id'] != user_id:
-                return False, "Vous n'êtes pas autorisé à soumettre cette demande"
+                return False, "Vous n'êtes pas autorisé à soumettre cette demande", False
             
             if demande['status'] != 'brouillon':
-                return False, "Cette demande a déjà été soumise"
+                return False, "Cette demande a déjà été soumise", False
             
             user = UserModel.get_user_by_id(user_id)
             if not user:
-                return False, "Utilisateur non trouvé"
+                return False, "Utilisateur non trouvé", False
             
             # Determine next status and validators
             next_status, validators = WorkflowService._get_next_workflow_step(
@@ -40,38 +42,50 @@ class WorkflowService:
             )
             
             if not next_status:
-                return False, "Workflow non défini pour ce type de demande et ce rôle"
+                return False, "Workflow non défini pour ce type de demande et ce rôle", False
             
-            # Update demande status
-            success = DemandeModel.update_demande(demande_id, status=next_status)
-            if not success:
-                return False, "Erreur lors de la mise à jour"
+            # Réservation du budget, mise à jour du statut, journal et notifications dans une seule transaction
+            with db.unit_of_work() as uow:
+                reservation = DemandeModel.reserve_budget(demande_id)
+                if not reservation['allowed']:
+                    return False, reservation['message'], False
+                
+                # Update demande status
+                success = DemandeModel.update_demande(demande_id, status=next_status)
+                if not success:
+                    uow.set_rollback_only()
+                    return False, "Erreur lors de la mise à jour", False
             
-            # Log activity
-            ActivityLogModel.log_activity(
-                user_id, demande_id, 'soumission_demande',
-                f"Soumission demande {demande['nom_manifestation']}"
-            )
+                # Log activity
+                ActivityLogModel.log_activity(
+                    user_id, demande_id, 'soumission_demande',
+                    f"Soumission demande {demande['nom_manifestation']}"
+                )
             
-            # Send notifications to validators
-            if validators:
-                demande_info = {
-                    'id': demande_id,
-                    'nom_manifestation': demande['nom_manifestation'],
-                    'client': demande['client'],
-                    'montant': demande['montant'],
-                    'type_demande': demande['type_demande'],
-                    'user_nom': user['nom'],
-                    'user_prenom': user['prenom']
-                }
+                # Send notifications to validators
+                if validators:
+                    demande_info = {
+                        'id': demande_id,
+                        'nom_manifestation': demande['nom_manifestation'],
+                        'client': demande['client'],
+                        'montant': demande['montant'],
+                        'type_demande': demande['type_demande'],
+                        'user_nom': user['nom'],
+                        'user_prenom': user['prenom']
+                    }
                 
-                notification_service.notify_demande_submitted(demande_info, validators)
+                    notification_service.notify_demande_submitted(demande_info, validators)
             
-            return True, "Demande soumise avec succès"
+            # Journal ou notification en échec : la soumission a été annulée
+            if uow.rollback_only:
+                return False, "Erreur lors de l'enregistrement de la soumission, opération annulée", False
+            if reservation['message']:
+                return True, f"Demande soumise avec succès (⚠️ {reservation['message']})", True
+            return True, "Demande soumise avec succès", False
             
         except Exception as e:
             logger.error(f"Error submitting demande: {e}")
-            return False, f"Erreur: {e}"
+            return False, f"Erreur: {e}", False
     
     @staticmethod
     def validate_demande(demande_id: int, validator_id: int, action: str, 
@@ -130,16 +144,8 @@ class WorkflowService:
                 if validator_role != 'dr':
                     return False
                 
-                # DR can only validate their team's demandes
-                requester = UserModel.get_user_by_id(demande['user_id'])
-                if requester and requester.get('directeur_id') == validator['id']:
-                    return True
-                
-                # DR can validate their own demandes
-                if demande['user_id'] == validator['id']:
-                    return True
-                
-                return False
+                # DR can validate their own demandes and those of their whole team (any depth)
+                return UserHierarchyModel.is_in_subtree(validator['id'], demande['user_id'])
             
             elif demande_status == 'en_attente_financier':
                 # Financial validators can validate
@@ -364,14 +370,16 @@ class WorkflowService:
     
     @staticmethod
     def get_workflow_stats() -> Dict[str, Any]:
-        """Get workflow statistics"""
+        """Get workflow statistics (agrégats SQL sur toute la table demandes)"""
         try:
-            from models.demande import DemandeModel
-            
-            # Get all demandes
-            all_demandes = DemandeModel.get_demandes_for_user(None, 'admin')
-            
-            if all_demandes.empty:
+            by_status_rows = db.execute_query('''
+                SELECT status, COUNT(*) AS nb
+                FROM demandes
+                GROUP BY status
+                ORDER BY nb DESC
+            ''', fetch='all') or []
+            
+            if not by_status_rows:
                 return {
                     'total_demandes': 0,
                     'by_status': {},
@@ -380,24 +388,28 @@ class WorkflowService:
                     'average_processing_time': 0
                 }
             
+            by_type_rows = db.execute_query('''
+                SELECT type_demande, COUNT(*) AS nb
+                FROM demandes
+                GROUP BY type_demande
+                ORDER BY nb DESC
+            ''', fetch='all') or []
+            
+            by_status = {row['status']: row['nb'] for row in by_status_rows}
             stats = {
-                'total_demandes': len(all_demandes),
-                'by_status': all_demandes['status'].value_counts().to_dict(),
-                'by_type': all_demandes['type_demande'].value_counts().to_dict(),
-                'pending_validations': len(all_demandes[
-                    all_demandes['status'].isin(['en_attente_dr', 'en_attente_financier'])
-                ])
+                'total_demandes': sum(by_status.values()),
+                'by_status': by_status,
+                'by_type': {row['type_demande']: row['nb'] for row in by_type_rows},
+                'pending_validations': by_status.get('en_attente_dr', 0) + by_status.get('en_attente_financier', 0)
             }
             
-            # Calculate average processing time for completed demandes
-            completed = all_demandes[all_demandes['status'].isin(['validee', 'rejetee'])]
-            if not completed.empty:
-                completed['created_at'] = pd.to_datetime(completed['created_at'])
-                completed['updated_at'] = pd.to_datetime(completed['updated_at'])
-                processing_times = (completed['updated_at'] - completed['created_at']).dt.days
-                stats['average_processing_time'] = processing_times.mean()
-            else:
-                stats['average_processing_time'] = 0
+            # Calculate average processing time for completed demandes (jours entiers)
+            processing = db.execute_query('''
+                SELECT AVG(CAST(julianday(updated_at) - julianday(created_at) AS INTEGER)) AS avg_days
+                FROM demandes
+                WHERE status IN ('validee', 'rejetee')
+            ''', fetch='one')
+            stats['average_processing_time'] = (processing['avg_days'] if processing else None) or 0
             
             return stats
             
@@ -0,0 +1,83 @@
+"""
+Fixtures communes des tests : base SQLite temporaire migrée à la dernière version
+
+Usage:
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+# Ajouter le répertoire du projet au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import ConnectionPool, db
+from migrations.ledger import schema_ledger
+from utils.query_cache import query_cache
+
+@pytest.fixture
+def empty_db(tmp_path):
+    """Base vide (non migrée) : le pool global pointe sur un fichier temporaire"""
+    previous_path, previous_pool = db.db_path, db.pool
+    previous_up_to_date = schema_ledger._up_to_date
+    db.pool.close_all()
+    db.db_path = str(tmp_path / "test.db")
+    db.pool = ConnectionPool(db.db_path)
+    schema_ledger._up_to_date = False
+    query_cache.reset()
+    yield db
+    db.pool.close_all()
+    db.db_path, db.pool = previous_path, previous_pool
+    schema_ledger._up_to_date = previous_up_to_date
+    query_cache.reset()
+
+@pytest.fixture
+def fresh_db(empty_db):
+    """Base temporaire avec toutes les migrations appliquées"""
+    empty_db.init_database()
+    return empty_db
+
+@pytest.fixture
+def make_user(fresh_db):
+    """Créer un utilisateur directement en base, renvoie son id"""
+    counter = iter(range(1, 10_000))
+
+    def _make_user(role: str = 'tc', directeur_id=None, **fields) -> int:
+        n = next(counter)
+        return fresh_db.execute_query('''
+            INSERT INTO users (email, password_hash, nom, prenom, role, directeur_id, is_active)
+            VALUES (?, 'x', ?, ?, ?, ?, 1)
+        ''', (fields.get('email', f"user{n}@test.local"), fields.get('nom', f"Nom{n}"),
+              fields.get('prenom', f"Prenom{n}"), role, directeur_id), fetch='lastrowid')
+
+    return _make_user
+
+@pytest.fixture
+def make_demande(fresh_db):
+    """Créer une demande directement en base (sans workflow), renvoie son id"""
+    def _make_demande(user_id: int, montant: float = 100.0, status: str = 'brouillon',
+                      by: str = 'BY25', **fields) -> int:
+        columns = {
+            'user_id': user_id, 'type_demande': 'budget', 'nom_manifestation': 'Salon',
+            'client': 'Client', 'date_evenement': '2025-06-01', 'lieu': 'Paris',
+            'montant': montant, 'status': status, 'by': by,
+        }
+        columns.update(fields)
+        placeholders = ', '.join('?' for _ in columns)
+        return fresh_db.execute_query(
+            f"INSERT INTO demandes ({', '.join(columns)}) VALUES ({placeholders})",
+            tuple(columns.values()), fetch='lastrowid'
+        )
+
+    return _make_demande
+
+@pytest.fixture
+def set_budget(fresh_db):
+    """Allouer un budget à un utilisateur pour une année fiscale (UserBudgetModel.create_budget)"""
+    from models.user_budget import UserBudgetModel
+
+    def _set_budget(user_id: int, by: str, amount: float):
+        assert UserBudgetModel.create_budget(user_id, by, amount)
+
+    return _set_budget
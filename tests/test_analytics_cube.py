@@ -0,0 +1,61 @@
+"""
+Cube analytique : même périmètre que la liste des demandes et rafraîchissement hors cache
+"""
+import pytest
+
+from models.analytics_cube import AnalyticsCube, cube
+from models.database import db
+from models.demande import DemandeModel
+from models.participant import ParticipantModel
+
+STATUSES = ('brouillon', 'en_attente_dr', 'en_attente_financier', 'validee', 'rejetee')
+
+@pytest.fixture
+def demandes(make_user, make_demande):
+    tc = make_user('tc')
+    other = make_user('tc')
+    for status in STATUSES:
+        make_demande(tc, status=status, montant=100)
+    shared = make_demande(other, status='validee', montant=50)
+    ParticipantModel.add_participant(shared, tc, other)
+    return {'tc': tc, 'other': other}
+
+def _cube_total(user_id, role, filters=None):
+    rows = cube.slice([], filters, (user_id, role))
+    return rows[0]['nb'] if rows else 0
+
+@pytest.mark.parametrize('role', ['admin', 'dg', 'dr_financier'])
+def test_cube_matches_list_scope(make_user, demandes, role):
+    user_id = make_user(role)
+
+    assert AnalyticsCube.supports_role(role)
+    assert _cube_total(user_id, role) == DemandeModel.count_demandes_for_user(user_id, role)
+    for status in STATUSES:
+        assert (_cube_total(user_id, role, {'status': status})
+                == DemandeModel.count_demandes_for_user(user_id, role, {'status_filter': status}))
+
+@pytest.mark.parametrize('role', ['tc', 'marketing', 'dr'])
+def test_roles_with_participations_not_served_by_cube(demandes, role):
+    assert not AnalyticsCube.supports_role(role)
+    assert cube.slice([], None, (demandes['tc'], role)) == []
+
+def test_slice_sees_new_writes(make_user, make_demande, demandes):
+    admin = make_user('admin')
+    before = _cube_total(admin, 'admin')
+    make_demande(demandes['tc'], status='validee')
+
+    assert _cube_total(admin, 'admin') == before + 1
+    assert cube.verify() == []
+
+def test_cached_read_does_not_refresh(make_user, make_demande, demandes):
+    admin = make_user('admin')
+    _cube_total(admin, 'admin')
+    make_demande(demandes['tc'])
+
+    # Lecture mémoïsée seule : le journal n'est pas intégré (aucune écriture)
+    cube._slice((), (), (admin, 'admin'))
+    pending = db.execute_query("SELECT COUNT(*) FROM analytics_cube_log", fetch='one')[0]
+    assert pending > 0
+
+    assert cube.refresh() == pending
+    assert cube.refresh() == 0
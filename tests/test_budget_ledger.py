@@ -0,0 +1,121 @@
+"""
+Réservation du budget à la soumission (BudgetLedgerModel.reserve) et registre budget_ledger
+"""
+import pytest
+
+from models.budget_ledger import BudgetLedgerModel
+from models.demande import DemandeModel
+
+@pytest.fixture
+def dr_with_budget(make_user, set_budget):
+    dr_id = make_user('dr')
+    set_budget(dr_id, 'BY25', 1000)
+    return dr_id
+
+def test_reserve_within_budget(dr_with_budget):
+    result = BudgetLedgerModel.reserve(dr_with_budget, 'BY25', 800, policy='block')
+    assert result['allowed'] and result['reserved'] and not result['over_budget']
+    assert result['available'] == 1000
+
+@pytest.mark.parametrize('policy, allowed', [('warn', True), ('block', False)])
+def test_reserve_over_budget(dr_with_budget, make_demande, policy, allowed):
+    make_demande(dr_with_budget, 700, status='en_attente_financier')
+    result = BudgetLedgerModel.reserve(dr_with_budget, 'BY25', 400, policy=policy)
+    assert result['allowed'] is allowed
+    assert result['over_budget'] and not result['reserved']
+    assert result['available'] == 300
+    assert '300' in result['message']
+
+def test_reserve_without_budget_is_not_checked(make_user):
+    tc_id = make_user('tc')
+    result = BudgetLedgerModel.reserve(tc_id, 'BY25', 5000, policy='block')
+    assert result == {'allowed': True, 'reserved': False, 'over_budget': False, 'available': None, 'message': ''}
+
+def test_reserve_excludes_amount_already_pending(dr_with_budget, make_demande):
+    make_demande(dr_with_budget, 800, status='en_attente_financier')
+    assert BudgetLedgerModel.get_entry(dr_with_budget, 'BY25')['pending'] == 800
+
+    result = BudgetLedgerModel.reserve(dr_with_budget, 'BY25', 800, policy='block', already_pending=800)
+    assert result['allowed'] and result['reserved']
+    assert result['available'] == 1000
+
+def test_submit_dr_demande_already_pending_is_not_counted_twice(dr_with_budget, make_demande, monkeypatch):
+    """Demande d'un DR créée directement en en_attente_financier, puis soumise"""
+    from config.settings import budget_config
+    monkeypatch.setattr(budget_config, 'reservation_policy', 'block')
+    demande_id = make_demande(dr_with_budget, 800, status='en_attente_financier')
+
+    success, message, warning = DemandeModel.submit_demande(demande_id, dr_with_budget)
+    assert success and not warning, message
+    entry = BudgetLedgerModel.get_entry(dr_with_budget, 'BY25')
+    assert entry['pending'] == 800
+
+def test_submit_blocked_over_budget(dr_with_budget, make_demande, monkeypatch):
+    from config.settings import budget_config
+    monkeypatch.setattr(budget_config, 'reservation_policy', 'block')
+    make_demande(dr_with_budget, 600, status='validee')
+    demande_id = make_demande(dr_with_budget, 800)
+
+    success, message, warning = DemandeModel.submit_demande(demande_id, dr_with_budget)
+    assert not success and not warning
+    assert '800' in message
+    assert DemandeModel.get_demande_by_id(demande_id)['status'] == 'brouillon'
+    assert BudgetLedgerModel.verify() == []
+
+def test_ledger_matches_sources_after_workflow(dr_with_budget, make_demande, fresh_db):
+    first = make_demande(dr_with_budget, 300)
+    second = make_demande(dr_with_budget, 200, status='en_attente_dr')
+    fresh_db.execute_query("UPDATE demandes SET status = 'en_attente_financier' WHERE id = ?", (first,))
+    fresh_db.execute_query("UPDATE demandes SET status = 'validee' WHERE id = ?", (second,))
+    fresh_db.execute_query("UPDATE demandes SET montant = 350, by = 'BY26' WHERE id = ?", (first,))
+    fresh_db.execute_query("DELETE FROM demandes WHERE id = ?", (second,))
+    assert BudgetLedgerModel.verify() == []
+
+def _create_as_dr(dr_id, montant):
+    from controllers.demande_controller import DemandeController
+    return DemandeController.create_demande(
+        user_id=dr_id, type_demande='budget', nom_manifestation='Salon', client='Client',
+        date_evenement='2025-06-01', lieu='Paris', montant=montant, by='BY25',
+    )
+
+@pytest.mark.parametrize('policy, status', [('warn', 'en_attente_financier'), ('block', 'brouillon')])
+def test_dr_creation_goes_through_reservation(dr_with_budget, make_demande, monkeypatch, policy, status):
+    """Création par un DR directement en en_attente_financier : même contrôle que la soumission"""
+    from config.settings import budget_config
+    monkeypatch.setattr(budget_config, 'reservation_policy', policy)
+    make_demande(dr_with_budget, 600, status='validee')
+
+    success, demande_id = _create_as_dr(dr_with_budget, 800)
+    assert success
+    assert DemandeModel.get_demande_by_id(demande_id)['status'] == status
+    assert BudgetLedgerModel.verify() == []
+
+def test_admin_creation_for_dr_blocked_over_budget(dr_with_budget, make_user, make_demande, monkeypatch, fresh_db):
+    from config.settings import budget_config
+    monkeypatch.setattr(budget_config, 'reservation_policy', 'block')
+    admin_id = make_user('admin')
+    make_demande(dr_with_budget, 600, status='validee')
+
+    success, demande_id = DemandeModel.create_demande_as_admin(
+        admin_id, dr_with_budget, 'budget', 'Salon', 'Client', '2025-06-01', 'Paris', 800, by='BY25'
+    )
+    assert not success and demande_id is None
+    assert fresh_db.execute_query("SELECT COUNT(*) FROM demandes", fetch='one')[0] == 1
+
+    success, demande_id = DemandeModel.create_demande_as_admin(
+        admin_id, dr_with_budget, 'budget', 'Salon', 'Client', '2025-06-01', 'Paris', 300, by='BY25'
+    )
+    assert success
+    assert DemandeModel.get_demande_by_id(demande_id)['status'] == 'en_attente_financier'
+    assert BudgetLedgerModel.get_entry(dr_with_budget, 'BY25')['pending'] == 300
+
+def test_submit_over_budget_warns(dr_with_budget, make_demande, monkeypatch):
+    from config.settings import budget_config
+    monkeypatch.setattr(budget_config, 'reservation_policy', 'warn')
+    make_demande(dr_with_budget, 600, status='validee')
+    demande_id = make_demande(dr_with_budget, 800)
+
+    success, message, warning = DemandeModel.submit_demande(demande_id, dr_with_budget)
+    assert success and warning
+    assert 'insuffisant' in message
+    assert DemandeModel.get_demande_by_id(demande_id)['status'] == 'en_attente_financier'
@@ -0,0 +1,85 @@
+"""
+Recherche plein texte (demandes_fts) et filtres de recherche des demandes
+"""
+import pytest
+
+from models.demande_search import DemandeSearchModel
+from utils.filter_sql import build_demande_filters
+
+def _search_ids(db, query, columns=None):
+    conditions, params = build_demande_filters({'search_query': query}, columns)
+    rows = db.execute_query(
+        f"SELECT d.id FROM demandes d JOIN users u ON u.id = d.user_id WHERE {' AND '.join(conditions)} ORDER BY d.id",
+        tuple(params), fetch='all'
+    )
+    return [row['id'] for row in rows]
+
+def test_search_matches_word_prefix_without_accents(fresh_db, make_user, make_demande):
+    user_id = make_user('tc')
+    salon = make_demande(user_id, nom_manifestation="Salon de l'Événement")
+    make_demande(user_id, nom_manifestation="Congrès")
+    assert _search_ids(fresh_db, "even") == [salon]
+    assert _search_ids(fresh_db, "SAL evenement") == [salon]
+    # Début de mot uniquement (plus de recherche par sous-chaîne)
+    assert _search_ids(fresh_db, "alon") == []
+
+def test_search_covers_dropdown_columns(fresh_db, make_user, make_demande):
+    user_id = make_user('tc')
+    ids = {
+        'budget': make_demande(user_id, budget='budget_marketing'),
+        'categorie': make_demande(user_id, categorie='salon_professionnel'),
+        'typologie_client': make_demande(user_id, typologie_client='grand_compte'),
+        'groupe_groupement': make_demande(user_id, groupe_groupement='groupe_alpha'),
+    }
+    assert _search_ids(fresh_db, "marketing") == [ids['budget']]
+    assert _search_ids(fresh_db, "professionnel") == [ids['categorie']]
+    assert _search_ids(fresh_db, "grand compte") == [ids['typologie_client']]
+    assert _search_ids(fresh_db, "alpha", ['groupe_groupement']) == [ids['groupe_groupement']]
+    assert _search_ids(fresh_db, "alpha", ['budget']) == []
+
+def test_search_requester_identity(fresh_db, make_user, make_demande):
+    user_id = make_user('tc', nom='Dupont')
+    demande_id = make_demande(user_id)
+    make_demande(make_user('tc'))
+    assert _search_ids(fresh_db, "dupon", ['nom']) == [demande_id]
+
+def test_index_follows_updates_and_deletes(fresh_db, make_user, make_demande):
+    user_id = make_user('tc')
+    demande_id = make_demande(user_id, client='Acme')
+    fresh_db.execute_query("UPDATE demandes SET client = 'Globex', categorie = 'atelier' WHERE id = ?", (demande_id,))
+    assert _search_ids(fresh_db, "acme") == []
+    assert _search_ids(fresh_db, "globex atelier") == [demande_id]
+    fresh_db.execute_query("DELETE FROM demandes WHERE id = ?", (demande_id,))
+    assert _search_ids(fresh_db, "globex") == []
+    fresh_db.execute_query("INSERT INTO demandes_fts (demandes_fts) VALUES ('integrity-check')")
+
+def test_search_ranked_within_visibility(fresh_db, make_user, make_demande):
+    owner = make_user('tc')
+    other = make_user('tc')
+    mine = make_demande(owner, nom_manifestation="Forum emploi")
+    make_demande(other, nom_manifestation="Forum emploi")
+    results = DemandeSearchModel.search("forum", owner, 'tc')
+    assert [row['id'] for row in results] == [mine]
+    assert '**' in results[0]['extrait']
+
+def test_migration_0017_reindexes_existing_demandes(empty_db):
+    from migrations.ledger import schema_ledger
+    schema_ledger.migrate(target_version=16)
+    user_id = empty_db.execute_query(
+        "INSERT INTO users (email, password_hash, nom, prenom, role) VALUES ('a@test.local', 'x', 'A', 'B', 'tc')",
+        fetch='lastrowid'
+    )
+    demande_id = empty_db.execute_query('''
+        INSERT INTO demandes (user_id, type_demande, nom_manifestation, client, date_evenement, lieu, montant, categorie)
+        VALUES (?, 'budget', 'Salon', 'Client', '2025-06-01', 'Paris', 100, 'atelier_formation')
+    ''', (user_id,), fetch='lastrowid')
+
+    assert schema_ledger.migrate() >= 1
+    assert _search_ids(empty_db, "formation") == [demande_id]
+
+def test_search_error_propagates(fresh_db, make_user):
+    user_id = make_user('tc')
+    fresh_db.execute_query("DROP TABLE demandes_fts")
+    with pytest.raises(RuntimeError):
+        DemandeSearchModel.search("forum", user_id, 'tc')
+    assert DemandeSearchModel.rebuild() is False
@@ -0,0 +1,89 @@
+"""
+Agrégats du tableau de bord (demande_stats) : maintenance par triggers et périmètres
+"""
+import pytest
+
+from models.demande import DemandeModel
+from models.demande_stats import DemandeStatsModel
+
+def _visible_count(db, user_id, role, by=None):
+    condition, params = DemandeModel._visibility_condition(user_id, role)
+    query = "SELECT COUNT(*) FROM demandes d WHERE " + (condition or "1")
+    if by:
+        query += " AND d.by = ?"
+        params = [*params, by]
+    return db.execute_query(query, tuple(params), fetch='one')[0]
+
+@pytest.fixture
+def team(fresh_db, make_user, make_demande):
+    dr_id = make_user('dr')
+    tc_id = make_user('tc', directeur_id=dr_id)
+    sub_id = make_user('tc', directeur_id=tc_id)
+    outsider = make_user('marketing')
+    own = make_demande(tc_id, 100, status='validee')
+    make_demande(sub_id, 200, status='en_attente_dr', by='BY26')
+    foreign = make_demande(outsider, 300, status='en_attente_financier')
+    make_demande(outsider, 400, by='BY26')
+    for demande_id, participant in ((own, tc_id), (foreign, tc_id), (foreign, sub_id), (own, outsider)):
+        fresh_db.execute_query(
+            "INSERT INTO demande_participants (demande_id, user_id, added_by_user_id) VALUES (?, ?, ?)",
+            (demande_id, participant, participant)
+        )
+    return {'dr': dr_id, 'tc': tc_id, 'sub': sub_id, 'marketing': outsider}
+
+@pytest.mark.parametrize('who, role', [('tc', 'tc'), ('sub', 'tc'), ('dr', 'dr'), ('marketing', 'marketing'),
+                                       ('tc', 'dg'), ('tc', 'dr_financier'), ('tc', 'admin')])
+@pytest.mark.parametrize('by', [None, 'BY25', 'BY26'])
+def test_stats_match_list_scope(fresh_db, team, who, role, by):
+    stats = DemandeStatsModel.get_stats(team[who], role, by)
+    assert stats['total_demandes'] == _visible_count(fresh_db, team[who], role, by)
+
+def test_stats_include_participations(team):
+    stats = DemandeStatsModel.get_stats(team['tc'], 'tc')
+    # Sa demande validée (dont il est aussi participant) + la demande d'un autre où il participe
+    assert stats['total_demandes'] == 2
+    assert stats['validees'] == 1 and stats['en_attente_financier'] == 1
+    assert stats['montant_valide'] == 100
+
+def test_verify_after_writes(fresh_db, team, make_demande):
+    demande_id = make_demande(team['tc'], 50)
+    fresh_db.execute_query("UPDATE demandes SET status = 'en_attente_dr', montant = 75, by = 'BY26' WHERE id = ?",
+                           (demande_id,))
+    fresh_db.execute_query("UPDATE demandes SET user_id = ? WHERE id = ?", (team['sub'], demande_id))
+    fresh_db.execute_query("UPDATE users SET directeur_id = NULL WHERE id = ?", (team['sub'],))
+    fresh_db.execute_query("DELETE FROM demandes WHERE id = ?", (demande_id,))
+    assert DemandeStatsModel.verify() == []
+
+def test_rebuild_repairs_table(fresh_db, team):
+    fresh_db.execute_query("UPDATE demande_stats SET nb = nb + 1")
+    assert DemandeStatsModel.verify()
+    assert DemandeStatsModel.rebuild()
+    assert DemandeStatsModel.verify() == []
+
+def test_user_delete_cascade_leaves_no_stale_rows(fresh_db, team):
+    fresh_db.execute_query("DELETE FROM users WHERE id = ?", (team['sub'],))
+    fresh_db.execute_query("DELETE FROM users WHERE id = ?", (team['dr'],))
+    assert fresh_db.execute_query("SELECT COUNT(*) FROM demande_stats WHERE user_id IN (?, ?)",
+                                  (team['sub'], team['dr']), fetch='one')[0] == 0
+    assert DemandeStatsModel.verify() == []
+
+def test_migration_0019_repairs_stale_rows(empty_db):
+    from migrations.ledger import schema_ledger
+    schema_ledger.migrate(target_version=18)
+    dr_id = empty_db.execute_query(
+        "INSERT INTO users (email, password_hash, nom, prenom, role) VALUES ('dr@test.local', 'x', 'D', 'R', 'dr')",
+        fetch='lastrowid'
+    )
+    tc_id = empty_db.execute_query(
+        "INSERT INTO users (email, password_hash, nom, prenom, role, directeur_id) VALUES ('tc@test.local', 'x', 'T', 'C', 'tc', ?)",
+        (dr_id,), fetch='lastrowid'
+    )
+    empty_db.execute_query('''
+        INSERT INTO demandes (user_id, type_demande, nom_manifestation, client, date_evenement, lieu, montant)
+        VALUES (?, 'budget', 'Salon', 'Client', '2025-06-01', 'Paris', 100)
+    ''', (tc_id,))
+    empty_db.execute_query("DELETE FROM users WHERE id = ?", (tc_id,))
+    assert len(DemandeStatsModel.verify()) == 1  # ligne du créateur supprimé restée en place
+
+    schema_ledger.migrate()
+    assert DemandeStatsModel.verify() == []
@@ -0,0 +1,75 @@
+"""
+Table de visibilité des demandes (demande_visibility) et périmètre d'équipe des DR
+"""
+from models.demande_visibility import DemandeVisibilityModel
+
+def _visible_ids(db, user_id, role):
+    condition, params = DemandeVisibilityModel.visibility_condition(user_id, role)
+    rows = db.execute_query(f"SELECT d.id FROM demandes d WHERE {condition} ORDER BY d.id",
+                            tuple(params), fetch='all')
+    return [row['id'] for row in rows]
+
+def test_table_follows_writes(fresh_db, make_user, make_demande):
+    dr_id = make_user('dr')
+    tc_id = make_user('tc', directeur_id=dr_id)
+    other_id = make_user('tc')
+    demande_id = make_demande(tc_id)
+    make_demande(other_id)
+    fresh_db.execute_query("INSERT INTO demande_participants (demande_id, user_id, added_by_user_id) VALUES (?, ?, ?)",
+                           (demande_id, other_id, tc_id))
+    fresh_db.execute_query("UPDATE demandes SET user_id = ? WHERE id = ?", (other_id, demande_id))
+    fresh_db.execute_query("UPDATE users SET directeur_id = NULL WHERE id = ?", (tc_id,))
+    fresh_db.execute_query("DELETE FROM demande_participants WHERE demande_id = ?", (demande_id,))
+    assert DemandeVisibilityModel.check() == {'manquantes': 0, 'en_trop': 0}
+    assert fresh_db.execute_query("SELECT COUNT(*) FROM demande_visibility WHERE reason = 'equipe'",
+                                  fetch='one')[0] == 0
+
+def test_scopes_by_role(fresh_db, make_user, make_demande):
+    dr_id = make_user('dr')
+    tc_id = make_user('tc', directeur_id=dr_id)
+    sub_tc_id = make_user('tc', directeur_id=tc_id)
+    outsider = make_user('tc')
+    own = make_demande(tc_id)
+    deep = make_demande(sub_tc_id)
+    foreign = make_demande(outsider)
+    fresh_db.execute_query("INSERT INTO demande_participants (demande_id, user_id, added_by_user_id) VALUES (?, ?, ?)",
+                           (foreign, tc_id, outsider))
+
+    assert _visible_ids(fresh_db, tc_id, 'tc') == [own, foreign]
+    # DR : toute sa hiérarchie (user_hierarchy), pas seulement ses subordonnés directs
+    assert _visible_ids(fresh_db, dr_id, 'dr') == [own, deep]
+    fresh_db.execute_query("UPDATE users SET directeur_id = ? WHERE id = ?", (dr_id, outsider))
+    assert _visible_ids(fresh_db, dr_id, 'dr') == [own, deep, foreign]
+    assert DemandeVisibilityModel.visibility_condition(dr_id, 'admin') is None
+
+def test_rebuild_repairs_table(fresh_db, make_user, make_demande):
+    make_demande(make_user('tc'))
+    fresh_db.execute_query("DELETE FROM demande_visibility")
+    assert DemandeVisibilityModel.check()['manquantes'] == 1
+    assert DemandeVisibilityModel.rebuild()['success']
+    assert DemandeVisibilityModel.check() == {'manquantes': 0, 'en_trop': 0}
+
+def test_migration_0018_drops_team_rows(empty_db):
+    from migrations.ledger import schema_ledger
+    schema_ledger.migrate(target_version=17)
+    dr_id = empty_db.execute_query(
+        "INSERT INTO users (email, password_hash, nom, prenom, role) VALUES ('dr@test.local', 'x', 'D', 'R', 'dr')",
+        fetch='lastrowid'
+    )
+    tc_id = empty_db.execute_query(
+        "INSERT INTO users (email, password_hash, nom, prenom, role, directeur_id) VALUES ('tc@test.local', 'x', 'T', 'C', 'tc', ?)",
+        (dr_id,), fetch='lastrowid'
+    )
+    empty_db.execute_query('''
+        INSERT INTO demandes (user_id, type_demande, nom_manifestation, client, date_evenement, lieu, montant)
+        VALUES (?, 'budget', 'Salon', 'Client', '2025-06-01', 'Paris', 100)
+    ''', (tc_id,))
+    assert empty_db.execute_query("SELECT COUNT(*) FROM demande_visibility WHERE reason = 'equipe'", fetch='one')[0] == 1
+
+    schema_ledger.migrate()
+    assert empty_db.execute_query("SELECT COUNT(*) FROM demande_visibility WHERE reason = 'equipe'", fetch='one')[0] == 0
+    triggers = {row['name'] for row in empty_db.execute_query(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_visibility%'", fetch='all')}
+    assert 'trg_visibility_directeur' not in triggers
+    assert {'trg_visibility_demande_insert', 'trg_visibility_demande_owner'} <= triggers
+    assert DemandeVisibilityModel.check() == {'manquantes': 0, 'en_trop': 0}
@@ -0,0 +1,43 @@
+"""
+Compteurs dropdown_usage : triggers comparés au recomptage des demandes (verify)
+"""
+from models.database import db
+from models.dropdown_usage import DropdownUsageModel
+
+def test_counts_follow_demande_writes(make_user, make_demande):
+    user_id = make_user('tc')
+    first = make_demande(user_id, budget='salon', region='nord_est', categorie='')
+    make_demande(user_id, budget='salon', region='sud')
+    assert DropdownUsageModel.get_counts('budget')['salon'] == 2
+    assert 'nord_est' in DropdownUsageModel.get_counts('region')
+    assert DropdownUsageModel.get_count('categorie', '') == 0
+
+    db.execute_query("UPDATE demandes SET budget = 'seminaire', region = 'sud' WHERE id = ?", (first,))
+    assert DropdownUsageModel.get_count('budget', 'salon') == 1
+    assert DropdownUsageModel.get_count('budget', 'seminaire') == 1
+    assert DropdownUsageModel.get_count('region', 'sud') == 2
+    assert 'nord_est' not in DropdownUsageModel.get_counts('region')
+
+    db.execute_query("DELETE FROM demandes WHERE id = ?", (first,))
+    assert 'seminaire' not in DropdownUsageModel.get_counts('budget')
+    assert DropdownUsageModel.verify() == []
+
+def test_user_delete_cascade_keeps_counts(make_user, make_demande):
+    user_id = make_user('tc')
+    make_demande(user_id, budget='salon')
+    db.execute_query("DELETE FROM users WHERE id = ?", (user_id,))
+    assert DropdownUsageModel.verify() == []
+
+def test_verify_detects_drift_and_rebuild_repairs(make_user, make_demande):
+    user_id = make_user('tc')
+    make_demande(user_id, budget='salon')
+    db.execute_query("UPDATE dropdown_usage SET count = 5 WHERE category = 'budget' AND value = 'salon'")
+    db.execute_query("INSERT INTO dropdown_usage (category, value, count) VALUES ('region', 'fantome', 1)")
+
+    differences = {(row['category'], row['value']): row for row in DropdownUsageModel.verify()}
+    assert differences[('budget', 'salon')]['count_attendu'] == 1
+    assert differences[('budget', 'salon')]['count_table'] == 5
+    assert differences[('region', 'fantome')]['count_attendu'] is None
+
+    assert DropdownUsageModel.rebuild()
+    assert DropdownUsageModel.verify() == []
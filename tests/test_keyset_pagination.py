@@ -0,0 +1,81 @@
+"""
+Pagination par clé (updated_at, id) de la liste des demandes : bornes des pages
+"""
+import pytest
+
+from models.database import db
+from models.demande import DemandeModel
+
+def _all_pages(user_id, role, page_size, filters=None):
+    pages, cursor = [], None
+    while True:
+        page = DemandeModel.get_demandes_page(user_id, role, filters, page_size=page_size, after=cursor)
+        pages.append([int(i) for i in page['rows']['id']] if not page['rows'].empty else [])
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            return pages
+        cursor = page['next_cursor']
+        assert cursor is not None
+
+def _expected_order(user_id):
+    rows = db.execute_query(
+        "SELECT id FROM demandes WHERE user_id = ? ORDER BY updated_at DESC, id DESC",
+        (user_id,), fetch='all'
+    )
+    return [row['id'] for row in rows]
+
+@pytest.fixture
+def admin(make_user):
+    return make_user('admin')
+
+@pytest.mark.parametrize('count, page_size, sizes', [
+    (0, 3, [0]),
+    (2, 3, [2]),
+    (3, 3, [3]),
+    (6, 3, [3, 3]),
+    (7, 3, [3, 3, 1]),
+])
+def test_page_sizes_at_boundaries(admin, make_user, make_demande, count, page_size, sizes):
+    owner = make_user('tc')
+    for n in range(count):
+        make_demande(owner, updated_at=f"2025-01-{n + 1:02d} 10:00:00")
+
+    pages = _all_pages(admin, 'admin', page_size)
+
+    assert [len(page) for page in pages] == sizes
+    assert [i for page in pages for i in page] == _expected_order(owner)
+
+def test_ties_on_updated_at_split_across_pages(admin, make_user, make_demande):
+    """Même updated_at pour toutes les demandes : l'id départage, sans doublon ni oubli"""
+    owner = make_user('tc')
+    ids = [make_demande(owner, updated_at="2025-03-01 09:00:00") for _ in range(5)]
+
+    pages = _all_pages(admin, 'admin', 2)
+
+    expected = sorted(ids, reverse=True)
+    assert pages == [expected[0:2], expected[2:4], expected[4:]]
+
+def test_update_between_pages_does_not_duplicate(admin, make_user, make_demande):
+    owner = make_user('tc')
+    ids = [make_demande(owner, updated_at=f"2025-01-{n + 1:02d} 10:00:00") for n in range(4)]
+
+    first = DemandeModel.get_demandes_page(admin, 'admin', page_size=2)
+    first_ids = [int(i) for i in first['rows']['id']]
+    # Une demande de la première page est modifiée : elle remonte mais ne revient pas après le curseur
+    db.execute_query("UPDATE demandes SET updated_at = '2025-02-01 10:00:00' WHERE id = ?", (first_ids[0],))
+    second = DemandeModel.get_demandes_page(admin, 'admin', page_size=2, after=first['next_cursor'])
+
+    second_ids = [int(i) for i in second['rows']['id']]
+    assert not set(first_ids) & set(second_ids)
+    assert sorted(first_ids + second_ids) == sorted(ids)
+    assert not second['has_more']
+
+def test_pages_respect_visibility(make_user, make_demande):
+    tc = make_user('tc')
+    other = make_user('tc')
+    own = [make_demande(tc, updated_at=f"2025-01-{n + 1:02d} 10:00:00") for n in range(3)]
+    make_demande(other)
+
+    pages = _all_pages(tc, 'tc', 2)
+
+    assert [i for page in pages for i in page] == sorted(own, reverse=True)
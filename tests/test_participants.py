@@ -0,0 +1,41 @@
+"""
+Ajout de participants en lot : seuls les nouveaux participants sont comptés
+"""
+from models.participant import ParticipantModel
+
+def test_existing_and_duplicate_participants_not_counted(make_user, make_demande):
+    owner = make_user('tc')
+    first, second, third = make_user('tc'), make_user('tc'), make_user('tc')
+    demande_id = make_demande(owner)
+    assert ParticipantModel.add_participant(demande_id, first, owner)
+
+    result = ParticipantModel.add_multiple_participants(demande_id, [first, second, third, second], owner)
+
+    assert result['success_count'] == 2
+    assert result['added_users'] == [second, third]
+    assert result['already_count'] == 2
+    assert result['failed_count'] == 0
+    participants = {p['user_id'] for p in ParticipantModel.get_participants(demande_id)}
+    assert participants == {first, second, third}
+
+def test_all_participants_already_present(make_user, make_demande):
+    owner = make_user('tc')
+    participant = make_user('tc')
+    demande_id = make_demande(owner)
+    ParticipantModel.add_multiple_participants(demande_id, [participant], owner)
+
+    result = ParticipantModel.add_multiple_participants(demande_id, [participant], owner)
+
+    assert result['success_count'] == 0
+    assert result['added_users'] == []
+    assert result['already_count'] == 1
+
+def test_unknown_user_reported_as_failed(make_user, make_demande):
+    owner = make_user('tc')
+    participant = make_user('tc')
+    demande_id = make_demande(owner)
+
+    result = ParticipantModel.add_multiple_participants(demande_id, [participant, 999_999], owner)
+
+    assert result['added_users'] == [participant]
+    assert result['failed_users'] == [999_999]
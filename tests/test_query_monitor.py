@@ -0,0 +1,142 @@
+"""
+Instrumentation des requêtes : vérification des plans et résolution de l'appelant
+"""
+import threading
+
+import pytest
+
+from config.settings import db_config
+from models.database import db
+from utils import query_monitor as monitor_module
+from utils.query_monitor import query_monitor
+
+@pytest.fixture
+def monitor(fresh_db, monkeypatch):
+    if not db_config.query_monitoring:
+        pytest.skip("Instrumentation désactivée (BUDGET_QUERY_MONITORING=0)")
+    monkeypatch.setattr(db_config, 'full_scan_check', True)
+    monkeypatch.setattr(db_config, 'slow_query_threshold_ms', 10_000.0)
+    monkeypatch.setattr(db_config, 'slow_query_log_path', None)
+    query_monitor.reset()
+    yield query_monitor
+    query_monitor.reset()
+
+def _count_calls(monkeypatch, name):
+    calls = []
+    original = getattr(monitor_module, name)
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(monitor_module, name, wrapper)
+    return calls
+
+def _list_users(user_id):
+    return db.execute_query("SELECT id FROM users WHERE id = ?", (user_id,), fetch='all')
+
+def test_stack_walked_once_per_normalized_query(monitor, monkeypatch):
+    walks = _count_calls(monkeypatch, '_find_caller')
+    monitor.start_rerun('test')
+    for user_id in range(5):
+        _list_users(user_id)
+    summary = monitor.end_rerun()
+
+    assert len(walks) == 1
+    assert summary['query_count'] == 5
+    assert len(summary['by_caller']) == 1
+    assert list(summary['by_caller'].values()) == [5]
+
+def test_later_executions_reuse_known_caller(monitor):
+    monitor.start_rerun('test')
+    for user_id in range(3):
+        _list_users(user_id)
+    summary = monitor.end_rerun()
+
+    assert summary['by_caller'] == {f"{__name__}:_list_users": 3}
+
+def test_slow_query_resolves_its_caller(monitor, monkeypatch):
+    monkeypatch.setattr(db_config, 'full_scan_check', False)
+    monkeypatch.setattr(db_config, 'slow_query_threshold_ms', 0.0)
+    monitor.start_rerun('test')
+    _list_users(1)
+    stats = monitor.get_current_rerun_stats()
+    monitor.end_rerun()
+
+    assert stats['queries'][0]['caller'] == f"{__name__}:_list_users"
+
+def test_fast_queries_without_plan_check_skip_the_stack(monitor, monkeypatch):
+    monkeypatch.setattr(db_config, 'full_scan_check', False)
+    walks = _count_calls(monkeypatch, '_find_caller')
+    monitor.start_rerun('test')
+    _list_users(1)
+    summary = monitor.end_rerun()
+
+    assert walks == []
+    assert summary['by_caller'] == {'non résolu': 1}
+
+def test_plan_checked_once_across_threads(monitor, monkeypatch):
+    explains = []
+    explain = monitor.explain
+
+    def counting_explain(conn, sql, params=None):
+        if 'FROM users WHERE id' in sql:
+            explains.append(sql)
+        return explain(conn, sql, params)
+
+    monkeypatch.setattr(monitor, 'explain', counting_explain)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        for user_id in range(10):
+            _list_users(user_id)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(explains) == 1
+
+def _explained(monitor, monkeypatch):
+    explains = []
+    explain = monitor.explain
+
+    def counting_explain(conn, sql, params=None):
+        explains.append(sql)
+        return explain(conn, sql, params)
+
+    monkeypatch.setattr(monitor, 'explain', counting_explain)
+    return explains
+
+def test_plan_checked_for_filtered_reads_only(monitor, monkeypatch, make_user):
+    user_id = make_user('tc')
+    explains = _explained(monitor, monkeypatch)
+
+    db.execute_query("UPDATE users SET nom = 'Test' WHERE id = ?", (user_id,))
+    db.execute_query("SELECT COUNT(*) AS n FROM users", fetch='one')
+    assert explains == []
+
+    _list_users(user_id)
+    assert explains == ["SELECT id FROM users WHERE id = ?"]
+
+def test_writes_do_not_report_trigger_scans(monitor, make_user, make_demande):
+    user_id = make_user('tc')
+    make_demande(user_id)
+    db.execute_query("DELETE FROM users WHERE id = ?", (user_id,))
+
+    assert not [sql for sql in monitor.get_full_scans() if not sql.upper().startswith(('SELECT', 'WITH'))]
+
+def test_warnings_name_the_routed_page(monitor, caplog):
+    db.execute_query("CREATE TABLE test_parcours (valeur TEXT)")
+    monitor.start_rerun('dashboard')
+    monitor.set_page('validations')
+    with caplog.at_level('WARNING', logger=monitor_module.__name__):
+        db.execute_query("SELECT valeur FROM test_parcours WHERE valeur = ?", ('x',), fetch='all')
+    monitor.end_rerun()
+
+    assert any('Parcours complet' in message and '(page validations)' in message
+               for message in caplog.messages)
+    assert 'validations' in monitor.get_page_stats()
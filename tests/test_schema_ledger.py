@@ -0,0 +1,73 @@
+"""
+Registre des migrations : base neuve, reprise, sommes de contrôle et échec d'une migration
+"""
+import logging
+
+import pytest
+
+from migrations import ledger
+from migrations.ledger import Migration, get_migrations, schema_ledger
+
+LATEST = get_migrations()[-1].version
+
+def _rerun_migrate(**kwargs):
+    schema_ledger._up_to_date = False
+    return schema_ledger.migrate(**kwargs)
+
+def test_fresh_database_applies_every_migration(empty_db):
+    assert schema_ledger.current_version() == 0
+
+    assert schema_ledger.migrate() == LATEST
+
+    status = schema_ledger.get_status()
+    assert status['current_version'] == LATEST
+    assert status['latest_version'] == LATEST
+    assert status['pending'] == []
+    assert status['checksum_mismatch'] == []
+    applied = schema_ledger.get_applied()
+    assert [row['version'] for row in applied] == list(range(1, LATEST + 1))
+    assert {row['checksum'] for row in applied} == {m.checksum for m in get_migrations()}
+
+def test_migrate_is_idempotent(fresh_db):
+    assert _rerun_migrate() == 0
+    assert schema_ledger.current_version() == LATEST
+
+def test_partial_migration_then_resume(empty_db):
+    assert schema_ledger.migrate(target_version=10) == 10
+    assert schema_ledger.current_version() == 10
+    assert len(schema_ledger.get_status()['pending']) == LATEST - 10
+
+    assert _rerun_migrate() == LATEST - 10
+    assert schema_ledger.get_status()['pending'] == []
+
+def test_checksums_stable_across_calls():
+    first = [m.checksum for m in get_migrations()]
+    second = [m.checksum for m in get_migrations()]
+    assert first == second
+    assert len(set(first)) == len(first)
+
+def test_modified_migration_reported(fresh_db, monkeypatch, caplog):
+    fresh_db.execute_query("UPDATE schema_migrations SET checksum = 'modifiee' WHERE version = 3")
+
+    assert schema_ledger.get_status()['checksum_mismatch'] == ['0003 donnees_par_defaut']
+
+    # Le contrôle des sommes est fait avant d'appliquer des migrations en attente
+    extra = Migration(LATEST + 1, 'test_suivante', lambda cursor: None)
+    monkeypatch.setattr(ledger, 'get_migrations', lambda: get_migrations() + [extra])
+    with caplog.at_level(logging.WARNING, logger='migrations.ledger'):
+        assert _rerun_migrate() == 1
+    assert any('0003 donnees_par_defaut modifiée' in message for message in caplog.messages)
+
+def test_failed_migration_rolled_back(fresh_db, monkeypatch):
+    def failing(cursor):
+        cursor.execute("CREATE TABLE test_migration_partielle (id INTEGER)")
+        return False
+
+    extra = Migration(LATEST + 1, 'test_echec', failing)
+    monkeypatch.setattr(ledger, 'get_migrations', lambda: get_migrations() + [extra])
+
+    with pytest.raises(RuntimeError):
+        _rerun_migrate()
+
+    assert schema_ledger.current_version() == LATEST
+    assert not fresh_db.table_exists('test_migration_partielle')
@@ -0,0 +1,109 @@
+"""
+Transactions applicatives (db.unit_of_work) et atomicité des workflows
+"""
+import pytest
+
+from models.database import db
+
+def _count(table):
+    return db.execute_query(f"SELECT COUNT(*) FROM {table}", fetch='one')[0]
+
+def _add_log(details):
+    db.execute_query("INSERT INTO activity_logs (user_id, action, details) VALUES (1, 'test', ?)", (details,))
+
+def test_commit_at_block_exit(fresh_db):
+    callbacks = []
+    with fresh_db.unit_of_work():
+        _add_log('a')
+        _add_log('b')
+        fresh_db.on_commit(lambda: callbacks.append('commit'))
+        assert callbacks == []
+    assert _count('activity_logs') == 2
+    assert callbacks == ['commit']
+
+def test_exception_rolls_back(fresh_db):
+    with pytest.raises(ValueError):
+        with fresh_db.unit_of_work():
+            _add_log('a')
+            raise ValueError("échec")
+    assert _count('activity_logs') == 0
+    assert not fresh_db.in_unit_of_work()
+
+def test_set_rollback_only(fresh_db):
+    callbacks = []
+    with fresh_db.unit_of_work() as uow:
+        _add_log('a')
+        fresh_db.on_commit(lambda: callbacks.append('commit'))
+        uow.set_rollback_only()
+    assert _count('activity_logs') == 0
+    assert callbacks == []
+
+def test_nested_block_joins_outer(fresh_db):
+    with fresh_db.unit_of_work() as outer:
+        _add_log('a')
+        with fresh_db.unit_of_work() as inner:
+            assert inner is outer
+            _add_log('b')
+        # Le bloc imbriqué ne valide pas : la transaction externe reste ouverte
+        assert fresh_db.in_unit_of_work()
+        inner.set_rollback_only()
+    assert _count('activity_logs') == 0
+
+def test_savepoint_inside_open_connection(fresh_db):
+    with fresh_db.get_connection() as conn:
+        conn.execute("INSERT INTO activity_logs (user_id, action, details) VALUES (1, 'test', 'externe')")
+        with fresh_db.unit_of_work() as uow:
+            _add_log('interne')
+            uow.set_rollback_only()
+        conn.commit()
+    assert [row['details'] for row in fresh_db.execute_query("SELECT details FROM activity_logs", fetch='all')] == ['externe']
+
+def test_helper_failure_marks_rollback_only(fresh_db):
+    from models.activity_log import ActivityLogModel
+    fresh_db.execute_query("DROP TABLE activity_logs")
+    with fresh_db.unit_of_work() as uow:
+        assert ActivityLogModel.log_activity(1, None, 'test') is False
+        assert uow.rollback_only
+    # Hors transaction : sans effet
+    fresh_db.set_rollback_only()
+
+def test_submit_rolled_back_when_activity_log_fails(fresh_db, make_user, make_demande):
+    from controllers.demande_controller import DemandeController
+    from models.budget_ledger import BudgetLedgerModel
+    dr_id = make_user('dr')
+    demande_id = make_demande(dr_id, 100)
+    fresh_db.execute_query("DROP TABLE activity_logs")
+
+    success, message, warning = DemandeController.submit_demande(demande_id, dr_id)
+    assert not success and 'annulée' in message
+    assert fresh_db.execute_query("SELECT status FROM demandes WHERE id = ?", (demande_id,), fetch='one')[0] == 'brouillon'
+    assert BudgetLedgerModel.verify() == []
+
+def test_financial_validation_records_history(fresh_db, make_user, make_demande):
+    from services.validation_engine import validation_engine
+    tc_id = make_user('tc')
+    financier_id = make_user('dr_financier')
+    dg_id = make_user('dg')
+    demande_id = make_demande(tc_id, 100, status='en_attente_financier')
+
+    assert validation_engine.validate_demande(demande_id, financier_id, 'valider', 'ok')[0]
+    assert validation_engine.validate_demande(demande_id, dg_id, 'valider', 'ok')[0]
+    rows = fresh_db.execute_query(
+        "SELECT validated_by, validation_type, action FROM demande_validations WHERE demande_id = ? ORDER BY id",
+        (demande_id,), fetch='all'
+    )
+    assert [tuple(row) for row in rows] == [(financier_id, 'financier', 'valider'), (dg_id, 'dg', 'valider')]
+    assert fresh_db.execute_query("SELECT status FROM demandes WHERE id = ?", (demande_id,), fetch='one')[0] == 'validee'
+
+def test_validation_rolled_back_when_notification_fails(fresh_db, make_user, make_demande):
+    from services.validation_engine import validation_engine
+    tc_id = make_user('tc')
+    financier_id = make_user('dr_financier')
+    demande_id = make_demande(tc_id, 100, status='en_attente_financier')
+    fresh_db.execute_query("DROP TABLE notifications")
+
+    success, message = validation_engine.validate_demande(demande_id, financier_id, 'valider', 'ok')
+    assert not success
+    row = fresh_db.execute_query("SELECT valideur_financier_id FROM demandes WHERE id = ?", (demande_id,), fetch='one')
+    assert row[0] is None
+    assert _count('demande_validations') == 0
@@ -0,0 +1,95 @@
+"""
+Budgets utilisateurs : écritures unitaires, en lot et report d'année sur le schéma d'une base neuve
+"""
+import pytest
+
+from models.database import db
+from models.user_budget import UserBudgetModel
+
+def _budgets(user_id):
+    rows = db.execute_query(
+        "SELECT by, fiscal_year, allocated_budget FROM user_budgets WHERE user_id = ? ORDER BY by",
+        (user_id,), fetch='all'
+    )
+    return [tuple(row) for row in rows or []]
+
+def test_create_budget_fills_fiscal_year(make_user):
+    user_id = make_user('tc')
+
+    assert UserBudgetModel.create_budget(user_id, 'BY25', 1000)
+    assert UserBudgetModel.create_budget(user_id, 'BY25', 1500)
+
+    assert _budgets(user_id) == [('BY25', 2025, 1500)]
+
+def test_bulk_create_budgets_on_fresh_schema(make_user):
+    first, second = make_user('tc'), make_user('dr')
+
+    result = UserBudgetModel.bulk_create_budgets([
+        {'user_id': first, 'by': 'BY25', 'allocated_budget': 1000},
+        {'user_id': first, 'by': 'BY26', 'allocated_budget': 1100},
+        {'user_id': second, 'by': 'BY25', 'allocated_budget': 2000},
+        {'user_id': second, 'by': 'mauvais', 'allocated_budget': 5},
+    ])
+
+    assert result == {'success_count': 3, 'error_count': 1, 'total_processed': 4}
+    assert _budgets(first) == [('BY25', 2025, 1000), ('BY26', 2026, 1100)]
+    assert _budgets(second) == [('BY25', 2025, 2000)]
+
+def test_bulk_create_budgets_updates_existing(make_user):
+    user_id = make_user('tc')
+    UserBudgetModel.bulk_create_budgets([{'user_id': user_id, 'by': 'BY25', 'allocated_budget': 1000}])
+
+    result = UserBudgetModel.bulk_create_budgets([{'user_id': user_id, 'by': 'BY25', 'allocated_budget': 1200}])
+
+    assert result['success_count'] == 1
+    assert _budgets(user_id) == [('BY25', 2025, 1200)]
+
+@pytest.fixture
+def rollover(make_user, set_budget):
+    """Budgets BY25 : un nouveau en BY26, un à remplacer, un déjà au bon montant, un utilisateur inactif"""
+    users = {name: make_user('tc') for name in ('new', 'overwritten', 'unchanged', 'inactive')}
+    for name, amount in (('new', 1000), ('overwritten', 2000), ('unchanged', 3000), ('inactive', 4000)):
+        set_budget(users[name], 'BY25', amount)
+    set_budget(users['overwritten'], 'BY26', 500)
+    set_budget(users['unchanged'], 'BY26', 3300)
+    db.execute_query("UPDATE users SET is_active = 0 WHERE id = ?", (users['inactive'],))
+    return users
+
+def _diff_users(result):
+    return {key: [entry['user_id'] for entry in entries] for key, entries in result['diff'].items()}
+
+def test_rollover_dry_run_reports_diff_without_writing(rollover):
+    before = {user_id: _budgets(user_id) for user_id in rollover.values()}
+
+    result = UserBudgetModel.copy_budgets_to_next_year('BY25', 'BY26', 10.0, dry_run=True)
+
+    assert _diff_users(result) == {
+        'new': [rollover['new']],
+        'overwritten': [rollover['overwritten']],
+        'unchanged': [rollover['unchanged']],
+        'skipped_inactive': [rollover['inactive']],
+    }
+    overwritten = result['diff']['overwritten'][0]
+    assert (overwritten['source_amount'], overwritten['current_amount'], overwritten['new_amount']) == (2000, 500, 2200)
+    assert result['success_count'] == 0
+    assert {user_id: _budgets(user_id) for user_id in rollover.values()} == before
+
+def test_rollover_upserts_target_year(rollover):
+    result = UserBudgetModel.copy_budgets_to_next_year('BY25', 'BY26', 10.0)
+
+    assert result['error_count'] == 0
+    assert result['success_count'] == 2
+    assert _budgets(rollover['new']) == [('BY25', 2025, 1000), ('BY26', 2026, 1100)]
+    assert _budgets(rollover['overwritten']) == [('BY25', 2025, 2000), ('BY26', 2026, 2200)]
+    assert _budgets(rollover['unchanged']) == [('BY25', 2025, 3000), ('BY26', 2026, 3300)]
+    assert _budgets(rollover['inactive']) == [('BY25', 2025, 4000)]
+
+    # Deuxième passage : tout est déjà au bon montant
+    again = UserBudgetModel.copy_budgets_to_next_year('BY25', 'BY26', 10.0)
+    assert again['success_count'] == 0
+    assert set(_diff_users(again)['unchanged']) == {rollover['new'], rollover['overwritten'], rollover['unchanged']}
+
+def test_rollover_rejects_invalid_target(rollover):
+    result = UserBudgetModel.copy_budgets_to_next_year('BY25', 'année 26')
+    assert result['error_count'] == 1
+    assert result['success_count'] == 0
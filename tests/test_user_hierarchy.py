@@ -0,0 +1,123 @@
+"""
+Table de fermeture user_hierarchy : triggers comparés au parcours récursif (verify)
+et règle de validation DR sur toute la hiérarchie
+"""
+import pytest
+
+from controllers.demande_controller import DemandeController
+from models.database import db
+from models.participant import ParticipantModel
+from models.user_hierarchy import UserHierarchyModel
+from services.permission_service import permission_service
+
+@pytest.fixture
+def team(make_user):
+    """Directeur -> manager régional -> commercial, plus un directeur sans équipe"""
+    directeur = make_user('dr')
+    manager = make_user('dr', directeur_id=directeur)
+    commercial = make_user('tc', directeur_id=manager)
+    autre = make_user('dr')
+    return {'directeur': directeur, 'manager': manager, 'commercial': commercial, 'autre': autre}
+
+def _depth(ancestor_id, descendant_id):
+    row = db.execute_query(
+        "SELECT depth FROM user_hierarchy WHERE ancestor_id = ? AND descendant_id = ?",
+        (ancestor_id, descendant_id), fetch='one'
+    )
+    return row['depth'] if row else None
+
+def test_insert_builds_full_chain(team):
+    assert _depth(team['directeur'], team['commercial']) == 2
+    assert _depth(team['manager'], team['commercial']) == 1
+    assert _depth(team['commercial'], team['commercial']) == 0
+    assert UserHierarchyModel.is_in_subtree(team['directeur'], team['commercial'])
+    assert not UserHierarchyModel.is_in_subtree(team['autre'], team['commercial'])
+    assert UserHierarchyModel.verify() == []
+
+def test_moving_a_manager_moves_the_subtree(team):
+    db.execute_query("UPDATE users SET directeur_id = ? WHERE id = ?", (team['autre'], team['manager']))
+
+    assert _depth(team['autre'], team['commercial']) == 2
+    assert _depth(team['directeur'], team['commercial']) is None
+    assert _depth(team['directeur'], team['manager']) is None
+    assert UserHierarchyModel.verify() == []
+
+def test_detaching_and_deleting_users(team):
+    db.execute_query("UPDATE users SET directeur_id = NULL WHERE id = ?", (team['commercial'],))
+    assert UserHierarchyModel.verify() == []
+
+    db.execute_query("DELETE FROM users WHERE id = ?", (team['commercial'],))
+    assert _depth(team['commercial'], team['commercial']) is None
+    assert UserHierarchyModel.verify() == []
+
+def test_cycle_refused(team):
+    with pytest.raises(ValueError, match='hierarchie circulaire'):
+        db.execute_query("UPDATE users SET directeur_id = ? WHERE id = ?", (team['commercial'], team['directeur']))
+    assert UserHierarchyModel.verify() == []
+
+def test_subtree_condition_excludes_self(team):
+    condition = UserHierarchyModel.subtree_condition('id', include_self=False)
+    rows = db.execute_query(f"SELECT id FROM users WHERE {condition} ORDER BY id",
+                            (team['directeur'],), fetch='all')
+    assert [row['id'] for row in rows] == [team['manager'], team['commercial']]
+
+def test_verify_detects_drift_and_rebuild_repairs(team):
+    db.execute_query("DELETE FROM user_hierarchy WHERE descendant_id = ?", (team['commercial'],))
+    db.execute_query("INSERT INTO user_hierarchy (ancestor_id, descendant_id, depth) VALUES (?, ?, 1)",
+                     (team['autre'], team['manager']))
+
+    differences = UserHierarchyModel.verify()
+    assert {(row['ancestor_id'], row['descendant_id']) for row in differences} == {
+        (team['directeur'], team['commercial']),
+        (team['manager'], team['commercial']),
+        (team['commercial'], team['commercial']),
+        (team['autre'], team['manager']),
+    }
+
+    assert UserHierarchyModel.rebuild()
+    assert UserHierarchyModel.verify() == []
+
+def test_deleting_a_manager_with_team(team):
+    db.execute_query("DELETE FROM users WHERE id = ?", (team['manager'],))
+    assert _depth(team['directeur'], team['commercial']) is None
+    assert UserHierarchyModel.verify() == []
+
+@pytest.fixture
+def chain(make_user, make_demande):
+    """dr1 -> dr2 -> tc, une demande du tc en attente DR, un autre DR participant"""
+    dr1 = make_user('dr')
+    dr2 = make_user('dr', directeur_id=dr1)
+    tc = make_user('tc', directeur_id=dr2)
+    participant = make_user('dr')
+    demande_id = make_demande(tc, status='en_attente_dr')
+    ParticipantModel.add_participant(demande_id, participant, tc)
+    return {'dr1': dr1, 'dr2': dr2, 'tc': tc, 'participant': participant, 'demande_id': demande_id}
+
+def _queue(dr_id):
+    demandes = DemandeController.get_demandes_for_user(dr_id, 'dr', status_filter='en_attente_dr',
+                                                       filters={'team_of': dr_id})
+    return [int(i) for i in demandes['id']] if not demandes.empty else []
+
+def test_every_ancestor_sees_and_may_validate(chain):
+    for dr_id in (chain['dr1'], chain['dr2']):
+        assert _queue(dr_id) == [chain['demande_id']]
+        assert DemandeController.get_validation_pending_count(dr_id, 'dr') == 1
+        assert permission_service.can_validate_demande('dr', 'en_attente_dr', dr_id, chain['tc'])
+
+def test_participant_dr_neither_queued_nor_allowed(chain):
+    participant = chain['participant']
+    visible = DemandeController.get_demandes_for_user(participant, 'dr')
+    assert chain['demande_id'] in [int(i) for i in visible['id']]
+
+    assert _queue(participant) == []
+    assert DemandeController.get_validation_pending_count(participant, 'dr') == 0
+    assert not permission_service.can_validate_demande('dr', 'en_attente_dr', participant, chain['tc'])
+    success, _ = DemandeController.validate_demande(chain['demande_id'], participant, 'valider')
+    assert not success
+
+def test_top_director_validates_through_two_levels(chain):
+    success, message = DemandeController.validate_demande(chain['demande_id'], chain['dr1'], 'valider', 'ok')
+
+    assert success, message
+    status = db.execute_query("SELECT status FROM demandes WHERE id = ?", (chain['demande_id'],), fetch='one')
+    assert status['status'] == 'en_attente_financier'
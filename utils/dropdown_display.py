@@ -1,101 +1,66 @@
 """
 Utilitaires pour l'affichage des options des listes déroulantes
 """
-from models.dropdown_options import DropdownOptionsModel
 from typing import Dict, Optional
 
+from utils.dropdown_registry import dropdown_registry
+
 class DropdownDisplayUtils:
     """Utilitaires pour l'affichage des options"""
     
-    # Cache pour éviter de répéter les requêtes
-    _options_cache = {}
-    _cache_timestamp = None
-    
-    @staticmethod
-    def is_cache_valid():
-        """Vérifie si le cache est encore valide (5 minutes)"""
-        from datetime import datetime, timedelta
-        
-        if DropdownDisplayUtils._cache_timestamp is None:
-            return False
-        
-        return datetime.now() - DropdownDisplayUtils._cache_timestamp < timedelta(minutes=5)
-    
     @staticmethod
     def get_label_for_value(category: str, value: str) -> str:
-        """Récupère le label pour une valeur donnée"""
+        """Récupère le label pour une valeur donnée (registre en mémoire des options)"""
         try:
-            # Traitement spécial pour les régions
-            if category == 'region':
-                from models.dropdown_options import DropdownOptionsModel
-                return DropdownOptionsModel.get_region_display_value(value)
-            
-            # Utiliser le cache si disponible et valide
-            cache_key = f"{category}_{value}"
-            if DropdownDisplayUtils.is_cache_valid() and cache_key in DropdownDisplayUtils._options_cache:
-                return DropdownDisplayUtils._options_cache[cache_key]
-            
-            # Récupérer toutes les options de la catégorie (y compris inactives)
-            from models.database import db
-            
-            # Chercher d'abord dans les options actives
-            result = db.execute_query("""
-                SELECT label FROM dropdown_options 
-                WHERE category = ? AND value = ? AND is_active = TRUE
-            """, (category, value), fetch='one')
-            
-            if result:
-                label = result['label']
-                DropdownDisplayUtils._options_cache[cache_key] = label
-                return label
-            
-            # Si pas trouvé dans les actives, chercher dans les inactives
-            result = db.execute_query("""
-                SELECT label FROM dropdown_options 
-                WHERE category = ? AND value = ?
-            """, (category, value), fetch='one')
-            
-            if result:
-                label = f"{result['label']} (supprimée)"
-                DropdownDisplayUtils._options_cache[cache_key] = label
-                return label
-            
-            # Si vraiment pas trouvé, retourner la valeur avec indication
-            fallback = f"{value} (option non trouvée)"
-            DropdownDisplayUtils._options_cache[cache_key] = fallback
-            
-            # Mettre à jour le timestamp du cache
-            if DropdownDisplayUtils._cache_timestamp is None:
-                from datetime import datetime
-                DropdownDisplayUtils._cache_timestamp = datetime.now()
-                
-            return fallback
-            
+            return dropdown_registry.get_label(category, value)
         except Exception as e:
             print(f"Erreur récupération label pour {category}.{value}: {e}")
             return f"{value} (erreur)"
     
+    # Mapping des champs d'une demande vers leurs catégories
+    DEMANDE_FIELD_CATEGORIES = {
+        'budget': 'budget',
+        'categorie': 'categorie', 
+        'typologie_client': 'typologie_client',
+        'groupe_groupement': 'groupe_groupement',
+        'region': 'region'
+    }
+    
     @staticmethod
-    def get_display_labels_for_demande(demande_data: Dict) -> Dict[str, str]:
-        """Récupère tous les labels d'affichage pour une demande"""
+    def get_labels_for_values(pairs) -> Dict[tuple, str]:
+        """
+        Labels de plusieurs (catégorie, valeur) lus dans le même instantané du registre,
+        mêmes règles que get_label_for_value
+        
+        Returns:
+            Dictionnaire {(catégorie, valeur): label}
+        """
+        pairs = list(pairs)
+        try:
+            return dropdown_registry.get_labels(pairs)
+        except Exception as e:
+            print(f"Erreur récupération labels: {e}")
+            return {(category, value): f"{value} (erreur)" for category, value in pairs if value}
+    
+    @staticmethod
+    def get_display_labels_for_demande(demande_data: Dict, labels: Optional[Dict[tuple, str]] = None) -> Dict[str, str]:
+        """
+        Récupère tous les labels d'affichage pour une demande
+        
+        Args:
+            labels: Labels déjà chargés par get_labels_for_values (affichage d'une page de demandes)
+        """
         try:
             display_labels = {}
             
-            # Mapping des champs vers leurs catégories
-            field_mappings = {
-                'budget': 'budget',
-                'categorie': 'categorie', 
-                'typologie_client': 'typologie_client',
-                'groupe_groupement': 'groupe_groupement',
-                'region': 'region'
-            }
-            
-            for field, category in field_mappings.items():
+            for field, category in DropdownDisplayUtils.DEMANDE_FIELD_CATEGORIES.items():
                 value = demande_data.get(field, '')
-                if value:
-                    display_labels[field] = DropdownDisplayUtils.get_label_for_value(category, value)
-                else:
+                if not value:
                     display_labels[field] = 'Non spécifié'
+                elif labels is not None and (category, value) in labels:
+                    display_labels[field] = labels[(category, value)]
+                else:
+                    display_labels[field] = DropdownDisplayUtils.get_label_for_value(category, value)
             
             return display_labels
             
@@ -106,8 +71,7 @@ class DropdownDisplayUtils:
     @staticmethod
     def clear_cache():
         """Vider le cache (utile après modification des options)"""
-        DropdownDisplayUtils._options_cache.clear()
-        DropdownDisplayUtils._cache_timestamp = None
+        dropdown_registry.invalidate()
         print("🧹 Cache des options vidé")
     
     @staticmethod
@@ -0,0 +1,154 @@
+"""
+Registre en mémoire des options des listes déroulantes
+
+Toutes les catégories sont chargées en une requête dans un instantané partagé par
+toutes les sessions du processus : options ordonnées par catégorie, index
+(catégorie, valeur) -> option et listes (valeur, label) des formulaires déjà
+construites. La résolution d'un label est une recherche dans un dict.
+
+Invalidation : l'instantané porte la version de dropdown_options dans data_versions
+(compteur incrémenté par trigger à chaque écriture, voir utils/query_cache.py) ; il
+est rechargé dès que cette version change, après une écriture locale ou au plus
+tard query_cache_check_interval secondes après l'écriture d'un autre processus.
+"""
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from models.database import db
+from utils.query_cache import query_cache
+
+logger = logging.getLogger(__name__)
+
+class _Snapshot:
+    """Options de toutes les catégories à une version donnée de dropdown_options"""
+
+    __slots__ = ('version', 'options', 'by_value', 'form_options')
+
+    def __init__(self, version: Optional[int], rows):
+        self.version = version
+        # Toutes les options (actives ou non) par catégorie, dans l'ordre d'affichage
+        self.options: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_value: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for row in rows:
+            option = {
+                'id': row['id'],
+                'value': row['value'],
+                'label': row['label'],
+                'order_index': row['order_index'],
+                'is_active': bool(row['is_active']),
+            }
+            self.options.setdefault(row['category'], []).append(option)
+            self.by_value[(row['category'], row['value'])] = option
+        # Listes (valeur, label) des options actives, prêtes pour les selectbox
+        self.form_options: Dict[str, Tuple[Tuple[str, str], ...]] = {
+            category: tuple((option['value'], option['label']) for option in options if option['is_active'])
+            for category, options in self.options.items()
+        }
+
+class DropdownRegistry:
+    """Instantané des listes déroulantes partagé par le processus, rechargé par version"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+        self._loads = 0
+
+    @staticmethod
+    def _load(version: Optional[int]) -> _Snapshot:
+        rows = db.execute_query('''
+            SELECT id, category, value, label, order_index, is_active
+            FROM dropdown_options
+            ORDER BY category, order_index ASC, label ASC
+        ''', fetch='all')
+        return _Snapshot(version, rows or [])
+
+    def _current(self) -> _Snapshot:
+        # Dans une transaction, les écritures non validées sont visibles : instantané jetable
+        if db.in_unit_of_work():
+            return self._load(None)
+
+        version = query_cache.table_version('dropdown_options')
+        snapshot = self._snapshot
+        if snapshot is not None and version is not None and snapshot.version == version:
+            return snapshot
+
+        try:
+            snapshot = self._load(version)
+        except Exception as e:
+            logger.error(f"Erreur chargement des listes déroulantes: {e}")
+            return self._snapshot or _Snapshot(None, [])
+        # Compteurs illisibles (version None) : pas de réutilisation de l'instantané
+        with self._lock:
+            self._snapshot = snapshot if version is not None else None
+            self._loads += 1
+        return snapshot
+
+    def get_options(self, category: str, active_only: bool = True) -> List[Dict[str, Any]]:
+        """Options d'une catégorie dans l'ordre d'affichage (id, value, label, order_index, is_active)"""
+        options = self._current().options.get(category, [])
+        return [dict(option) for option in options if option['is_active'] or not active_only]
+
+    def get_form_options(self, category: str) -> List[Tuple[str, str]]:
+        """Liste (valeur, label) des options actives d'une catégorie"""
+        return list(self._current().form_options.get(category, ()))
+
+    def get_form_options_by_category(self, categories: Iterable[str]) -> Dict[str, List[Tuple[str, str]]]:
+        """Listes (valeur, label) de plusieurs catégories, lues dans le même instantané"""
+        form_options = self._current().form_options
+        return {category: list(form_options.get(category, ())) for category in categories}
+
+    def get_categories(self) -> List[str]:
+        """Catégories ayant au moins une option"""
+        return sorted(self._current().options)
+
+    def get_option(self, category: str, value: str) -> Optional[Dict[str, Any]]:
+        """Option (active ou non) d'une valeur, None si inconnue"""
+        option = self._current().by_value.get((category, value))
+        return dict(option) if option else None
+
+    def is_valid(self, category: str, value: str) -> bool:
+        """La valeur est-elle une option active de la catégorie ?"""
+        option = self._current().by_value.get((category, value))
+        return option is not None and option['is_active']
+
+    @staticmethod
+    def _label(snapshot: _Snapshot, category: str, value: str) -> str:
+        option = snapshot.by_value.get((category, value))
+        if category == 'region':
+            # Régions : label actif, sinon transformation automatique ("nord_est" -> "NORD EST")
+            if option and option['is_active']:
+                return option['label']
+            return value.replace('_', ' ').upper()
+        if option is None:
+            return f"{value} (option non trouvée)"
+        return option['label'] if option['is_active'] else f"{option['label']} (supprimée)"
+
+    def get_label(self, category: str, value: str) -> str:
+        """Label d'affichage d'une valeur (inactive : « (supprimée) », inconnue : « (option non trouvée) »)"""
+        if not value:
+            return "Non spécifié"
+        return self._label(self._current(), category, value)
+
+    def get_labels(self, pairs: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+        """Labels de plusieurs (catégorie, valeur), mêmes règles que get_label"""
+        snapshot = self._current()
+        return {(category, value): self._label(snapshot, category, value)
+                for category, value in pairs if value}
+
+    def invalidate(self):
+        """Oublier l'instantané : rechargé à la prochaine lecture"""
+        with self._lock:
+            self._snapshot = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Version de l'instantané courant, nombre d'options et de chargements"""
+        snapshot = self._snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'options': len(snapshot.by_value) if snapshot else 0,
+            'loads': self._loads,
+        }
+
+# Instance globale
+dropdown_registry = DropdownRegistry()
@@ -0,0 +1,217 @@
+"""
+Compilation des filtres de FilterUI en clauses SQL paramétrées
+
+Les pages de demandes/analytics transmettent le dictionnaire de filtres produit par
+FilterUI (status_filter, type_filter, montant_filter, periode_filter, ...) au modèle,
+qui les ajoute au WHERE : la base ne renvoie que les lignes affichées.
+Les tranches de montant et les périodes sont définies ici une seule fois et
+réutilisées par les filtres pandas de utils/filters.py.
+"""
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from models.user_hierarchy import UserHierarchyModel
+
+# Valeurs « pas de filtre » utilisées par les sélecteurs
+_ALL_VALUES = (None, '', 'tous', 'toutes', 'Tous', 'Toutes')
+
+# Tranches de montant : liste de (opérateur, borne)
+AMOUNT_BUCKETS = {
+    'moins_1000': [('<', 1000)],
+    '1000_5000': [('>=', 1000), ('<=', 5000)],
+    '5000_10000': [('>=', 5000), ('<=', 10000)],
+    'plus_5000': [('>', 5000)],
+    'plus_10000': [('>', 10000)],
+}
+
+# Colonnes indexées par la table plein texte demandes_fts (voir models/demande_search.py) ;
+# les valeurs des listes déroulantes (budget, ...) sont découpées en mots sur les « _ »
+FTS_COLUMNS = [
+    'nom_manifestation', 'client', 'client_enseigne', 'lieu', 'agence',
+    'nom_contact', 'commentaires', 'participants_libres',
+    'budget', 'categorie', 'typologie_client', 'groupe_groupement'
+]
+
+# Colonnes de recherche textuelle par défaut : tout l'index plein texte
+DEFAULT_SEARCH_COLUMNS = FTS_COLUMNS
+
+# Colonnes cherchables et leur expression qualifiée (d = demandes, u = créateur)
+SEARCHABLE_COLUMNS = {
+    'nom_manifestation': 'd.nom_manifestation',
+    'client': 'd.client',
+    'lieu': 'd.lieu',
+    'budget': 'd.budget',
+    'categorie': 'd.categorie',
+    'typologie_client': 'd.typologie_client',
+    'groupe_groupement': 'd.groupe_groupement',
+    'region': 'd.region',
+    'agence': 'd.agence',
+    'client_enseigne': 'd.client_enseigne',
+    'commentaires': 'd.commentaires',
+    'nom_contact': 'd.nom_contact',
+    'participants_libres': 'd.participants_libres',
+    'nom': 'u.nom',
+    'prenom': 'u.prenom',
+    'email': 'u.email',
+}
+
+def period_start(period: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Début de la période sélectionnée (ce_mois, 3_mois, 6_mois, cette_annee), None si aucune"""
+    now = now or datetime.now()
+    if period == 'ce_mois':
+        return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if period == '3_mois':
+        return now - timedelta(days=90)
+    if period == '6_mois':
+        return now - timedelta(days=180)
+    if period == 'cette_annee':
+        return now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return None
+
+def fts_match_expression(search_query: str, columns: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Expression MATCH FTS5 d'une saisie utilisateur : chaque mot devient un préfixe ("mot"*),
+    tous les mots sont requis. Les guillemets neutralisent la syntaxe FTS (OR, NEAR, -, ...).
+
+    La correspondance se fait en début de mot, et non plus par sous-chaîne comme l'ancien
+    filtre pandas : « salon » trouve « Salon de Lyon » et « salon_pro », mais « alon » ne
+    trouve plus rien. Les accents et la casse sont ignorés.
+
+    Args:
+        columns: Restreindre aux colonnes indexées listées (toutes si None)
+
+    Returns:
+        L'expression, ou None si la saisie ne contient aucun mot
+    """
+    words = re.findall(r"\w+", search_query or '')
+    if not words:
+        return None
+    expression = ' '.join(f'"{word}"*' for word in words)
+    if columns is not None and set(columns) != set(FTS_COLUMNS):
+        expression = '{' + ' '.join(columns) + '} : (' + expression + ')'
+    return expression
+
+def date_range_conditions(column: str, start_date=None, end_date=None) -> Tuple[List[str], List[Any]]:
+    """
+    Conditions d'intervalle de dates sur une colonne TIMESTAMP, bornes incluses.
+
+    Comparaison sur la valeur brute (column >= début, column < lendemain de la fin)
+    plutôt que DATE(column) : la condition reste utilisable par un index sur column.
+
+    Args:
+        start_date, end_date: date, datetime ou chaîne AAAA-MM-JJ (None : pas de borne)
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    if start_date:
+        conditions.append(f"{column} >= ?")
+        params.append(str(start_date)[:10])
+    if end_date:
+        end = datetime.strptime(str(end_date)[:10], '%Y-%m-%d') + timedelta(days=1)
+        conditions.append(f"{column} < ?")
+        params.append(end.strftime('%Y-%m-%d'))
+    return conditions, params
+
+def _is_set(value: Any) -> bool:
+    if isinstance(value, (list, tuple, set)):
+        return len(value) > 0
+    return value not in _ALL_VALUES
+
+def build_demande_filters(filters: Dict[str, Any], search_columns: Optional[List[str]] = None,
+                          now: Optional[datetime] = None) -> Tuple[List[str], List[Any]]:
+    """
+    Traduire un dictionnaire de filtres en conditions SQL sur demandes d JOIN users u.
+
+    Args:
+        filters: Clés reconnues : search_query (index plein texte demandes_fts), status_filter (valeur ou liste), type_filter,
+            montant_filter, urgence_filter, periode_filter (sur d.created_at), cy_filter, by_filter,
+            team_of (id d'un directeur : demandes de lui-même et de toute son équipe, user_hierarchy)
+        search_columns: Colonnes de la recherche textuelle (voir SEARCHABLE_COLUMNS)
+
+    Returns:
+        (conditions, params) : conditions à combiner par AND, paramètres dans l'ordre
+    """
+    conditions: List[str] = []
+    params: List[Any] = []
+    filters = filters or {}
+
+    search_query = (filters.get('search_query') or '').strip()
+    if search_query:
+        requested = [c for c in (search_columns or DEFAULT_SEARCH_COLUMNS) if c in SEARCHABLE_COLUMNS]
+        fts_columns = [c for c in requested if c in FTS_COLUMNS]
+        match = fts_match_expression(search_query, fts_columns) if fts_columns else None
+        if match is None:
+            # Pas de mot exploitable par l'index : recherche par sous-chaîne sur toutes les colonnes
+            fts_columns = []
+        user_columns = [SEARCHABLE_COLUMNS[c][2:] for c in requested
+                        if c not in fts_columns and SEARCHABLE_COLUMNS[c].startswith('u.')]
+        like_columns = [SEARCHABLE_COLUMNS[c] for c in requested
+                        if c not in fts_columns and SEARCHABLE_COLUMNS[c].startswith('d.')]
+        like_param = f"%{search_query}%"
+
+        # Ensemble des identifiants candidats, chacun obtenu par index (FTS, demandes.user_id)
+        candidates = []
+        if match is not None:
+            candidates.append("SELECT rowid FROM demandes_fts WHERE demandes_fts MATCH ?")
+            params.append(match)
+        if user_columns:
+            candidates.append("SELECT id FROM demandes WHERE user_id IN (SELECT id FROM users WHERE "
+                              + ' OR '.join(f"{col} LIKE ?" for col in user_columns) + ")")
+            params.extend([like_param] * len(user_columns))
+        alternatives = [f"d.id IN ({' UNION '.join(candidates)})"] if candidates else []
+        # Autres colonnes hors index plein texte : LIKE (parcours des demandes)
+        alternatives.extend(f"{col} LIKE ?" for col in like_columns)
+        params.extend([like_param] * len(like_columns))
+        if alternatives:
+            conditions.append('(' + ' OR '.join(alternatives) + ')')
+
+    status_filter = filters.get('status_filter')
+    if _is_set(status_filter):
+        if isinstance(status_filter, (list, tuple, set)):
+            statuses = list(status_filter)
+            conditions.append(f"d.status IN ({', '.join('?' for _ in statuses)})")
+            params.extend(statuses)
+        else:
+            conditions.append("d.status = ?")
+            params.append(status_filter)
+
+    type_filter = filters.get('type_filter')
+    if _is_set(type_filter):
+        conditions.append("d.type_demande = ?")
+        params.append(type_filter)
+
+    for operator, bound in AMOUNT_BUCKETS.get(filters.get('montant_filter'), []):
+        conditions.append(f"d.montant {operator} ?")
+        params.append(bound)
+
+    urgence_filter = filters.get('urgence_filter')
+    if _is_set(urgence_filter):
+        conditions.append("d.urgence = ?")
+        params.append(urgence_filter)
+
+    start = period_start(filters.get('periode_filter'), now)
+    if start is not None:
+        # Comparaison sur la valeur brute de la colonne : reste utilisable par un index
+        conditions.append("d.created_at >= ?")
+        params.append(start.strftime('%Y-%m-%d %H:%M:%S'))
+
+    cy_filter = filters.get('cy_filter')
+    if _is_set(cy_filter):
+        try:
+            conditions.append("d.cy = ?")
+            params.append(int(cy_filter))
+        except (TypeError, ValueError):
+            conditions.pop()
+
+    by_filter = filters.get('by_filter')
+    if _is_set(by_filter):
+        conditions.append("d.by = ?")
+        params.append(by_filter)
+
+    team_of = filters.get('team_of')
+    if team_of is not None:
+        conditions.append(UserHierarchyModel.subtree_condition('d.user_id'))
+        params.append(team_of)
+
+    return conditions, params
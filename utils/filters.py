@@ -4,7 +4,11 @@ Utilitaires pour la gestion des filtres dans l'application
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
+import operator
 from typing import Dict, Any, List, Optional
+from utils.filter_sql import AMOUNT_BUCKETS, period_start
+
+_AMOUNT_OPERATORS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
 
 class FilterManager:
     """Gestionnaire centralisé des filtres pour toutes les pages"""
@@ -72,18 +76,14 @@ class FilterManager:
         if amount_filter == 'tous' or not amount_filter or df.empty:
             return df
         
-        if amount_filter == 'moins_1000':
-            return df[df['montant'] < 1000]
-        elif amount_filter == '1000_5000':
-            return df[(df['montant'] >= 1000) & (df['montant'] <= 5000)]
-        elif amount_filter == '5000_10000':
-            return df[(df['montant'] >= 5000) & (df['montant'] <= 10000)]
-        elif amount_filter == 'plus_5000':
-            return df[df['montant'] > 5000]
-        elif amount_filter == 'plus_10000':
-            return df[df['montant'] > 10000]
+        bounds = AMOUNT_BUCKETS.get(amount_filter)
+        if not bounds:
+            return df
         
-        return df
+        mask = pd.Series(True, index=df.index)
+        for op, bound in bounds:
+            mask &= _AMOUNT_OPERATORS[op](df['montant'], bound)
+        return df[mask]
     
     @staticmethod
     def apply_urgency_filter(df: pd.DataFrame, urgency_filter: str) -> pd.DataFrame:
@@ -101,20 +101,9 @@ class FilterManager:
         try:
             # Convertir la colonne de date
             df[date_column] = pd.to_datetime(df[date_column])
-            now = datetime.now()
-            
-            if period_filter == 'ce_mois':
-                debut_mois = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-                return df[df[date_column] >= debut_mois]
-            elif period_filter == '3_mois':
-                trois_mois_avant = now - timedelta(days=90)
-                return df[df[date_column] >= trois_mois_avant]
-            elif period_filter == '6_mois':
-                six_mois_avant = now - timedelta(days=180)
-                return df[df[date_column] >= six_mois_avant]
-            elif period_filter == 'cette_annee':
-                debut_annee = now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-                return df[df[date_column] >= debut_annee]
+            start = period_start(period_filter)
+            if start is not None:
+                return df[df[date_column] >= start]
             
         except Exception as e:
             st.warning(f"Erreur lors du filtrage par période: {e}")
@@ -153,6 +153,16 @@ def validate_fiscal_year_format(by_value: str) -> bool:
     except Exception:
         return False
 
+def fiscal_year_number(by_value: str) -> int:
+    """
+    Année numérique d'une année fiscale BYXX (BY25 -> 2025), pour la colonne
+    user_budgets.fiscal_year (NOT NULL, unique par utilisateur) tenue à côté de by
+    
+    Args:
+        by_value: Année fiscale au format BYXX (voir validate_fiscal_year_format)
+    """
+    return 2000 + int(by_value[2:])
+
 def create_fiscal_year_option(year: int) -> Tuple[str, str]:
     """
     Crée une option d'année fiscale à partir d'une année
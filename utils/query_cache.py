@@ -0,0 +1,289 @@
+"""
+Cache de lecture des modèles, invalidé par version de table
+
+Chaque rerun Streamlit relit les mêmes données (statistiques du tableau de bord,
+options des listes déroulantes, directeurs, années fiscales, notifications non lues).
+Les méthodes de lecture décorées par @cached_query('table', ...) sont mises en cache
+pour tout le processus, par méthode et arguments (user_id et rôle compris, donc par
+périmètre de visibilité).
+
+Invalidation : la table data_versions tient un compteur par table, incrémenté par
+des triggers à chaque écriture, quel que soit le processus qui écrit. Le cache relit
+ces compteurs (une seule petite requête) après chaque écriture locale validée, et au
+plus toutes les query_cache_check_interval secondes pour les écritures des autres
+processus ; entre deux, une lecture en cache n'exécute aucune requête. Une entrée
+dont une table a changé de version est ignorée puis évincée.
+
+Éviction LRU, durée de vie maximale (TTL) et plafond mémoire ; statistiques via
+query_cache.get_stats().
+"""
+import copy
+import functools
+import logging
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import db_config
+
+logger = logging.getLogger(__name__)
+
+# Tables dont les écritures sont comptées dans data_versions (migration 0011)
+TRACKED_TABLES = (
+    'users', 'user_budgets', 'demandes', 'demande_validations',
+    'demande_participants', 'notifications', 'dropdown_options',
+)
+
+def _estimate_size(value) -> int:
+    """Taille approximative d'un résultat en octets (DataFrame : mémoire réelle)"""
+    if hasattr(value, 'memory_usage'):
+        try:
+            return int(value.memory_usage(deep=True).sum())
+        except Exception:
+            pass
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+class _CacheEntry:
+    """Résultat en cache avec les versions des tables lues au moment du calcul"""
+
+    __slots__ = ('value', 'size', 'expires_at', 'versions')
+
+    def __init__(self, value, size: int, expires_at: float, versions: Tuple):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.versions = versions
+
+class QueryCache:
+    """Cache LRU + TTL des résultats de lecture, partagé par tous les threads du processus"""
+
+    def __init__(self, config=db_config):
+        self.config = config
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[tuple, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._versions: Dict[str, int] = {}
+        self._checked_at: Optional[float] = None
+        self._write_generation = 0
+        self._checked_generation = -1
+        self._available = True
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'version_checks': 0,
+            'uncacheable': 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.query_cache_enabled and self._available
+
+    @staticmethod
+    def create_schema(cursor):
+        """Créer la table des compteurs de modifications et ses triggers (migration 0011)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        for table in TRACKED_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)", (table,))
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_data_version_{table}_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                ''')
+
+    def notify_write(self):
+        """Une écriture locale a été faite : relire les versions à la prochaine lecture"""
+        with self._lock:
+            self._write_generation += 1
+
+    def _refresh_versions(self):
+        """Relire data_versions si une écriture locale a eu lieu ou si l'intervalle est écoulé"""
+        with self._lock:
+            if (self._checked_generation == self._write_generation and self._checked_at is not None
+                    and time.monotonic() - self._checked_at < self.config.query_cache_check_interval):
+                return
+            generation = self._write_generation
+
+        from models.database import db
+
+        # Requête hors verrou : un thread qui attend une connexion du pool ne bloque pas le cache
+        try:
+            rows = db.execute_query("SELECT table_name, version FROM data_versions", fetch='all')
+        except Exception as e:
+            # Table absente (base non migrée) : cache désactivé plutôt que résultats périmés
+            logger.warning(f"⚠️ Cache de lecture désactivé, compteurs de version illisibles: {e}")
+            with self._lock:
+                self._available = False
+                self.clear()
+            return
+
+        versions = {row['table_name']: row['version'] for row in rows or []}
+        with self._lock:
+            if generation < self._checked_generation:
+                return  # un autre thread a relu des versions plus récentes
+            changed = {table for table in set(versions) | set(self._versions)
+                       if versions.get(table) != self._versions.get(table)}
+            self._versions = versions
+            self._checked_at = time.monotonic()
+            self._checked_generation = generation
+            self._stats['version_checks'] += 1
+            if changed:
+                self._drop_tables(changed)
+
+    def _drop_tables(self, tables):
+        """Évincer les entrées qui dépendent d'une des tables modifiées"""
+        for key in [key for key, entry in self._entries.items()
+                    if any(table in tables for table, _ in entry.versions)]:
+            self._remove(key)
+            self._stats['invalidations'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _store(self, key, value, versions: Tuple):
+        size = _estimate_size(value)
+        if size > self.config.query_cache_max_bytes // 4:
+            self._stats['uncacheable'] += 1
+            return
+        self._remove(key)
+        self._entries[key] = _CacheEntry(value, size, time.monotonic() + self.config.query_cache_ttl, versions)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.config.query_cache_max_entries
+                                 or self._bytes > self.config.query_cache_max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def get_or_load(self, key: tuple, tables: Tuple[str, ...], loader):
+        """Résultat en cache pour key, sinon loader() mis en cache avec les versions de tables"""
+        from models.database import db
+
+        # Dans une transaction, les lectures voient des écritures non validées : pas de cache
+        if not self.enabled or db.in_unit_of_work():
+            return loader()
+
+        self._refresh_versions()
+        with self._lock:
+            if not self._available:
+                return loader()
+            versions = tuple((table, self._versions.get(table)) for table in tables)
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.versions == versions and entry.expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return copy.deepcopy(entry.value)
+                self._remove(key)
+                self._stats['expirations' if entry.versions == versions else 'invalidations'] += 1
+            self._stats['misses'] += 1
+
+        value = loader()
+
+        with self._lock:
+            # Versions relues entre-temps : le résultat est peut-être déjà périmé
+            if tuple((table, self._versions.get(table)) for table in tables) == versions:
+                self._store(key, copy.deepcopy(value), versions)
+        return value
+
+    def table_version(self, table: str) -> Optional[int]:
+        """
+        Version courante d'une table suivie, relue comme pour les lectures en cache
+        (None si les compteurs sont illisibles). Sert aux caches tenus hors de ce
+        cache, comme le registre des listes déroulantes.
+        """
+        self._refresh_versions()
+        with self._lock:
+            return self._versions.get(table) if self._available else None
+
+    def invalidate(self, *tables: str):
+        """Évincer les entrées dépendant de ces tables (toutes si aucune table donnée)"""
+        with self._lock:
+            if tables:
+                self._drop_tables(set(tables))
+            else:
+                self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Compteurs hits / misses / évictions, taille et taux de succès"""
+        with self._lock:
+            stats = dict(self._stats)
+            lookups = stats['hits'] + stats['misses']
+            stats.update({
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.config.query_cache_max_entries,
+                'max_bytes': self.config.query_cache_max_bytes,
+                'hit_rate': round(stats['hits'] / lookups * 100, 1) if lookups else 0.0,
+                'enabled': self.enabled,
+            })
+            return stats
+
+    def reset(self):
+        """Vider le cache et remettre les compteurs à zéro"""
+        with self._lock:
+            self.clear()
+            self._versions = {}
+            self._checked_at = None
+            self._available = True
+            for name in self._stats:
+                self._stats[name] = 0
+
+def cached_query(*tables: str):
+    """
+    Mettre en cache une méthode de lecture dépendant des tables données.
+
+    Le résultat ne doit dépendre que des arguments et des tables listées (tables de base :
+    les tables dérivées comme demande_stats changent avec demandes / users). Les appels
+    avec des arguments non hachables (dict de filtres, listes) ne sont pas mis en cache.
+    Placer sous @staticmethod :
+
+        @staticmethod
+        @cached_query('users')
+        def get_directors(): ...
+    """
+    unknown = set(tables) - set(TRACKED_TABLES)
+    if unknown:
+        raise ValueError(f"Tables non suivies par data_versions: {sorted(unknown)}")
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)
+            return query_cache.get_or_load(key, tables, lambda: func(*args, **kwargs))
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+# Instance globale
+query_cache = QueryCache()
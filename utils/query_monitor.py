@@ -0,0 +1,451 @@
+"""
+Instrumentation des requêtes SQLite
+
+Chaque connexion du pool est ouverte avec InstrumentedConnection : toutes les requêtes
+(db.execute_query, db.get_connection, pd.read_sql_query, curseurs directs) sont
+mesurées au niveau du curseur. Pour chaque requête on enregistre le SQL normalisé,
+le nombre de paramètres, la durée et le nombre de lignes. La méthode appelante est
+retrouvée en remontant la pile, ce qui coûte cher : seulement à la première
+exécution d'une lecture filtrée (vérification de son plan) et pour les requêtes
+lentes ; les autres exécutions sont attribuées à l'appelant déjà connu.
+
+Les mesures sont agrégées par exécution du script Streamlit (rerun) et par page :
+main.py ouvre le rerun et son routage y rattache la page affichée (set_page).
+Les requêtes plus lentes que le seuil sont écrites dans le journal des requêtes
+lentes avec leur EXPLAIN QUERY PLAN, et un rerun qui dépasse le budget de requêtes
+ou de temps de sa page émet un avertissement. Le plan des lectures avec WHERE est
+vérifié une fois par requête normalisée (parcours complet de table signalé).
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config.settings import db_config
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+_SKIPPED_FILES = {
+    _THIS_FILE,
+    os.path.join(_PROJECT_ROOT, 'models', 'database.py'),
+}
+
+_COMMENT_RE = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE_RE = re.compile(r'\s+')
+_EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+_READS = ('SELECT', 'WITH')
+_WHERE_RE = re.compile(r'\bWHERE\b', re.I)
+_PLAN_SOURCE_RE = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE)\s+(\S+)')
+_PLAN_SCAN_RE = re.compile(r'^SCAN\s+(\S+)')
+
+def normalize_sql(sql: str) -> str:
+    """Forme canonique d'une requête : sans commentaires, littéraux remplacés par ?"""
+    sql = _COMMENT_RE.sub(' ', sql)
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('(?...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+def find_full_scans(plan: List[str], ignore_tables=()) -> List[str]:
+    """
+    Étapes d'un EXPLAIN QUERY PLAN qui parcourent toute une table (SCAN sans recherche par index).
+
+    Les parcours de sous-requêtes matérialisées/co-routines et des tables ignorées
+    (petites tables de référence) ne sont pas signalés.
+    """
+    derived = {m.group(1) for m in map(_PLAN_SOURCE_RE.match, plan) if m}
+    scans = []
+    for detail in plan:
+        match = _PLAN_SCAN_RE.match(detail)
+        if not match:
+            continue
+        name = match.group(1)
+        if name in derived or name in ignore_tables or name == 'CONSTANT':
+            continue
+        scans.append(detail)
+    return scans
+
+def _count_params(params) -> int:
+    if params is None:
+        return 0
+    try:
+        return len(params)
+    except TypeError:
+        return 0
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+def _find_caller() -> str:
+    """
+    Première frame du projet en dehors de la couche base de données (ex. models.demande:DemandeModel.get_demande_by_id),
+    à défaut la méthode de models/database.py qui a émis la requête (initialisation, statistiques, ...)
+    """
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_PROJECT_ROOT):
+            if filename not in _SKIPPED_FILES:
+                return _frame_name(frame)
+            if fallback is None and filename != _THIS_FILE:
+                fallback = _frame_name(frame)
+        frame = frame.f_back
+    return fallback or 'inconnu'
+
+def _is_filtered_read(normalized: str) -> bool:
+    """
+    Lecture avec un WHERE, seule requête dont le plan est vérifié : les plans des écritures
+    portent les sous-programmes des triggers et des clés étrangères, et une lecture sans
+    WHERE (COUNT(*) d'une table, chargement d'un référentiel) parcourt la table par nature
+    """
+    return normalized.upper().startswith(_READS) and _WHERE_RE.search(normalized) is not None
+
+class QueryRecord:
+    """Mesure d'une requête exécutée"""
+
+    __slots__ = ('sql', 'normalized', 'param_count', 'executions', 'duration_ms',
+                 'rows', 'caller', 'params', 'logged')
+
+    def __init__(self, sql: str, params, param_count: int, executions: int):
+        self.sql = sql
+        self.normalized = normalize_sql(sql)
+        self.params = params
+        self.param_count = param_count
+        self.executions = executions
+        self.duration_ms = 0.0
+        self.rows = 0
+        self.caller: Optional[str] = None
+        self.logged = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'sql': self.normalized,
+            'param_count': self.param_count,
+            'executions': self.executions,
+            'duration_ms': round(self.duration_ms, 3),
+            'rows': self.rows,
+            'caller': self.caller,
+        }
+
+class _RerunStats:
+    """Requêtes d'une exécution du script Streamlit"""
+
+    def __init__(self, page: Optional[str]):
+        self.page = page
+        self.started_at = time.perf_counter()
+        self.queries: List[QueryRecord] = []
+
+class QueryMonitor:
+    """Collecte et agrégation des mesures de requêtes"""
+
+    def __init__(self, config=db_config):
+        self.config = config
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._pages: Dict[str, Dict[str, Any]] = {}
+        self._plans_checked = set()
+        self._callers: Dict[str, str] = {}
+        self._full_scans: Dict[str, Dict[str, Any]] = {}
+
+    # --- Cycle de vie d'un rerun -------------------------------------------------
+
+    def start_rerun(self, page: Optional[str] = None):
+        """Début d'une exécution du script : les requêtes du thread courant y sont rattachées"""
+        self._local.rerun = _RerunStats(page)
+
+    def set_page(self, page: str):
+        """Rattacher le rerun en cours à une page (après navigation/redirection)"""
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is not None:
+            rerun.page = page
+
+    def end_rerun(self, page: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Clore le rerun en cours, l'agréger à sa page et vérifier le budget"""
+        rerun = getattr(self._local, 'rerun', None)
+        self._local.rerun = None
+        if rerun is None:
+            return None
+
+        page = page or rerun.page or 'inconnue'
+        summary = self._summarize(rerun.queries)
+        summary['page'] = page
+        summary['wall_ms'] = round((time.perf_counter() - rerun.started_at) * 1000, 1)
+
+        with self._lock:
+            stats = self._pages.setdefault(page, {
+                'reruns': 0,
+                'queries': 0,
+                'query_ms': 0.0,
+                'max_queries': 0,
+                'max_query_ms': 0.0,
+                'budget_exceeded': 0,
+                'by_caller': Counter(),
+                'by_sql': Counter(),
+            })
+            stats['reruns'] += 1
+            stats['queries'] += summary['query_count']
+            stats['query_ms'] += summary['query_ms']
+            stats['max_queries'] = max(stats['max_queries'], summary['query_count'])
+            stats['max_query_ms'] = max(stats['max_query_ms'], summary['query_ms'])
+            stats['by_caller'].update(summary['by_caller'])
+            stats['by_sql'].update(summary['by_sql'])
+
+            over_budget = (summary['query_count'] > self.config.page_query_budget
+                           or summary['query_ms'] > self.config.page_time_budget_ms)
+            if over_budget:
+                stats['budget_exceeded'] += 1
+        summary['over_budget'] = over_budget
+
+        if over_budget:
+            top = ', '.join(f"{caller} ×{count}"
+                            for caller, count in summary['by_caller'].most_common(5))
+            logger.warning(
+                f"⚠️ Budget de requêtes dépassé sur la page '{page}': "
+                f"{summary['query_count']} requêtes (budget {self.config.page_query_budget}), "
+                f"{summary['query_ms']:.1f} ms (budget {self.config.page_time_budget_ms:.0f} ms) — {top}"
+            )
+        return summary
+
+    def _caller_of(self, record: QueryRecord) -> str:
+        """Appelant de la requête, sinon premier appelant connu de sa forme normalisée"""
+        if record.caller is not None:
+            return record.caller
+        with self._lock:
+            return self._callers.get(record.normalized, 'non résolu')
+
+    def _summarize(self, queries: List[QueryRecord]) -> Dict[str, Any]:
+        by_caller = Counter()
+        by_sql = Counter()
+        total_ms = 0.0
+        for record in queries:
+            by_caller[self._caller_of(record)] += 1
+            by_sql[record.normalized] += 1
+            total_ms += record.duration_ms
+        return {
+            'query_count': len(queries),
+            'query_ms': round(total_ms, 3),
+            'by_caller': by_caller,
+            'by_sql': by_sql,
+        }
+
+    # --- Enregistrement ----------------------------------------------------------
+
+    def begin(self, sql: str, params, many: bool = False) -> tuple:
+        """Créer la mesure d'une requête ; renvoie (record, params) car un itérable de paramètres est matérialisé"""
+        if many:
+            params = list(params)
+            first = params[0] if params else None
+            return QueryRecord(sql, first, _count_params(first), len(params)), params
+        return QueryRecord(sql, params, _count_params(params), 1), params
+
+    def finish(self, record: QueryRecord, cursor: sqlite3.Cursor, first: bool, check_slow: bool = True):
+        """Ajouter la requête au rerun courant (une seule fois) et vérifier le seuil de lenteur"""
+        if first:
+            rerun = getattr(self._local, 'rerun', None)
+            if rerun is not None:
+                rerun.queries.append(record)
+            if self.config.full_scan_check and _is_filtered_read(record.normalized):
+                with self._lock:
+                    unchecked = record.normalized not in self._plans_checked
+                    self._plans_checked.add(record.normalized)
+                if unchecked:
+                    self._resolve_caller(record)
+                    self._check_full_scan(record, cursor.connection)
+        if check_slow and not record.logged and record.duration_ms >= self.config.slow_query_threshold_ms:
+            record.logged = True
+            self._resolve_caller(record)
+            self._log_slow_query(record, cursor.connection)
+
+    def _resolve_caller(self, record: QueryRecord):
+        """Remonter la pile (appelé pendant l'exécution ou la lecture de la requête)"""
+        if record.caller is None:
+            record.caller = _find_caller()
+            with self._lock:
+                self._callers.setdefault(record.normalized, record.caller)
+
+    def _log_slow_query(self, record: QueryRecord, conn: sqlite3.Connection):
+        plan = self.explain(conn, record.sql, record.params)
+        rerun = getattr(self._local, 'rerun', None)
+        entry = record.to_dict()
+        entry.update({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'page': rerun.page if rerun is not None else None,
+            'plan': plan,
+        })
+        logger.warning(f"🐢 Requête lente ({record.duration_ms:.1f} ms) depuis {record.caller}{self._page_suffix()}: "
+                       f"{record.normalized[:200]}")
+
+        path = self.config.slow_query_log_path
+        if not path:
+            return
+        try:
+            with self._log_lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"Erreur écriture journal des requêtes lentes: {e}")
+
+    def _check_full_scan(self, record: QueryRecord, conn: sqlite3.Connection):
+        """Vérifier une fois par requête normalisée si son plan parcourt une table entière"""
+        scans = find_full_scans(self.explain(conn, record.sql, record.params),
+                                self.config.full_scan_ignore_tables)
+        if not scans:
+            return
+        with self._lock:
+            self._full_scans[record.normalized] = {'caller': record.caller, 'scans': scans}
+        logger.warning(f"🔎 Parcours complet ({', '.join(scans)}) depuis {record.caller}{self._page_suffix()}: "
+                       f"{record.normalized[:200]}")
+
+    def _page_suffix(self) -> str:
+        rerun = getattr(self._local, 'rerun', None)
+        return f" (page {rerun.page})" if rerun is not None and rerun.page else ""
+
+    def get_full_scans(self) -> Dict[str, Dict[str, Any]]:
+        """Requêtes normalisées dont le plan contient un parcours complet de table"""
+        with self._lock:
+            return dict(self._full_scans)
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql: str, params=None) -> List[str]:
+        """EXPLAIN QUERY PLAN d'une requête (liste des étapes), [] si non applicable"""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            # Curseur non instrumenté : l'EXPLAIN ne doit pas être mesuré lui-même
+            cursor = sqlite3.Cursor(conn)
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params if params is not None else ())
+            return [row[3] for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            return [f"EXPLAIN impossible: {e}"]
+
+    # --- Consultation ------------------------------------------------------------
+
+    def get_current_rerun_stats(self) -> Optional[Dict[str, Any]]:
+        """Mesures du rerun en cours pour le thread courant"""
+        rerun = getattr(self._local, 'rerun', None)
+        if rerun is None:
+            return None
+        summary = self._summarize(rerun.queries)
+        summary['page'] = rerun.page
+        summary['queries'] = []
+        for record in rerun.queries:
+            query = record.to_dict()
+            query['caller'] = self._caller_of(record)
+            summary['queries'].append(query)
+        return summary
+
+    def get_page_stats(self, top: int = 10) -> Dict[str, Dict[str, Any]]:
+        """Agrégats par page : moyenne de requêtes et de temps par rerun, principaux appelants"""
+        with self._lock:
+            result = {}
+            for page, stats in self._pages.items():
+                reruns = stats['reruns'] or 1
+                result[page] = {
+                    'reruns': stats['reruns'],
+                    'avg_queries': round(stats['queries'] / reruns, 1),
+                    'avg_query_ms': round(stats['query_ms'] / reruns, 1),
+                    'max_queries': stats['max_queries'],
+                    'max_query_ms': round(stats['max_query_ms'], 1),
+                    'budget_exceeded': stats['budget_exceeded'],
+                    'top_callers': [
+                        {'caller': caller, 'per_rerun': round(count / reruns, 1)}
+                        for caller, count in stats['by_caller'].most_common(top)
+                    ],
+                    'top_queries': [
+                        {'sql': sql, 'per_rerun': round(count / reruns, 1)}
+                        for sql, count in stats['by_sql'].most_common(top)
+                    ],
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._pages.clear()
+            self._plans_checked.clear()
+            self._callers.clear()
+            self._full_scans.clear()
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Curseur qui mesure execute/executemany et les lectures de résultats"""
+
+    _record = None
+
+    def execute(self, sql, parameters=()):
+        record, parameters = query_monitor.begin(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._after_execute(record, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        record, seq_of_parameters = query_monitor.begin(sql, seq_of_parameters, many=True)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._after_execute(record, start)
+
+    def _after_execute(self, record: QueryRecord, start: float):
+        record.duration_ms = (time.perf_counter() - start) * 1000
+        if self.description is None and self.rowcount > 0:
+            record.rows = self.rowcount
+        self._record = record
+        # SELECT : le seuil de lenteur est vérifié à la lecture, une fois les lignes comptées
+        query_monitor.finish(record, self, first=True, check_slow=self.description is None)
+
+    def _after_fetch(self, start: float, rows: int):
+        record = self._record
+        if record is not None:
+            record.duration_ms += (time.perf_counter() - start) * 1000
+            record.rows += rows
+            query_monitor.finish(record, self, first=False)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._after_fetch(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._after_fetch(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._after_fetch(start, len(rows))
+        return rows
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion dont tous les curseurs (y compris ceux de pandas) sont instrumentés"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# Instance globale
+query_monitor = QueryMonitor()
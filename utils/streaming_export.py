@@ -0,0 +1,182 @@
+"""
+Export CSV / Excel en flux vers un fichier temporaire
+
+Les exports lisent la requête par blocs (curseur SQLite parcouru avec fetchmany) et
+écrivent chaque bloc dans un fichier temporaire : CSV, ou XLSX via le mode write_only
+d'openpyxl. Aucun DataFrame complet n'est construit, la mémoire utilisée reste celle
+d'un bloc quel que soit le nombre de lignes. Le fichier produit est ensuite servi par
+st.download_button (voir download_export_button).
+"""
+import csv
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models.database import db
+
+logger = logging.getLogger(__name__)
+
+# Répertoire des fichiers d'export, purgé des fichiers de plus d'une heure
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'budgetmanage_exports')
+_EXPORT_MAX_AGE = 3600
+
+DEFAULT_CHUNK_SIZE = 2000
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Colonne d'export : (en-tête, clé dans la ligne SQL, formateur optionnel de la valeur)
+ExportColumn = Tuple[str, str, Optional[Callable[[Any], Any]]]
+
+def iter_query_chunks(query: str, params: Sequence = (), chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Lignes de la requête (sqlite3.Row) par blocs de chunk_size, lues au fil du curseur"""
+    with db.get_connection() as conn:
+        cursor = conn.execute(query, tuple(params))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+
+def _purge_old_exports():
+    now = time.time()
+    try:
+        for name in os.listdir(EXPORT_DIR):
+            path = os.path.join(EXPORT_DIR, name)
+            if now - os.path.getmtime(path) > _EXPORT_MAX_AGE:
+                os.remove(path)
+    except OSError:
+        pass
+
+def _row_converter(row_keys: List[str], columns: List[ExportColumn]) -> Optional[Callable]:
+    """
+    Fonction ligne SQL -> valeurs exportées, résolue une fois par export (positions des
+    colonnes) ; None si la ligne peut être écrite telle quelle.
+    """
+    positions = [row_keys.index(key) for _, key, _ in columns]
+    formatters = [(i, formatter) for i, (_, _, formatter) in enumerate(columns) if formatter]
+    if not formatters and positions == list(range(len(row_keys))):
+        return None
+
+    def convert(row):
+        values = [row[position] for position in positions]
+        for i, formatter in formatters:
+            values[i] = formatter(values[i])
+        return values
+
+    return convert
+
+def _default_columns(cursor_columns: Iterable[str]) -> List[ExportColumn]:
+    return [(name, name, None) for name in cursor_columns]
+
+def export_query(query: str, params: Sequence = (), columns: Optional[List[ExportColumn]] = None,
+                 fmt: str = 'csv', file_prefix: str = 'export', sheet_name: str = 'Export',
+                 extra_sheets: Optional[Dict[str, List[Sequence[Any]]]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Écrire le résultat d'une requête dans un fichier temporaire CSV ou XLSX, bloc par bloc.
+
+    Args:
+        columns: Colonnes exportées (en-tête, clé, formateur) ; par défaut toutes les colonnes
+            de la requête avec leur nom
+        fmt: 'csv' ou 'xlsx' (openpyxl requis ; CSV si indisponible)
+        extra_sheets: Feuilles XLSX supplémentaires {nom: lignes, première ligne = en-têtes},
+            ignorées en CSV
+
+    Returns:
+        Dict avec success, path, file_name, mime, rows (lignes exportées), format et error
+    """
+    if fmt == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            logger.warning("⚠️ openpyxl indisponible, export en CSV")
+            fmt = 'csv'
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _purge_old_exports()
+    file_name = f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}"
+    handle, path = tempfile.mkstemp(prefix=f"{file_prefix}_", suffix=f".{fmt}", dir=EXPORT_DIR)
+    os.close(handle)
+
+    result = {'success': False, 'path': path, 'file_name': file_name, 'mime': MIME_TYPES[fmt],
+              'rows': 0, 'format': fmt, 'error': None}
+    try:
+        if fmt == 'xlsx':
+            result['rows'] = _write_xlsx(path, query, params, columns, sheet_name, extra_sheets, chunk_size)
+        else:
+            result['rows'] = _write_csv(path, query, params, columns, chunk_size)
+        result['success'] = True
+    except Exception as e:
+        logger.error(f"Erreur export {file_prefix}: {e}")
+        result['error'] = str(e)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return result
+
+def _write_csv(path: str, query: str, params: Sequence, columns: Optional[List[ExportColumn]],
+               chunk_size: int) -> int:
+    count = 0
+    # utf-8-sig : accents lisibles à l'ouverture dans Excel
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        header_written = False
+        for rows in iter_query_chunks(query, params, chunk_size):
+            if not header_written:
+                columns = columns or _default_columns(rows[0].keys())
+                convert = _row_converter(rows[0].keys(), columns)
+                writer.writerow([header for header, _, _ in columns])
+                header_written = True
+            writer.writerows(map(convert, rows) if convert else rows)
+            count += len(rows)
+        if not header_written and columns:
+            writer.writerow([header for header, _, _ in columns])
+    return count
+
+def _write_xlsx(path: str, query: str, params: Sequence, columns: Optional[List[ExportColumn]],
+                sheet_name: str, extra_sheets: Optional[Dict[str, List[Sequence[Any]]]],
+                chunk_size: int) -> int:
+    from openpyxl import Workbook
+
+    # write_only : les lignes sont écrites dans le fichier au fur et à mesure
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    count = 0
+    header_written = False
+    for rows in iter_query_chunks(query, params, chunk_size):
+        if not header_written:
+            columns = columns or _default_columns(rows[0].keys())
+            convert = _row_converter(rows[0].keys(), columns)
+            sheet.append([header for header, _, _ in columns])
+            header_written = True
+        for row in rows:
+            sheet.append(convert(row) if convert else list(row))
+        count += len(rows)
+    if not header_written and columns:
+        sheet.append([header for header, _, _ in columns])
+
+    for name, lines in (extra_sheets or {}).items():
+        extra = workbook.create_sheet(name)
+        for line in lines:
+            extra.append(list(line))
+
+    workbook.save(path)
+    return count
+
+def download_export_button(result: Dict[str, Any], label: str = "📥 Télécharger", **kwargs) -> bool:
+    """Servir un fichier produit par export_query avec st.download_button"""
+    import streamlit as st
+
+    if not result.get('success'):
+        st.error(f"❌ Erreur lors de l'export: {result.get('error')}")
+        return False
+    with open(result['path'], 'rb') as f:
+        st.download_button(label=label, data=f, file_name=result['file_name'], mime=result['mime'], **kwargs)
+    return True
@@ -28,13 +28,16 @@ def admin_create_demande_page():
     available_drs = AdminDemandeController.get_available_drs()
     
     # Récupérer les options depuis la table dropdown_options
-    from views.admin_dropdown_options_view import get_valid_dropdown_options
+    from views.admin_dropdown_options_view import get_valid_dropdown_options_by_category
     
-    budget_options = get_valid_dropdown_options('budget')
-    categorie_options = get_valid_dropdown_options('categorie')
-    typologie_options = get_valid_dropdown_options('typologie_client')
-    region_options = get_valid_dropdown_options('region')
-    groupe_options = get_valid_dropdown_options('groupe_groupement')
+    form_options = get_valid_dropdown_options_by_category(
+        ('budget', 'categorie', 'typologie_client', 'region', 'groupe_groupement')
+    )
+    budget_options = form_options['budget']
+    categorie_options = form_options['categorie']
+    typologie_options = form_options['typologie_client']
+    region_options = form_options['region']
+    groupe_options = form_options['groupe_groupement']
     
     # Affichage d'avertissement si les options ne sont pas disponibles (non bloquant)
     if not budget_options and not categorie_options:
@@ -7,54 +7,9 @@ import pandas as pd
 from datetime import datetime
 from controllers.auth_controller import AuthController
 from models.dropdown_options import DropdownOptionsModel
+from models.dropdown_usage import DropdownUsageModel
 from models.database import db
 
-def _get_usage_count(category: str, value: str) -> int:
-    """
-    Obtient le nombre d'utilisations d'une valeur dans les demandes
-    Gère le mapping des catégories vers les bonnes colonnes
-    """
-    try:
-        # Mapping des catégories vers les colonnes de la table demandes
-        column_mapping = {
-            'budget': 'budget',
-            'categorie': 'categorie',
-            'typologie_client': 'typologie_client',
-            'groupe_groupement': 'groupe_groupement',
-            'region': 'region',
-            'annee_fiscale': None  # Cas spécial - pas de colonne directe
-        }
-        
-        column_name = column_mapping.get(category)
-        
-        if column_name is None:
-            # Pour annee_fiscale, on ne peut pas compter directement
-            # car il n'y a pas de colonne annee_fiscale dans demandes
-            if category == 'annee_fiscale':
-                # On pourrait vérifier fiscal_year mais c'est complexe avec la conversion
-                # Pour l'instant, on retourne 0
-                return 0
-            else:
-                return None
-        
-        # Vérifier si la colonne existe dans la table demandes
-        columns_info = db.execute_query("PRAGMA table_info(demandes)", fetch='all')
-        existing_columns = [col['name'] for col in columns_info]
-        
-        if column_name not in existing_columns:
-            return None
-        
-        # Compter les utilisations
-        result = db.execute_query(f'''
-            SELECT COUNT(*) FROM demandes WHERE {column_name} = ?
-        ''', (value,), fetch='one')
-        
-        return result[0] if result else 0
-        
-    except Exception as e:
-        print(f"Erreur _get_usage_count pour {category}={value}: {e}")
-        return None
-
 @AuthController.require_role(['admin'])
 def admin_dropdown_options_page():
     """Page UNIQUE de gestion des listes déroulantes - CRUD complet"""
@@ -203,6 +158,9 @@ def _crud_options_tab():
     
     st.markdown("---")
     
+    # Utilisations de toutes les valeurs de la catégorie en une requête (table dropdown_usage)
+    usage_counts = DropdownUsageModel.get_counts(selected_category)
+    
     # CRUD ligne par ligne
     for option in options:
         col = st.columns([1, 3, 2, 1, 1, 2, 2])
@@ -252,7 +210,7 @@ def _crud_options_tab():
         
         # Utilisation en base
         with col[5]:
-            usage_count = _get_usage_count(selected_category, option['value'])
+            usage_count = usage_counts.get(option['value'], 0) if usage_counts is not None else None
             if usage_count is not None:
                 if usage_count > 0:
                     st.caption(f"📊 {usage_count}x")
@@ -536,31 +494,8 @@ def _impact_demandes_tab():
     
     with col3:
         try:
-            # Liste des catégories qui ont des colonnes dans demandes
-            categories_with_columns = ['budget', 'categorie', 'typologie_client', 'groupe_groupement', 'region']
-            invalid_count = 0
-            
-            for category in categories_with_columns:
-                try:
-                    # Vérifier si la colonne existe
-                    columns_info = db.execute_query("PRAGMA table_info(demandes)", fetch='all')
-                    existing_columns = [col['name'] for col in columns_info]
-                    
-                    if category in existing_columns:
-                        invalid = db.execute_query(f'''
-                            SELECT COUNT(DISTINCT d.{category})
-                            FROM demandes d
-                            WHERE d.{category} IS NOT NULL 
-                            AND d.{category} != ''
-                            AND NOT EXISTS (
-                                SELECT 1 FROM dropdown_options o 
-                                WHERE o.category = ? AND o.value = d.{category} AND o.is_active = 1
-                            )
-                        ''', (category,), fetch='one')[0]
-                        invalid_count += invalid
-                except Exception as e:
-                    print(f"Erreur vérification {category}: {e}")
-                    pass
+            # Valeurs utilisées dans les demandes sans option active (table dropdown_usage)
+            invalid_count = DropdownUsageModel.count_unknown_values()
             
             st.metric("Valeurs Invalides", invalid_count)
         except Exception as e:
@@ -568,32 +503,31 @@ def _impact_demandes_tab():
 
 # Fonctions utilitaires
 def get_valid_dropdown_options(category: str):
-    """Récupère les options valides pour un formulaire"""
-    from models.database import db
+    """Récupère les options valides pour un formulaire (listes prêtes du registre en mémoire)"""
+    from utils.dropdown_registry import dropdown_registry
     
     try:
-        options = db.execute_query('''
-            SELECT value, label FROM dropdown_options 
-            WHERE category = ? AND is_active = TRUE
-            ORDER BY order_index ASC, label ASC
-        ''', (category,), fetch='all')
-        
-        return [(opt['value'], opt['label']) for opt in options] if options else []
+        return dropdown_registry.get_form_options(category)
     except Exception as e:
         print(f"Erreur get_valid_dropdown_options: {e}")
         return []
 
+def get_valid_dropdown_options_by_category(categories):
+    """Options valides de plusieurs catégories pour un formulaire, lues dans le même instantané"""
+    from utils.dropdown_registry import dropdown_registry
+    
+    try:
+        return dropdown_registry.get_form_options_by_category(categories)
+    except Exception as e:
+        print(f"Erreur get_valid_dropdown_options_by_category: {e}")
+        return {category: [] for category in categories}
+
 def validate_dropdown_value(category: str, value: str) -> bool:
     """Valide qu'une valeur est autorisée"""
-    from models.database import db
+    from utils.dropdown_registry import dropdown_registry
     
     try:
-        result = db.execute_query('''
-            SELECT id FROM dropdown_options
-            WHERE category = ? AND value = ? AND is_active = 1
-        ''', (category, value), fetch='one')
-        
-        return result is not None
+        return dropdown_registry.is_valid(category, value)
     except Exception as e:
         print(f"Erreur validate_dropdown_value: {e}")
         return False
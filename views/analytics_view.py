@@ -8,6 +8,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from controllers.auth_controller import AuthController
 from controllers.demande_controller import DemandeController
+from models.analytics_cube import AnalyticsCube
 
 @AuthController.require_auth
 def analytics_page():
@@ -22,22 +23,33 @@ def analytics_page():
     
     # Afficher les filtres d'analytics
     try:
-        from views.components.analytics_filters import display_analytics_filters, apply_analytics_filters, get_filtered_count_info
+        from views.components.analytics_filters import display_analytics_filters, get_analytics_filters, get_filtered_count_info
         display_analytics_filters()
         
-        # Récupérer les données selon le rôle
+        user_id = AuthController.get_current_user_id()
+        filters = get_analytics_filters()
+
+        # Filtres exprimables sur le cube (statut, type) et rôle dont le périmètre est celui du
+        # cube (hors participations) : agrégats pré-calculés, aucune demande lue
+        cube_filters = (AnalyticsCube.filters_from_ui(filters)
+                        if AnalyticsCube.supports_role(user_info['role']) else None)
+        if cube_filters is not None:
+            aggregates = _aggregate_from_cube(user_id, user_info['role'], filters, cube_filters)
+            if aggregates is None:
+                st.info("Aucune donnée à analyser pour les filtres sélectionnés")
+                return
+            _display_analytics(aggregates, user_info, filters)
+            return
+
+        # Récupérer les données selon le rôle, filtres appliqués par la base
         demandes = DemandeController.get_demandes_for_user(
-            AuthController.get_current_user_id(), 
+            user_id,
             user_info['role'],
-            status_filter='tous'
+            filters=filters
         )
         
-        original_count = len(demandes)
+        original_count = DemandeController.count_demandes_for_user(user_id, user_info['role'])
         
-        # Appliquer les filtres d'analytics
-        if not demandes.empty:
-            demandes = apply_analytics_filters(demandes)
-            
         # Afficher info sur le filtrage
         if original_count > 0:
             st.info(get_filtered_count_info(original_count, len(demandes)))
@@ -45,6 +57,8 @@ def analytics_page():
     except ImportError:
         # Fallback vers l'ancienne méthode
         _display_analytics_filters()
+        filters = {name: st.session_state.get(f'analytics_{name}')
+                   for name in ['status_filter', 'type_filter', 'periode_filter', 'montant_filter']}
         
         demandes = DemandeController.get_demandes_for_user(
             AuthController.get_current_user_id(), 
@@ -58,6 +72,7 @@ def analytics_page():
     except Exception as e:
         st.error(f"Erreur lors du chargement des données: {e}")
         demandes = pd.DataFrame()
+        filters = None
     
     if demandes.empty:
         st.info("Aucune donnée à analyser pour les filtres sélectionnés")
@@ -72,24 +87,112 @@ def analytics_page():
         st.error(f"Erreur de conversion des dates: {e}")
         return
     
+    _display_analytics(_aggregate_from_rows(demandes), user_info, filters)
+
+def _aggregate_from_cube(user_id, role, filters, cube_filters):
+    """Agrégats de la page lus dans le cube analytique (None si aucune demande)"""
+    from views.components.analytics_filters import get_filtered_count_info
+
+    totals = DemandeController.get_analytics_slice(user_id, role, [], cube_filters)
+    total = totals[0] if totals else {'nb': 0, 'montant': 0, 'montant_valide': 0}
+    if cube_filters:
+        overall = DemandeController.get_analytics_slice(user_id, role, [])
+        original_count = overall[0]['nb'] if overall else 0
+    else:
+        original_count = total['nb']
+
+    if original_count > 0:
+        st.info(get_filtered_count_info(original_count, total['nb']))
+    if not total['nb']:
+        return None
+
+    by_status = DemandeController.get_analytics_slice(user_id, role, ['status'], cube_filters)
+    monthly = DemandeController.get_analytics_slice(user_id, role, ['mois'], cube_filters)
+    validees = sum(row['nb'] for row in by_status if row['status'] == 'validee')
+
+    aggregates = {
+        'metrics': {
+            'total_demandes': total['nb'],
+            'total_montant': total['montant'],
+            'montant_valide': total['montant_valide'],
+            'taux_validation': validees / total['nb'] * 100,
+        },
+        'monthly': pd.DataFrame(
+            [{'mois': row['mois'], 'sum': row['montant'], 'count': row['nb']} for row in monthly if row['mois']],
+            columns=['mois', 'sum', 'count']
+        ),
+        'status': pd.DataFrame(
+            [{'status': row['status'], 'count': row['nb']} for row in by_status],
+            columns=['status', 'count']
+        ),
+        'clients': pd.DataFrame(
+            DemandeController.get_top_clients(user_id, role, filters),
+            columns=['client', 'montant_total', 'nb_demandes']
+        ),
+        'regions': None,
+    }
+    if role in ['admin', 'dg']:
+        regions = DemandeController.get_analytics_slice(user_id, role, ['region'], cube_filters)
+        aggregates['regions'] = pd.DataFrame(
+            [{'region': row['region'], 'montant_total': row['montant'], 'nb_demandes': row['nb']} for row in regions],
+            columns=['region', 'montant_total', 'nb_demandes']
+        )
+    return aggregates
+
+def _aggregate_from_rows(demandes):
+    """Agrégats de la page calculés sur les demandes chargées (filtres hors cube)"""
+    total_demandes = len(demandes)
+    validees = demandes[demandes['status'] == 'validee']
+
+    client_data = demandes.groupby('client').agg({
+        'montant': ['sum', 'count']
+    }).reset_index()
+    client_data.columns = ['client', 'montant_total', 'nb_demandes']
+
+    status_data = demandes['status'].value_counts().reset_index()
+    status_data.columns = ['status', 'count']
+
+    regional_data = None
+    if 'region' in demandes.columns:
+        regional_data = demandes.groupby('region').agg({
+            'montant': 'sum',
+            'id': 'count'
+        }).reset_index()
+        regional_data.columns = ['region', 'montant_total', 'nb_demandes']
+
+    return {
+        'metrics': {
+            'total_demandes': total_demandes,
+            'total_montant': demandes['montant'].sum(),
+            'montant_valide': validees['montant'].sum(),
+            'taux_validation': (len(validees) / total_demandes * 100) if total_demandes > 0 else 0,
+        },
+        'monthly': demandes.groupby('mois')['montant'].agg(['sum', 'count']).reset_index(),
+        'status': status_data,
+        'clients': client_data.sort_values('montant_total', ascending=False).head(10),
+        'regions': regional_data,
+    }
+
+def _display_analytics(aggregates, user_info, filters):
+    """Métriques, graphiques et export à partir des agrégats de la page"""
     # Métriques globales
-    _display_global_metrics(demandes)
+    _display_global_metrics(aggregates['metrics'])
     
     # Graphiques
     col1, col2 = st.columns(2)
     
     with col1:
-        _display_evolution_chart(demandes)
+        _display_evolution_chart(aggregates['monthly'])
     
     with col2:
-        _display_status_chart(demandes)
+        _display_status_chart(aggregates['status'])
     
     # Analyses détaillées
-    _display_client_analysis(demandes)
-    _display_regional_analysis(demandes, user_info)
+    _display_client_analysis(aggregates['clients'])
+    _display_regional_analysis(aggregates['regions'], user_info)
     
     # Export des données
-    _display_export_section(demandes)
+    _display_export_section(user_info, filters)
 
 def _display_analytics_filters():
     """Affiche les filtres pour les analytics"""
@@ -250,31 +353,24 @@ def _apply_analytics_filters(demandes):
     
     return filtered_demandes
 
-def _display_global_metrics(demandes):
+def _display_global_metrics(metrics):
     """Affiche les métriques globales"""
     col1, col2, col3, col4 = st.columns(4)
     
-    total_demandes = len(demandes)
-    total_montant = demandes['montant'].sum()
-    montant_valide = demandes[demandes['status'] == 'validee']['montant'].sum()
-    taux_validation = (len(demandes[demandes['status'] == 'validee']) / total_demandes * 100) if total_demandes > 0 else 0
-    
     with col1:
-        st.metric("Total Demandes", total_demandes)
+        st.metric("Total Demandes", metrics['total_demandes'])
     with col2:
-        st.metric("Montant Total", f"{total_montant:,.0f}€")
+        st.metric("Montant Total", f"{metrics['total_montant']:,.0f}€")
     with col3:
-        st.metric("Montant Validé", f"{montant_valide:,.0f}€")
+        st.metric("Montant Validé", f"{metrics['montant_valide']:,.0f}€")
     with col4:
-        st.metric("Taux Validation", f"{taux_validation:.1f}%")
+        st.metric("Taux Validation", f"{metrics['taux_validation']:.1f}%")
 
-def _display_evolution_chart(demandes):
-    """Affiche l'évolution mensuelle"""
+def _display_evolution_chart(monthly_data):
+    """Affiche l'évolution mensuelle (colonnes mois, sum, count)"""
     st.subheader("📈 Évolution Mensuelle")
     
     try:
-        monthly_data = demandes.groupby('mois')['montant'].agg(['sum', 'count']).reset_index()
-        
         if not monthly_data.empty:
             fig = px.line(
                 monthly_data, 
@@ -294,14 +390,11 @@ def _display_evolution_chart(demandes):
     except Exception as e:
         st.error(f"Erreur graphique évolution: {e}")
 
-def _display_status_chart(demandes):
-    """Affiche la répartition par statut"""
+def _display_status_chart(status_data):
+    """Affiche la répartition par statut (colonnes status, count)"""
     st.subheader("📊 Répartition par Statut")
     
     try:
-        status_data = demandes['status'].value_counts().reset_index()
-        status_data.columns = ['status', 'count']
-        
         if not status_data.empty:
             fig = px.pie(
                 status_data, 
@@ -320,17 +413,11 @@ def _display_status_chart(demandes):
     except Exception as e:
         st.error(f"Erreur graphique statut: {e}")
 
-def _display_client_analysis(demandes):
-    """Affiche l'analyse par client"""
+def _display_client_analysis(client_data):
+    """Affiche l'analyse par client (10 premiers : client, montant_total, nb_demandes)"""
     st.subheader("🏢 Top Clients")
     
     try:
-        client_data = demandes.groupby('client').agg({
-            'montant': ['sum', 'count']
-        }).reset_index()
-        client_data.columns = ['client', 'montant_total', 'nb_demandes']
-        client_data = client_data.sort_values('montant_total', ascending=False).head(10)
-        
         if not client_data.empty:
             fig = px.bar(
                 client_data, 
@@ -351,24 +438,13 @@ def _display_client_analysis(demandes):
     except Exception as e:
         st.error(f"Erreur analyse clients: {e}")
 
-def _display_regional_analysis(demandes, user_info):
-    """Affiche l'analyse par région"""
+def _display_regional_analysis(regional_data, user_info):
+    """Affiche l'analyse par région (colonnes region, montant_total, nb_demandes)"""
     if user_info['role'] in ['admin', 'dg']:
         st.subheader("🌍 Analyse Régionale")
         
         try:
-            # Simuler des données régionales si pas disponibles
-            if 'region' not in demandes.columns:
-                regions = ['Nord', 'Sud', 'Est', 'Ouest', 'Centre']
-                demandes['region'] = pd.Series(regions * (len(demandes) // len(regions) + 1))[:len(demandes)]
-            
-            regional_data = demandes.groupby('region').agg({
-                'montant': 'sum',
-                'id': 'count'
-            }).reset_index()
-            regional_data.columns = ['region', 'montant_total', 'nb_demandes']
-            
-            if not regional_data.empty:
+            if regional_data is not None and not regional_data.empty:
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -391,8 +467,10 @@ def _display_regional_analysis(demandes, user_info):
         except Exception as e:
             st.error(f"Erreur analyse régionale: {e}")
 
-def _display_export_section(demandes):
-    """Affiche la section d'export"""
+def _display_export_section(user_info, filters):
+    """Affiche la section d'export (demandes filtrées écrites en flux dans un fichier temporaire)"""
+    from utils.streaming_export import download_export_button
+
     st.markdown("---")
     st.subheader("📁 Export des Données")
     
@@ -401,14 +479,11 @@ def _display_export_section(demandes):
     with col1:
         if st.button("📊 Exporter Excel", use_container_width=True):
             try:
-                # Fallback vers CSV si Excel non disponible
-                csv_data = demandes.to_csv(index=False)
-                st.download_button(
-                    label="📥 Télécharger CSV",
-                    data=csv_data,
-                    file_name=f"analytics_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                    mime="text/csv"
+                # CSV si openpyxl n'est pas disponible
+                result = DemandeController.export_demandes_file(
+                    AuthController.get_current_user_id(), user_info['role'], filters, fmt='xlsx'
                 )
+                download_export_button(result, label=f"📥 Télécharger {result.get('format', 'csv').upper()}")
             except Exception as e:
                 st.error(f"Erreur export: {e}")
     
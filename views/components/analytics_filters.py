@@ -2,7 +2,7 @@
 Composant de filtres pour la page des analytics
 """
 import streamlit as st
-from utils.filters import FilterUI, FilterManager, apply_combined_filters
+from utils.filters import FilterUI, FilterManager
 
 def display_analytics_filters():
     """Affiche des filtres pour les analytics"""
@@ -44,17 +44,14 @@ def display_analytics_filters():
             FilterManager.clear_filters('analytics', filter_names, default_filters)
             st.rerun()
 
-def apply_analytics_filters(df):
-    """Applique les filtres aux données d'analytics"""
-    # Récupérer les valeurs des filtres
-    filters = {
+def get_analytics_filters():
+    """Filtres courants des analytics, à transmettre à get_demandes_for_user (appliqués en SQL)"""
+    return {
         'status_filter': FilterManager.get_filter_value('analytics', 'status_filter'),
         'type_filter': FilterManager.get_filter_value('analytics', 'type_filter'),
         'periode_filter': FilterManager.get_filter_value('analytics', 'periode_filter'),
         'montant_filter': FilterManager.get_filter_value('analytics', 'montant_filter')
     }
-    
-    return apply_combined_filters(df, filters)
 
 def get_filtered_count_info(original_count, filtered_count):
     """Retourne un message informatif sur le filtrage"""
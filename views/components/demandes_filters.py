@@ -2,7 +2,14 @@
 Version simplifiée des filtres pour demandes_view.py
 """
 import streamlit as st
-from utils.filters import FilterUI, FilterManager, apply_combined_filters
+from utils.filters import FilterUI, FilterManager
+from utils.filter_sql import FTS_COLUMNS
+
+# Colonnes de la recherche textuelle (voir utils.filter_sql.SEARCHABLE_COLUMNS) :
+# index plein texte demandes_fts (dont budget, categorie, typologie_client et
+# groupe_groupement) + identité du demandeur. Recherche par début de mot, voir
+# utils.filter_sql.fts_match_expression
+DEMANDES_SEARCH_COLUMNS = FTS_COLUMNS + ['prenom', 'nom', 'email']
 
 def display_simplified_filters():
     """Affiche des filtres simplifiés et robustes"""
@@ -70,25 +77,13 @@ def display_simplified_filters():
                 st.session_state.page = "nouvelle_demande"
                 st.rerun()
 
-def apply_demandes_filters(df):
-    """Applique les filtres aux demandes"""
-    from utils.spinner_utils import OperationFeedback
-    
-    with OperationFeedback.apply_filters():
-        # Récupérer les valeurs des filtres
-        filters = {
-            'search_query': FilterManager.get_filter_value('demandes', 'search_query'),
-            'status_filter': FilterManager.get_filter_value('demandes', 'status_filter'),
-            'type_filter': FilterManager.get_filter_value('demandes', 'type_filter'),
-            'montant_filter': FilterManager.get_filter_value('demandes', 'montant_filter'),
-            'cy_filter': FilterManager.get_filter_value('demandes', 'cy_filter'),
-            'by_filter': FilterManager.get_filter_value('demandes', 'by_filter')
-        }
-        
-        # Colonnes de recherche textuelle
-        search_columns = [
-            'nom_manifestation', 'client', 'lieu', 'budget', 'categorie', 
-            'prenom', 'nom', 'email', 'typologie_client', 'groupe_groupement'
-        ]
-        
-        return apply_combined_filters(df, filters, search_columns)
+def get_demandes_filters():
+    """Filtres courants de la page demandes, à transmettre à get_demandes_for_user (appliqués en SQL)"""
+    return {
+        'search_query': FilterManager.get_filter_value('demandes', 'search_query'),
+        'status_filter': FilterManager.get_filter_value('demandes', 'status_filter'),
+        'type_filter': FilterManager.get_filter_value('demandes', 'type_filter'),
+        'montant_filter': FilterManager.get_filter_value('demandes', 'montant_filter'),
+        'cy_filter': FilterManager.get_filter_value('demandes', 'cy_filter'),
+        'by_filter': FilterManager.get_filter_value('demandes', 'by_filter')
+    }
@@ -6,10 +6,11 @@ import pandas as pd
 from datetime import datetime
 from controllers.auth_controller import AuthController
 from controllers.demande_controller import DemandeController
-from config.settings import get_status_info
+from config.settings import get_status_info, app_config
 from utils.date_utils import format_date
 from utils.spinner_utils import OperationFeedback
 from models.user import UserModel
+from services.demande_card_loader import DemandeCardLoader
 
 @AuthController.require_auth
 def demandes_page():
@@ -24,19 +25,30 @@ def demandes_page():
     
     # Filtres et recherche (version simplifiée)
     try:
-        from views.components.demandes_filters import display_simplified_filters, apply_demandes_filters
+        from views.components.demandes_filters import (
+            display_simplified_filters, get_demandes_filters, DEMANDES_SEARCH_COLUMNS
+        )
         display_simplified_filters()
+        filters = get_demandes_filters()
+        cursor = _get_page_cursor(filters)
         
-        # Récupérer toutes les demandes d'abord
+        # Les filtres sont appliqués par la base : seule la page affichée est chargée
         with OperationFeedback.load_demandes():
-            demandes = DemandeController.get_demandes_for_user(
+            page = DemandeController.get_demandes_page(
                 user_id=AuthController.get_current_user_id(),
-                role=user_info['role']
+                role=user_info['role'],
+                filters=filters,
+                search_columns=DEMANDES_SEARCH_COLUMNS,
+                page_size=app_config.default_page_size,
+                after=cursor
+            )
+            demandes = page['rows']
+            totals = DemandeController.get_demandes_totals(
+                user_id=AuthController.get_current_user_id(),
+                role=user_info['role'],
+                filters=filters,
+                search_columns=DEMANDES_SEARCH_COLUMNS
             )
-        
-        # Appliquer les filtres
-        if not demandes.empty:
-            demandes = apply_demandes_filters(demandes)
             
     except ImportError:
         # Fallback vers l'ancienne méthode si le composant n'est pas disponible
@@ -61,21 +73,69 @@ def demandes_page():
         
         if not demandes.empty:
             demandes = _apply_filters(demandes, type_filter, montant_filter, search_query)
+        totals = _compute_totals(demandes)
+        page = {'next_cursor': None, 'has_more': False}
             
     except Exception as e:
         st.error(f"Erreur lors du chargement des demandes: {e}")
         demandes = pd.DataFrame()
     
+    if demandes.empty and len(st.session_state.get('demandes_page_cursors', [None])) > 1:
+        # Page devenue vide (demandes supprimées ou modifiées) : revenir à la première page
+        st.session_state.demandes_page_cursors = [None]
+        st.rerun()
+    
     if demandes.empty:
         st.info("Aucune demande trouvée")
         _display_no_demandes_help()
         return
     
-    # Statistiques rapides
-    _display_quick_stats(demandes)
+    # Statistiques rapides (calculées sur l'ensemble filtré, pas seulement la page)
+    _display_quick_stats(totals)
     
-    # Affichage des demandes
+    # Affichage des demandes de la page courante
     _display_cards_view(demandes, user_info)
+    _display_pagination(page, totals['total'])
+
+def _get_page_cursor(filters):
+    """Curseur de la page courante ; revient à la première page quand les filtres changent"""
+    signature = repr(sorted(filters.items(), key=lambda item: item[0]))
+    if st.session_state.get('demandes_page_filters') != signature:
+        st.session_state.demandes_page_filters = signature
+        # Pile des curseurs des pages parcourues : None = première page
+        st.session_state.demandes_page_cursors = [None]
+    return st.session_state.demandes_page_cursors[-1]
+
+def _display_pagination(page, total):
+    """Navigation page précédente / suivante (pagination par clé)"""
+    cursors = st.session_state.get('demandes_page_cursors', [None])
+    page_number = len(cursors)
+    page_count = max(1, -(-total // app_config.default_page_size))
+    
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("⬅️ Précédent", key="demandes_prev_page", disabled=page_number <= 1):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {page_number} / {page_count} — {total} demande(s)")
+    with col3:
+        if st.button("Suivant ➡️", key="demandes_next_page", disabled=not page.get('has_more')):
+            cursors.append(page['next_cursor'])
+            st.rerun()
+
+def _compute_totals(demandes):
+    """Totaux d'un DataFrame de demandes (même forme que DemandeController.get_demandes_totals)"""
+    if demandes.empty:
+        return {'total': 0, 'montant_total': 0, 'montant_valide': 0, 'en_attente': 0, 'validees': 0}
+    validees = demandes[demandes['status'] == 'validee']
+    return {
+        'total': len(demandes),
+        'montant_total': demandes['montant'].sum(),
+        'montant_valide': validees['montant'].sum(),
+        'en_attente': len(demandes[demandes['status'].str.contains('attente', na=False)]),
+        'validees': len(validees),
+    }
 
 def _apply_filters(demandes, type_filter, montant_filter, search_query):
     """Applique les filtres supplémentaires aux demandes"""
@@ -239,14 +299,14 @@ def _display_filters():
                 st.session_state.page = "nouvelle_demande"
                 st.rerun()
 
-def _display_quick_stats(demandes):
+def _display_quick_stats(totals):
     """Affiche des statistiques rapides"""
     col1, col2, col3, col4 = st.columns(4)
     
-    total_montant = demandes['montant'].sum()
-    montant_valide = demandes[demandes['status'] == 'validee']['montant'].sum()
-    en_attente = len(demandes[demandes['status'].str.contains('attente', na=False)])
-    taux_validation = (len(demandes[demandes['status'] == 'validee']) / len(demandes) * 100) if len(demandes) > 0 else 0
+    total_montant = totals['montant_total']
+    montant_valide = totals['montant_valide']
+    en_attente = totals['en_attente']
+    taux_validation = (totals['validees'] / totals['total'] * 100) if totals['total'] > 0 else 0
     
     with col1:
         st.metric("Montant Total", f"{total_montant:,.0f}€")
@@ -258,134 +318,133 @@ def _display_quick_stats(demandes):
         st.metric("Taux Validation", f"{taux_validation:.1f}%")
 
 def _display_cards_view(demandes, user_info):
-    """Affiche les demandes en mode cartes"""
+    """Affiche les demandes en mode cartes ; le détail n'est construit que pour les cartes ouvertes"""
+    # Participants, valideurs et labels de la page chargés en lot à la première carte ouverte
+    loader = DemandeCardLoader(demandes)
     for idx, row in demandes.iterrows():
         status_info = get_status_info(row['status'])
         
-        with st.expander(
+        # Le contenu d'un st.expander est toujours exécuté : l'ouverture passe par un toggle
+        # pour ne charger libellés, participants et valideurs que des cartes consultées
+        opened = st.toggle(
             f"{status_info['icon']} {row['nom_manifestation']} - {row['montant']:,.0f}€",
-            expanded=False
-        ):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Utiliser la nouvelle transformation pour les régions (via l'utilitaire)
-                try:
-                    from utils.dropdown_display import DropdownDisplayUtils
-                    display_labels = DropdownDisplayUtils.get_display_labels_for_demande(row)
-                except ImportError:
-                    # Fallback vers les valeurs brutes si l'utilitaire n'est pas disponible
-                    # et utiliser get_region_display_value pour la région comme fallback spécifique
-                    try:
-                         from models.dropdown_options import DropdownOptionsModel
-                         region_display = DropdownOptionsModel.get_region_display_value(row.get('region'))
-                    except ImportError:
-                         region_display = row.get('region','N/A')
-
-                    display_labels = {
-                        'budget': row.get('budget', 'N/A'),
-                        'categorie': row.get('categorie', 'N/A'),
-                        'typologie_client': row.get('typologie_client', 'N/A'),
-                        'groupe_groupement': row.get('groupe_groupement', 'N/A'),
-                        'region': region_display
-                    }
-                
-                st.markdown("**📝 Détails:**")
-                st.markdown(f"- **Type:** {row.get('type_demande','N/A').title()}")
-                st.markdown(f"- **Budget:** {display_labels['budget']}")
-                st.markdown(f"- **Catégorie:** {display_labels['categorie']}")
-                st.markdown(f"- **Typologie Client:** {display_labels['typologie_client']}")
-                st.markdown(f"- **Groupe/Groupement:** {display_labels['groupe_groupement']}")
-                st.markdown(f"- **Région:** {display_labels['region']}")
-                st.markdown(f"- **Agence:** {row.get('agence','N/A')}")
-                st.markdown(f"- **Client/Enseigne:** {row.get('client_enseigne','N/A')}")
-                st.markdown(f"- **Email Contact:** {row.get('mail_contact','N/A')}")
-                st.markdown(f"- **Nom Contact:** {row.get('nom_contact','N/A')}")
-                st.markdown(f"- **Client:** {row.get('client','N/A')}")
-                st.markdown(f"- **Date événement:** {format_date(row.get('date_evenement'))}")
-                st.markdown(f"- **Lieu:** {row.get('lieu','N/A')}")
-                st.markdown(f"- **Montant:** {row.get('montant', 0.0):,.0f}€")
-
-                # Afficher les participants améliorés
-                try:
-                    from views.components.participants_selector import get_participants_display_text
-                    participants_text = get_participants_display_text(
-                        row['id'], 
-                        {'prenom': row.get('prenom', 'N/A'), 'nom': row.get('nom', 'N/A'), 'role': row.get('user_role', 'tc')},
-                        row.get('demandeur_participe', True),
-                        row.get('participants_libres', '')
-                    )
-                    if participants_text and participants_text != "Aucun participant":
-                        st.markdown(f"- **Participants:** {participants_text}")
-                except ImportError:
-                    # Fallback vers l'ancien affichage
-                    if row.get('participants'):
-                        st.markdown(f"- **Participants:** {row.get('participants','N/A')}")
-
-            with col2:
-                st.markdown("**👤 Informations:**")
-                st.markdown(f"- **Demandeur:** {row.get('prenom','N/A')} {row.get('nom','N/A')}")
-                st.markdown(f"- **Email Demandeur:** {row.get('email','N/A')}")
-                st.markdown(f"- **Rôle Demandeur:** {row.get('user_role','N/A')}")
-                st.markdown(f"- **Statut:** {status_info['label']}")
-                st.markdown(f"- **Année Fiscale:** {row.get('by', 'N/A')}")
-                st.markdown(f"- **Urgence:** {row.get('urgence','normale').title()}")
-                st.markdown(f"- **Créée le:** {format_date(row.get('created_at'))}")
-                st.markdown(f"- **Modifiée le:** {format_date(row.get('updated_at'))}")
-
-                # --- Statut Validations: DR, Financier, DG ---
-                st.markdown("**Statut Validations:**")
-                from models.user import UserModel # Importer ici pour éviter les dépendances circulaires
-                import pandas as pd # Importer pandas pour isna
-
-                # Statut DR
-                dr_validated_id = row.get('valideur_dr_id')
-                dr_status_text = "⏳ En attente DR"
-                if dr_validated_id is not None and isinstance(dr_validated_id, (int, float)) and not pd.isna(dr_validated_id):
-                    dr_validated_id = int(dr_validated_id)
-                    dr_validator = UserModel.get_user_by_id(dr_validated_id)
-                    if dr_validator:
-                        dr_status_text = f"✅ Validé par {dr_validator.get('prenom', '')} {dr_validator.get('nom', '')} : {format_date(row.get('date_validation_dr'))}"
-                    else:
-                        dr_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_dr'))}"
-                st.markdown(f"- {dr_status_text}")
-
-                # Statut Financier
-                fin_validated_id = row.get('valideur_financier_id')
-                fin_status_text = "⏳ En attente Financier"
-                if fin_validated_id is not None and isinstance(fin_validated_id, (int, float)) and not pd.isna(fin_validated_id):
-                     fin_validated_id = int(fin_validated_id)
-                     fin_validator = UserModel.get_user_by_id(fin_validated_id)
-                     if fin_validator:
-                          fin_status_text = f"✅ Validé par {fin_validator.get('prenom', '')} {fin_validator.get('nom', '')} : {format_date(row.get('date_validation_financier'))}"
-                     else:
-                          fin_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_financier'))}"
-                st.markdown(f"- {fin_status_text}")
-
-                # Statut DG
-                dg_validated_id = row.get('valideur_dg_id')
-                dg_status_text = "⏳ En attente DG"
-                if dg_validated_id is not None and isinstance(dg_validated_id, (int, float)) and not pd.isna(dg_validated_id):
-                    dg_validated_id = int(dg_validated_id)
-                    dg_validator = UserModel.get_user_by_id(dg_validated_id)
-                    if dg_validator:
-                        dg_status_text = f"✅ Validé par {dg_validator.get('prenom', '')} {dg_validator.get('nom', '')} : {format_date(row.get('date_validation_dg'))}"
-                    else:
-                        dg_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_dg'))}"
-                st.markdown(f"- {dg_status_text}")
+            key=f"demande_card_{row['id']}"
+        )
+        if not opened:
+            continue
+        
+        with st.container():
+            _display_card_details(row, user_info, status_info, loader)
 
-            # Commentaires généraux sous les colonnes
-            if row.get('commentaires'):
-                st.markdown("**💭 Commentaires Généraux:**")
-                st.markdown(row.get('commentaires'))
+def _display_card_details(row, user_info, status_info, loader):
+    """Détail d'une demande : informations, validations, commentaires et actions"""
+    col1, col2 = st.columns(2)
 
-            st.markdown("---") # Séparateur
+    with col1:
+        # Utiliser la nouvelle transformation pour les régions (via l'utilitaire)
+        try:
+            display_labels = loader.display_labels(row)
+        except ImportError:
+            # Fallback vers les valeurs brutes si l'utilitaire n'est pas disponible
+            # et utiliser get_region_display_value pour la région comme fallback spécifique
+            try:
+                 from models.dropdown_options import DropdownOptionsModel
+                 region_display = DropdownOptionsModel.get_region_display_value(row.get('region'))
+            except ImportError:
+                 region_display = row.get('region','N/A')
+
+            display_labels = {
+                'budget': row.get('budget', 'N/A'),
+                'categorie': row.get('categorie', 'N/A'),
+                'typologie_client': row.get('typologie_client', 'N/A'),
+                'groupe_groupement': row.get('groupe_groupement', 'N/A'),
+                'region': region_display
+            }
 
-            # Afficher les actions disponibles pour cette demande (validation, soumission, suppression, etc.)
-            _display_demande_actions(row, user_info)
-            
-            # --- Ajouter les actions de validation si applicable ---
-            _display_demande_validation_actions(row, user_info)
+        st.markdown("**📝 Détails:**")
+        st.markdown(f"- **Type:** {row.get('type_demande','N/A').title()}")
+        st.markdown(f"- **Budget:** {display_labels['budget']}")
+        st.markdown(f"- **Catégorie:** {display_labels['categorie']}")
+        st.markdown(f"- **Typologie Client:** {display_labels['typologie_client']}")
+        st.markdown(f"- **Groupe/Groupement:** {display_labels['groupe_groupement']}")
+        st.markdown(f"- **Région:** {display_labels['region']}")
+        st.markdown(f"- **Agence:** {row.get('agence','N/A')}")
+        st.markdown(f"- **Client/Enseigne:** {row.get('client_enseigne','N/A')}")
+        st.markdown(f"- **Email Contact:** {row.get('mail_contact','N/A')}")
+        st.markdown(f"- **Nom Contact:** {row.get('nom_contact','N/A')}")
+        st.markdown(f"- **Client:** {row.get('client','N/A')}")
+        st.markdown(f"- **Date événement:** {format_date(row.get('date_evenement'))}")
+        st.markdown(f"- **Lieu:** {row.get('lieu','N/A')}")
+        st.markdown(f"- **Montant:** {row.get('montant', 0.0):,.0f}€")
+
+        # Participants préchargés pour toute la page
+        participants_text = loader.participants_text(row)
+        if participants_text and participants_text != "Aucun participant":
+            st.markdown(f"- **Participants:** {participants_text}")
+
+    with col2:
+        st.markdown("**👤 Informations:**")
+        st.markdown(f"- **Demandeur:** {row.get('prenom','N/A')} {row.get('nom','N/A')}")
+        st.markdown(f"- **Email Demandeur:** {row.get('email','N/A')}")
+        st.markdown(f"- **Rôle Demandeur:** {row.get('user_role','N/A')}")
+        st.markdown(f"- **Statut:** {status_info['label']}")
+        st.markdown(f"- **Année Fiscale:** {row.get('by', 'N/A')}")
+        st.markdown(f"- **Urgence:** {row.get('urgence','normale').title()}")
+        st.markdown(f"- **Créée le:** {format_date(row.get('created_at'))}")
+        st.markdown(f"- **Modifiée le:** {format_date(row.get('updated_at'))}")
+
+        # --- Statut Validations: DR, Financier, DG ---
+        st.markdown("**Statut Validations:**")
+        import pandas as pd # Importer pandas pour isna
+
+        # Statut DR
+        dr_validated_id = row.get('valideur_dr_id')
+        dr_status_text = "⏳ En attente DR"
+        if dr_validated_id is not None and isinstance(dr_validated_id, (int, float)) and not pd.isna(dr_validated_id):
+            dr_validated_id = int(dr_validated_id)
+            dr_validator = loader.user(dr_validated_id)
+            if dr_validator:
+                dr_status_text = f"✅ Validé par {dr_validator.get('prenom', '')} {dr_validator.get('nom', '')} : {format_date(row.get('date_validation_dr'))}"
+            else:
+                dr_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_dr'))}"
+        st.markdown(f"- {dr_status_text}")
+
+        # Statut Financier
+        fin_validated_id = row.get('valideur_financier_id')
+        fin_status_text = "⏳ En attente Financier"
+        if fin_validated_id is not None and isinstance(fin_validated_id, (int, float)) and not pd.isna(fin_validated_id):
+             fin_validated_id = int(fin_validated_id)
+             fin_validator = loader.user(fin_validated_id)
+             if fin_validator:
+                  fin_status_text = f"✅ Validé par {fin_validator.get('prenom', '')} {fin_validator.get('nom', '')} : {format_date(row.get('date_validation_financier'))}"
+             else:
+                  fin_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_financier'))}"
+        st.markdown(f"- {fin_status_text}")
+
+        # Statut DG
+        dg_validated_id = row.get('valideur_dg_id')
+        dg_status_text = "⏳ En attente DG"
+        if dg_validated_id is not None and isinstance(dg_validated_id, (int, float)) and not pd.isna(dg_validated_id):
+            dg_validated_id = int(dg_validated_id)
+            dg_validator = loader.user(dg_validated_id)
+            if dg_validator:
+                dg_status_text = f"✅ Validé par {dg_validator.get('prenom', '')} {dg_validator.get('nom', '')} : {format_date(row.get('date_validation_dg'))}"
+            else:
+                dg_status_text = f"✅ Validé par inconnu : {format_date(row.get('date_validation_dg'))}"
+        st.markdown(f"- {dg_status_text}")
+
+    # Commentaires généraux sous les colonnes
+    if row.get('commentaires'):
+        st.markdown("**💭 Commentaires Généraux:**")
+        st.markdown(row.get('commentaires'))
+
+    st.markdown("---") # Séparateur
+
+    # Afficher les actions disponibles pour cette demande (validation, soumission, suppression, etc.)
+    _display_demande_actions(row, user_info)
+
+    # --- Ajouter les actions de validation si applicable ---
+    _display_demande_validation_actions(row, user_info)
 
 def _display_demande_actions(row, user_info):
     """Affiche les actions spécifiques (soumettre, modifier, supprimer) pour une demande"""
@@ -409,7 +468,8 @@ def _display_demande_actions(row, user_info):
                 _handle_delete_demande(row['id'])
     
     elif (row['status'] == 'en_attente_dr' and 
-          user_info['role'] == 'dr'):
+          user_info['role'] == 'dr' and
+          AuthController.can_validate_demande(row['status'], int(row['user_id']))):
         
         with col1:
             if st.button("✅ Valider", key=f"validate_dr_{row['id']}", use_container_width=True):
@@ -463,13 +523,17 @@ def _handle_submit_demande(demande_id):
     """Gère la soumission d'une demande"""
     with st.spinner("Soumission en cours..."):
         try:
-            success, message = DemandeController.submit_demande(
+            success, message, warning = DemandeController.submit_demande(
                 demande_id, AuthController.get_current_user_id()
             )
             
             if success:
                 st.success("✅ Demande soumise avec succès!")
-                st.rerun()
+                # Avertissement de budget (politique 'warn') : affiché au lieu de recharger la page
+                if warning:
+                    st.warning(message)
+                else:
+                    st.rerun()
             else:
                 st.error(f"❌ {message}")
         except Exception as e:
@@ -561,7 +625,8 @@ def _display_demande_validation_actions(row, user_info):
     current_user_id = user_info['id']
     
     # Actions de validation pour le rôle DR
-    if row['status'] == 'en_attente_dr' and role == 'dr':
+    if (row['status'] == 'en_attente_dr' and role == 'dr'
+            and AuthController.can_validate_demande(row['status'], int(row['user_id']))):
         st.markdown("**Action DR:**")
         col1, col2 = st.columns(2)
         
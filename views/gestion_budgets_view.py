@@ -2,6 +2,7 @@
 Vue pour la gestion des budgets utilisateurs par année fiscale
 """
 import streamlit as st
+import pandas as pd
 from datetime import date
 from controllers.auth_controller import AuthController
 from models.user_budget import UserBudgetModel
@@ -112,9 +113,26 @@ def _display_budget_overview(fiscal_year):
                 st.write(f"{role_data['user_count']} utilisateur(s)")
             with col3:
                 st.write(f"{role_data['total_budget']:,.0f}€")
-    
-    # Liste des utilisateurs avec budgets
-    budgets = UserBudgetModel.get_all_budgets_for_year(fiscal_year)
+
+    # Répartition par directeur (équipe complète, tous niveaux)
+    if summary.get('by_director'):
+        st.markdown("#### 🏢 Répartition par Directeur")
+
+        for director_data in summary['by_director']:
+            col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+
+            with col1:
+                st.write(f"**{director_data['prenom']} {director_data['nom']}**")
+                st.caption(f"🌍 {director_data.get('region') or 'N/A'}")
+            with col2:
+                st.write(f"{director_data['user_count']} utilisateur(s)")
+            with col3:
+                st.write(f"{director_data['total_budget']:,.0f}€")
+            with col4:
+                st.write(f"{director_data['consumed_budget']:,.0f}€ consommés")
+
+    # Liste des utilisateurs avec budgets (consommation de tous les utilisateurs en une requête)
+    budgets = UserBudgetModel.get_budget_consumption_for_year(fiscal_year)
     
     if budgets:
         st.markdown("#### 👥 Utilisateurs avec Budget")
@@ -130,8 +148,7 @@ def _display_budget_overview(fiscal_year):
                 st.write(f"{budget['allocated_budget']:,.0f}€")
             
             with col3:
-                consumption = UserBudgetModel.get_budget_consumption(budget['user_id'], fiscal_year)
-                st.write(f"{consumption['consumption_rate']:.1f}%")
+                st.write(f"{budget['consumption_rate']:.1f}%")
             
             with col4:
                 if st.button("✏️", key=f"edit_budget_{budget['user_id']}", help="Modifier le budget"):
@@ -250,7 +267,7 @@ def _display_bulk_assignment(fiscal_year):
                     for user in role_users:
                         budgets_to_assign.append({
                             'user_id': user['id'],
-                            'fiscal_year': fiscal_year,
+                            'by': fiscal_year,
                             'allocated_budget': role_budget
                         })
         
@@ -310,21 +327,30 @@ def _display_copy_previous_year(fiscal_year, annee_fiscale_options):
             help="Pourcentage d'augmentation/diminution par rapport à l'année source"
         )
         
-        # Aperçu
-        source_budgets = UserBudgetModel.get_all_budgets_for_year(source_year)
-        if source_budgets:
-            st.info(f"📊 {len(source_budgets)} budget(s) trouvé(s) pour {source_year}")
+        # Aperçu : écart calculé sans écriture
+        preview = UserBudgetModel.copy_budgets_to_next_year(source_year, fiscal_year, increase_pct, dry_run=True)
+        diff = preview['diff']
+        to_copy = diff['new'] + diff['overwritten'] + diff['unchanged']
+        if to_copy or diff['skipped_inactive']:
+            st.info(f"📊 {len(to_copy) + len(diff['skipped_inactive'])} budget(s) trouvé(s) pour {source_year} : "
+                    f"{len(diff['new'])} nouveau(x), {len(diff['overwritten'])} remplacé(s), "
+                    f"{len(diff['unchanged'])} inchangé(s), {len(diff['skipped_inactive'])} utilisateur(s) inactif(s) ignoré(s)")
             
             if increase_pct != 0:
-                total_old = sum(b['allocated_budget'] for b in source_budgets)
-                total_new = total_old * (1 + increase_pct / 100)
+                total_old = sum(b['source_amount'] for b in to_copy)
+                total_new = sum(b['new_amount'] for b in to_copy)
                 st.info(f"💰 Total: {total_old:,.0f}€ → {total_new:,.0f}€")
+            
+            if diff['overwritten']:
+                with st.expander(f"⚠️ {len(diff['overwritten'])} budget(s) {fiscal_year} existant(s) remplacé(s)"):
+                    for b in diff['overwritten']:
+                        st.write(f"**{b['prenom']} {b['nom']}** : {b['current_amount']:,.0f}€ → {b['new_amount']:,.0f}€")
         else:
             st.warning(f"Aucun budget trouvé pour {source_year}")
         
         submitted = st.form_submit_button("📋 Copier les Budgets", type="primary")
         
-        if submitted and source_budgets:
+        if submitted and to_copy:
             result = UserBudgetModel.copy_budgets_to_next_year(source_year, fiscal_year, increase_pct)
             
             st.success(f"✅ {result['success_count']} budget(s) copié(s) avec succès !")
@@ -338,7 +364,7 @@ def _display_budget_analysis(fiscal_year):
     st.markdown("### 📈 Analyse des Budgets")
     
     # Récupérer toutes les données
-    budgets = UserBudgetModel.get_all_budgets_for_year(fiscal_year)
+    budgets = UserBudgetModel.get_budget_consumption_for_year(fiscal_year)
     
     if not budgets:
         st.info("Aucun budget configuré pour cette année")
@@ -347,13 +373,11 @@ def _display_budget_analysis(fiscal_year):
     # Analyse de consommation
     st.markdown("#### 🎯 Consommation des Budgets")
     
-    for budget in budgets:
-        consumption = UserBudgetModel.get_budget_consumption(budget['user_id'], fiscal_year)
-        
+    for consumption in budgets:
         col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
         
         with col1:
-            st.write(f"**{budget['prenom']} {budget['nom']}**")
+            st.write(f"**{consumption['prenom']} {consumption['nom']}**")
         
         with col2:
             st.write(f"{consumption['allocated_budget']:,.0f}€")
@@ -369,13 +393,33 @@ def _display_budget_analysis(fiscal_year):
         progress = min(consumption['consumption_rate'] / 100, 1.0)
         st.progress(progress)
     
+    _display_consumption_trend()
+    
     # Graphiques d'analyse
     if len(budgets) > 1:
         st.markdown("#### 📊 Graphiques d'Analyse")
         
         # TODO: Ajouter des graphiques avec plotly
         # - Répartition des budgets par rôle
-        # - Évolution de la consommation
         # - Comparaison avec l'année précédente
         
         st.info("📈 Graphiques d'analyse à venir...")
+
+def _display_consumption_trend():
+    """Affiche le taux de consommation de chaque utilisateur par année fiscale"""
+    matrix = UserBudgetModel.get_budget_consumption_matrix()
+    
+    if len(matrix['fiscal_years']) < 2 or not matrix['users']:
+        return
+    
+    st.markdown("#### 📅 Évolution par Année Fiscale")
+    
+    rows = []
+    for user in matrix['users']:
+        row = {'Utilisateur': f"{user['prenom']} {user['nom']}"}
+        for by in matrix['fiscal_years']:
+            consumption = user['years'].get(by)
+            row[by] = f"{consumption['consumed_budget']:,.0f}€ ({consumption['consumption_rate']:.0f}%)" if consumption else "-"
+        rows.append(row)
+    
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
@@ -820,40 +820,21 @@ def _display_export_options():
         
         if st.button("📥 Générer Export Excel", type="primary", use_container_width=True):
             with st.spinner("Génération de l'export en cours..."):
-                export_df = UserController.export_users()
+                # Écriture en flux dans un fichier temporaire (pas de DataFrame complet en mémoire)
+                result = UserController.export_users_file(
+                    fmt='xlsx',
+                    active_only=export_active_only,
+                    exported_by=AuthController.get_current_user()['email']
+                )
                 
-                if not export_df.empty:
-                    if export_active_only:
-                        export_df = export_df[export_df['Actif'] == 'Oui']
-                    
-                    # Convertir en Excel
-                    from io import BytesIO
-                    import pandas as pd
-                    
-                    buffer = BytesIO()
-                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                        export_df.to_excel(writer, sheet_name='Utilisateurs', index=False)
-                        
-                        # Ajouter les statistiques
-                        stats_df = pd.DataFrame([
-                            ['Total utilisateurs', len(export_df)],
-                            ['Date export', datetime.now().strftime('%d/%m/%Y %H:%M')],
-                            ['Exporté par', AuthController.get_current_user()['email']]
-                        ], columns=['Statistique', 'Valeur'])
-                        
-                        stats_df.to_excel(writer, sheet_name='Informations', index=False)
-                    
-                    st.download_button(
-                        label="📥 Télécharger Excel",
-                        data=buffer.getvalue(),
-                        file_name=f"utilisateurs_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        use_container_width=True
-                    )
-                    
-                    st.success(f"✅ Export généré: {len(export_df)} utilisateur(s)")
-                else:
+                if result['success'] and result['rows'] > 0:
+                    from utils.streaming_export import download_export_button
+                    download_export_button(result, label="📥 Télécharger Excel", use_container_width=True)
+                    st.success(f"✅ Export généré: {result['rows']} utilisateur(s)")
+                elif result['success']:
                     st.error("❌ Aucune donnée à exporter")
+                else:
+                    st.error(f"❌ Erreur lors de l'export: {result['error']}")
     
     with col2:
         st.markdown("#### ℹ️ Informations Export")
@@ -26,6 +26,8 @@ def nouvelle_demande_page():
         type_demande = st.session_state.get('last_created_demande_type', 'budget')
         
         st.success("✅ Demande créée avec succès !")
+        if st.session_state.get('last_created_demande_warning'):
+            st.warning(st.session_state.last_created_demande_warning)
         st.balloons()
         
         # Afficher le résumé
@@ -65,14 +67,17 @@ def nouvelle_demande_page():
         st.info("💰 Vous créez une demande Budget qui suivra le workflow de validation")
     
     # Récupérer les options depuis la table dropdown_options
-    from views.admin_dropdown_options_view import get_valid_dropdown_options
+    from views.admin_dropdown_options_view import get_valid_dropdown_options_by_category
     
-    budget_options = get_valid_dropdown_options('budget')
-    categorie_options = get_valid_dropdown_options('categorie')
-    typologie_options = get_valid_dropdown_options('typologie_client')
-    region_options = get_valid_dropdown_options('region')
-    groupe_options = get_valid_dropdown_options('groupe_groupement')
-    annee_fiscale_options = get_valid_dropdown_options('annee_fiscale')
+    form_options = get_valid_dropdown_options_by_category(
+        ('budget', 'categorie', 'typologie_client', 'region', 'groupe_groupement', 'annee_fiscale')
+    )
+    budget_options = form_options['budget']
+    categorie_options = form_options['categorie']
+    typologie_options = form_options['typologie_client']
+    region_options = form_options['region']
+    groupe_options = form_options['groupe_groupement']
+    annee_fiscale_options = form_options['annee_fiscale']
     
     # Vérifier si les options sont disponibles
     if not budget_options and not categorie_options:
@@ -91,7 +96,7 @@ def _clear_creation_state():
     """Nettoie complètement l'état de création"""
     keys_to_clear = [
         'demande_creation_success', 'last_created_demande_id', 'last_created_demande_nom',
-        'last_created_demande_montant', 'last_created_demande_type',
+        'last_created_demande_montant', 'last_created_demande_type', 'last_created_demande_warning',
         'demande_created', 'created_demande_id', 'created_demande_nom', 
         'created_demande_montant', 'created_demande_type'
     ]
@@ -100,8 +105,8 @@ def _clear_creation_state():
         if key in st.session_state:
             del st.session_state[key]
 
-def _set_creation_success(demande_id, nom_manifestation, montant, type_demande):
-    """Marque une création comme réussie"""
+def _set_creation_success(demande_id, nom_manifestation, montant, type_demande, warning=None):
+    """Marque une création comme réussie (warning : avertissement de la soumission, ex. budget dépassé)"""
     # Nettoyer d'abord les anciens états
     _clear_creation_state()
     
@@ -111,6 +116,7 @@ def _set_creation_success(demande_id, nom_manifestation, montant, type_demande):
     st.session_state.last_created_demande_nom = nom_manifestation
     st.session_state.last_created_demande_montant = montant
     st.session_state.last_created_demande_type = type_demande
+    st.session_state.last_created_demande_warning = warning
 
 def _display_simplified_form(type_demande, user_info):
     """Affiche le formulaire simplifié"""
@@ -383,12 +389,13 @@ def _display_full_form(type_demande, user_info, budget_options, categorie_option
             if submit_btn:
                 # Soumettre immédiatement
                 with st.spinner("Soumission en cours..."):
-                    submit_success, submit_message = DemandeController.submit_demande(
+                    submit_success, submit_message, submit_warning = DemandeController.submit_demande(
                         demande_id, AuthController.get_current_user_id()
                     )
                 
                 if submit_success:
-                    _set_creation_success(demande_id, nom_manifestation, montant, type_demande)
+                    _set_creation_success(demande_id, nom_manifestation, montant, type_demande,
+                                          warning=submit_message if submit_warning else None)
                     st.rerun()
                 else:
                     st.error(f"❌ Erreur lors de la soumission: {submit_message}")
@@ -467,7 +467,7 @@ def nouvelle_demande_page():
             if submit_btn:
                 # Soumettre immédiatement
                 with st.spinner("Soumission de la demande en cours..."):
-                    submit_success, submit_message = DemandeController.submit_demande(
+                    submit_success, submit_message, _ = DemandeController.submit_demande(
                         demande_id, AuthController.get_current_user_id()
                     )
                 
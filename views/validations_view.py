@@ -9,6 +9,7 @@ from controllers.demande_controller import DemandeController
 from config.settings import get_status_info
 from utils.date_utils import format_date
 from models.user import UserModel
+from services.demande_card_loader import DemandeCardLoader
 
 @AuthController.require_role(['dr', 'dr_financier', 'dg'])
 def validations_page():
@@ -61,12 +62,13 @@ def _get_demandes_validation(user_info):
     fiscal_year_param = fiscal_year_filter if fiscal_year_filter != 'Tous' else None
     
     if role == 'dr':
-        # DR voit les demandes en attente DR de son équipe
+        # DR voit les demandes en attente DR de toute son équipe (hors simples participations)
         return DemandeController.get_demandes_for_user(
             user_id,
             role,
             status_filter='en_attente_dr',
-            fiscal_year_filter=fiscal_year_param
+            fiscal_year_filter=fiscal_year_param,
+            filters={'team_of': user_id}
         )
     elif role in ['dr_financier', 'dg']:
         # Financiers voient toutes les demandes en attente financière
@@ -224,8 +226,10 @@ def _display_pending_validations(demandes, user_info):
     if len(filtered_demandes) != len(demandes):
         st.info(f"🔍 {len(filtered_demandes)} demande(s) sur {len(demandes)} après filtrage")
     
+    # Participants, valideurs et labels de toutes les cartes en quelques requêtes groupées
+    loader = DemandeCardLoader(filtered_demandes)
     for idx, row in filtered_demandes.iterrows():
-        _display_validation_card(row, user_info)
+        _display_validation_card(row, user_info, loader)
 
 def _apply_validation_filters(demandes):
     """Applique les filtres aux demandes de validation"""
@@ -272,7 +276,7 @@ def _apply_validation_filters(demandes):
     
     return filtered_demandes
 
-def _display_validation_card(row, user_info):
+def _display_validation_card(row, user_info, loader):
     """Affiche une carte de validation pour une demande (maintenant un expander)"""
     urgence_colors = {
         'normale': '🟢',
@@ -293,8 +297,7 @@ def _display_validation_card(row, user_info):
         with col1:
             # Récupérer les labels d'affichage pour les options
             try:
-                from utils.dropdown_display import DropdownDisplayUtils
-                display_labels = DropdownDisplayUtils.get_display_labels_for_demande(row)
+                display_labels = loader.display_labels(row)
             except ImportError:
                 # Fallback vers les valeurs brutes si l'utilitaire n'est pas disponible
                 display_labels = {
@@ -321,21 +324,10 @@ def _display_validation_card(row, user_info):
             st.markdown(f"- **Lieu:** {row.get('lieu','N/A')}")
             st.markdown(f"- **Montant:** {row.get('montant', 0.0):,.0f}€")
             
-            # Afficher les participants améliorés
-            try:
-                from views.components.participants_selector import get_participants_display_text
-                participants_text = get_participants_display_text(
-                    row['id'], 
-                    {'prenom': row.get('prenom', 'N/A'), 'nom': row.get('nom', 'N/A'), 'role': row.get('user_role', 'tc')},
-                    row.get('demandeur_participe', True),
-                    row.get('participants_libres', '')
-                )
-                if participants_text and participants_text != "Aucun participant":
-                    st.markdown(f"- **Participants:** {participants_text}")
-            except ImportError:
-                # Fallback vers l'ancien affichage
-                if row.get('participants'):
-                    st.markdown(f"- **Participants:** {row.get('participants','N/A')}")
+            # Participants préchargés pour toute la page
+            participants_text = loader.participants_text(row)
+            if participants_text and participants_text != "Aucun participant":
+                st.markdown(f"- **Participants:** {participants_text}")
 
         with col2:
             st.markdown("**👤 Informations:**")
@@ -350,7 +342,6 @@ def _display_validation_card(row, user_info):
 
             # --- Statut Validations: DR, Financier, DG ---
             st.markdown("**Statut Validations:**")
-            from models.user import UserModel # Importer ici pour éviter les dépendances circulaires
             import pandas as pd # Importer pandas pour isna
 
             # Statut DR
@@ -358,7 +349,7 @@ def _display_validation_card(row, user_info):
             dr_status_text = "⏳ En attente DR"
             if dr_validated_id is not None and isinstance(dr_validated_id, (int, float)) and not pd.isna(dr_validated_id):
                  dr_validated_id = int(dr_validated_id)
-                 dr_validator = UserModel.get_user_by_id(dr_validated_id)
+                 dr_validator = loader.user(dr_validated_id)
                  if dr_validator:
                       dr_status_text = f"✅ Validé par {dr_validator.get('prenom', '')} {dr_validator.get('nom', '')} : {format_date(row.get('date_validation_dr'))}"
                  else:
@@ -371,7 +362,7 @@ def _display_validation_card(row, user_info):
             fin_status_text = "⏳ En attente Financier"
             if fin_validated_id is not None and isinstance(fin_validated_id, (int, float)) and not pd.isna(fin_validated_id):
                  fin_validated_id = int(fin_validated_id)
-                 fin_validator = UserModel.get_user_by_id(fin_validated_id)
+                 fin_validator = loader.user(fin_validated_id)
                  if fin_validator:
                       fin_status_text = f"✅ Validé par {fin_validator.get('prenom', '')} {fin_validator.get('nom', '')} : {format_date(row.get('date_validation_financier'))}"
                  else:
@@ -383,7 +374,7 @@ def _display_validation_card(row, user_info):
             dg_status_text = "⏳ En attente DG"
             if dg_validated_id is not None and isinstance(dg_validated_id, (int, float)) and not pd.isna(dg_validated_id):
                 dg_validated_id = int(dg_validated_id)
-                dg_validator = UserModel.get_user_by_id(dg_validated_id)
+                dg_validator = loader.user(dg_validated_id)
                 if dg_validator:
                      dg_status_text = f"✅ Validé par {dg_validator.get('prenom', '')} {dg_validator.get('nom', '')} : {format_date(row.get('date_validation_dg'))}"
                 else:
@@ -416,7 +407,8 @@ def _display_validation_actions(row, user_info):
         st.write(f"🔍 DEBUG - Valideur Financier: {row.get('valideur_financier_id')}")
         st.write(f"🔍 DEBUG - Valideur DG: {row.get('valideur_dg_id')}")
     
-    if role == 'dr' and row['status'] == 'en_attente_dr':
+    if (role == 'dr' and row['status'] == 'en_attente_dr'
+            and AuthController.can_validate_demande(row['status'], int(row['user_id']))):
         col1, col2 = st.columns(2)
         
         with col1: